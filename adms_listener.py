@@ -4,40 +4,222 @@ ADMS Protocol Listener pour terminaux ZKTeco IN01
 Écoute le protocole ADMS et convertit vers HTTP pour PointaFlex
 """
 
+import argparse
+import asyncio
 import socket
 import struct
-import json
+import sys
+import logging
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from datetime import datetime
+from pathlib import Path
 import threading
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from agent_logging import setup_logging
+from agent_metrics import TerminalMetrics, start_metrics_server
+from backlog_drainer import BacklogDrainer
+from punch_wire import WireFormat
+from wal_queue import WriteAheadQueue
+
 # Configuration
 ADMS_LISTEN_PORT = 8081
-BACKEND_URL = "http://localhost:3000/api/v1/attendance/push"
+BACKEND_URL = "http://localhost:3000/api/v1/attendance/webhook/state/bulk"  # Lots de la queue, une requête par lot
 DEVICE_ID = "Terminal_Caisse"
 TENANT_ID = "90fab0cc-8539-4566-8da7-8742e9b6937b"
+LISTEN_BACKLOG = 512  # File d'attente accept() (l'ancien listen(5) refusait des connexions au changement d'équipe)
+DELIVERY_WORKERS = 16  # Envois backend simultanés en mode asyncio
+QUEUE_DIR = str(Path(__file__).resolve().parent / "adms_queue")  # Queue durable locale
+BATCH_MAX_SIZE = 50  # Pointages max par lot envoyé au backend
+BULK_MAX_SIZE = 500  # Maximum accepté par l'endpoint bulk
+BATCH_MAX_WAIT = 0.5  # Secondes max d'attente pour compléter un lot
+BACKEND_TIMEOUT = 30  # Un lot est traité en une requête (transaction côté backend)
+# Format des lots: "auto" (binaire compact dès que le backend l'annonce), "binary" ou "json"
+BULK_WIRE_FORMAT = "auto"
+RETRY_DELAY = 5  # Secondes avant de réessayer un lot refusé par le backend
+LOG_FILE = str(Path(__file__).resolve().parent / "adms_listener.log")  # JSON-lines, rotation par taille
+METRICS_PORT = 9103  # Endpoint Prometheus http://localhost:9103/metrics (0 = désactivé)
+
+logger = logging.getLogger("adms_listener")
+
+ACK_FRAME = b'\x50\x50\x82\x7D\x00\x00\x00\x00\x00\x00\x00\x00'
+RECV_BUFFER_SIZE = 65536
+
+# Format des frames ADMS:
+# Bytes 0-1: magic 0x50 0x50
+# Bytes 2-3: command (uint16 LE) - 0x0011 temps réel, 0x0012 pointages stockés
+# Bytes 4-7: longueur du payload (uint32 LE) - 0 sur les anciens firmwares = 1 enregistrement
+# Payload:   N enregistrements de 10 bytes (user_id uint32, timestamp uint32, status, verify mode)
+ADMS_MAGIC = b'\x50\x50'
+ADMS_HEADER = struct.Struct('<2sHI')
+ADMS_RECORD = struct.Struct('<IIBB')
+ADMS_ATTENDANCE_COMMANDS = (0x0011, 0x0012)
+MAX_FRAME_RECORDS = 256  # Enregistrements max par frame (rafale de pointages stockés)
+MAX_FRAME_PAYLOAD = MAX_FRAME_RECORDS * ADMS_RECORD.size  # Au-delà, l'en-tête est considéré corrompu
+FRAME_TIMEOUT = 5  # Secondes sans données avant d'abandonner un frame incomplet
+
+# Mapping des modes de vérification
+VERIFY_MODE_MAP = {
+    0: "PIN_CODE",
+    1: "FINGERPRINT",
+    3: "FINGERPRINT",
+    4: "FACE_RECOGNITION",
+    15: "RFID_BADGE"
+}
+
+# terminalState du webhook state (0 = Check-In, 1 = Check-Out)
+TERMINAL_STATES = {"IN": 0, "OUT": 1}
+ACCEPTED_STATUSES = ("CREATED", "DUPLICATE", "DEBOUNCE_BLOCKED")
+
+class ADMSFramer:
+    """
+    Découpage incrémental du flux TCP ADMS en frames.
+
+    Un recv() peut contenir plusieurs frames (rafale de pointages stockés après
+    une coupure réseau) ou seulement une partie d'un frame: les octets sont
+    accumulés dans un bytearray réutilisé, chaque frame complet est décodé en
+    place via memoryview (struct.iter_unpack, sans copie du payload) et seul le
+    reste incomplet est conservé pour le prochain appel. Une longueur au-delà
+    de max_payload est traitée comme un en-tête corrompu; un frame resté
+    incomplet après FRAME_TIMEOUT est abandonné (drop_partial).
+    """
+
+    def __init__(self, max_payload=MAX_FRAME_PAYLOAD):
+        self.buffer = bytearray()
+        self.max_payload = max_payload
+        self.discarded = 0  # Octets ignorés lors des resynchronisations
+        self.reported_discarded = 0
+
+    def feed(self, data):
+        """
+        Ajoute des octets reçus et retourne la liste des frames complets:
+        [(command, [(user_id, timestamp, status, verify_mode), ...]), ...]
+        """
+        self.buffer += data
+        frames = []
+        buffer = self.buffer
+        end = len(buffer)
+        pos = 0
+
+        view = memoryview(buffer)
+        try:
+            while end - pos >= ADMS_HEADER.size:
+                # Resynchronisation sur le prochain magic si le flux est corrompu
+                if not buffer.startswith(ADMS_MAGIC, pos):
+                    next_magic = buffer.find(ADMS_MAGIC, pos + 1)
+                    skip_to = next_magic if next_magic >= 0 else end - 1
+                    self.discarded += skip_to - pos
+                    pos = skip_to
+                    continue
+
+                _, command, length = ADMS_HEADER.unpack_from(buffer, pos)
+
+                if length == 0 and command in ADMS_ATTENDANCE_COMMANDS:
+                    length = ADMS_RECORD.size  # Ancien format: un seul enregistrement
+                elif length > self.max_payload:
+                    self.discarded += len(ADMS_MAGIC)
+                    pos += len(ADMS_MAGIC)
+                    continue
+
+                frame_end = pos + ADMS_HEADER.size + length
+                if frame_end > end:
+                    break  # Frame incomplet: attendre la suite
+
+                records = []
+                if command in ADMS_ATTENDANCE_COMMANDS:
+                    usable = length - length % ADMS_RECORD.size
+                    payload = view[pos + ADMS_HEADER.size:pos + ADMS_HEADER.size + usable]
+                    records = list(ADMS_RECORD.iter_unpack(payload))
+                    payload.release()
+
+                frames.append((command, records))
+                pos = frame_end
+        finally:
+            view.release()
+
+        # Conserver uniquement le reste incomplet
+        if pos:
+            del buffer[:pos]
+
+        return frames
+
+    def drop_partial(self):
+        """
+        Abandonne le frame incomplet en attente (délai de lecture dépassé):
+        le flux se resynchronise sur le prochain frame reçu. Retourne le
+        nombre d'octets abandonnés.
+        """
+        dropped = len(self.buffer)
+        if dropped:
+            self.discarded += dropped
+            del self.buffer[:]
+        return dropped
+
+    def take_discarded(self):
+        """Octets ignorés depuis le dernier appel"""
+        discarded = self.discarded - self.reported_discarded
+        self.reported_discarded = self.discarded
+        return discarded
 
 class ADMSListener:
-    def __init__(self, port=8081):
+    def __init__(self, port=8081, backlog=LISTEN_BACKLOG, engine="thread",
+                 queue_dir=QUEUE_DIR, batch_size=BATCH_MAX_SIZE, batch_wait=BATCH_MAX_WAIT,
+                 wire=BULK_WIRE_FORMAT):
         self.port = port
+        self.backlog = backlog
+        self.engine = engine
         self.sock = None
+        # Session HTTP partagée: connexion keep-alive vers le backend
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=1))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=1))
+        # Format des lots négocié avec le backend (punch_wire.py)
+        self.wire = WireFormat(wire)
+        self.executor = None
+        # Le terminal est acquitté dès l'écriture dans la queue durable;
+        # l'envoi au backend se fait par lots dans un thread séparé
+        self.queue = WriteAheadQueue(queue_dir)
+        self.batch_size = min(batch_size, BULK_MAX_SIZE)
+        self.batch_wait = batch_wait
+        # Envoi et queue sous le label DEVICE_ID; lectures par terminal (label IP)
+        self.metrics = TerminalMetrics(DEVICE_ID)
+        self.metrics.track_queue_depth(lambda: len(self.queue))
+        # Lot envoyé en une requête à l'endpoint bulk (traité dans l'ordre
+        # chronologique), sans limite de débit (flux temps réel)
+        self.drainer = BacklogDrainer(self.queue, self.send_to_backend, rate=None, batch=True,
+                                      batch_size=self.batch_size, log=logger.info)
+        self.metrics.track_backlog_drain(self.drainer)
 
     def start(self):
-        """Démarre le serveur ADMS"""
-        print(f"🎧 Démarrage du listener ADMS sur le port {self.port}")
-        print(f"📡 Backend: {BACKEND_URL}")
-        print(f"⏳ En attente de connexions des terminaux...")
-        print("")
+        """Démarre le serveur ADMS avec le moteur choisi"""
+        delivery = threading.Thread(target=self.delivery_loop, name="adms-batch-delivery")
+        delivery.daemon = True
+        delivery.start()
+
+        if self.engine == "asyncio":
+            asyncio.run(self.serve_asyncio())
+        else:
+            self.serve_threaded()
+
+    def serve_threaded(self):
+        """Moteur historique: un thread par terminal connecté"""
+        logger.info(f"🎧 Démarrage du listener ADMS sur le port {self.port} (moteur: thread)")
+        logger.info(f"📡 Backend: {BACKEND_URL}")
+        logger.info("⏳ En attente de connexions des terminaux...")
+        logger.info("")
 
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.sock.bind(('0.0.0.0', self.port))
-        self.sock.listen(5)
+        self.sock.listen(self.backlog)
 
         while True:
             try:
                 client, addr = self.sock.accept()
-                print(f"🔌 Nouvelle connexion depuis: {addr}")
+                logger.info(f"🔌 Nouvelle connexion depuis: {addr}")
 
                 # Handle dans un thread séparé
                 thread = threading.Thread(
@@ -48,45 +230,181 @@ class ADMSListener:
                 thread.start()
 
             except KeyboardInterrupt:
-                print("\n🛑 Arrêt du serveur...")
+                logger.info("\n🛑 Arrêt du serveur...")
                 break
             except Exception as e:
-                print(f"❌ Erreur: {e}")
+                logger.error(f"❌ Erreur: {e}")
 
     def handle_client(self, client, addr):
         """Gère une connexion client ADMS"""
+        framer = ADMSFramer()
+        terminal = TerminalMetrics(addr[0])
+        recv_buffer = bytearray(RECV_BUFFER_SIZE)
+        recv_view = memoryview(recv_buffer)
+        client.settimeout(FRAME_TIMEOUT)
         try:
             while True:
-                # Recevoir les données
-                data = client.recv(4096)
-                if not data:
+                # Recevoir les données dans le buffer réutilisable
+                try:
+                    size = client.recv_into(recv_buffer)
+                except socket.timeout:
+                    self.expire_partial_frame(terminal, framer, addr)
+                    continue
+                if not size:
                     break
 
-                print(f"📥 Données reçues ({len(data)} bytes) depuis {addr}")
-                print(f"   Hex: {data.hex()}")
+                logger.info(f"📥 Données reçues ({size} bytes) depuis {addr}")
+
+                # Un segment TCP peut contenir plusieurs frames ou une fraction de frame
+                frames = framer.feed(recv_view[:size])
+                self.observe_frames(terminal, framer, frames)
+                for command, records in frames:
+                    if self.deliver_frame(command, records):
+                        # Réponse ACK au terminal
+                        client.send(ACK_FRAME)
+
+        except Exception as e:
+            logger.error(f"❌ Erreur client {addr}: {e}")
+        finally:
+            recv_view.release()
+            client.close()
+            logger.info(f"🔌 Connexion fermée: {addr}")
+
+    def expire_partial_frame(self, terminal, framer, addr):
+        """Terminal silencieux au milieu d'un frame: frame abandonné, resynchronisation"""
+        dropped = framer.drop_partial()
+        if dropped:
+            logger.warning(f"⚠️  Frame incomplet abandonné ({dropped} bytes) depuis {addr}")
+            self.observe_frames(terminal, framer, [])
+
+    def observe_frames(self, terminal, framer, frames):
+        """Pointages lus et trames non décodables d'un terminal"""
+        if framer.take_discarded():
+            terminal.parse_failures.inc()
+        for command, records in frames:
+            if command not in ADMS_ATTENDANCE_COMMANDS:
+                continue
+            if records:
+                latest = max(record[1] for record in records)
+                terminal.record_read(len(records), datetime.fromtimestamp(latest))
+            else:
+                terminal.parse_failures.inc()
+
+    def deliver_frame(self, command, records):
+        """
+        Écrit dans la queue durable les pointages d'un frame complet.
+        Retourne True si le frame doit être acquitté (tous les pointages sur disque).
+        """
+        if command not in ADMS_ATTENDANCE_COMMANDS or not records:
+            logger.warning(f"⚠️  Données non reconnues comme pointage (commande 0x{command:04x})")
+            return False
+
+        try:
+            self.queue.append_many([self.build_attendance(*record) for record in records])
+        except Exception as e:
+            logger.error(f"❌ Erreur écriture queue locale: {e}")
+            return False
+
+        logger.info(f"💾 {len(records)} pointage(s) en queue (0x{command:04x}, en attente: {len(self.queue)})")
+        return True
+
+    def delivery_loop(self):
+        """
+        Étage d'envoi: regroupe les pointages de la queue en lots (taille max
+        batch_size ou attente max batch_wait) et envoie chaque lot en une
+        requête à l'endpoint bulk, sur la session keep-alive. L'offset
+        n'avance qu'après acceptation du backend.
+        """
+        while True:
+            if not self.queue.wait(timeout=1.0):
+                continue
+
+            # Laisser le lot se remplir pendant la fenêtre de temps
+            deadline = time.monotonic() + self.batch_wait
+            while len(self.queue) < self.batch_size and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            sent_before = self.drainer.sent
+            complete = self.drainer.drain_batch()
+            sent = self.drainer.sent - sent_before
+
+            if complete and sent:
+                logger.info(f"✅ Lot envoyé: {sent} pointage(s) (en attente: {len(self.queue)})")
+            elif not complete:
+                logger.error(f"❌ Lot partiellement envoyé: {sent} pointage(s), nouvel essai dans {RETRY_DELAY}s")
+                self.metrics.retries.inc()
+                time.sleep(RETRY_DELAY)
+
+    async def serve_asyncio(self):
+        """
+        Moteur asyncio: toutes les connexions dans une seule boucle d'événements.
+        Les terminaux inactifs (keep-alive) ne coûtent qu'un socket, et l'envoi
+        au backend (requests, bloquant) est délégué à un pool de threads borné.
+        """
+        logger.info(f"🎧 Démarrage du listener ADMS sur le port {self.port} (moteur: asyncio)")
+        logger.info(f"📡 Backend: {BACKEND_URL}")
+        logger.info(f"⏳ En attente de connexions des terminaux (backlog: {self.backlog})...")
+        logger.info("")
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=DELIVERY_WORKERS,
+            thread_name_prefix="adms-delivery"
+        )
+        server = await asyncio.start_server(
+            self.handle_client_async,
+            host='0.0.0.0',
+            port=self.port,
+            backlog=self.backlog,
+            reuse_address=True
+        )
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def handle_client_async(self, reader, writer):
+        """Gère une connexion client ADMS (même parsing et même ACK que handle_client)"""
+        addr = writer.get_extra_info('peername')
+        logger.info(f"🔌 Nouvelle connexion depuis: {addr}")
+        loop = asyncio.get_running_loop()
+
+        framer = ADMSFramer()
+        terminal = TerminalMetrics(addr[0] if addr else "inconnu")
 
-                # Parser les données ADMS
-                attendance_data = self.parse_adms_data(data)
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(reader.read(RECV_BUFFER_SIZE), FRAME_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.expire_partial_frame(terminal, framer, addr)
+                    continue
+                if not data:
+                    break
 
-                if attendance_data:
-                    # Envoyer vers le backend
-                    success = self.send_to_backend(attendance_data)
+                logger.info(f"📥 Données reçues ({len(data)} bytes) depuis {addr}")
 
+                frames = framer.feed(data)
+                self.observe_frames(terminal, framer, frames)
+                for command, records in frames:
+                    # Envoi non bloquant: la boucle continue de servir les autres terminaux
+                    success = await loop.run_in_executor(
+                        self.executor, self.deliver_frame, command, records
+                    )
                     if success:
-                        print(f"✅ Pointage envoyé: {attendance_data['employeeId']} à {attendance_data['timestamp']}")
-                        # Réponse ACK au terminal
-                        ack = b'\x50\x50\x82\x7D\x00\x00\x00\x00\x00\x00\x00\x00'
-                        client.send(ack)
-                    else:
-                        print(f"❌ Erreur lors de l'envoi au backend")
-                else:
-                    print(f"⚠️  Données non reconnues comme pointage")
+                        writer.write(ACK_FRAME)
+                        await writer.drain()
 
         except Exception as e:
-            print(f"❌ Erreur client {addr}: {e}")
+            logger.error(f"❌ Erreur client {addr}: {e}")
         finally:
-            client.close()
-            print(f"🔌 Connexion fermée: {addr}")
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            logger.info(f"🔌 Connexion fermée: {addr}")
 
     def parse_adms_data(self, data):
         """
@@ -105,7 +423,7 @@ class ADMSListener:
                 return None
 
             # Le command code est au byte 2-3
-            command = struct.unpack('<H', data[2:4])[0]
+            _, command, _ = ADMS_HEADER.unpack_from(data)
 
             # Command 0x0011 = Real-time attendance
             if command == 0x0011:
@@ -118,7 +436,7 @@ class ADMSListener:
             return None
 
         except Exception as e:
-            print(f"⚠️  Erreur parsing ADMS: {e}")
+            logger.warning(f"⚠️  Erreur parsing ADMS: {e}")
             return None
 
     def parse_realtime_attendance(self, data):
@@ -130,44 +448,13 @@ class ADMSListener:
             # Byte 16: Status (0=check-out, 1=check-in)
             # Byte 17: Verify mode (0=password, 1=fingerprint, etc.)
 
-            if len(data) < 18:
+            if len(data) < ADMS_HEADER.size + ADMS_RECORD.size:
                 return None
 
-            user_id = struct.unpack('<I', data[8:12])[0]
-            timestamp_unix = struct.unpack('<I', data[12:16])[0]
-            status = data[16]
-            verify_mode = data[17]
-
-            # Convertir timestamp
-            dt = datetime.fromtimestamp(timestamp_unix)
-
-            # Mapper status
-            att_type = "OUT" if status == 0 else "IN"
-
-            # Mapper verify mode
-            method_map = {
-                0: "PIN_CODE",
-                1: "FINGERPRINT",
-                3: "FINGERPRINT",
-                4: "FACE_RECOGNITION",
-                15: "RFID_BADGE"
-            }
-            method = method_map.get(verify_mode, "MANUAL")
-
-            return {
-                "employeeId": str(user_id),
-                "timestamp": dt.isoformat(),
-                "type": att_type,
-                "method": method,
-                "rawData": {
-                    "protocol": "ADMS",
-                    "status": status,
-                    "verifyMode": verify_mode
-                }
-            }
+            return self.build_attendance(*ADMS_RECORD.unpack_from(data, ADMS_HEADER.size))
 
         except Exception as e:
-            print(f"⚠️  Erreur parse realtime: {e}")
+            logger.warning(f"⚠️  Erreur parse realtime: {e}")
             return None
 
     def parse_stored_attendance(self, data):
@@ -175,50 +462,143 @@ class ADMSListener:
         # Similar to realtime but may have different offsets
         return self.parse_realtime_attendance(data)
 
-    def send_to_backend(self, attendance_data):
-        """Envoie le pointage vers PointaFlex backend"""
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "Device-ID": DEVICE_ID,
-                "X-Tenant-ID": TENANT_ID
+    def build_attendance(self, user_id, timestamp_unix, status, verify_mode):
+        """Convertit un enregistrement ADMS décodé au format du webhook state"""
+        # Convertir timestamp (heure du terminal, suffixe Z comme sync_terminals)
+        dt = datetime.fromtimestamp(timestamp_unix)
+
+        # Mapper status
+        att_type = "OUT" if status == 0 else "IN"
+
+        return {
+            "employeeId": str(user_id),
+            "timestamp": dt.isoformat() + ".000Z",
+            "type": att_type,
+            "terminalState": TERMINAL_STATES[att_type],
+            "method": VERIFY_MODE_MAP.get(verify_mode, "MANUAL"),
+            "rawData": {
+                "protocol": "ADMS",
+                "status": status,
+                "verifyMode": verify_mode
             }
+        }
 
-            response = requests.post(
-                BACKEND_URL,
-                json=attendance_data,
-                headers=headers,
-                timeout=5
-            )
+    def send_to_backend(self, attendances):
+        """
+        Envoie un lot de pointages de la queue à l'endpoint bulk (une requête).
+        Retourne un booléen par pointage, dans l'ordre du lot (True: traité par le backend).
+        """
+        punches = [state_payload(attendance) for attendance in attendances]
+        headers = {"X-Device-ID": DEVICE_ID, "X-Tenant-ID": TENANT_ID}
 
-            if response.status_code in [200, 201]:
-                return True
-            else:
-                print(f"❌ Backend error {response.status_code}: {response.text}")
-                return False
+        started = time.perf_counter()
+        try:
+            while True:
+                body, wire_headers = self.wire.request(punches)
+                response = self.session.post(
+                    BACKEND_URL,
+                    headers={**headers, **wire_headers},
+                    timeout=BACKEND_TIMEOUT,
+                    **body
+                )
+                # Format binaire refusé (415): le lot repart aussitôt en JSON
+                if not self.wire.negotiate(response):
+                    break
+        except requests.exceptions.RequestException as e:
+            self.metrics.observe_request(time.perf_counter() - started, False)
+            logger.error(f"❌ Erreur envoi backend: {e}")
+            return [False] * len(attendances)
+        accepted = response.status_code in [200, 201]
+        self.metrics.observe_request(time.perf_counter() - started, accepted)
 
-        except Exception as e:
-            print(f"❌ Erreur envoi backend: {e}")
-            return False
+        try:
+            results = response.json().get("results") if accepted else None
+        except ValueError:
+            results = None
+        if not isinstance(results, list) or len(results) != len(attendances):
+            # Réponse incomplète: tout le lot sera renvoyé (l'anti-doublon écarte les déjà enregistrés)
+            logger.error(f"❌ Backend error {response.status_code}: {response.text[:500]}")
+            return [False] * len(attendances)
+
+        outcomes = []
+        for punch, result in zip(punches, results):
+            ok = result.get("status") in ACCEPTED_STATUSES
+            if not ok:
+                logger.error(f"❌ Pointage refusé ({punch['employeeId']} {punch['timestamp']}): "
+                             f"{result.get('error', result.get('status'))}")
+            outcomes.append(ok)
+        return outcomes
+
+def state_payload(attendance):
+    """Pointage de la queue au format du webhook state (mis en queue avant le passage au bulk: converti)"""
+    if "terminalState" in attendance:
+        return attendance
+    return {
+        **attendance,
+        "timestamp": attendance["timestamp"][:19] + ".000Z",
+        "terminalState": TERMINAL_STATES[attendance["type"]],
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ADMS Protocol Listener pour ZKTeco IN01")
+    parser.add_argument("--engine", choices=["thread", "asyncio"], default="thread",
+                        help="Moteur serveur: thread (un thread par terminal) ou asyncio (boucle unique)")
+    parser.add_argument("--port", type=int, default=ADMS_LISTEN_PORT,
+                        help=f"Port d'écoute (défaut: {ADMS_LISTEN_PORT})")
+    parser.add_argument("--backlog", type=int, default=LISTEN_BACKLOG,
+                        help=f"Taille de la file accept() (défaut: {LISTEN_BACKLOG})")
+    parser.add_argument("--queue-dir", default=QUEUE_DIR,
+                        help="Répertoire de la queue durable locale")
+    parser.add_argument("--batch-size", type=int, default=BATCH_MAX_SIZE,
+                        help=f"Pointages max par lot envoyé au backend (défaut: {BATCH_MAX_SIZE}, "
+                             f"max: {BULK_MAX_SIZE})")
+    parser.add_argument("--batch-wait", type=float, default=BATCH_MAX_WAIT,
+                        help=f"Attente max en secondes pour compléter un lot (défaut: {BATCH_MAX_WAIT})")
+    parser.add_argument("--wire", choices=WireFormat.MODES, default=BULK_WIRE_FORMAT,
+                        help="Format des lots: auto (binaire si le backend l'annonce), binary ou json "
+                             f"(défaut: {BULK_WIRE_FORMAT})")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help=f"Port de l'endpoint /metrics Prometheus (défaut: {METRICS_PORT}, 0 = désactivé)")
+    parser.add_argument("--log-file", default=LOG_FILE,
+                        help="Fichier de log JSON-lines (rotation par taille, archives numérotées)")
+    parser.add_argument("--log-rotate-interval", type=int, default=None,
+                        help="Rotation périodique du log en secondes (ex: 86400), en plus de la taille")
+    return parser.parse_args()
 
 def main():
-    print("=" * 60)
-    print("🎧 ADMS Protocol Listener pour ZKTeco IN01")
-    print("=" * 60)
-    print("")
-    print("Configuration:")
-    print(f"  • Port d'écoute: {ADMS_LISTEN_PORT}")
-    print(f"  • Backend: {BACKEND_URL}")
-    print(f"  • Device ID: {DEVICE_ID}")
-    print(f"  • Tenant ID: {TENANT_ID}")
-    print("")
-
-    listener = ADMSListener(ADMS_LISTEN_PORT)
+    args = parse_args()
+    setup_logging("adms_listener", args.log_file, interval=args.log_rotate_interval)
+    start_metrics_server(args.metrics_port)
+
+    logger.info("=" * 60)
+    logger.info("🎧 ADMS Protocol Listener pour ZKTeco IN01")
+    logger.info("=" * 60)
+    logger.info("")
+    logger.info("Configuration:")
+    logger.info(f"  • Port d'écoute: {args.port}")
+    logger.info(f"  • Moteur: {args.engine} (backlog: {args.backlog})")
+    logger.info(f"  • Queue locale: {args.queue_dir} (lots: {args.batch_size} / {args.batch_wait}s, format: {args.wire})")
+    logger.info(f"  • Backend: {BACKEND_URL}")
+    if args.metrics_port:
+        logger.info(f"  • Métriques: http://localhost:{args.metrics_port}/metrics")
+    logger.info(f"  • Device ID: {DEVICE_ID}")
+    logger.info(f"  • Tenant ID: {TENANT_ID}")
+    logger.info("")
+
+    listener = ADMSListener(
+        args.port,
+        backlog=args.backlog,
+        engine=args.engine,
+        queue_dir=args.queue_dir,
+        batch_size=args.batch_size,
+        batch_wait=args.batch_wait,
+        wire=args.wire
+    )
 
     try:
         listener.start()
     except KeyboardInterrupt:
-        print("\n\n🛑 Arrêt du listener ADMS")
+        logger.info("\n\n🛑 Arrêt du listener ADMS")
 
 if __name__ == "__main__":
     main()
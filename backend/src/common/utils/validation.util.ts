@@ -0,0 +1,32 @@
+import { BadRequestException, ValidationPipeOptions } from '@nestjs/common';
+
+/**
+ * Options du ValidationPipe global (main.ts)
+ * Partagées avec les pipes qui valident un corps hors du pipe global
+ * (ex: PunchBatchPipe pour les lots JSON de /webhook/state/bulk)
+ */
+export const validationPipeOptions: ValidationPipeOptions = {
+  whitelist: true,
+  forbidNonWhitelisted: true,
+  transform: true,
+  transformOptions: {
+    enableImplicitConversion: true,
+  },
+  exceptionFactory: (errors) => {
+    const messages = errors.map((error) => {
+      const constraints = error.constraints || {};
+      const property = error.property;
+      const rejectedValue = error.value;
+      return {
+        property,
+        value: rejectedValue,
+        constraints: Object.values(constraints),
+      };
+    });
+    return new BadRequestException({
+      statusCode: 400,
+      message: 'Erreur de validation',
+      errors: messages,
+    });
+  },
+};
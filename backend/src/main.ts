@@ -1,8 +1,11 @@
 import * as crypto from 'crypto';
 import { NestFactory } from '@nestjs/core';
-import { ValidationPipe, BadRequestException } from '@nestjs/common';
+import { ValidationPipe } from '@nestjs/common';
+import { NestExpressApplication } from '@nestjs/platform-express';
 import { SwaggerModule, DocumentBuilder } from '@nestjs/swagger';
 import { AppModule } from './app.module';
+import { validationPipeOptions } from './common/utils/validation.util';
+import { PUNCH_BATCH_CONTENT_TYPE, PUNCH_BATCH_BODY_LIMIT } from './modules/attendance/punch-wire';
 
 // Polyfill pour crypto - nécessaire pour @nestjs/schedule
 if (typeof globalThis.crypto === 'undefined') {
@@ -20,7 +23,10 @@ if (typeof (global as any).crypto === 'undefined') {
 }
 
 async function bootstrap() {
-  const app = await NestFactory.create(AppModule);
+  const app = await NestFactory.create<NestExpressApplication>(AppModule);
+
+  // Lots de pointages au format binaire compact (agents): corps brut, gzip décompressé par le parser
+  app.useBodyParser('raw', { type: PUNCH_BATCH_CONTENT_TYPE, limit: PUNCH_BATCH_BODY_LIMIT });
 
   // Global prefix
   app.setGlobalPrefix('api/v1');
@@ -57,33 +63,7 @@ async function bootstrap() {
   });
 
   // Validation pipe
-  app.useGlobalPipes(
-    new ValidationPipe({
-      whitelist: true,
-      forbidNonWhitelisted: true,
-      transform: true,
-      transformOptions: {
-        enableImplicitConversion: true,
-      },
-      exceptionFactory: (errors) => {
-        const messages = errors.map((error) => {
-          const constraints = error.constraints || {};
-          const property = error.property;
-          const rejectedValue = error.value;
-          return {
-            property,
-            value: rejectedValue,
-            constraints: Object.values(constraints),
-          };
-        });
-        return new BadRequestException({
-          statusCode: 400,
-          message: 'Erreur de validation',
-          errors: messages,
-        });
-      },
-    }),
-  );
+  app.useGlobalPipes(new ValidationPipe(validationPipeOptions));
 
   // Swagger documentation
   const config = new DocumentBuilder()
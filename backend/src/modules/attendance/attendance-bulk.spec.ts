@@ -0,0 +1,89 @@
+import { AttendanceService } from './attendance.service';
+import { InMemoryPrisma } from './testing/in-memory-prisma';
+import { DAY, DEVICE_ID, TENANT_ID, seedTerminalDatabase, terminalPunch } from './testing/terminal-fixtures';
+
+// Les calculs d'anomalies utilisent l'heure locale: fixer le fuseau du test
+process.env.TZ = 'UTC';
+
+function createService(prisma: InMemoryPrisma) {
+  const supplementaryDays = { createAutoSupplementaryDay: jest.fn().mockResolvedValue({ created: false }) };
+  // Anti-doublon du webhook unitaire par requête (l'index mémoire est testé séparément)
+  const punchIndex = {
+    findSameTypeWithin: (tenantId: string, employeeId: string, type: string, timestamp: Date, toleranceMs: number) =>
+      prisma.attendance.findFirst({
+        where: {
+          tenantId,
+          employeeId,
+          type,
+          timestamp: {
+            gte: new Date(timestamp.getTime() - toleranceMs),
+            lte: new Date(timestamp.getTime() + toleranceMs),
+          },
+        },
+        select: { id: true },
+      }),
+    invalidateEmployee: jest.fn(),
+  };
+  return new AttendanceService(prisma as any, supplementaryDays as any, punchIndex as any);
+}
+
+function overtimes(prisma: InMemoryPrisma) {
+  return prisma.tables.overtime.map(({ employeeId, date, hours, type, status }) => ({ employeeId, date, hours, type, status }));
+}
+
+function punches(prisma: InMemoryPrisma) {
+  return prisma.tables.attendance
+    .map(({ type, timestamp, anomalyType, overtimeMinutes }) => ({ type, timestamp, anomalyType, overtimeMinutes }))
+    .sort((a, b) => a.timestamp.getTime() - b.timestamp.getTime());
+}
+
+describe('AttendanceService - webhook/state/bulk', () => {
+  beforeEach(() => {
+    jest.spyOn(console, 'log').mockImplementation(() => undefined);
+  });
+
+  afterEach(() => {
+    jest.restoreAllMocks();
+  });
+
+  it('crée les mêmes heures sup que le webhook unitaire pour une double sortie le même jour', async () => {
+    const day = [terminalPunch('IN', '08:00'), terminalPunch('OUT', '18:00'), terminalPunch('OUT', '19:00')];
+
+    const single = seedTerminalDatabase();
+    const singleService = createService(single);
+    for (const item of day) {
+      expect((await singleService.processTerminalPunch(TENANT_ID, DEVICE_ID, item)).status).toBe('CREATED');
+    }
+
+    const bulk = seedTerminalDatabase();
+    const result = await createService(bulk).processTerminalPunchBulk(TENANT_ID, DEVICE_ID, day);
+
+    expect(result.results.map((item) => item.status)).toEqual(['CREATED', 'CREATED', 'CREATED']);
+    // La sortie de 18:00 est remplacée (DOUBLE_OUT): seules les 2h de la sortie de 19:00 comptent
+    expect(overtimes(single)).toEqual([expect.objectContaining({ hours: 2 })]);
+    expect(overtimes(bulk)).toEqual(overtimes(single));
+    expect(punches(bulk)).toEqual(punches(single));
+    expect(punches(bulk)[1].anomalyType).toBe('DOUBLE_OUT');
+  });
+
+  it('annule seul le pointage en erreur, y compris ses écritures sur les pointages précédents', async () => {
+    jest.spyOn(console, 'error').mockImplementation(() => undefined);
+    const bulk = seedTerminalDatabase();
+    const service = createService(bulk);
+    const createAutoOvertime = (service as any).createAutoOvertime.bind(service);
+    jest.spyOn(service as any, 'createAutoOvertime').mockImplementation(async (...args: any[]) => {
+      if (args[1].timestamp.toISOString() === `${DAY}T19:00:00.000Z`) {
+        throw new Error('Panne pendant le calcul des heures sup');
+      }
+      return createAutoOvertime(...args);
+    });
+
+    const day = [terminalPunch('IN', '08:00'), terminalPunch('OUT', '18:00'), terminalPunch('OUT', '19:00')];
+    const result = await service.processTerminalPunchBulk(TENANT_ID, DEVICE_ID, day);
+
+    expect(result.results.map((item) => item.status)).toEqual(['CREATED', 'CREATED', 'ERROR']);
+    // Le DOUBLE_OUT posé sur la sortie de 18:00 et la suppression de son overtime sont annulés
+    expect(punches(bulk).map((item) => item.anomalyType ?? null)).toEqual([null, null]);
+    expect(overtimes(bulk)).toEqual([expect.objectContaining({ hours: 1 })]);
+  });
+});
@@ -13,11 +13,17 @@ import {
   Res,
   UnauthorizedException,
 } from '@nestjs/common';
-import { ApiTags, ApiOperation, ApiResponse, ApiBearerAuth, ApiHeader, ApiQuery } from '@nestjs/swagger';
+import { ApiTags, ApiOperation, ApiResponse, ApiBearerAuth, ApiHeader, ApiQuery, ApiBody, ApiConsumes } from '@nestjs/swagger';
 import { AttendanceService } from './attendance.service';
+import { PUNCH_BATCH_CONTENT_TYPE, PunchBatchBody, PunchBatchPipe } from './punch-wire';
 import { CreateAttendanceDto } from './dto/create-attendance.dto';
 import { WebhookAttendanceDto } from './dto/webhook-attendance.dto';
-import { WebhookStateDto, WebhookStateResponseDto } from './dto/webhook-state.dto';
+import {
+  WebhookStateDto,
+  WebhookStateResponseDto,
+  WebhookStateBulkDto,
+  WebhookStateBulkResponseDto,
+} from './dto/webhook-state.dto';
 import { CorrectAttendanceDto } from './dto/correct-attendance.dto';
 import { AttendanceStatsQueryDto } from './dto/attendance-stats.dto';
 import { BulkCorrectAttendanceDto } from './dto/bulk-correct.dto';
@@ -134,6 +140,49 @@ export class AttendanceController {
     return this.attendanceService.processTerminalPunch(tenantId, deviceId, webhookData, apiKey);
   }
 
+  @Post('webhook/state/bulk')
+  @Public()
+  @Header('Accept-Post', `application/json, ${PUNCH_BATCH_CONTENT_TYPE}`)
+  @ApiOperation({
+    summary: 'Webhook avec STATE du terminal - import en masse',
+    description: `
+      Variante par lots de /webhook/state pour les ré-imports d'historique.
+      Le terminal, les paramètres du tenant, les employés et l'état anti-doublon
+      sont résolus une seule fois par lot. Les écritures du lot sont faites
+      dans une seule transaction (un pointage en erreur est annulé seul).
+
+      Statut par pointage (même ordre que le lot):
+      - CREATED (avec anomaly éventuelle)
+      - DUPLICATE (pointage identique déjà enregistré, rien n'est créé)
+      - DEBOUNCE_BLOCKED (pointage du même type dans la tolérance anti-doublon)
+      - ERROR
+
+      Le lot est accepté en JSON ou au format binaire compact
+      (Content-Type: ${PUNCH_BATCH_CONTENT_TYPE}, Content-Encoding: gzip, voir punch-wire.ts),
+      annoncé aux agents par l'en-tête Accept-Post des réponses.
+    `,
+  })
+  @ApiConsumes('application/json', PUNCH_BATCH_CONTENT_TYPE)
+  @ApiBody({ type: WebhookStateBulkDto })
+  @ApiHeader({ name: 'X-Device-ID', required: true, description: 'Device unique ID' })
+  @ApiHeader({ name: 'X-Tenant-ID', required: true, description: 'Tenant ID' })
+  @ApiHeader({ name: 'X-API-Key', required: false, description: 'Device API Key' })
+  @ApiResponse({ status: 201, description: 'Batch processed', type: WebhookStateBulkResponseDto })
+  @ApiResponse({ status: 400, description: 'Invalid data' })
+  @ApiResponse({ status: 415, description: 'Unsupported binary batch version (resend as JSON)' })
+  async handleWebhookWithStateBulk(
+    @Headers('x-device-id') deviceId: string,
+    @Headers('x-tenant-id') tenantId: string,
+    @Headers('x-api-key') apiKey: string,
+    @PunchBatchBody(PunchBatchPipe) bulkData: WebhookStateBulkDto,
+  ): Promise<WebhookStateBulkResponseDto> {
+    if (!deviceId || !tenantId) {
+      throw new UnauthorizedException('Missing device credentials');
+    }
+
+    return this.attendanceService.processTerminalPunchBulk(tenantId, deviceId, bulkData.punches, apiKey);
+  }
+
   @Get('count')
   @Public()
   @ApiOperation({ summary: 'Get punch count for an employee on a specific date (for IN/OUT detection)' })
@@ -159,6 +208,27 @@ export class AttendanceController {
     return this.attendanceService.getPunchCountForDay(tenantId, employeeId, date, deviceId, apiKey, punchTime);
   }
 
+  @Get('terminal/shift-windows')
+  @Public()
+  @ApiOperation({ summary: 'Shift windows of the day (adaptive polling of terminal agents)' })
+  @ApiHeader({ name: 'X-Device-ID', required: true, description: 'Device unique ID' })
+  @ApiHeader({ name: 'X-Tenant-ID', required: true, description: 'Tenant ID' })
+  @ApiHeader({ name: 'X-API-Key', required: false, description: 'Device API Key' })
+  @ApiQuery({ name: 'date', required: false, description: 'Date in YYYY-MM-DD format (default: today)' })
+  @ApiResponse({ status: 200, description: 'Shift start/end/break windows with the number of employees' })
+  async getTerminalShiftWindows(
+    @Headers('x-device-id') deviceId: string,
+    @Headers('x-tenant-id') tenantId: string,
+    @Headers('x-api-key') apiKey: string,
+    @Query('date') date?: string,
+  ) {
+    if (!deviceId || !tenantId) {
+      throw new UnauthorizedException('Missing device credentials');
+    }
+
+    return this.attendanceService.getTerminalShiftWindows(tenantId, date, deviceId, apiKey);
+  }
+
   @Post('determine-type')
   @Public()
   @ApiOperation({
@@ -2,6 +2,7 @@ import { Module, forwardRef } from '@nestjs/common';
 import { ScheduleModule } from '@nestjs/schedule';
 import { AttendanceService } from './attendance.service';
 import { AttendanceController } from './attendance.controller';
+import { PunchIndexService } from './punch-index.service';
 import { PrismaModule } from '../../database/prisma.module';
 import { MailModule } from '../mail/mail.module';
 import { SupplementaryDaysModule } from '../supplementary-days/supplementary-days.module';
@@ -21,6 +22,7 @@ import { PendingValidationEscalationJob } from './jobs/pending-validation-escala
   controllers: [AttendanceController],
   providers: [
     AttendanceService,
+    PunchIndexService,
     DetectAbsencesJob,
     DetectMissingOutJob,
     AutoCloseSessionsJob,
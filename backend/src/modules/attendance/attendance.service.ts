@@ -1,9 +1,10 @@
 import { Injectable, NotFoundException, BadRequestException, ForbiddenException, Inject, forwardRef } from '@nestjs/common';
 import { PrismaService } from '../../database/prisma.service';
-import { RecoveryDayStatus, LeaveStatus, OvertimeStatus } from '@prisma/client';
+import { randomUUID } from 'crypto';
+import { RecoveryDayStatus, LeaveStatus, OvertimeStatus, Prisma } from '@prisma/client';
 import { CreateAttendanceDto } from './dto/create-attendance.dto';
 import { WebhookAttendanceDto } from './dto/webhook-attendance.dto';
-import { WebhookStateDto, WebhookStateResponseDto } from './dto/webhook-state.dto';
+import { WebhookStateDto, WebhookStateResponseDto, WebhookStateBulkResponseDto } from './dto/webhook-state.dto';
 import { CorrectAttendanceDto } from './dto/correct-attendance.dto';
 import { ValidateAttendanceDto, ValidationAction } from './dto/validate-attendance.dto';
 import { AttendanceType, NotificationType, DeviceType } from '@prisma/client';
@@ -11,6 +12,10 @@ import { Decimal } from '@prisma/client/runtime/library';
 import { findEmployeeByMatriculeFlexible } from '../../common/utils/matricule.util';
 import { getManagerLevel, getManagedEmployeeIds } from '../../common/utils/manager-level.util';
 import { SupplementaryDaysService } from '../supplementary-days/supplementary-days.service';
+import { PunchIndexService } from './punch-index.service';
+
+// Durée max de la transaction d'un lot webhook/state/bulk (500 pointages; défaut Prisma: 5 s)
+const TERMINAL_BULK_TRANSACTION_TIMEOUT_MS = 120000;
 
 @Injectable()
 export class AttendanceService {
@@ -18,6 +23,7 @@ export class AttendanceService {
     private prisma: PrismaService,
     @Inject(forwardRef(() => SupplementaryDaysService))
     private supplementaryDaysService: SupplementaryDaysService,
+    private punchIndex: PunchIndexService,
   ) {}
 
   /**
@@ -82,15 +88,22 @@ export class AttendanceService {
   /**
    * Création automatique d'Overtime en temps réel lors d'un pointage OUT
    * avec heures supplémentaires détectées (Modèle hybride - Niveau 1)
+   * @param db Client Prisma ou transaction en cours (lot webhook/state/bulk)
    */
   private async createAutoOvertime(
     tenantId: string,
     attendance: any,
     overtimeMinutes: number,
+    db: Prisma.TransactionClient = this.prisma,
   ): Promise<void> {
+    // Dans une transaction, un échec ne doit annuler que l'overtime (pas le pointage)
+    const savepoint = db !== this.prisma;
     try {
+      if (savepoint) {
+        await db.$executeRawUnsafe('SAVEPOINT auto_overtime');
+      }
       // 1. Récupérer les settings du tenant
-      const settings = await this.prisma.tenantSettings.findUnique({
+      const settings = await db.tenantSettings.findUnique({
         where: { tenantId },
         select: {
           overtimeMinimumThreshold: true,
@@ -118,7 +131,7 @@ export class AttendanceService {
       }
 
       // 2. Vérifier l'éligibilité de l'employé
-      const employee = await this.prisma.employee.findUnique({
+      const employee = await db.employee.findUnique({
         where: { id: attendance.employeeId },
         select: {
           id: true,
@@ -140,7 +153,7 @@ export class AttendanceService {
       const attendanceDate = new Date(attendance.timestamp.toISOString().split('T')[0]);
       const approvedLeaveStatuses = [LeaveStatus.APPROVED, LeaveStatus.MANAGER_APPROVED, LeaveStatus.HR_APPROVED];
 
-      const leave = await this.prisma.leave.findFirst({
+      const leave = await db.leave.findFirst({
         where: {
           tenantId,
           employeeId: attendance.employeeId,
@@ -155,7 +168,7 @@ export class AttendanceService {
         return;
       }
 
-      const recoveryDay = await this.prisma.recoveryDay.findFirst({
+      const recoveryDay = await db.recoveryDay.findFirst({
         where: {
           tenantId,
           employeeId: attendance.employeeId,
@@ -171,7 +184,7 @@ export class AttendanceService {
       }
 
       // 4. Vérifier si un Overtime existe déjà pour cette date
-      const existingOvertime = await this.prisma.overtime.findFirst({
+      const existingOvertime = await db.overtime.findFirst({
         where: {
           tenantId,
           employeeId: attendance.employeeId,
@@ -193,7 +206,7 @@ export class AttendanceService {
 
       if (autoDetectType) {
         // Vérifier si c'est un jour férié
-        const holiday = await this.prisma.holiday.findFirst({
+        const holiday = await db.holiday.findFirst({
           where: {
             tenantId,
             date: attendanceDate,
@@ -217,7 +230,7 @@ export class AttendanceService {
       const status = shouldAutoApprove ? OvertimeStatus.APPROVED : OvertimeStatus.PENDING;
 
       // 8. Créer l'Overtime
-      const overtime = await this.prisma.overtime.create({
+      const overtime = await db.overtime.create({
         data: {
           tenantId,
           employeeId: attendance.employeeId,
@@ -238,6 +251,9 @@ export class AttendanceService {
       console.log(`[AutoOvertime] ${statusEmoji} Overtime ${statusText} créé pour ${employee.firstName} ${employee.lastName} (${employee.matricule}): ${overtimeHours.toFixed(2)}h de type ${overtimeType}`);
 
     } catch (error) {
+      if (savepoint) {
+        await db.$executeRawUnsafe('ROLLBACK TO SAVEPOINT auto_overtime');
+      }
       // Ne pas bloquer le pointage si la création de l'overtime échoue
       console.error(`[AutoOvertime] Erreur lors de la création automatique:`, error);
     }
@@ -1161,6 +1177,104 @@ export class AttendanceService {
     }
   }
 
+  /**
+   * SHIFT WINDOWS - Utilisé par le planificateur de relève des terminaux
+   * ═══════════════════════════════════════════════════════════════════════════════
+   *
+   * Retourne les fenêtres horaires (début, fin, pause) des shifts du tenant pour
+   * une date, avec le nombre d'employés concernés: plannings publiés du jour
+   * (horaires personnalisés inclus) et shift par défaut des employés actifs sans
+   * planning. Les agents resserrent la relève autour de ces horaires.
+   */
+  async getTerminalShiftWindows(
+    tenantId: string,
+    date?: string,
+    deviceId?: string,
+    apiKey?: string,
+  ) {
+    if (deviceId) {
+      const device = await this.prisma.attendanceDevice.findFirst({
+        where: { deviceId, tenantId },
+        select: { id: true, apiKey: true },
+      });
+
+      if (!device) {
+        throw new NotFoundException(`Device ${deviceId} not found for tenant ${tenantId}`);
+      }
+
+      if (apiKey && device.apiKey && device.apiKey !== apiKey) {
+        throw new ForbiddenException('Invalid API Key');
+      }
+    }
+
+    const day = date ? new Date(`${date}T00:00:00.000Z`) : new Date();
+    const dateOnly = new Date(Date.UTC(day.getUTCFullYear(), day.getUTCMonth(), day.getUTCDate()));
+
+    const [shifts, schedules] = await Promise.all([
+      this.prisma.shift.findMany({
+        where: { tenantId },
+        select: {
+          id: true,
+          code: true,
+          name: true,
+          startTime: true,
+          endTime: true,
+          breakStartTime: true,
+          breakDuration: true,
+          isNightShift: true,
+          _count: { select: { employees: { where: { isActive: true } } } },
+        },
+      }),
+      this.prisma.schedule.findMany({
+        where: { tenantId, date: dateOnly, status: 'PUBLISHED' },
+        select: { employeeId: true, shiftId: true, customStartTime: true, customEndTime: true },
+      }),
+    ]);
+
+    // Une fenêtre par (shift, début, fin): les horaires personnalisés forment leur propre fenêtre
+    const windows = new Map<string, any>();
+    const addWindow = (shift: (typeof shifts)[number], start: string, end: string, employees: number) => {
+      const key = `${shift.id}|${start}|${end}`;
+      const window = windows.get(key);
+      if (window) {
+        window.employees += employees;
+        return;
+      }
+      windows.set(key, {
+        shiftCode: shift.code,
+        shiftName: shift.name,
+        start,
+        end,
+        breakStart: shift.breakStartTime,
+        breakDuration: shift.breakDuration,
+        isNightShift: shift.isNightShift,
+        employees,
+      });
+    };
+
+    const shiftsById = new Map(shifts.map((shift) => [shift.id, shift]));
+    const scheduledByShift = new Map<string, number>();
+    for (const schedule of schedules) {
+      const shift = shiftsById.get(schedule.shiftId);
+      if (!shift) continue;
+      addWindow(shift, schedule.customStartTime || shift.startTime, schedule.customEndTime || shift.endTime, 1);
+      scheduledByShift.set(shift.id, (scheduledByShift.get(shift.id) || 0) + 1);
+    }
+
+    // Shift par défaut (Employee.currentShiftId): approximation pour les employés sans planning du jour
+    for (const shift of shifts) {
+      const unscheduled = shift._count.employees - (scheduledByShift.get(shift.id) || 0);
+      if (unscheduled > 0) {
+        addWindow(shift, shift.startTime, shift.endTime, unscheduled);
+      }
+    }
+
+    return {
+      date: dateOnly.toISOString().slice(0, 10),
+      windows: [...windows.values()].sort((a, b) => a.start.localeCompare(b.start)),
+    };
+  }
+
   /**
    * GET PUNCH COUNT FOR DAY - Utilisé par le script de sync pour déterminer IN/OUT
    * ═══════════════════════════════════════════════════════════════════════════════
@@ -3806,12 +3920,14 @@ export class AttendanceService {
 
   /**
    * Récupère le schedule pour une date donnée, avec fallback vers currentShiftId si aucun schedule n'existe
+   * @param db Client Prisma ou transaction en cours (lot webhook/state/bulk)
    * @returns Schedule avec shift inclus, ou null si aucun schedule et pas de currentShiftId
    */
   private async getScheduleWithFallback(
     tenantId: string,
     employeeId: string,
     date: Date,
+    db: Prisma.TransactionClient = this.prisma,
   ): Promise<{
     id: string;
     date: Date;
@@ -3837,7 +3953,7 @@ export class AttendanceService {
 
     // 1. Chercher TOUS les schedules existants pour cette date (PUBLISHED uniquement)
     // IMPORTANT: Un employé peut avoir plusieurs shifts le même jour!
-    const schedules = await this.prisma.schedule.findMany({
+    const schedules = await db.schedule.findMany({
       where: {
         tenantId,
         employeeId,
@@ -3882,7 +3998,7 @@ export class AttendanceService {
       let smallestDifference = Infinity;
 
       // Récupérer le timezone du tenant pour calculer correctement
-      const tenant = await this.prisma.tenant.findUnique({
+      const tenant = await db.tenant.findUnique({
         where: { id: tenantId },
         select: { timezone: true },
       });
@@ -3927,7 +4043,7 @@ export class AttendanceService {
         0, 0, 0, 0
       ));
 
-      const previousDaySchedule = await this.prisma.schedule.findFirst({
+      const previousDaySchedule = await db.schedule.findFirst({
         where: {
           tenantId,
           employeeId,
@@ -3969,7 +4085,7 @@ export class AttendanceService {
     }
 
     // 3. FALLBACK : Si pas de schedule, utiliser currentShiftId
-    const employee = await this.prisma.employee.findUnique({
+    const employee = await db.employee.findUnique({
       where: { id: employeeId },
       select: {
         currentShiftId: true,
@@ -8487,28 +8603,8 @@ export class AttendanceService {
         };
       }
 
-      // 2. TROUVER L'EMPLOYÉ (par matricule)
-      let employee = await findEmployeeByMatriculeFlexible(
-        this.prisma,
-        tenantId,
-        webhookData.employeeId,
-      );
-
-      // Chercher aussi dans le mapping terminal si non trouvé
-      if (!employee) {
-        const mapping = await this.prisma.terminalMatriculeMapping.findFirst({
-          where: {
-            tenantId,
-            terminalMatricule: webhookData.employeeId,
-            isActive: true,
-          },
-          include: { employee: true },
-        });
-        if (mapping) {
-          employee = mapping.employee;
-          console.log(`   ✅ Employé trouvé via mapping: ${mapping.terminalMatricule} → ${employee.matricule}`);
-        }
-      }
+      // 2. TROUVER L'EMPLOYÉ (par matricule, puis mapping terminal)
+      const employee = await this.resolveTerminalEmployee(tenantId, webhookData.employeeId);
 
       if (!employee) {
         console.log(`❌ [TERMINAL-STATE] Employé non trouvé: ${webhookData.employeeId}`);
@@ -8532,49 +8628,30 @@ export class AttendanceService {
       const workingDays = (tenantSettings?.workingDays as number[]) || [1, 2, 3, 4, 5]; // Défaut: Lundi-Vendredi
       const toleranceMs = toleranceMinutes * 60 * 1000;
 
-      // 3. ANTI-DOUBLON (même employé, même timestamp ± tolérance configurée)
-      const existingPunch = await this.prisma.attendance.findFirst({
-        where: {
-          tenantId,
-          employeeId: employee.id,
-          timestamp: {
-            gte: new Date(punchTime.getTime() - toleranceMs),
-            lte: new Date(punchTime.getTime() + toleranceMs),
-          },
-          type: webhookData.type,
-        },
-        select: { id: true },
-      });
+      // 3. ANTI-DOUBLON (même employé, même type, timestamp ± tolérance configurée)
+      // Réponse en mémoire via l'index des derniers pointages, requête DB si l'index ne peut pas trancher
+      const existingPunch = await this.punchIndex.findSameTypeWithin(
+        tenantId,
+        employee.id,
+        webhookData.type,
+        punchTime,
+        toleranceMs,
+      );
 
       if (existingPunch) {
         console.log(`⚠️ [TERMINAL-STATE] Doublon détecté: ${existingPunch.id} (tolérance: ${toleranceMinutes} min)`);
 
         // Créer un enregistrement informatif DEBOUNCE_BLOCKED (visible dans l'interface anomalies)
         const debounceRecord = await this.prisma.attendance.create({
-          data: {
+          data: this.buildDebounceRecordData(
             tenantId,
-            employeeId: employee.id,
-            deviceId: device.id,
-            siteId: device.siteId,
-            timestamp: punchTime,
-            type: webhookData.type,
-            terminalState: webhookData.terminalState,
-            method: webhookData.method || 'FINGERPRINT',
-            source: webhookData.source || 'TERMINAL',
-            detectionMethod: 'TERMINAL_STATE',
-            hasAnomaly: true,
-            anomalyType: 'DEBOUNCE_BLOCKED',
-            isCorrected: true, // Marqué comme traité (informatif, pas de correction nécessaire)
-            correctionNote: `Doublon du pointage ${existingPunch.id} (tolérance: ${toleranceMinutes} min)`,
-            validationStatus: 'NONE',
-            rawData: {
-              terminalState: webhookData.terminalState,
-              source: 'TERMINAL_STATE_WEBHOOK',
-              processedAt: new Date().toISOString(),
-              duplicateOf: existingPunch.id,
-              toleranceMinutes,
-            },
-          },
+            device,
+            employee.id,
+            webhookData,
+            punchTime,
+            existingPunch.id,
+            toleranceMinutes,
+          ),
         });
 
         console.log(`   📝 Enregistré comme DEBOUNCE_BLOCKED: ${debounceRecord.id}`);
@@ -8587,492 +8664,844 @@ export class AttendanceService {
         };
       }
 
-      // 4. ENRICHISSEMENT MÉTIER
-      const schedule = await this.getScheduleWithFallback(tenantId, employee.id, punchTime);
-      const shift = schedule?.shift as {
-        id: string;
-        name: string;
-        startTime: string;
-        endTime: string;
-        isNightShift?: boolean;
-        breakDuration?: number;
-      } | null;
-
-      // Vérifier jour férié
-      const punchDate = punchTime.toISOString().split('T')[0];
-      const holiday = await this.prisma.holiday.findFirst({
+      // 4-8. ENRICHISSEMENT, ANOMALIES ET PERSISTANCE
+      return await this.persistTerminalPunch(tenantId, device, employee, webhookData, punchTime, workingDays, startTime);
+    } catch (error) {
+      console.error(`❌ [TERMINAL-STATE] Erreur:`, error);
+      return {
+        status: 'ERROR',
+        error: error.message || 'Erreur inconnue',
+        duration: Date.now() - startTime,
+      };
+    }
+  }
+
+  /**
+   * Traite un lot de pointages avec STATE du terminal (ré-import d'historique)
+   *
+   * Le terminal, les paramètres du tenant, les employés (une recherche par
+   * matricule distinct) et l'état anti-doublon (une seule requête sur la
+   * fenêtre du lot) sont résolus une fois pour tout le lot:
+   * - pointage identique déjà enregistré (même employé, type et timestamp) → DUPLICATE, rien n'est créé
+   * - même type dans la tolérance → DEBOUNCE_BLOCKED, enregistrements insérés en un seul createMany
+   * - sinon → même traitement métier que processTerminalPunch (anomalies, heures sup)
+   *
+   * Les pointages sont traités dans l'ordre chronologique (la détection
+   * d'anomalies dépend des pointages précédents); les résultats sont
+   * renvoyés dans l'ordre du lot.
+   *
+   * Toutes les écritures du lot (pointages et DEBOUNCE_BLOCKED) sont faites
+   * dans une seule transaction: les lectures de la détection d'anomalies
+   * voient les pointages précédents du lot, et un lot interrompu n'est
+   * jamais enregistré à moitié. Chaque pointage a son point de sauvegarde:
+   * un pointage en erreur est annulé seul (ERROR) sans faire échouer le lot.
+   * Les heures sup sont créées dans la transaction, pointage par pointage;
+   * les jours supplémentaires automatiques après sa validation. Les employés
+   * écrits sont invalidés dans l'index des derniers pointages une fois la
+   * transaction terminée.
+   *
+   * @param tenantId ID du tenant
+   * @param deviceId ID du terminal
+   * @param punches Pointages du lot
+   * @param apiKey Clé API optionnelle
+   */
+  async processTerminalPunchBulk(
+    tenantId: string,
+    deviceId: string,
+    punches: WebhookStateDto[],
+    apiKey?: string,
+  ): Promise<WebhookStateBulkResponseDto> {
+    const startTime = Date.now();
+    const results: WebhookStateResponseDto[] = new Array(punches.length);
+
+    console.log(`\n📦 [TERMINAL-STATE-BULK] Lot de ${punches.length} pointage(s) du terminal ${deviceId}`);
+
+    // 1. VÉRIFIER LE TERMINAL (une fois pour le lot)
+    const device = await this.prisma.attendanceDevice.findFirst({
+      where: { deviceId, tenantId },
+      select: { id: true, apiKey: true, siteId: true, isActive: true },
+    });
+
+    let deviceError: string | null = null;
+    if (!device) {
+      deviceError = `Terminal non trouvé: ${deviceId}`;
+    } else if (!device.isActive) {
+      deviceError = `Terminal inactif: ${deviceId}`;
+    } else if (device.apiKey && apiKey && device.apiKey !== apiKey) {
+      deviceError = 'API Key invalide';
+    }
+
+    if (deviceError) {
+      console.log(`❌ [TERMINAL-STATE-BULK] ${deviceError}`);
+      return this.summarizeTerminalPunchBulk(
+        punches.map(() => ({ status: 'ERROR' as const, error: deviceError })),
+        startTime,
+      );
+    }
+
+    // 2. PARAMÈTRES DU TENANT (une fois pour le lot)
+    const tenantSettings = await this.prisma.tenantSettings.findUnique({
+      where: { tenantId },
+      select: { doublePunchToleranceMinutes: true, workingDays: true },
+    });
+    const toleranceMinutes = tenantSettings?.doublePunchToleranceMinutes ?? 2;
+    const workingDays = (tenantSettings?.workingDays as number[]) || [1, 2, 3, 4, 5];
+    const toleranceMs = toleranceMinutes * 60 * 1000;
+
+    // 3. EMPLOYÉS (une recherche par matricule distinct)
+    const employees = new Map<string, any>();
+    for (const matricule of new Set(punches.map((punch) => punch.employeeId))) {
+      employees.set(matricule, await this.resolveTerminalEmployee(tenantId, matricule));
+    }
+
+    // 4. ÉTAT ANTI-DOUBLON: une seule requête sur la fenêtre du lot
+    const ordered = punches
+      .map((punch, index) => ({ punch, index, time: new Date(punch.timestamp).getTime() }))
+      .sort((a, b) => a.time - b.time);
+    const employeeIds = [...new Set([...employees.values()].filter(Boolean).map((employee) => employee.id))];
+
+    // Pointages connus par employé et type: (id, timestamp en ms)
+    const known = new Map<string, { id: string; time: number }[]>();
+    const knownFor = (employeeId: string, type: string) => {
+      const key = `${employeeId}|${type}`;
+      if (!known.has(key)) {
+        known.set(key, []);
+      }
+      return known.get(key);
+    };
+
+    if (employeeIds.length > 0 && ordered.length > 0) {
+      const existing = await this.prisma.attendance.findMany({
         where: {
           tenantId,
-          date: new Date(punchDate),
+          employeeId: { in: employeeIds },
+          timestamp: {
+            gte: new Date(ordered[0].time - toleranceMs),
+            lte: new Date(ordered[ordered.length - 1].time + toleranceMs),
+          },
         },
+        select: { id: true, employeeId: true, type: true, timestamp: true },
       });
-      const isHoliday = !!holiday;
+      for (const punch of existing) {
+        knownFor(punch.employeeId, punch.type).push({ id: punch.id, time: punch.timestamp.getTime() });
+      }
+    }
 
-      // Vérifier congé
-      const leave = await this.prisma.leave.findFirst({
-        where: {
-          tenantId,
-          employeeId: employee.id,
-          status: { in: ['APPROVED', 'MANAGER_APPROVED', 'HR_APPROVED'] },
-          startDate: { lte: new Date(punchDate) },
-          endDate: { gte: new Date(punchDate) },
+    // 5. TRAITEMENT DANS L'ORDRE CHRONOLOGIQUE, en une seule transaction
+    const debounceRecords: Prisma.AttendanceCreateManyInput[] = [];
+    const debounceIndexes: number[] = [];
+    const followUps: (() => Promise<void>)[] = [];
+    // Employés écrits dans la transaction: leur index est invalidé après validation
+    const touchedEmployeeIds = new Set<string>();
+
+    try {
+      await this.prisma.$transaction(async (tx) => {
+        for (const { punch, index, time } of ordered) {
+          const employee = employees.get(punch.employeeId);
+          if (!employee) {
+            results[index] = { status: 'ERROR', error: `Employé non trouvé: ${punch.employeeId}` };
+            continue;
+          }
+
+          const sameType = knownFor(employee.id, punch.type);
+          const identical = sameType.find((known) => known.time === time);
+          if (identical) {
+            results[index] = { status: 'DUPLICATE', existingId: identical.id };
+            continue;
+          }
+
+          const punchTime = new Date(time);
+          const nearby = sameType.find((known) => Math.abs(known.time - time) <= toleranceMs);
+          if (nearby) {
+            const record = {
+              id: randomUUID(),
+              ...this.buildDebounceRecordData(tenantId, device, employee.id, punch, punchTime, nearby.id, toleranceMinutes),
+            };
+            debounceRecords.push(record);
+            debounceIndexes.push(index);
+            touchedEmployeeIds.add(employee.id);
+            sameType.push({ id: record.id, time });
+            results[index] = { status: 'DEBOUNCE_BLOCKED', id: record.id, existingId: nearby.id };
+            continue;
+          }
+
+          // Point de sauvegarde: une erreur PostgreSQL invalide sinon toute la transaction
+          touchedEmployeeIds.add(employee.id);
+          await tx.$executeRawUnsafe('SAVEPOINT terminal_punch');
+          try {
+            const result = await this.persistTerminalPunch(
+              tenantId,
+              device,
+              employee,
+              punch,
+              punchTime,
+              workingDays,
+              Date.now(),
+              tx,
+              followUps,
+            );
+            await tx.$executeRawUnsafe('RELEASE SAVEPOINT terminal_punch');
+            sameType.push({ id: result.id, time });
+            results[index] = result;
+          } catch (error) {
+            await tx.$executeRawUnsafe('ROLLBACK TO SAVEPOINT terminal_punch');
+            console.error(`❌ [TERMINAL-STATE-BULK] Erreur (${punch.employeeId} ${punch.timestamp}):`, error);
+            results[index] = { status: 'ERROR', error: error.message || 'Erreur inconnue' };
+          }
+        }
+
+        // 6. ENREGISTREMENTS DEBOUNCE_BLOCKED: insertion groupée dans la même transaction
+        if (debounceRecords.length > 0) {
+          await tx.$executeRawUnsafe('SAVEPOINT terminal_debounce');
+          try {
+            await tx.attendance.createMany({ data: debounceRecords });
+            await tx.$executeRawUnsafe('RELEASE SAVEPOINT terminal_debounce');
+          } catch (error) {
+            await tx.$executeRawUnsafe('ROLLBACK TO SAVEPOINT terminal_debounce');
+            console.error(`❌ [TERMINAL-STATE-BULK] Insertion des doublons impossible:`, error);
+            for (const index of debounceIndexes) {
+              results[index] = { status: 'ERROR', error: error.message || 'Erreur inconnue' };
+            }
+          }
+        }
+      }, { timeout: TERMINAL_BULK_TRANSACTION_TIMEOUT_MS });
+    } catch (error) {
+      // Transaction annulée: aucun pointage du lot n'a été enregistré
+      console.error(`❌ [TERMINAL-STATE-BULK] Transaction annulée:`, error);
+      for (let index = 0; index < results.length; index++) {
+        if (results[index]?.status === 'CREATED' || results[index]?.status === 'DEBOUNCE_BLOCKED' || !results[index]) {
+          results[index] = { status: 'ERROR', error: error.message || 'Erreur inconnue' };
+        }
+      }
+      return this.summarizeTerminalPunchBulk(results, startTime);
+    } finally {
+      // Un pointage unitaire concurrent a pu recharger l'index pendant la
+      // transaction (sans voir ses écritures): le recharger après validation
+      for (const employeeId of touchedEmployeeIds) {
+        this.punchIndex.invalidateEmployee(tenantId, employeeId);
+      }
+    }
+
+    // 7. JOURS SUPPLÉMENTAIRES AUTOMATIQUES (pointages validés)
+    for (const followUp of followUps) {
+      try {
+        await followUp();
+      } catch (error) {
+        console.error(`❌ [TERMINAL-STATE-BULK] Post-traitement impossible:`, error);
+      }
+    }
+
+    return this.summarizeTerminalPunchBulk(results, startTime);
+  }
+
+  /**
+   * Recherche l'employé d'un matricule terminal (recherche flexible, puis mapping terminal)
+   */
+  private async resolveTerminalEmployee(tenantId: string, matricule: string): Promise<any | null> {
+    const employee = await findEmployeeByMatriculeFlexible(this.prisma, tenantId, matricule);
+    if (employee) {
+      return employee;
+    }
+
+    const mapping = await this.prisma.terminalMatriculeMapping.findFirst({
+      where: {
+        tenantId,
+        terminalMatricule: matricule,
+        isActive: true,
+      },
+      include: { employee: true },
+    });
+    if (mapping) {
+      console.log(`   ✅ Employé trouvé via mapping: ${mapping.terminalMatricule} → ${mapping.employee.matricule}`);
+      return mapping.employee;
+    }
+
+    return null;
+  }
+
+  /**
+   * Enregistrement informatif DEBOUNCE_BLOCKED (visible dans l'interface anomalies)
+   */
+  private buildDebounceRecordData(
+    tenantId: string,
+    device: { id: string; siteId: string | null },
+    employeeId: string,
+    webhookData: WebhookStateDto,
+    punchTime: Date,
+    duplicateOf: string,
+    toleranceMinutes: number,
+  ): Prisma.AttendanceCreateManyInput {
+    return {
+      tenantId,
+      employeeId,
+      deviceId: device.id,
+      siteId: device.siteId,
+      timestamp: punchTime,
+      type: webhookData.type,
+      terminalState: webhookData.terminalState,
+      method: webhookData.method || 'FINGERPRINT',
+      source: webhookData.source || 'TERMINAL',
+      detectionMethod: 'TERMINAL_STATE',
+      hasAnomaly: true,
+      anomalyType: 'DEBOUNCE_BLOCKED',
+      isCorrected: true, // Marqué comme traité (informatif, pas de correction nécessaire)
+      correctionNote: `Doublon du pointage ${duplicateOf} (tolérance: ${toleranceMinutes} min)`,
+      validationStatus: 'NONE',
+      rawData: {
+        terminalState: webhookData.terminalState,
+        source: 'TERMINAL_STATE_WEBHOOK',
+        processedAt: new Date().toISOString(),
+        duplicateOf,
+        toleranceMinutes,
+      },
+    };
+  }
+
+  /**
+   * Enrichissement métier, calcul des anomalies et persistance d'un pointage
+   * accepté par l'anti-doublon (partagé par le webhook unitaire et le lot)
+   * @param db Client Prisma ou transaction du lot en cours
+   * @param followUps Si fourni, le jour supplémentaire automatique y est ajouté
+   * pour être créé après validation de la transaction (SupplementaryDaysService
+   * n'écrit pas dans la transaction). Les heures sup sont créées dans l'ordre
+   * des pointages, comme pour le webhook unitaire: la sortie remplacée d'un
+   * DOUBLE_OUT supprime l'overtime avant que la nouvelle sortie le recrée.
+   */
+  private async persistTerminalPunch(
+    tenantId: string,
+    device: { id: string; siteId: string | null },
+    employee: any,
+    webhookData: WebhookStateDto,
+    punchTime: Date,
+    workingDays: number[],
+    startTime: number,
+    db: Prisma.TransactionClient = this.prisma,
+    followUps?: (() => Promise<void>)[],
+  ): Promise<WebhookStateResponseDto> {
+    // 4. ENRICHISSEMENT MÉTIER
+    const schedule = await this.getScheduleWithFallback(tenantId, employee.id, punchTime, db);
+    const shift = schedule?.shift as {
+      id: string;
+      name: string;
+      startTime: string;
+      endTime: string;
+      isNightShift?: boolean;
+      breakDuration?: number;
+    } | null;
+
+    // Vérifier jour férié
+    const punchDate = punchTime.toISOString().split('T')[0];
+    const holiday = await db.holiday.findFirst({
+      where: {
+        tenantId,
+        date: new Date(punchDate),
+      },
+    });
+    const isHoliday = !!holiday;
+
+    // Vérifier congé
+    const leave = await db.leave.findFirst({
+      where: {
+        tenantId,
+        employeeId: employee.id,
+        status: { in: ['APPROVED', 'MANAGER_APPROVED', 'HR_APPROVED'] },
+        startDate: { lte: new Date(punchDate) },
+        endDate: { gte: new Date(punchDate) },
+      },
+    });
+    const isOnLeave = !!leave;
+
+    console.log(`   📋 Shift: ${shift?.name || 'Aucun'} (${shift?.startTime || '-'} → ${shift?.endTime || '-'})`);
+    console.log(`   📅 Jour férié: ${isHoliday ? 'OUI' : 'Non'}, En congé: ${isOnLeave ? 'OUI' : 'Non'}`);
+
+    // 4.1. VÉRIFICATION JOUR OUVRABLE (WEEKEND CHECK)
+    // Si c'est un jour non ouvrable ET que le schedule est virtuel (pas de planning explicite)
+    const dayOfWeek = punchTime.getDay(); // 0 = Dimanche, 1 = Lundi, etc.
+    const normalizedDayOfWeek = dayOfWeek === 0 ? 7 : dayOfWeek; // Normaliser dimanche à 7
+    const isWorkingDay = workingDays.includes(normalizedDayOfWeek);
+    const isVirtualSchedule = schedule?.id === 'virtual';
+    const dayNames = ['dimanche', 'lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi'];
+    const dayName = dayNames[dayOfWeek];
+
+    console.log(`   📆 Jour: ${dayName} (${normalizedDayOfWeek}), Ouvrable: ${isWorkingDay ? 'OUI' : 'NON'}, Planning explicite: ${!isVirtualSchedule ? 'OUI' : 'NON (virtuel)'}`);
+
+    // 5. CALCUL ANOMALIE (basé sur le type RÉEL du terminal)
+    let anomalyType: string | null = null;
+    let anomalyMinutes: number | null = null;
+    let lateMinutes: number | null = null;
+    let earlyLeaveMinutes: number | null = null;
+    let overtimeMinutes: number | null = null;
+
+    // Variables pour DOUBLE_IN (déclarées ici pour être accessibles dans la persistance)
+    let isDoubleIn = false;
+    let firstInTime: Date | null = null;
+
+    // Variable pour MISSING_IN (OUT sans IN préalable)
+    let isMissingIn = false;
+
+    if (isHoliday && !isOnLeave) {
+      anomalyType = 'HOLIDAY_WORKED';
+    } else if (isOnLeave) {
+      anomalyType = 'LEAVE_BUT_PRESENT';
+    } else if (!isWorkingDay && isVirtualSchedule) {
+      // Jour non ouvrable (weekend) sans planning explicite → Anomalie WEEKEND_WORK
+      anomalyType = 'WEEKEND_WORK';
+      console.log(`   ⚠️ Anomalie WEEKEND_WORK: pointage le ${dayName} sans planning explicite`);
+    } else if (shift) {
+      const punchMinutes = punchTime.getHours() * 60 + punchTime.getMinutes();
+      const [startH, startM] = shift.startTime.split(':').map(Number);
+      const [endH, endM] = shift.endTime.split(':').map(Number);
+      const shiftStartMinutes = startH * 60 + startM;
+      let shiftEndMinutes = endH * 60 + endM;
+
+      // Ajustement shift nuit
+      if (shift.isNightShift && shiftEndMinutes < shiftStartMinutes) {
+        shiftEndMinutes += 1440; // +24h
+      }
+
+      // Récupérer les seuils du tenant
+      const settings = await db.tenantSettings.findUnique({
+        where: { tenantId },
+        select: {
+          lateToleranceEntry: true,
+          earlyToleranceExit: true,
+          overtimeMinimumThreshold: true,
         },
       });
-      const isOnLeave = !!leave;
-
-      console.log(`   📋 Shift: ${shift?.name || 'Aucun'} (${shift?.startTime || '-'} → ${shift?.endTime || '-'})`);
-      console.log(`   📅 Jour férié: ${isHoliday ? 'OUI' : 'Non'}, En congé: ${isOnLeave ? 'OUI' : 'Non'}`);
-
-      // 4.1. VÉRIFICATION JOUR OUVRABLE (WEEKEND CHECK)
-      // Si c'est un jour non ouvrable ET que le schedule est virtuel (pas de planning explicite)
-      const dayOfWeek = punchTime.getDay(); // 0 = Dimanche, 1 = Lundi, etc.
-      const normalizedDayOfWeek = dayOfWeek === 0 ? 7 : dayOfWeek; // Normaliser dimanche à 7
-      const isWorkingDay = workingDays.includes(normalizedDayOfWeek);
-      const isVirtualSchedule = schedule?.id === 'virtual';
-      const dayNames = ['dimanche', 'lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi'];
-      const dayName = dayNames[dayOfWeek];
-
-      console.log(`   📆 Jour: ${dayName} (${normalizedDayOfWeek}), Ouvrable: ${isWorkingDay ? 'OUI' : 'NON'}, Planning explicite: ${!isVirtualSchedule ? 'OUI' : 'NON (virtuel)'}`);
-
-      // 5. CALCUL ANOMALIE (basé sur le type RÉEL du terminal)
-      let anomalyType: string | null = null;
-      let anomalyMinutes: number | null = null;
-      let lateMinutes: number | null = null;
-      let earlyLeaveMinutes: number | null = null;
-      let overtimeMinutes: number | null = null;
-
-      // Variables pour DOUBLE_IN (déclarées ici pour être accessibles dans la persistance)
-      let isDoubleIn = false;
-      let firstInTime: Date | null = null;
-
-      // Variable pour MISSING_IN (OUT sans IN préalable)
-      let isMissingIn = false;
-
-      if (isHoliday && !isOnLeave) {
-        anomalyType = 'HOLIDAY_WORKED';
-      } else if (isOnLeave) {
-        anomalyType = 'LEAVE_BUT_PRESENT';
-      } else if (!isWorkingDay && isVirtualSchedule) {
-        // Jour non ouvrable (weekend) sans planning explicite → Anomalie WEEKEND_WORK
-        anomalyType = 'WEEKEND_WORK';
-        console.log(`   ⚠️ Anomalie WEEKEND_WORK: pointage le ${dayName} sans planning explicite`);
-      } else if (shift) {
-        const punchMinutes = punchTime.getHours() * 60 + punchTime.getMinutes();
-        const [startH, startM] = shift.startTime.split(':').map(Number);
-        const [endH, endM] = shift.endTime.split(':').map(Number);
-        const shiftStartMinutes = startH * 60 + startM;
-        let shiftEndMinutes = endH * 60 + endM;
-
-        // Ajustement shift nuit
-        if (shift.isNightShift && shiftEndMinutes < shiftStartMinutes) {
-          shiftEndMinutes += 1440; // +24h
-        }
 
-        // Récupérer les seuils du tenant
-        const settings = await this.prisma.tenantSettings.findUnique({
-          where: { tenantId },
-          select: {
-            lateToleranceEntry: true,
-            earlyToleranceExit: true,
-            overtimeMinimumThreshold: true,
-          },
-        });
+      const lateThreshold = settings?.lateToleranceEntry ?? 10;
+      const earlyThreshold = settings?.earlyToleranceExit ?? 5;
+      const overtimeThreshold = settings?.overtimeMinimumThreshold ?? 30;
 
-        const lateThreshold = settings?.lateToleranceEntry ?? 10;
-        const earlyThreshold = settings?.earlyToleranceExit ?? 5;
-        const overtimeThreshold = settings?.overtimeMinimumThreshold ?? 30;
+      if (webhookData.type === 'IN') {
+        const punchDate = punchTime.toISOString().split('T')[0];
 
-        if (webhookData.type === 'IN') {
-          const punchDate = punchTime.toISOString().split('T')[0];
+        // ═══════════════════════════════════════════════════════════════
+        // MISSING_OUT: Vérifier s'il y a un IN précédent (jours passés) sans OUT
+        // ═══════════════════════════════════════════════════════════════
+        const threeDaysAgo = new Date(punchTime);
+        threeDaysAgo.setDate(threeDaysAgo.getDate() - 3); // Chercher sur 3 jours max
 
-          // ═══════════════════════════════════════════════════════════════
-          // MISSING_OUT: Vérifier s'il y a un IN précédent (jours passés) sans OUT
-          // ═══════════════════════════════════════════════════════════════
-          const threeDaysAgo = new Date(punchTime);
-          threeDaysAgo.setDate(threeDaysAgo.getDate() - 3); // Chercher sur 3 jours max
+        const unclosedPreviousIn = await db.attendance.findFirst({
+          where: {
+            tenantId,
+            employeeId: employee.id,
+            type: 'IN',
+            timestamp: {
+              gte: threeDaysAgo,
+              lt: new Date(punchDate + 'T00:00:00Z'), // Avant aujourd'hui
+            },
+            OR: [
+              { anomalyType: null },
+              { anomalyType: { notIn: ['MISSING_OUT', 'DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
+            ],
+          },
+          orderBy: { timestamp: 'desc' }, // Le plus récent d'abord
+        });
 
-          const unclosedPreviousIn = await this.prisma.attendance.findFirst({
+        if (unclosedPreviousIn) {
+          // Vérifier s'il y a un OUT correspondant après ce IN
+          const hasOutAfter = await db.attendance.findFirst({
             where: {
               tenantId,
               employeeId: employee.id,
-              type: 'IN',
+              type: 'OUT',
               timestamp: {
-                gte: threeDaysAgo,
-                lt: new Date(punchDate + 'T00:00:00Z'), // Avant aujourd'hui
+                gt: unclosedPreviousIn.timestamp,
               },
               OR: [
                 { anomalyType: null },
-                { anomalyType: { notIn: ['MISSING_OUT', 'DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
+                { anomalyType: { notIn: ['MISSING_IN', 'DOUBLE_OUT', 'DEBOUNCE_BLOCKED'] } },
               ],
             },
-            orderBy: { timestamp: 'desc' }, // Le plus récent d'abord
           });
 
-          if (unclosedPreviousIn) {
-            // Vérifier s'il y a un OUT correspondant après ce IN
-            const hasOutAfter = await this.prisma.attendance.findFirst({
-              where: {
-                tenantId,
-                employeeId: employee.id,
-                type: 'OUT',
-                timestamp: {
-                  gt: unclosedPreviousIn.timestamp,
-                },
-                OR: [
-                  { anomalyType: null },
-                  { anomalyType: { notIn: ['MISSING_IN', 'DOUBLE_OUT', 'DEBOUNCE_BLOCKED'] } },
-                ],
-              },
-            });
-
-            if (!hasOutAfter) {
-              // Pas de OUT après ce IN → MISSING_OUT
-              // Vérifier que le shift de ce jour-là est bien terminé
-              const inDate = unclosedPreviousIn.timestamp;
-              const inDateStr = inDate.toISOString().split('T')[0];
+          if (!hasOutAfter) {
+            // Pas de OUT après ce IN → MISSING_OUT
+            // Vérifier que le shift de ce jour-là est bien terminé
+            const inDate = unclosedPreviousIn.timestamp;
+            const inDateStr = inDate.toISOString().split('T')[0];
 
-              // Récupérer le shift de l'ancien IN
-              const oldSchedule = await this.getScheduleWithFallback(tenantId, employee.id, inDate);
-              const oldShift = oldSchedule?.shift as { endTime: string; isNightShift?: boolean } | null;
+            // Récupérer le shift de l'ancien IN
+            const oldSchedule = await this.getScheduleWithFallback(tenantId, employee.id, inDate, db);
+            const oldShift = oldSchedule?.shift as { endTime: string; isNightShift?: boolean } | null;
 
-              let shiftEnded = true; // Par défaut, considérer que le shift est terminé
+            let shiftEnded = true; // Par défaut, considérer que le shift est terminé
 
-              if (oldShift) {
-                const [endH, endM] = oldShift.endTime.split(':').map(Number);
-                let expectedEndTime = new Date(inDateStr + 'T00:00:00Z');
-                expectedEndTime.setUTCHours(endH, endM, 0, 0);
+            if (oldShift) {
+              const [endH, endM] = oldShift.endTime.split(':').map(Number);
+              let expectedEndTime = new Date(inDateStr + 'T00:00:00Z');
+              expectedEndTime.setUTCHours(endH, endM, 0, 0);
 
-                // Pour shift nuit, la fin est le lendemain
-                if (oldShift.isNightShift) {
-                  expectedEndTime.setDate(expectedEndTime.getDate() + 1);
-                }
-
-                // Ajouter 2h de buffer après la fin du shift
-                const bufferMs = 2 * 60 * 60 * 1000; // 2 heures
-                shiftEnded = punchTime.getTime() > (expectedEndTime.getTime() + bufferMs);
+              // Pour shift nuit, la fin est le lendemain
+              if (oldShift.isNightShift) {
+                expectedEndTime.setDate(expectedEndTime.getDate() + 1);
               }
 
-              if (shiftEnded) {
-                // Marquer l'ancien IN comme MISSING_OUT
-                await this.prisma.attendance.update({
-                  where: { id: unclosedPreviousIn.id },
-                  data: {
-                    hasAnomaly: true,
-                    anomalyType: 'MISSING_OUT',
-                    isCorrected: false, // À corriger manuellement
-                    anomalyNote: `Entrée du ${inDate.toLocaleDateString('fr-FR')} sans sortie. Veuillez ajouter l'heure de sortie manuellement.`,
-                  },
-                });
-                console.log(`   ⚠️ MISSING_OUT détecté: IN du ${inDate.toLocaleDateString('fr-FR')} à ${inDate.toLocaleTimeString('fr-FR')} sans OUT`);
-              }
+              // Ajouter 2h de buffer après la fin du shift
+              const bufferMs = 2 * 60 * 60 * 1000; // 2 heures
+              shiftEnded = punchTime.getTime() > (expectedEndTime.getTime() + bufferMs);
+            }
+
+            if (shiftEnded) {
+              // Marquer l'ancien IN comme MISSING_OUT
+              await db.attendance.update({
+                where: { id: unclosedPreviousIn.id },
+                data: {
+                  hasAnomaly: true,
+                  anomalyType: 'MISSING_OUT',
+                  isCorrected: false, // À corriger manuellement
+                  anomalyNote: `Entrée du ${inDate.toLocaleDateString('fr-FR')} sans sortie. Veuillez ajouter l'heure de sortie manuellement.`,
+                },
+              });
+              console.log(`   ⚠️ MISSING_OUT détecté: IN du ${inDate.toLocaleDateString('fr-FR')} à ${inDate.toLocaleTimeString('fr-FR')} sans OUT`);
             }
           }
+        }
 
-          // ═══════════════════════════════════════════════════════════════
-          // DOUBLE_IN: Vérifier s'il existe déjà une entrée aujourd'hui
-          // ═══════════════════════════════════════════════════════════════
-          const existingIn = await this.prisma.attendance.findFirst({
+        // ═══════════════════════════════════════════════════════════════
+        // DOUBLE_IN: Vérifier s'il existe déjà une entrée aujourd'hui
+        // ═══════════════════════════════════════════════════════════════
+        const existingIn = await db.attendance.findFirst({
+          where: {
+            tenantId,
+            employeeId: employee.id,
+            type: 'IN',
+            timestamp: {
+              gte: new Date(punchDate + 'T00:00:00Z'),
+              lt: new Date(punchDate + 'T23:59:59Z'),
+            },
+            OR: [
+              { anomalyType: null },
+              { anomalyType: { notIn: ['DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
+            ],
+          },
+          orderBy: { timestamp: 'asc' }, // Premier IN (le plus ancien)
+        });
+
+        if (existingIn) {
+          // Vérifier s'il y a un OUT entre l'ancien IN et le nouveau IN
+          const hasOutBetween = await db.attendance.findFirst({
             where: {
               tenantId,
               employeeId: employee.id,
-              type: 'IN',
+              type: 'OUT',
               timestamp: {
-                gte: new Date(punchDate + 'T00:00:00Z'),
-                lt: new Date(punchDate + 'T23:59:59Z'),
+                gt: existingIn.timestamp,
+                lt: punchTime,
               },
               OR: [
                 { anomalyType: null },
-                { anomalyType: { notIn: ['DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
+                { anomalyType: { notIn: ['DOUBLE_OUT', 'DEBOUNCE_BLOCKED'] } },
               ],
             },
-            orderBy: { timestamp: 'asc' }, // Premier IN (le plus ancien)
           });
 
-          if (existingIn) {
-            // Vérifier s'il y a un OUT entre l'ancien IN et le nouveau IN
-            const hasOutBetween = await this.prisma.attendance.findFirst({
-              where: {
-                tenantId,
-                employeeId: employee.id,
-                type: 'OUT',
-                timestamp: {
-                  gt: existingIn.timestamp,
-                  lt: punchTime,
-                },
-                OR: [
-                  { anomalyType: null },
-                  { anomalyType: { notIn: ['DOUBLE_OUT', 'DEBOUNCE_BLOCKED'] } },
-                ],
-              },
-            });
-
-            if (!hasOutBetween) {
-              // Pas de OUT entre les deux IN → le NOUVEAU IN est un DOUBLE_IN
-              // On garde le PREMIER IN comme valide (heure d'arrivée réelle)
-              isDoubleIn = true;
-              firstInTime = existingIn.timestamp;
-              console.log(`   📝 Nouveau pointage sera marqué comme DOUBLE_IN (première entrée: ${existingIn.timestamp.toLocaleTimeString('fr-FR')})`);
-            }
+          if (!hasOutBetween) {
+            // Pas de OUT entre les deux IN → le NOUVEAU IN est un DOUBLE_IN
+            // On garde le PREMIER IN comme valide (heure d'arrivée réelle)
+            isDoubleIn = true;
+            firstInTime = existingIn.timestamp;
+            console.log(`   📝 Nouveau pointage sera marqué comme DOUBLE_IN (première entrée: ${existingIn.timestamp.toLocaleTimeString('fr-FR')})`);
           }
+        }
 
-          // RETARD = IN après début shift + tolérance
-          const late = punchMinutes - shiftStartMinutes;
-          if (late > lateThreshold) {
-            anomalyType = 'LATE';
-            lateMinutes = late;
-            anomalyMinutes = late;
-            console.log(`   ⚠️ Anomalie: RETARD de ${late} min`);
-          }
+        // RETARD = IN après début shift + tolérance
+        const late = punchMinutes - shiftStartMinutes;
+        if (late > lateThreshold) {
+          anomalyType = 'LATE';
+          lateMinutes = late;
+          anomalyMinutes = late;
+          console.log(`   ⚠️ Anomalie: RETARD de ${late} min`);
         }
+      }
+
+      if (webhookData.type === 'OUT') {
+        const punchDate = punchTime.toISOString().split('T')[0];
+
+        // MISSING_IN: Vérifier s'il existe une entrée pour cet employé aujourd'hui
+        const existingIn = await db.attendance.findFirst({
+          where: {
+            tenantId,
+            employeeId: employee.id,
+            type: 'IN',
+            timestamp: {
+              gte: new Date(punchDate + 'T00:00:00Z'),
+              lt: new Date(punchDate + 'T23:59:59Z'),
+            },
+            OR: [
+              { anomalyType: null },
+              { anomalyType: { notIn: ['DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
+            ],
+          },
+        });
 
-        if (webhookData.type === 'OUT') {
-          const punchDate = punchTime.toISOString().split('T')[0];
+        if (!existingIn) {
+          // Pas de IN aujourd'hui → MISSING_IN (à corriger manuellement)
+          isMissingIn = true;
+          console.log(`   ⚠️ MISSING_IN détecté: Aucune entrée trouvée pour aujourd'hui`);
+
+          // ═══════════════════════════════════════════════════════════════
+          // MISSING_OUT: Aussi vérifier s'il y a un IN précédent sans OUT
+          // (cas où l'employé pointe OUT au lieu de IN par erreur)
+          // ═══════════════════════════════════════════════════════════════
+          const threeDaysAgo = new Date(punchTime);
+          threeDaysAgo.setDate(threeDaysAgo.getDate() - 3);
 
-          // MISSING_IN: Vérifier s'il existe une entrée pour cet employé aujourd'hui
-          const existingIn = await this.prisma.attendance.findFirst({
+          const unclosedPreviousIn = await db.attendance.findFirst({
             where: {
               tenantId,
               employeeId: employee.id,
               type: 'IN',
               timestamp: {
-                gte: new Date(punchDate + 'T00:00:00Z'),
-                lt: new Date(punchDate + 'T23:59:59Z'),
+                gte: threeDaysAgo,
+                lt: new Date(punchDate + 'T00:00:00Z'),
               },
               OR: [
                 { anomalyType: null },
-                { anomalyType: { notIn: ['DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
+                { anomalyType: { notIn: ['MISSING_OUT', 'DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
               ],
             },
+            orderBy: { timestamp: 'desc' },
           });
 
-          if (!existingIn) {
-            // Pas de IN aujourd'hui → MISSING_IN (à corriger manuellement)
-            isMissingIn = true;
-            console.log(`   ⚠️ MISSING_IN détecté: Aucune entrée trouvée pour aujourd'hui`);
-
-            // ═══════════════════════════════════════════════════════════════
-            // MISSING_OUT: Aussi vérifier s'il y a un IN précédent sans OUT
-            // (cas où l'employé pointe OUT au lieu de IN par erreur)
-            // ═══════════════════════════════════════════════════════════════
-            const threeDaysAgo = new Date(punchTime);
-            threeDaysAgo.setDate(threeDaysAgo.getDate() - 3);
-
-            const unclosedPreviousIn = await this.prisma.attendance.findFirst({
+          if (unclosedPreviousIn) {
+            // Vérifier s'il y a un OUT correspondant
+            const hasOutAfter = await db.attendance.findFirst({
               where: {
                 tenantId,
                 employeeId: employee.id,
-                type: 'IN',
-                timestamp: {
-                  gte: threeDaysAgo,
-                  lt: new Date(punchDate + 'T00:00:00Z'),
-                },
+                type: 'OUT',
+                timestamp: { gt: unclosedPreviousIn.timestamp },
                 OR: [
                   { anomalyType: null },
-                  { anomalyType: { notIn: ['MISSING_OUT', 'DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
+                  { anomalyType: { notIn: ['MISSING_IN', 'DOUBLE_OUT', 'DEBOUNCE_BLOCKED'] } },
                 ],
               },
-              orderBy: { timestamp: 'desc' },
             });
 
-            if (unclosedPreviousIn) {
-              // Vérifier s'il y a un OUT correspondant
-              const hasOutAfter = await this.prisma.attendance.findFirst({
-                where: {
-                  tenantId,
-                  employeeId: employee.id,
-                  type: 'OUT',
-                  timestamp: { gt: unclosedPreviousIn.timestamp },
-                  OR: [
-                    { anomalyType: null },
-                    { anomalyType: { notIn: ['MISSING_IN', 'DOUBLE_OUT', 'DEBOUNCE_BLOCKED'] } },
-                  ],
+            if (!hasOutAfter) {
+              const inDate = unclosedPreviousIn.timestamp;
+              await db.attendance.update({
+                where: { id: unclosedPreviousIn.id },
+                data: {
+                  hasAnomaly: true,
+                  anomalyType: 'MISSING_OUT',
+                  isCorrected: false,
+                  anomalyNote: `Entrée du ${inDate.toLocaleDateString('fr-FR')} sans sortie. Veuillez ajouter l'heure de sortie manuellement.`,
                 },
               });
-
-              if (!hasOutAfter) {
-                const inDate = unclosedPreviousIn.timestamp;
-                await this.prisma.attendance.update({
-                  where: { id: unclosedPreviousIn.id },
-                  data: {
-                    hasAnomaly: true,
-                    anomalyType: 'MISSING_OUT',
-                    isCorrected: false,
-                    anomalyNote: `Entrée du ${inDate.toLocaleDateString('fr-FR')} sans sortie. Veuillez ajouter l'heure de sortie manuellement.`,
-                  },
-                });
-                console.log(`   ⚠️ MISSING_OUT détecté: IN du ${inDate.toLocaleDateString('fr-FR')} à ${inDate.toLocaleTimeString('fr-FR')} sans OUT`);
-              }
+              console.log(`   ⚠️ MISSING_OUT détecté: IN du ${inDate.toLocaleDateString('fr-FR')} à ${inDate.toLocaleTimeString('fr-FR')} sans OUT`);
             }
           }
+        }
 
-          // Vérifier s'il existe déjà une sortie pour cet employé aujourd'hui (DOUBLE_OUT)
-          const existingOut = await this.prisma.attendance.findFirst({
+        // Vérifier s'il existe déjà une sortie pour cet employé aujourd'hui (DOUBLE_OUT)
+        const existingOut = await db.attendance.findFirst({
+          where: {
+            tenantId,
+            employeeId: employee.id,
+            type: 'OUT',
+            timestamp: {
+              gte: new Date(punchDate + 'T00:00:00'),
+              lt: new Date(punchDate + 'T23:59:59'),
+            },
+          },
+          orderBy: { timestamp: 'desc' },
+        });
+
+        if (existingOut) {
+          // Marquer l'ancienne sortie comme DOUBLE_OUT (informatif)
+          await db.attendance.update({
+            where: { id: existingOut.id },
+            data: {
+              hasAnomaly: true,
+              anomalyType: 'DOUBLE_OUT',
+              isCorrected: true, // Informatif, pas de correction nécessaire
+              correctionNote: `Remplacé par sortie ultérieure à ${punchTime.toLocaleTimeString('fr-FR')}`,
+              overtimeMinutes: null, // Retirer les heures sup de l'ancienne sortie
+            },
+          });
+          console.log(`   📝 Ancienne sortie ${existingOut.id} marquée comme DOUBLE_OUT`);
+
+          // Supprimer l'overtime associé à l'ancienne sortie (sera recréé avec la nouvelle)
+          await db.overtime.deleteMany({
             where: {
               tenantId,
               employeeId: employee.id,
-              type: 'OUT',
-              timestamp: {
-                gte: new Date(punchDate + 'T00:00:00'),
-                lt: new Date(punchDate + 'T23:59:59'),
-              },
+              date: new Date(punchDate),
             },
-            orderBy: { timestamp: 'desc' },
           });
+          console.log(`   🗑️ Ancien overtime supprimé pour recalcul`);
+        }
 
-          if (existingOut) {
-            // Marquer l'ancienne sortie comme DOUBLE_OUT (informatif)
-            await this.prisma.attendance.update({
-              where: { id: existingOut.id },
-              data: {
-                hasAnomaly: true,
-                anomalyType: 'DOUBLE_OUT',
-                isCorrected: true, // Informatif, pas de correction nécessaire
-                correctionNote: `Remplacé par sortie ultérieure à ${punchTime.toLocaleTimeString('fr-FR')}`,
-                overtimeMinutes: null, // Retirer les heures sup de l'ancienne sortie
-              },
-            });
-            console.log(`   📝 Ancienne sortie ${existingOut.id} marquée comme DOUBLE_OUT`);
-
-            // Supprimer l'overtime associé à l'ancienne sortie (sera recréé avec la nouvelle)
-            await this.prisma.overtime.deleteMany({
-              where: {
-                tenantId,
-                employeeId: employee.id,
-                date: new Date(punchDate),
-              },
-            });
-            console.log(`   🗑️ Ancien overtime supprimé pour recalcul`);
-          }
-
-          // Ajuster pour shift nuit si le punch est après minuit
-          let adjustedPunchMinutes = punchMinutes;
-          if (shift.isNightShift && punchMinutes < shiftStartMinutes) {
-            adjustedPunchMinutes += 1440;
-          }
+        // Ajuster pour shift nuit si le punch est après minuit
+        let adjustedPunchMinutes = punchMinutes;
+        if (shift.isNightShift && punchMinutes < shiftStartMinutes) {
+          adjustedPunchMinutes += 1440;
+        }
 
-          const diff = shiftEndMinutes - adjustedPunchMinutes;
-
-          if (diff > earlyThreshold) {
-            // Départ anticipé
-            anomalyType = 'EARLY_LEAVE';
-            earlyLeaveMinutes = diff;
-            anomalyMinutes = diff;
-            console.log(`   ⚠️ Anomalie: DÉPART ANTICIPÉ de ${diff} min`);
-          } else if (diff < -overtimeThreshold) {
-            // Heures supplémentaires (PAS une anomalie, juste du travail en plus)
-            // Vérifier d'abord si l'employé est éligible aux heures sup
-            if (employee.isEligibleForOvertime !== false) {
-              overtimeMinutes = Math.abs(diff);
-              console.log(`   ⏱️ HEURES SUP détectées: ${Math.abs(diff)} min`);
-            } else {
-              console.log(`   ℹ️ Heures sup ignorées (employé non éligible): ${Math.abs(diff)} min`);
-            }
+        const diff = shiftEndMinutes - adjustedPunchMinutes;
+
+        if (diff > earlyThreshold) {
+          // Départ anticipé
+          anomalyType = 'EARLY_LEAVE';
+          earlyLeaveMinutes = diff;
+          anomalyMinutes = diff;
+          console.log(`   ⚠️ Anomalie: DÉPART ANTICIPÉ de ${diff} min`);
+        } else if (diff < -overtimeThreshold) {
+          // Heures supplémentaires (PAS une anomalie, juste du travail en plus)
+          // Vérifier d'abord si l'employé est éligible aux heures sup
+          if (employee.isEligibleForOvertime !== false) {
+            overtimeMinutes = Math.abs(diff);
+            console.log(`   ⏱️ HEURES SUP détectées: ${Math.abs(diff)} min`);
+          } else {
+            console.log(`   ℹ️ Heures sup ignorées (employé non éligible): ${Math.abs(diff)} min`);
           }
         }
       }
+    }
 
-      // 6. PERSISTANCE (type = CELUI DU TERMINAL, JAMAIS MODIFIÉ)
-      // Priorité des anomalies: MISSING_IN > DOUBLE_IN > autres
-      let finalAnomalyType = anomalyType;
-      if (isMissingIn) {
-        finalAnomalyType = 'MISSING_IN';
-      } else if (isDoubleIn) {
-        finalAnomalyType = 'DOUBLE_IN';
-      }
-      const finalHasAnomaly = isMissingIn || isDoubleIn || !!anomalyType;
+    // 6. PERSISTANCE (type = CELUI DU TERMINAL, JAMAIS MODIFIÉ)
+    // Priorité des anomalies: MISSING_IN > DOUBLE_IN > autres
+    let finalAnomalyType = anomalyType;
+    if (isMissingIn) {
+      finalAnomalyType = 'MISSING_IN';
+    } else if (isDoubleIn) {
+      finalAnomalyType = 'DOUBLE_IN';
+    }
+    const finalHasAnomaly = isMissingIn || isDoubleIn || !!anomalyType;
 
-      const attendance = await this.prisma.attendance.create({
-        data: {
-          tenantId,
-          employeeId: employee.id,
-          deviceId: device.id,
-          siteId: device.siteId,
-          timestamp: punchTime,
-          type: webhookData.type,              // ← DU TERMINAL DIRECTEMENT
-          terminalState: webhookData.terminalState, // ← STATE BRUT CONSERVÉ
-          method: webhookData.method || 'FINGERPRINT',
-          source: webhookData.source || 'TERMINAL',
-          detectionMethod: 'TERMINAL_STATE',   // ← TOUJOURS
-          hasAnomaly: finalHasAnomaly,
-          anomalyType: finalAnomalyType,
-          lateMinutes,
-          earlyLeaveMinutes,
-          overtimeMinutes,
-          validationStatus: 'NONE',
-          // MISSING_IN: à corriger manuellement (pas auto-corrigé)
-          ...(isMissingIn && {
-            isCorrected: false,
-            anomalyNote: `Sortie enregistrée sans entrée préalable. Veuillez ajouter l'heure d'entrée manuellement.`,
-          }),
-          // DOUBLE_IN: marquer comme auto-corrigé (informatif)
-          ...(isDoubleIn && !isMissingIn && {
-            isCorrected: true,
-            correctionNote: `Entrée en double - première entrée à ${firstInTime?.toLocaleTimeString('fr-FR')} conservée`,
-          }),
-          rawData: webhookData.rawData || {
-            terminalState: webhookData.terminalState,
-            source: 'TERMINAL_STATE_WEBHOOK',
-            processedAt: new Date().toISOString(),
-          },
+    const attendance = await db.attendance.create({
+      data: {
+        tenantId,
+        employeeId: employee.id,
+        deviceId: device.id,
+        siteId: device.siteId,
+        timestamp: punchTime,
+        type: webhookData.type,              // ← DU TERMINAL DIRECTEMENT
+        terminalState: webhookData.terminalState, // ← STATE BRUT CONSERVÉ
+        method: webhookData.method || 'FINGERPRINT',
+        source: webhookData.source || 'TERMINAL',
+        detectionMethod: 'TERMINAL_STATE',   // ← TOUJOURS
+        hasAnomaly: finalHasAnomaly,
+        anomalyType: finalAnomalyType,
+        lateMinutes,
+        earlyLeaveMinutes,
+        overtimeMinutes,
+        validationStatus: 'NONE',
+        // MISSING_IN: à corriger manuellement (pas auto-corrigé)
+        ...(isMissingIn && {
+          isCorrected: false,
+          anomalyNote: `Sortie enregistrée sans entrée préalable. Veuillez ajouter l'heure d'entrée manuellement.`,
+        }),
+        // DOUBLE_IN: marquer comme auto-corrigé (informatif)
+        ...(isDoubleIn && !isMissingIn && {
+          isCorrected: true,
+          correctionNote: `Entrée en double - première entrée à ${firstInTime?.toLocaleTimeString('fr-FR')} conservée`,
+        }),
+        rawData: webhookData.rawData || {
+          terminalState: webhookData.terminalState,
+          source: 'TERMINAL_STATE_WEBHOOK',
+          processedAt: new Date().toISOString(),
         },
-      });
+      },
+    });
 
-      console.log(`   ✅ CRÉÉ: ${attendance.id}`);
-      console.log(`   📊 Type: ${attendance.type}, Anomalie: ${finalAnomalyType || 'Aucune'}`);
+    console.log(`   ✅ CRÉÉ: ${attendance.id}`);
+    console.log(`   📊 Type: ${attendance.type}, Anomalie: ${finalAnomalyType || 'Aucune'}`);
 
-      // 7. CRÉATION AUTO OVERTIME si applicable
-      if (overtimeMinutes && overtimeMinutes > 0) {
-        await this.createAutoOvertime(tenantId, attendance, overtimeMinutes);
-      }
+    // 7. CRÉATION AUTO OVERTIME si applicable
+    if (overtimeMinutes && overtimeMinutes > 0) {
+      await this.createAutoOvertime(tenantId, attendance, overtimeMinutes, db);
+    }
 
-      // 8. CRÉATION AUTO JOUR SUPPLÉMENTAIRE si weekend/jour férié
-      if (webhookData.type === 'OUT') {
-        // Trouver le IN correspondant pour calculer les heures travaillées
-        const punchDateStr = punchTime.toISOString().split('T')[0];
-        const matchingIn = await this.prisma.attendance.findFirst({
-          where: {
-            tenantId,
-            employeeId: employee.id,
-            type: 'IN',
-            timestamp: {
-              gte: new Date(punchDateStr + 'T00:00:00Z'),
-              lt: punchTime,
-            },
-            OR: [
-              { anomalyType: null },
-              { anomalyType: { notIn: ['DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
-            ],
+    // 8. JOUR SUPPLÉMENTAIRE AUTOMATIQUE (après la transaction du lot)
+    const followUp = () => this.createTerminalPunchSupplementaryDay(tenantId, employee, attendance, webhookData, punchTime);
+    if (followUps) {
+      followUps.push(followUp);
+    } else {
+      await followUp();
+    }
+
+    const duration = Date.now() - startTime;
+    console.log(`   ⏱️ Traitement: ${duration}ms`);
+    console.log(`═══════════════════════════════════════════════════════════════\n`);
+
+    return {
+      status: 'CREATED',
+      id: attendance.id,
+      type: attendance.type,
+      anomaly: finalAnomalyType || undefined,
+      duration,
+    };
+  }
+
+  /**
+   * Jour supplémentaire automatique d'un pointage terminal enregistré
+   */
+  private async createTerminalPunchSupplementaryDay(
+    tenantId: string,
+    employee: any,
+    attendance: any,
+    webhookData: WebhookStateDto,
+    punchTime: Date,
+  ): Promise<void> {
+    // 8. CRÉATION AUTO JOUR SUPPLÉMENTAIRE si weekend/jour férié
+    if (webhookData.type === 'OUT') {
+      // Trouver le IN correspondant pour calculer les heures travaillées
+      const punchDateStr = punchTime.toISOString().split('T')[0];
+      const matchingIn = await this.prisma.attendance.findFirst({
+        where: {
+          tenantId,
+          employeeId: employee.id,
+          type: 'IN',
+          timestamp: {
+            gte: new Date(punchDateStr + 'T00:00:00Z'),
+            lt: punchTime,
           },
-          orderBy: { timestamp: 'desc' },
-        });
+          OR: [
+            { anomalyType: null },
+            { anomalyType: { notIn: ['DOUBLE_IN', 'DEBOUNCE_BLOCKED'] } },
+          ],
+        },
+        orderBy: { timestamp: 'desc' },
+      });
 
-        if (matchingIn) {
-          const hoursWorked = (punchTime.getTime() - matchingIn.timestamp.getTime()) / (1000 * 60 * 60);
-          if (hoursWorked > 0) {
-            await this.createAutoSupplementaryDay(tenantId, attendance, hoursWorked, matchingIn.timestamp);
-          }
+      if (matchingIn) {
+        const hoursWorked = (punchTime.getTime() - matchingIn.timestamp.getTime()) / (1000 * 60 * 60);
+        if (hoursWorked > 0) {
+          await this.createAutoSupplementaryDay(tenantId, attendance, hoursWorked, matchingIn.timestamp);
         }
       }
+    }
+  }
 
-      const duration = Date.now() - startTime;
-      console.log(`   ⏱️ Traitement: ${duration}ms`);
-      console.log(`═══════════════════════════════════════════════════════════════\n`);
-
-      return {
-        status: 'CREATED',
-        id: attendance.id,
-        type: attendance.type,
-        anomaly: finalAnomalyType || undefined,
-        duration,
-      };
+  /**
+   * Totaux d'un lot traité par processTerminalPunchBulk
+   */
+  private summarizeTerminalPunchBulk(
+    results: WebhookStateResponseDto[],
+    startTime: number,
+  ): WebhookStateBulkResponseDto {
+    const count = (status: WebhookStateResponseDto['status']) =>
+      results.filter((result) => result.status === status).length;
+
+    const summary: WebhookStateBulkResponseDto = {
+      results,
+      created: count('CREATED'),
+      duplicates: count('DUPLICATE'),
+      debounceBlocked: count('DEBOUNCE_BLOCKED'),
+      anomalies: results.filter((result) => result.status === 'CREATED' && !!result.anomaly).length,
+      errors: count('ERROR'),
+      duration: Date.now() - startTime,
+    };
 
-    } catch (error) {
-      console.error(`❌ [TERMINAL-STATE] Erreur:`, error);
-      return {
-        status: 'ERROR',
-        error: error.message || 'Erreur inconnue',
-        duration: Date.now() - startTime,
-      };
-    }
+    console.log(
+      `📦 [TERMINAL-STATE-BULK] ${summary.created} créé(s) dont ${summary.anomalies} avec anomalie, ` +
+      `${summary.duplicates} déjà présent(s), ${summary.debounceBlocked} anti-doublon, ` +
+      `${summary.errors} erreur(s) en ${summary.duration}ms`,
+    );
+    return summary;
   }
 }
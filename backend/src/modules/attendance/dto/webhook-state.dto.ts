@@ -1,4 +1,5 @@
-import { IsString, IsEnum, IsOptional, IsDateString, IsInt, IsObject, Min, Max } from 'class-validator';
+import { IsString, IsEnum, IsOptional, IsDateString, IsInt, IsObject, IsArray, ArrayMaxSize, ValidateNested, Min, Max } from 'class-validator';
+import { Type } from 'class-transformer';
 import { ApiProperty, ApiPropertyOptional } from '@nestjs/swagger';
 import { AttendanceType, DeviceType } from '@prisma/client';
 
@@ -90,3 +91,44 @@ export class WebhookStateResponseDto {
   @ApiPropertyOptional({ description: 'Durée de traitement en ms' })
   duration?: number;
 }
+
+/**
+ * Lot de pointages pour l'import en masse (ré-import d'historique)
+ *
+ * Les employés, les paramètres du tenant et l'état anti-doublon sont résolus
+ * une seule fois pour tout le lot.
+ */
+export class WebhookStateBulkDto {
+  @ApiProperty({ description: 'Pointages du lot (500 max)', type: [WebhookStateDto] })
+  @IsArray()
+  @ArrayMaxSize(500)
+  @ValidateNested({ each: true })
+  @Type(() => WebhookStateDto)
+  punches: WebhookStateDto[];
+}
+
+/**
+ * Réponse du webhook state en masse
+ */
+export class WebhookStateBulkResponseDto {
+  @ApiProperty({ description: 'Résultat par pointage, dans l\'ordre du lot', type: [WebhookStateResponseDto] })
+  results: WebhookStateResponseDto[];
+
+  @ApiProperty({ description: 'Pointages créés' })
+  created: number;
+
+  @ApiProperty({ description: 'Pointages déjà présents (ignorés)' })
+  duplicates: number;
+
+  @ApiProperty({ description: 'Pointages bloqués par l\'anti-doublon' })
+  debounceBlocked: number;
+
+  @ApiProperty({ description: 'Pointages créés avec anomalie' })
+  anomalies: number;
+
+  @ApiProperty({ description: 'Pointages en erreur' })
+  errors: number;
+
+  @ApiProperty({ description: 'Durée de traitement du lot en ms' })
+  duration: number;
+}
@@ -0,0 +1,68 @@
+import { AttendanceService } from './attendance.service';
+import { PunchIndexService } from './punch-index.service';
+import { InMemoryPrisma } from './testing/in-memory-prisma';
+import { DAY, DEVICE_ID, EMPLOYEE_ID, TENANT_ID, seedTerminalDatabase, terminalPunch } from './testing/terminal-fixtures';
+
+// Les calculs d'anomalies utilisent l'heure locale: fixer le fuseau du test
+process.env.TZ = 'UTC';
+
+const TOLERANCE_MS = 2 * 60 * 1000;
+
+function lookup(index: PunchIndexService, time: string) {
+  return index.findSameTypeWithin(TENANT_ID, EMPLOYEE_ID, 'IN' as any, new Date(`${DAY}T${time}:00.000Z`), TOLERANCE_MS);
+}
+
+describe('PunchIndexService', () => {
+  beforeEach(() => {
+    jest.spyOn(console, 'log').mockImplementation(() => undefined);
+    // Couverture de l'index (WARMUP_HOURS) relative au jour des pointages
+    jest.spyOn(Date, 'now').mockReturnValue(new Date(`${DAY}T20:00:00Z`).getTime());
+  });
+
+  afterEach(() => {
+    jest.restoreAllMocks();
+  });
+
+  it('sert depuis la mémoire un pointage créé hors transaction', async () => {
+    const prisma = seedTerminalDatabase();
+    const index = new PunchIndexService(prisma as any);
+    index.onModuleInit();
+    expect(await lookup(index, '07:00')).toBeNull();
+
+    const created = await prisma.attendance.create({
+      data: { tenantId: TENANT_ID, employeeId: EMPLOYEE_ID, type: 'IN', timestamp: new Date(`${DAY}T08:00:00Z`), deviceId: 'device-1' },
+    });
+    const findFirst = jest.spyOn(prisma.attendance, 'findFirst');
+
+    expect(await lookup(index, '08:01')).toEqual({ id: created.id });
+    expect(await lookup(index, '08:05')).toBeNull();
+    expect(findFirst).not.toHaveBeenCalled();
+  });
+
+  it('recharge après validation un employé relu pendant la transaction d\'un lot', async () => {
+    const prisma = seedTerminalDatabase();
+    const index = new PunchIndexService(prisma as any);
+    const supplementaryDays = { createAutoSupplementaryDay: jest.fn().mockResolvedValue({ created: false }) };
+    const service = new AttendanceService(prisma as any, supplementaryDays as any, index);
+
+    // Pointage unitaire concurrent: relit l'employé juste après l'écriture du lot, avant validation
+    const duringTransaction: any[] = [];
+    prisma.$use(async (params, next) => {
+      const result = await next(params);
+      if (params.model === 'Attendance' && params.action === 'create' && params.runInTransaction) {
+        duringTransaction.push(await lookup(index, '08:01'));
+      }
+      return result;
+    });
+    index.onModuleInit();
+    expect(await lookup(index, '07:00')).toBeNull();
+
+    const result = await service.processTerminalPunchBulk(TENANT_ID, DEVICE_ID, [terminalPunch('IN', '08:00')]);
+
+    expect(result.results[0].status).toBe('CREATED');
+    // Écriture non validée: invisible du pointage concurrent, qui a rechargé l'employé
+    expect(duringTransaction).toEqual([null]);
+    // Après validation, l'index doit voir le pointage du lot
+    expect(await lookup(index, '08:01')).toEqual({ id: result.results[0].id });
+  });
+});
@@ -0,0 +1,357 @@
+import { Injectable, OnModuleInit } from '@nestjs/common';
+import { Prisma, AttendanceType } from '@prisma/client';
+import { PrismaService } from '../../database/prisma.service';
+
+/**
+ * Index en mémoire du dernier pointage de chaque employé (par type)
+ *
+ * Utilisé par l'anti-doublon des terminaux (processTerminalPunch): au lieu
+ * d'une requête par pointage, la décision est prise en mémoire quand l'index
+ * peut y répondre de façon exacte:
+ * - dernier pointage du même type connu et antérieur au pointage reçu →
+ *   doublon si l'écart est dans la tolérance
+ * - aucun pointage du même type depuis le début de la couverture de l'index →
+ *   pas de doublon
+ * - sinon (pointage plus ancien que l'index, employé invalidé) → requête DB
+ *
+ * L'index est alimenté au premier usage d'un tenant (pointages des dernières
+ * WARMUP_HOURS heures) puis tenu à jour par un middleware Prisma sur le modèle
+ * Attendance: les créations sont ajoutées, les corrections/suppressions
+ * invalident l'employé concerné (rechargé depuis la base au prochain pointage).
+ *
+ * Taille bornée (LRU par employé et par tenant). L'éviction d'un employé
+ * avance le début de couverture du tenant au-delà de son dernier pointage, ce
+ * qui garde les réponses exactes.
+ *
+ * Index propre au processus: avec plusieurs instances du backend sans affinité
+ * par tenant, désactiver avec PUNCH_INDEX_ENABLED=false.
+ */
+
+const PUNCH_INDEX_ENABLED = process.env.PUNCH_INDEX_ENABLED !== 'false';
+const MAX_EMPLOYEES_PER_TENANT = parseInt(process.env.PUNCH_INDEX_MAX_EMPLOYEES || '20000', 10);
+const MAX_TENANTS = 200;
+const WARMUP_HOURS = 48;
+
+// Champs modifiés qui changent la réponse de l'index
+const INDEXED_FIELDS = ['timestamp', 'type', 'employeeId', 'tenantId', 'employee', 'tenant'];
+const REASSIGN_FIELDS = ['employeeId', 'tenantId', 'employee', 'tenant'];
+
+export interface IndexedPunch {
+  id: string;
+  timestamp: number;
+  type: AttendanceType;
+  deviceId: string | null;
+}
+
+// Dernier pointage connu par type
+type EmployeePunches = Partial<Record<AttendanceType, IndexedPunch>>;
+
+interface TenantIndex {
+  // Ordre d'insertion de la Map = ordre LRU (le plus ancien en premier)
+  employees: Map<string, EmployeePunches>;
+  // Employés dont l'état est inconnu (correction, suppression...)
+  stale: Set<string>;
+  // Absence d'un employé dans l'index = aucun pointage depuis coverageStart
+  coverageStart: number;
+  warming: Promise<void> | null;
+}
+
+@Injectable()
+export class PunchIndexService implements OnModuleInit {
+  private tenants = new Map<string, TenantIndex>();
+
+  constructor(private prisma: PrismaService) {}
+
+  onModuleInit() {
+    if (!PUNCH_INDEX_ENABLED) {
+      console.log('ℹ️ [PUNCH-INDEX] Index des derniers pointages désactivé (PUNCH_INDEX_ENABLED=false)');
+      return;
+    }
+    this.prisma.$use(this.middleware);
+  }
+
+  /**
+   * Pointage du même type dans [timestamp - tolérance, timestamp + tolérance]
+   * (même règle que la requête anti-doublon), depuis la mémoire si possible.
+   */
+  async findSameTypeWithin(
+    tenantId: string,
+    employeeId: string,
+    type: AttendanceType,
+    timestamp: Date,
+    toleranceMs: number,
+  ): Promise<{ id: string } | null> {
+    if (!PUNCH_INDEX_ENABLED) {
+      return this.queryWithin(tenantId, employeeId, type, timestamp, toleranceMs);
+    }
+
+    let tenant: TenantIndex;
+    try {
+      tenant = await this.getTenant(tenantId);
+      if (tenant.stale.has(employeeId)) {
+        await this.reloadEmployee(tenantId, tenant, employeeId);
+      }
+    } catch (error) {
+      return this.queryWithin(tenantId, employeeId, type, timestamp, toleranceMs);
+    }
+
+    const time = timestamp.getTime();
+    const last = this.touch(tenant, employeeId)?.[type];
+
+    if (last && time >= last.timestamp) {
+      return time - last.timestamp <= toleranceMs ? { id: last.id } : null;
+    }
+    if (!last && time - toleranceMs >= tenant.coverageStart) {
+      return null;
+    }
+
+    // Pointage plus ancien que l'index (ré-import, rattrapage): requête DB
+    return this.queryWithin(tenantId, employeeId, type, timestamp, toleranceMs);
+  }
+
+  invalidateEmployee(tenantId: string, employeeId: string) {
+    const tenant = this.tenants.get(tenantId);
+    if (tenant) {
+      tenant.employees.delete(employeeId);
+      tenant.stale.add(employeeId);
+    }
+  }
+
+  invalidateTenant(tenantId: string) {
+    this.tenants.delete(tenantId);
+  }
+
+  // ---------------------------------------------------------------------------
+  // Chargement
+  // ---------------------------------------------------------------------------
+
+  private async getTenant(tenantId: string): Promise<TenantIndex> {
+    let tenant = this.tenants.get(tenantId);
+    if (tenant) {
+      // LRU des tenants
+      this.tenants.delete(tenantId);
+      this.tenants.set(tenantId, tenant);
+    } else {
+      tenant = {
+        employees: new Map(),
+        stale: new Set(),
+        coverageStart: Date.now() - WARMUP_HOURS * 60 * 60 * 1000,
+        warming: null,
+      };
+      tenant.warming = this.warmUp(tenantId, tenant);
+      this.tenants.set(tenantId, tenant);
+      if (this.tenants.size > MAX_TENANTS) {
+        this.tenants.delete(this.tenants.keys().next().value);
+      }
+    }
+
+    if (tenant.warming) {
+      await tenant.warming;
+    }
+    return tenant;
+  }
+
+  private async warmUp(tenantId: string, tenant: TenantIndex) {
+    const started = Date.now();
+    try {
+      const punches = await this.prisma.attendance.findMany({
+        where: { tenantId, timestamp: { gte: new Date(tenant.coverageStart) } },
+        select: { id: true, employeeId: true, type: true, timestamp: true, deviceId: true },
+      });
+      for (const punch of punches) {
+        this.store(tenant, punch.employeeId, {
+          id: punch.id,
+          timestamp: punch.timestamp.getTime(),
+          type: punch.type,
+          deviceId: punch.deviceId,
+        });
+      }
+      console.log(`🗂️ [PUNCH-INDEX] Tenant ${tenantId}: ${tenant.employees.size} employé(s) indexé(s) en ${Date.now() - started}ms`);
+    } catch (error) {
+      // Index inutilisable: le tenant sera rechargé au prochain pointage
+      console.error(`❌ [PUNCH-INDEX] Chargement impossible pour ${tenantId}:`, error);
+      this.tenants.delete(tenantId);
+      throw error;
+    } finally {
+      tenant.warming = null;
+    }
+  }
+
+  private async reloadEmployee(tenantId: string, tenant: TenantIndex, employeeId: string) {
+    // Dernier pointage de chaque type: horodatage max par type, puis les lignes correspondantes
+    const latest = await this.prisma.attendance.groupBy({
+      by: ['type'],
+      where: { tenantId, employeeId },
+      _max: { timestamp: true },
+    });
+    const punches = latest.length === 0 ? [] : await this.prisma.attendance.findMany({
+      where: {
+        tenantId,
+        employeeId,
+        OR: latest.map((group) => ({ type: group.type, timestamp: group._max.timestamp })),
+      },
+      select: { id: true, type: true, timestamp: true, deviceId: true },
+    });
+    tenant.stale.delete(employeeId);
+    tenant.employees.delete(employeeId);
+    for (const punch of punches) {
+      this.store(tenant, employeeId, {
+        id: punch.id,
+        timestamp: punch.timestamp.getTime(),
+        type: punch.type,
+        deviceId: punch.deviceId,
+      });
+    }
+  }
+
+  private queryWithin(
+    tenantId: string,
+    employeeId: string,
+    type: AttendanceType,
+    timestamp: Date,
+    toleranceMs: number,
+  ) {
+    return this.prisma.attendance.findFirst({
+      where: {
+        tenantId,
+        employeeId,
+        timestamp: {
+          gte: new Date(timestamp.getTime() - toleranceMs),
+          lte: new Date(timestamp.getTime() + toleranceMs),
+        },
+        type,
+      },
+      select: { id: true },
+    });
+  }
+
+  // ---------------------------------------------------------------------------
+  // Mise à jour
+  // ---------------------------------------------------------------------------
+
+  private touch(tenant: TenantIndex, employeeId: string): EmployeePunches | undefined {
+    const entry = tenant.employees.get(employeeId);
+    if (entry) {
+      tenant.employees.delete(employeeId);
+      tenant.employees.set(employeeId, entry);
+    }
+    return entry;
+  }
+
+  private store(tenant: TenantIndex, employeeId: string, punch: IndexedPunch) {
+    const entry = this.touch(tenant, employeeId) || {};
+    const current = entry[punch.type];
+    if (!current || punch.timestamp >= current.timestamp) {
+      entry[punch.type] = punch;
+    }
+    tenant.employees.set(employeeId, entry);
+
+    if (tenant.employees.size > MAX_EMPLOYEES_PER_TENANT) {
+      const [evictedId, evicted] = tenant.employees.entries().next().value;
+      tenant.employees.delete(evictedId);
+      // L'absence de l'employé évincé ne vaut plus « aucun pointage » qu'après son dernier pointage
+      const lastTime = Math.max(0, ...Object.values(evicted).map((punch) => punch.timestamp));
+      tenant.coverageStart = Math.max(tenant.coverageStart, lastTime + 1);
+    }
+  }
+
+  private record(row: any, inTransaction: boolean) {
+    if (!row?.tenantId || !row?.employeeId) {
+      return;
+    }
+    const tenant = this.tenants.get(row.tenantId);
+    if (!tenant) {
+      return;
+    }
+    if (inTransaction || !row.id || !row.type || !row.timestamp || tenant.stale.has(row.employeeId)) {
+      // Transaction pouvant être annulée ou ligne incomplète: recharger depuis la base
+      this.invalidateEmployee(row.tenantId, row.employeeId);
+      return;
+    }
+    this.store(tenant, row.employeeId, {
+      id: row.id,
+      timestamp: new Date(row.timestamp).getTime(),
+      type: row.type,
+      deviceId: row.deviceId ?? null,
+    });
+  }
+
+  private invalidateWhere(where: any) {
+    const tenantId = typeof where?.tenantId === 'string' ? where.tenantId : null;
+    const employeeId = typeof where?.employeeId === 'string' ? where.employeeId : null;
+    if (tenantId && employeeId) {
+      this.invalidateEmployee(tenantId, employeeId);
+    } else if (tenantId) {
+      this.invalidateTenant(tenantId);
+    } else {
+      this.tenants.clear();
+    }
+  }
+
+  private middleware: Prisma.Middleware = async (params, next) => {
+    if (params.model !== 'Attendance') {
+      return next(params);
+    }
+
+    const action = params.action;
+    const touchesIndex = (data: any) => !!data && INDEXED_FIELDS.some((field) => field in data);
+
+    // S'assurer que la ligne renvoyée permet de mettre l'index à jour
+    if (['create', 'update', 'upsert', 'delete'].includes(action) && params.args?.select) {
+      params.args.select = {
+        ...params.args.select,
+        id: true,
+        tenantId: true,
+        employeeId: true,
+        type: true,
+        timestamp: true,
+        deviceId: true,
+      };
+    }
+
+    const result = await next(params);
+
+    try {
+      switch (action) {
+        case 'create':
+          this.record(result, params.runInTransaction);
+          break;
+        case 'update':
+          if (result && REASSIGN_FIELDS.some((field) => field in (params.args?.data || {}))) {
+            // Pointage réaffecté: l'ancien employé est inconnu ici
+            this.invalidateTenant(result.tenantId);
+          } else if (result && touchesIndex(params.args?.data)) {
+            this.invalidateEmployee(result.tenantId, result.employeeId);
+          }
+          break;
+        case 'upsert':
+        case 'delete':
+          if (result) {
+            this.invalidateEmployee(result.tenantId, result.employeeId);
+          }
+          break;
+        case 'createMany': {
+          const rows = Array.isArray(params.args?.data) ? params.args.data : [params.args?.data];
+          for (const row of rows) {
+            this.record(row, params.runInTransaction);
+          }
+          break;
+        }
+        case 'updateMany':
+          if (touchesIndex(params.args?.data)) {
+            this.invalidateWhere(params.args?.where);
+          }
+          break;
+        case 'deleteMany':
+          this.invalidateWhere(params.args?.where);
+          break;
+      }
+    } catch (error) {
+      // Ne jamais faire échouer l'écriture à cause de l'index
+      console.error('❌ [PUNCH-INDEX] Mise à jour de l\'index impossible:', error);
+      this.tenants.clear();
+    }
+
+    return result;
+  };
+}
@@ -0,0 +1,86 @@
+import { BadRequestException, UnsupportedMediaTypeException } from '@nestjs/common';
+import { readFileSync } from 'fs';
+import { join } from 'path';
+import { PUNCH_BATCH_MAX_PUNCHES, decodePunchBatch } from './punch-wire';
+
+// Lot encodé par scripts/punch_wire.py (régénéré par scripts/test_punch_wire.py)
+const fixture = JSON.parse(readFileSync(join(__dirname, 'testing', 'punch-wire.fixture.json'), 'utf8'));
+
+interface RawPunch {
+  employee: number;
+  seconds: bigint;
+  state?: number;
+  type?: number;
+  method?: number;
+}
+
+/**
+ * Lot binaire construit octet par octet (cas que l'encodeur Python ne produit pas)
+ */
+function rawBatch(employeeIds: string[], punches: RawPunch[], header: { version?: number; count?: number } = {}) {
+  const head = Buffer.alloc(12);
+  head.write('PFP', 0, 'latin1');
+  head[3] = header.version ?? 1;
+  head.writeUInt32LE(header.count ?? punches.length, 4);
+  head.writeUInt32LE(employeeIds.length, 8);
+  const strings = employeeIds.map((id) => {
+    const encoded = Buffer.from(id, 'utf8');
+    return Buffer.concat([Buffer.from([encoded.length]), encoded]);
+  });
+  const records = punches.map((punch) => {
+    const record = Buffer.alloc(16);
+    record.writeUInt32LE(punch.employee, 0);
+    record.writeBigInt64LE(punch.seconds, 4);
+    record[12] = punch.state ?? 0;
+    record[13] = punch.type ?? 0;
+    record[14] = punch.method ?? 255;
+    return record;
+  });
+  return Buffer.concat([head, ...strings, ...records]);
+}
+
+describe('decodePunchBatch', () => {
+  it('décode le lot de référence encodé par scripts/punch_wire.py', () => {
+    expect(decodePunchBatch(Buffer.from(fixture.body, 'base64'))).toEqual(fixture.punches);
+  });
+
+  it('omet la méthode absente (NO_METHOD)', () => {
+    const [punch] = decodePunchBatch(rawBatch(['00123'], [{ employee: 0, seconds: 1768377600n, method: 255 }]));
+    expect(punch).toEqual({ employeeId: '00123', timestamp: '2026-01-14T08:00:00.000Z', type: 'IN', terminalState: 0 });
+    expect('method' in punch).toBe(false);
+  });
+
+  it('décode les horodatages i64 négatifs (avant 1970)', () => {
+    const punches = decodePunchBatch(rawBatch(['42'], [
+      { employee: 0, seconds: -1n },
+      { employee: 0, seconds: -86400n },
+      { employee: 0, seconds: -2208988800n },
+    ]));
+    expect(punches.map((punch) => punch.timestamp)).toEqual([
+      '1969-12-31T23:59:59.000Z',
+      '1969-12-31T00:00:00.000Z',
+      '1900-01-01T00:00:00.000Z',
+    ]);
+  });
+
+  it('accepte exactement PUNCH_BATCH_MAX_PUNCHES pointages', () => {
+    const punches = Array.from({ length: PUNCH_BATCH_MAX_PUNCHES }, (_, i) => ({ employee: 0, seconds: BigInt(1768377600 + i) }));
+    expect(decodePunchBatch(rawBatch(['1'], punches))).toHaveLength(PUNCH_BATCH_MAX_PUNCHES);
+  });
+
+  it.each([
+    ['version inconnue', () => rawBatch(['1'], [], { version: 2 }), UnsupportedMediaTypeException],
+    ['en-tête tronqué', () => Buffer.from('PFP\x01'), UnsupportedMediaTypeException],
+    ['lot trop volumineux', () => rawBatch(['1'], [], { count: PUNCH_BATCH_MAX_PUNCHES + 1 }), BadRequestException],
+    ['table des matricules tronquée', () => rawBatch(['00123'], []).subarray(0, 15), BadRequestException],
+    ['matricule vide', () => rawBatch([''], []), BadRequestException],
+    ['enregistrement tronqué', () => rawBatch(['1'], [{ employee: 0, seconds: 0n }]).subarray(0, 29), BadRequestException],
+    ['index de matricule hors table', () => rawBatch(['1'], [{ employee: 1, seconds: 0n }]), BadRequestException],
+    ['type inconnu', () => rawBatch(['1'], [{ employee: 0, seconds: 0n, type: 2 }]), BadRequestException],
+    ['méthode inconnue', () => rawBatch(['1'], [{ employee: 0, seconds: 0n, method: 7 }]), BadRequestException],
+    ['horodatage hors limites', () => rawBatch(['1'], [{ employee: 0, seconds: 9223372036854775807n }]), BadRequestException],
+    ['horodatage négatif hors limites', () => rawBatch(['1'], [{ employee: 0, seconds: -9000000000000000n }]), BadRequestException],
+  ])('refuse un lot invalide: %s', (_, build, exception) => {
+    expect(() => decodePunchBatch(build())).toThrow(exception);
+  });
+});
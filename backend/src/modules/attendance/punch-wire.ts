@@ -0,0 +1,153 @@
+import {
+  ArgumentMetadata,
+  BadRequestException,
+  ExecutionContext,
+  Injectable,
+  PipeTransform,
+  UnsupportedMediaTypeException,
+  ValidationPipe,
+  createParamDecorator,
+} from '@nestjs/common';
+import { AttendanceType, DeviceType } from '@prisma/client';
+import { validationPipeOptions } from '../../common/utils/validation.util';
+import { WebhookStateBulkDto, WebhookStateDto } from './dto/webhook-state.dto';
+
+/**
+ * Format binaire compact des lots de pointages (agents → /webhook/state/bulk)
+ *
+ * Alternative au JSON pour les imports en masse: enregistrements de taille
+ * fixe, dans une enveloppe gzip (Content-Encoding: gzip, décompressée par le
+ * body parser raw de main.ts). Encodeur de référence: scripts/punch_wire.py.
+ *
+ * Corps (petit-boutiste):
+ * - en-tête (12 octets): "PFP" + version (u8), nombre de pointages (u32),
+ *   nombre de matricules (u32)
+ * - table des matricules: longueur (u8) + UTF-8
+ * - 16 octets par pointage: index du matricule (u32), horodatage en secondes
+ *   depuis l'epoch (i64), terminalState (u8), type (u8), méthode (u8, 255 =
+ *   absente), réservé (u8)
+ *
+ * Les champs sont typés par construction: le lot décodé n'a pas besoin de
+ * passer par class-validator, seules les bornes sont vérifiées ici.
+ * Le format est annoncé aux agents par l'en-tête Accept-Post des réponses.
+ */
+export const PUNCH_BATCH_CONTENT_TYPE = 'application/vnd.pointaflex.punches';
+export const PUNCH_BATCH_BODY_LIMIT = '1mb';
+export const PUNCH_BATCH_MAX_PUNCHES = 500; // Même limite que WebhookStateBulkDto
+
+const MAGIC = 'PFP';
+const VERSION = 1;
+const HEADER_SIZE = 12;
+const RECORD_SIZE = 16;
+const NO_METHOD = 255;
+const SECONDS_PER_DAY = 86400;
+const TWO_DIGITS = Array.from({ length: 60 }, (_, n) => String(n).padStart(2, '0'));
+
+// Mêmes ordres que TYPES et METHODS de scripts/punch_wire.py (ne pas réordonner)
+const TYPES: AttendanceType[] = [AttendanceType.IN, AttendanceType.OUT];
+const METHODS: DeviceType[] = [
+  DeviceType.FINGERPRINT,
+  DeviceType.FACE_RECOGNITION,
+  DeviceType.RFID_BADGE,
+  DeviceType.QR_CODE,
+  DeviceType.PIN_CODE,
+  DeviceType.MOBILE_GPS,
+  DeviceType.MANUAL,
+];
+
+/**
+ * Décode un lot binaire en pointages au format du webhook state
+ * @throws UnsupportedMediaTypeException si la version du format est inconnue
+ * (l'agent renvoie alors le lot en JSON), BadRequestException si le lot est invalide
+ */
+export function decodePunchBatch(body: Buffer): WebhookStateDto[] {
+  if (body.length < HEADER_SIZE || body.toString('latin1', 0, 3) !== MAGIC || body[3] !== VERSION) {
+    throw new UnsupportedMediaTypeException(`Format de lot binaire non supporté (version attendue: ${VERSION})`);
+  }
+  const count = body.readUInt32LE(4);
+  const stringCount = body.readUInt32LE(8);
+  if (count > PUNCH_BATCH_MAX_PUNCHES) {
+    throw new BadRequestException(`Lot trop volumineux: ${count} pointages (${PUNCH_BATCH_MAX_PUNCHES} max)`);
+  }
+
+  const employeeIds: string[] = new Array(stringCount);
+  let offset = HEADER_SIZE;
+  for (let i = 0; i < stringCount; i++) {
+    const length = offset < body.length ? body[offset] : 0;
+    if (!length || offset + 1 + length > body.length) {
+      throw new BadRequestException('Lot binaire invalide: table des matricules tronquée');
+    }
+    employeeIds[i] = body.toString('utf8', offset + 1, offset + 1 + length);
+    offset += 1 + length;
+  }
+  if (body.length - offset !== count * RECORD_SIZE) {
+    throw new BadRequestException('Lot binaire invalide: taille des enregistrements incohérente');
+  }
+
+  const punches: WebhookStateDto[] = new Array(count);
+  const days = new Map<number, string>(); // Jour → "AAAA-MM-JJT" (toISOString une fois par jour du lot)
+  for (let i = 0; i < count; i++, offset += RECORD_SIZE) {
+    const employeeId = employeeIds[body.readUInt32LE(offset)];
+    const seconds = body.readUInt32LE(offset + 4) + body.readInt32LE(offset + 8) * 0x100000000;
+    const type = TYPES[body[offset + 13]];
+    const methodCode = body[offset + 14];
+    const method = methodCode === NO_METHOD ? undefined : METHODS[methodCode];
+    if (employeeId === undefined || !type || (methodCode !== NO_METHOD && !method)) {
+      throw new BadRequestException(`Lot binaire invalide: pointage ${i} incohérent`);
+    }
+
+    const day = Math.floor(seconds / SECONDS_PER_DAY);
+    let prefix = days.get(day);
+    if (prefix === undefined) {
+      const date = new Date(day * SECONDS_PER_DAY * 1000);
+      if (isNaN(date.getTime())) {
+        throw new BadRequestException(`Lot binaire invalide: horodatage du pointage ${i} hors limites`);
+      }
+      prefix = date.toISOString().slice(0, 11);
+      days.set(day, prefix);
+    }
+    const time = seconds - day * SECONDS_PER_DAY;
+
+    const punch: WebhookStateDto = {
+      employeeId,
+      timestamp: `${prefix}${TWO_DIGITS[Math.floor(time / 3600)]}:${TWO_DIGITS[Math.floor(time / 60) % 60]}:${TWO_DIGITS[time % 60]}.000Z`,
+      type,
+      terminalState: body[offset + 12],
+    };
+    if (method) {
+      punch.method = method;
+    }
+    punches[i] = punch;
+  }
+  return punches;
+}
+
+/**
+ * Corps brut de la requête, sans passer par le ValidationPipe global
+ * (décorateur personnalisé): la validation est faite par PunchBatchPipe
+ * @throws UnsupportedMediaTypeException si un lot binaire n'a pas été lu par
+ * le body parser raw de main.ts (l'agent renvoie alors le lot en JSON)
+ */
+export const PunchBatchBody = createParamDecorator((data: unknown, ctx: ExecutionContext) => {
+  const request = ctx.switchToHttp().getRequest();
+  if (request.is(PUNCH_BATCH_CONTENT_TYPE) && !Buffer.isBuffer(request.body)) {
+    throw new UnsupportedMediaTypeException('Lots binaires non acceptés par cette instance');
+  }
+  return request.body;
+});
+
+/**
+ * Lot de /webhook/state/bulk selon son Content-Type: binaire (Buffer du body
+ * parser raw) décodé par decodePunchBatch, JSON validé comme par le pipe global
+ */
+@Injectable()
+export class PunchBatchPipe implements PipeTransform {
+  private readonly jsonPipe = new ValidationPipe({ ...validationPipeOptions, validateCustomDecorators: true });
+
+  async transform(value: unknown, metadata: ArgumentMetadata): Promise<WebhookStateBulkDto> {
+    if (Buffer.isBuffer(value)) {
+      return { punches: decodePunchBatch(value) };
+    }
+    return this.jsonPipe.transform(value, { ...metadata, metatype: WebhookStateBulkDto });
+  }
+}
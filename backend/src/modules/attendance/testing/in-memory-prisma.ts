@@ -0,0 +1,337 @@
+import { randomUUID } from 'crypto';
+
+/**
+ * Client Prisma en mémoire pour les tests des webhooks terminal
+ *
+ * Sous-ensemble des délégués utilisés par AttendanceService et
+ * PunchIndexService (findFirst, findMany, findUnique, count, create,
+ * createMany, update, updateMany, deleteMany, groupBy), avec:
+ * - filtres where: égalité, in/notIn, gt/gte/lt/lte, not, OR/AND
+ *   (notIn et comparaisons excluent NULL, comme en SQL)
+ * - $transaction interactive isolée: ses écritures ne sont visibles hors de
+ *   la transaction qu'après validation (read committed), annulées sur erreur
+ * - points de sauvegarde via $executeRawUnsafe (SAVEPOINT, RELEASE, ROLLBACK TO)
+ * - middlewares $use (params.runInTransaction renseigné)
+ *
+ * Les relations (include) ne sont pas résolues: les lignes de test portent
+ * directement les objets liés nécessaires (ex: schedule.shift).
+ */
+
+type Row = Record<string, any>;
+type Tables = Record<string, Row[]>;
+
+const MODELS = [
+  'attendance',
+  'attendanceDevice',
+  'employee',
+  'holiday',
+  'leave',
+  'overtime',
+  'recoveryDay',
+  'schedule',
+  'tenant',
+  'tenantSettings',
+  'terminalMatriculeMapping',
+];
+
+function cloneTables(tables: Tables): Tables {
+  const copy: Tables = {};
+  for (const [model, rows] of Object.entries(tables)) {
+    copy[model] = rows.map((row) => ({ ...row }));
+  }
+  return copy;
+}
+
+function comparable(value: any): any {
+  return value instanceof Date ? value.getTime() : value;
+}
+
+function compare(a: any, b: any): number {
+  const left = comparable(a);
+  const right = comparable(b);
+  return left < right ? -1 : left > right ? 1 : 0;
+}
+
+function sameValue(a: any, b: any): boolean {
+  if (a instanceof Date || b instanceof Date) {
+    return a != null && b != null && new Date(a).getTime() === new Date(b).getTime();
+  }
+  return (a ?? null) === (b ?? null);
+}
+
+function matchesCondition(value: any, condition: any): boolean {
+  if (condition === null || typeof condition !== 'object' || condition instanceof Date) {
+    return sameValue(value, condition);
+  }
+  return Object.entries(condition).every(([operator, operand]: [string, any]) => {
+    switch (operator) {
+      case 'equals':
+        return sameValue(value, operand);
+      case 'in':
+        return operand.some((candidate: any) => sameValue(value, candidate));
+      case 'notIn':
+        return value != null && !operand.some((candidate: any) => sameValue(value, candidate));
+      case 'gt':
+        return value != null && compare(value, operand) > 0;
+      case 'gte':
+        return value != null && compare(value, operand) >= 0;
+      case 'lt':
+        return value != null && compare(value, operand) < 0;
+      case 'lte':
+        return value != null && compare(value, operand) <= 0;
+      case 'not':
+        return !matchesCondition(value, operand);
+      default:
+        throw new Error(`Filtre non supporté par InMemoryPrisma: ${operator}`);
+    }
+  });
+}
+
+function matches(row: Row, where: any): boolean {
+  if (!where) {
+    return true;
+  }
+  return Object.entries(where).every(([key, condition]: [string, any]) => {
+    if (condition === undefined) {
+      return true;
+    }
+    if (key === 'OR') {
+      return condition.some((branch: any) => matches(row, branch));
+    }
+    if (key === 'AND') {
+      return (Array.isArray(condition) ? condition : [condition]).every((branch: any) => matches(row, branch));
+    }
+    return matchesCondition(row[key], condition);
+  });
+}
+
+function sortRows(rows: Row[], orderBy: any): Row[] {
+  const orders = Array.isArray(orderBy) ? orderBy : orderBy ? [orderBy] : [];
+  return [...rows].sort((a, b) => {
+    for (const order of orders) {
+      for (const [key, direction] of Object.entries(order)) {
+        if (typeof direction !== 'string') {
+          continue; // Tri sur une relation: ignoré
+        }
+        const difference = compare(a[key], b[key]);
+        if (difference) {
+          return direction === 'desc' ? -difference : difference;
+        }
+      }
+    }
+    return 0;
+  });
+}
+
+function project(row: Row, select: any): Row {
+  if (!select) {
+    return { ...row };
+  }
+  const projected: Row = {};
+  for (const [key, wanted] of Object.entries(select)) {
+    if (wanted) {
+      projected[key] = row[key];
+    }
+  }
+  return projected;
+}
+
+function defined(data: Row): Row {
+  return Object.fromEntries(Object.entries(data).filter(([, value]) => value !== undefined));
+}
+
+export class InMemoryPrisma {
+  [model: string]: any;
+
+  tables: Tables;
+  private middlewares: ((params: any, next: (params: any) => Promise<any>) => Promise<any>)[];
+  private parent: InMemoryPrisma | null;
+  private base: Tables | null;
+  private savepoints: { name: string; tables: Tables }[] = [];
+
+  constructor(seed: Partial<Tables> = {}, parent: InMemoryPrisma = null) {
+    this.parent = parent;
+    if (parent) {
+      this.tables = cloneTables(parent.tables);
+      this.base = cloneTables(parent.tables);
+      this.middlewares = parent.middlewares;
+    } else {
+      this.tables = {};
+      for (const model of MODELS) {
+        this.tables[model] = (seed[model] || []).map((row) => ({ id: randomUUID(), ...row }));
+      }
+      this.base = null;
+      this.middlewares = [];
+    }
+    for (const model of MODELS) {
+      this[model] = this.delegate(model);
+    }
+  }
+
+  $use(middleware: (params: any, next: (params: any) => Promise<any>) => Promise<any>) {
+    this.middlewares.push(middleware);
+  }
+
+  async $transaction(fn: (tx: InMemoryPrisma) => Promise<any>, options?: { timeout?: number }) {
+    if (typeof fn !== 'function') {
+      throw new Error('InMemoryPrisma: seules les transactions interactives sont supportées');
+    }
+    const tx = new InMemoryPrisma({}, this);
+    const result = await fn(tx);
+    this.commit(tx);
+    return result;
+  }
+
+  async $executeRawUnsafe(sql: string) {
+    const [, command, name] = /^(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT) (\w+)$/.exec(sql.trim()) || [];
+    if (!command || !this.parent) {
+      throw new Error(`InMemoryPrisma: requête brute non supportée hors transaction: ${sql}`);
+    }
+    if (command === 'SAVEPOINT') {
+      this.savepoints.push({ name, tables: cloneTables(this.tables) });
+      return 0;
+    }
+    const index = this.savepoints.map((savepoint) => savepoint.name).lastIndexOf(name);
+    if (index < 0) {
+      throw new Error(`InMemoryPrisma: point de sauvegarde inconnu: ${name}`);
+    }
+    if (command === 'RELEASE SAVEPOINT') {
+      this.savepoints.splice(index);
+    } else {
+      this.tables = cloneTables(this.savepoints[index].tables);
+      this.savepoints.splice(index + 1);
+    }
+    return 0;
+  }
+
+  // ---------------------------------------------------------------------------
+  // Interne
+  // ---------------------------------------------------------------------------
+
+  /**
+   * Applique au parent les lignes créées, modifiées ou supprimées par la
+   * transaction (les écritures concurrentes hors transaction sont conservées)
+   */
+  private commit(tx: InMemoryPrisma) {
+    for (const model of MODELS) {
+      const before = new Map(tx.base[model].map((row) => [row.id, JSON.stringify(row)]));
+      const after = new Set(tx.tables[model].map((row) => row.id));
+      const rows = this.tables[model];
+      for (const row of tx.tables[model]) {
+        if (!before.has(row.id)) {
+          rows.push({ ...row });
+        } else if (before.get(row.id) !== JSON.stringify(row)) {
+          const index = rows.findIndex((existing) => existing.id === row.id);
+          if (index >= 0) {
+            rows[index] = { ...row };
+          }
+        }
+      }
+      this.tables[model] = rows.filter((row) => !before.has(row.id) || after.has(row.id));
+    }
+  }
+
+  private delegate(model: string) {
+    const run = (action: string) => (args: any = {}) => this.run(model, action, args);
+    return {
+      findFirst: run('findFirst'),
+      findUnique: run('findUnique'),
+      findMany: run('findMany'),
+      count: run('count'),
+      create: run('create'),
+      createMany: run('createMany'),
+      update: run('update'),
+      updateMany: run('updateMany'),
+      deleteMany: run('deleteMany'),
+      groupBy: run('groupBy'),
+    };
+  }
+
+  private run(model: string, action: string, args: any): Promise<any> {
+    const params = {
+      model: model.charAt(0).toUpperCase() + model.slice(1),
+      action,
+      args,
+      dataPath: [],
+      runInTransaction: !!this.parent,
+    };
+    const dispatch = (index: number) => (current: any): Promise<any> =>
+      index < this.middlewares.length
+        ? this.middlewares[index](current, dispatch(index + 1))
+        : Promise.resolve(this.execute(model, current.action, current.args));
+    return dispatch(0)(params);
+  }
+
+  private execute(model: string, action: string, args: any): any {
+    const rows = this.tables[model];
+    const found = () => sortRows(rows.filter((row) => matches(row, args.where)), args.orderBy);
+
+    switch (action) {
+      case 'findFirst':
+      case 'findUnique': {
+        const row = found()[0];
+        return row ? project(row, args.select) : null;
+      }
+      case 'findMany': {
+        const selected = found().slice(args.skip || 0, args.take ? (args.skip || 0) + args.take : undefined);
+        return selected.map((row) => project(row, args.select));
+      }
+      case 'count':
+        return found().length;
+      case 'create': {
+        const row = { id: randomUUID(), createdAt: new Date(), updatedAt: new Date(), ...defined(args.data) };
+        rows.push(row);
+        return project(row, args.select);
+      }
+      case 'createMany': {
+        const data = Array.isArray(args.data) ? args.data : [args.data];
+        for (const item of data) {
+          rows.push({ id: randomUUID(), createdAt: new Date(), updatedAt: new Date(), ...defined(item) });
+        }
+        return { count: data.length };
+      }
+      case 'update': {
+        const row = found()[0];
+        if (!row) {
+          throw new Error(`InMemoryPrisma: ${model} introuvable pour update`);
+        }
+        Object.assign(row, defined(args.data), { updatedAt: new Date() });
+        return project(row, args.select);
+      }
+      case 'updateMany': {
+        const selected = found();
+        for (const row of selected) {
+          Object.assign(row, defined(args.data), { updatedAt: new Date() });
+        }
+        return { count: selected.length };
+      }
+      case 'deleteMany': {
+        const selected = new Set(found());
+        this.tables[model] = rows.filter((row) => !selected.has(row));
+        return { count: selected.size };
+      }
+      case 'groupBy': {
+        const groups = new Map<string, Row[]>();
+        for (const row of found()) {
+          const key = JSON.stringify(args.by.map((field: string) => row[field]));
+          groups.set(key, [...(groups.get(key) || []), row]);
+        }
+        return [...groups.values()].map((members) => {
+          const group: Row = {};
+          for (const field of args.by) {
+            group[field] = members[0][field];
+          }
+          if (args._max) {
+            group._max = {};
+            for (const field of Object.keys(args._max)) {
+              group._max[field] = members.map((member) => member[field]).reduce((a, b) => (compare(a, b) >= 0 ? a : b));
+            }
+          }
+          return group;
+        });
+      }
+      default:
+        throw new Error(`InMemoryPrisma: action non supportée: ${action}`);
+    }
+  }
+}
@@ -0,0 +1,47 @@
+import { WebhookStateDto } from '../dto/webhook-state.dto';
+import { InMemoryPrisma } from './in-memory-prisma';
+
+/**
+ * Jeu de données commun aux tests des webhooks terminal: un terminal, un
+ * employé éligible aux heures sup et son planning 08:00-17:00 du jour DAY
+ */
+
+export const TENANT_ID = 'tenant-1';
+export const DEVICE_ID = 'TERM-001';
+export const EMPLOYEE_ID = 'employee-1';
+export const MATRICULE = '00123';
+export const DAY = '2026-01-14'; // Mercredi
+
+export function seedTerminalDatabase() {
+  return new InMemoryPrisma({
+    attendanceDevice: [{ id: 'device-1', deviceId: DEVICE_ID, tenantId: TENANT_ID, apiKey: null, siteId: null, isActive: true }],
+    tenantSettings: [{ tenantId: TENANT_ID, doublePunchToleranceMinutes: 2, workingDays: [1, 2, 3, 4, 5] }],
+    employee: [{
+      id: EMPLOYEE_ID,
+      tenantId: TENANT_ID,
+      matricule: MATRICULE,
+      firstName: 'Awa',
+      lastName: 'Diallo',
+      isEligibleForOvertime: true,
+    }],
+    schedule: [{
+      id: 'schedule-1',
+      tenantId: TENANT_ID,
+      employeeId: EMPLOYEE_ID,
+      date: new Date(`${DAY}T00:00:00Z`),
+      status: 'PUBLISHED',
+      customStartTime: null,
+      customEndTime: null,
+      shift: { id: 'shift-1', name: 'Journée', startTime: '08:00', endTime: '17:00', breakDuration: 60, isNightShift: false },
+    }],
+  });
+}
+
+export function terminalPunch(type: 'IN' | 'OUT', time: string): WebhookStateDto {
+  return {
+    employeeId: MATRICULE,
+    timestamp: `${DAY}T${time}:00.000Z`,
+    type: type as any,
+    terminalState: type === 'IN' ? 0 : 1,
+  };
+}
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Journalisation des agents terminaux (bridges ZKTeco, listener ADMS)
+
+- L'appel de log ne fait que déposer l'enregistrement dans une file mémoire
+  bornée: l'écriture (fichier + console) est faite par un thread de fond
+  (QueueListener), la boucle de polling/envoi n'attend jamais le disque.
+  Si la file est pleine (disque bloqué), les messages sont abandonnés et
+  comptés plutôt que de bloquer.
+- Fichier au format JSON-lines (un objet par ligne: ts, level, logger, msg
+  et les champs passés dans extra={"fields": {...}}).
+- Rotation par taille et/ou par durée, archives numérotées
+  (agent.log.1, agent.log.2, ...), sans relire le fichier.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotation au-delà de 10 Mo
+LOG_BACKUP_COUNT = 5  # Archives conservées (.1 = la plus récente)
+LOG_ROTATE_INTERVAL = None  # Rotation périodique en secondes (ex: 86400), None = taille seule
+LOG_QUEUE_SIZE = 10000  # Messages en attente d'écriture au maximum
+
+_listeners = []
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Un objet JSON par ligne"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage().strip(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizeTimeRotatingFileHandler(RotatingFileHandler):
+    """Rotation numérotée (comme RotatingFileHandler) déclenchée par la taille ou la durée"""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT,
+                 interval=LOG_ROTATE_INTERVAL):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.interval = interval
+        self.rollover_at = time.time() + interval if interval else None
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Dépose l'enregistrement sans jamais bloquer; compte les messages abandonnés"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Le message est formaté par le thread appelant (les arguments peuvent changer ensuite)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(name, log_file=None, console=True, level=logging.INFO,
+                  max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT, interval=LOG_ROTATE_INTERVAL):
+    """
+    Configure et retourne le logger d'un agent. Les messages vont à la console
+    (texte brut, comme print) et, si log_file est fourni, au fichier JSON-lines.
+    """
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
+
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter("%(message)s"))
+        handlers.append(console_handler)
+    if log_file:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = SizeTimeRotatingFileHandler(log_file, max_bytes, backup_count, interval)
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+    logger.addHandler(DroppingQueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def dropped_count(logger):
+    """Nombre de messages abandonnés (file pleine) pour ce logger"""
+    return sum(getattr(handler, "dropped", 0) for handler in logger.handlers)
+
+
+@atexit.register
+def shutdown_logging():
+    """Vide les files en attente (appelé automatiquement à la sortie)"""
+    while _listeners:
+        _listeners.pop().stop()
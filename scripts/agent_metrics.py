@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Métriques des agents terminaux au format texte Prometheus
+
+Registre minimal (compteurs, jauges, histogrammes avec labels) servi sur
+http://<hôte>:<port>/metrics par un petit serveur HTTP en thread de fond,
+sans dépendance externe. Les jauges peuvent être calculées à la lecture
+(profondeur de queue, âge du dernier pointage...).
+
+    from agent_metrics import REGISTRY, start_metrics_server
+    punches = REGISTRY.counter("pointage_punches_read_total", "Pointages lus", ["terminal"])
+    punches.labels("CP").inc()
+    start_metrics_server(9101)
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes (secondes) des histogrammes de latence backend
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: labels attendus {self.labelnames}")
+        with self.lock:
+            child = self.children.get(values)
+            if child is None:
+                child = self.children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        # Métrique sans label: un seul enfant
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self.lock:
+            children = list(self.children.items())
+        for values, child in children:
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class _GaugeChild(_CounterChild):
+    def __init__(self):
+        super().__init__()
+        self.function = None
+
+    def set(self, value):
+        with self.lock:
+            self.value = float(value)
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Valeur calculée à chaque lecture de /metrics"""
+        self.function = function
+
+    def render(self, name, labelnames, values):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                value = float("nan")
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def time(self):
+        return _Timer(self)
+
+    def render(self, name, labelnames, values):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(labelnames, values, ("le", _format_value(float(bound))))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, values, ("le", "+Inf"))
+        lines.append(f"{name}_bucket{labels} {count}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Métrique {name} déjà enregistrée avec un autre type")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+CIRCUIT_BREAKER_STATES = {"CLOSED": 0, "HALF_OPEN": 1, "OPEN": 2}
+
+
+class TerminalMetrics:
+    """
+    Métriques communes des agents pour un terminal (label "terminal"):
+    mêmes noms pour les bridges et le listener ADMS.
+    """
+
+    def __init__(self, terminal, registry=REGISTRY):
+        self.terminal = str(terminal)
+        self.registry = registry
+        self.last_record_time = None
+
+        self.punches_read = registry.counter(
+            "pointage_punches_read_total", "Pointages lus depuis le terminal", ["terminal"]).labels(terminal)
+        self.parse_failures = registry.counter(
+            "pointage_parse_failures_total", "Lectures ou trames terminal non décodables", ["terminal"]).labels(terminal)
+        self.backend_latency = registry.histogram(
+            "pointage_backend_request_seconds", "Durée des requêtes vers le backend", ["terminal"]).labels(terminal)
+        self.backend_requests = registry.counter(
+            "pointage_backend_requests_total", "Requêtes vers le backend par résultat", ["terminal", "outcome"])
+        self.retries = registry.counter(
+            "pointage_retries_total", "Nouvelles tentatives d'envoi au backend", ["terminal"]).labels(terminal)
+        registry.gauge(
+            "pointage_last_record_age_seconds", "Secondes depuis l'horodatage du dernier pointage lu",
+            ["terminal"]).labels(terminal).set_function(self._last_record_age)
+
+    def record_read(self, count, last_timestamp=None):
+        """Pointages lus; last_timestamp = horodatage (datetime) du plus récent"""
+        if count:
+            self.punches_read.inc(count)
+        if last_timestamp is not None:
+            self.last_record_time = last_timestamp.timestamp()
+
+    def observe_request(self, seconds, success):
+        self.backend_latency.observe(seconds)
+        self.backend_requests.labels(self.terminal, "success" if success else "failure").inc()
+
+    def track_queue_depth(self, function):
+        """Profondeur de la queue locale, lue à chaque scrape"""
+        self.registry.gauge(
+            "pointage_queue_depth", "Pointages en attente dans la queue locale",
+            ["terminal"]).labels(self.terminal).set_function(function)
+
+    def track_circuit_breaker(self, breaker):
+        """État du circuit breaker (0=CLOSED, 1=HALF_OPEN, 2=OPEN)"""
+        self.registry.gauge(
+            "pointage_circuit_breaker_state", "État du circuit breaker (0=CLOSED, 1=HALF_OPEN, 2=OPEN)",
+            ["terminal"]).labels(self.terminal).set_function(lambda: CIRCUIT_BREAKER_STATES.get(breaker.state, -1))
+
+    def track_poll_scheduler(self, scheduler):
+        """Intervalle de relève courant et débit observé (poll_scheduler.PollScheduler)"""
+        self.registry.gauge(
+            "pointage_poll_interval_seconds", "Intervalle de relève courant du terminal",
+            ["terminal"]).labels(self.terminal).set_function(lambda: scheduler.interval)
+        self.registry.gauge(
+            "pointage_punch_rate_per_minute", "Débit de pointages observé (moyenne mobile)",
+            ["terminal"]).labels(self.terminal).set_function(lambda: scheduler.rate * 60)
+        self.registry.gauge(
+            "pointage_idle_polls", "Relèves vides consécutives",
+            ["terminal"]).labels(self.terminal).set_function(lambda: scheduler.empty_polls)
+
+    def track_backlog_drain(self, drainer):
+        """Débit et ETA du vidage de la queue locale (backlog_drainer.BacklogDrainer) et ses voies"""
+        def eta():
+            value = drainer.stats()["eta_s"]
+            return float("nan") if value is None else value
+
+        self.registry.gauge(
+            "pointage_backlog_drain_rate", "Pointages de la queue locale envoyés par seconde (dernière minute)",
+            ["terminal"]).labels(self.terminal).set_function(lambda: drainer.stats()["rate_per_s"])
+        self.registry.gauge(
+            "pointage_backlog_eta_seconds", "Temps estimé avant que la queue locale soit vide",
+            ["terminal"]).labels(self.terminal).set_function(eta)
+        if drainer.dispatcher is not None:
+            self.track_dispatcher(drainer.dispatcher)
+
+    def track_dispatcher(self, dispatcher):
+        """Voies d'envoi par employé (punch_dispatcher.PunchDispatcher): profondeur, occupation, déséquilibre"""
+        depth = self.registry.gauge(
+            "pointage_dispatch_lane_depth", "Pointages en attente ou en cours d'envoi par voie", ["terminal", "lane"])
+        busy = self.registry.gauge(
+            "pointage_dispatch_lane_busy_seconds", "Temps cumulé passé à envoyer par voie (occupation: rate())",
+            ["terminal", "lane"])
+        for lane in range(dispatcher.lanes):
+            depth.labels(self.terminal, lane).set_function(lambda lane=lane: dispatcher.depth[lane])
+            busy.labels(self.terminal, lane).set_function(lambda lane=lane: dispatcher.busy_seconds[lane])
+        self.registry.gauge(
+            "pointage_dispatch_skew", "Charge de la voie la plus chargée / charge moyenne (1 = équilibré)",
+            ["terminal"]).labels(self.terminal).set_function(lambda: dispatcher.stats()["skew"])
+
+    def _last_record_age(self):
+        if self.last_record_time is None:
+            return float("nan")
+        return max(0.0, time.time() - self.last_record_time)
+
+
+def start_metrics_server(port, registry=REGISTRY, host="0.0.0.0"):
+    """Sert /metrics dans un thread de fond; retourne le serveur (port 0 = désactivé)"""
+    if not port:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Pas de ligne de log par scrape
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server")
+    thread.daemon = True
+    thread.start()
+    return server
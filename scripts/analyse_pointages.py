@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Analyse hors ligne des pointages: heures travaillées, pauses, heures
+supplémentaires et anomalies par employé et par jour
+
+Entrée: export CSV des pointages bruts de sync_terminals.py (--dump).
+Les pointages sont chargés en colonnes NumPy (employé, horodatage, état) et
+appariés par tris et regroupements vectorisés, sans boucle Python par
+pointage: des milliers d'employés sur plusieurs mois en quelques secondes.
+
+Règles:
+- anti-rebond: un pointage à moins de DEBOUNCE_MINUTES du précédent du même
+  employé est ignoré (DEBOUNCE_BLOCKED), comme le fait le backend;
+- appariement par catégorie d'état (STATE_TYPE_MAP): IN→OUT (travail),
+  Break-Out→Break-In (pause), OT-In→OT-Out (heures supplémentaires);
+- une session est comptée sur le jour de son ouverture: une équipe de nuit
+  (17:00 → 02:00) reste sur un seul jour;
+- heures travaillées = sessions IN→OUT moins les pauses du jour.
+
+Exporter une marge avant la période analysée (--since): un OUT de nuit dont
+l'IN précède l'export apparaît sinon en MISSING_IN.
+
+Nécessite: pip install numpy (en plus de pyzk et requests pour sync_terminals.py)
+
+Usage:
+    python sync_terminals.py --since 2026-01-01 --no-index --dump pointages.csv
+    python analyse_pointages.py pointages.csv --out rapport.csv
+"""
+
+import argparse
+import csv
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from sync_terminals import STATE_TYPE_MAP
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+DEBOUNCE_MINUTES = 4  # Tolérance double pointage du backend (doublePunchToleranceMinutes)
+MAX_SESSION_HOURS = 16  # IN→OUT plus long: oubli de pointage, non apparié
+MAX_BREAK_HOURS = 4
+MAX_OVERTIME_HOURS = 12
+
+# Catégories d'état: chaque catégorie s'apparie indépendamment
+WORK, BREAK, OVERTIME = 0, 1, 2
+STATE_CATEGORY = {0: WORK, 1: WORK, 2: BREAK, 3: BREAK, 4: OVERTIME, 5: OVERTIME}
+OPENING_TYPE = {WORK: "IN", BREAK: "OUT", OVERTIME: "IN"}  # Break-Out (type OUT) ouvre la pause
+MAX_DURATION = {WORK: MAX_SESSION_HOURS, BREAK: MAX_BREAK_HOURS, OVERTIME: MAX_OVERTIME_HOURS}
+
+ANOMALIES = ("MISSING_IN", "MISSING_OUT", "DOUBLE_IN", "DOUBLE_OUT", "DEBOUNCE_BLOCKED",
+             "BREAK_UNPAIRED", "OVERTIME_UNPAIRED")
+(MISSING_IN, MISSING_OUT, DOUBLE_IN, DOUBLE_OUT, DEBOUNCE_BLOCKED,
+ BREAK_UNPAIRED, OVERTIME_UNPAIRED) = range(len(ANOMALIES))
+
+SECONDS_PER_DAY = 86400
+
+# Tables de correspondance indexées par l'état (uint8): conversion vectorisée
+CATEGORY_LUT = np.zeros(256, dtype=np.int8)
+OPENS_LUT = np.zeros(256, dtype=bool)
+for _state in range(256):
+    _category = STATE_CATEGORY.get(_state, WORK)
+    CATEGORY_LUT[_state] = _category
+    OPENS_LUT[_state] = STATE_TYPE_MAP.get(_state, "IN") == OPENING_TYPE[_category]
+
+
+# =============================================================================
+# CHARGEMENT
+# =============================================================================
+@dataclass
+class PunchColumns:
+    """Pointages en colonnes: employee est un code dans employee_ids"""
+    employee: np.ndarray   # int32
+    timestamp: np.ndarray  # int64, secondes (heure locale du terminal)
+    state: np.ndarray      # uint8
+    employee_ids: list
+
+    def __len__(self):
+        return len(self.timestamp)
+
+
+def load_csv(paths):
+    """Charge un ou plusieurs exports sync_terminals.py --dump"""
+    codes = {}
+    employees, stamps, states = [], [], []
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            user_col, ts_col, state_col = (header.index(name) for name in ("user_id", "timestamp", "state"))
+            for row in reader:
+                user_id = row[user_col]
+                code = codes.get(user_id)
+                if code is None:
+                    code = codes[user_id] = len(codes)
+                employees.append(code)
+                stamps.append(row[ts_col])
+                states.append(row[state_col])
+
+    return PunchColumns(
+        employee=np.array(employees, dtype=np.int32),
+        timestamp=np.array(stamps, dtype="datetime64[s]").astype(np.int64),
+        state=np.array(states, dtype=np.int64).astype(np.uint8),
+        employee_ids=list(codes),
+    )
+
+
+# =============================================================================
+# ANALYSE
+# =============================================================================
+def group_starts(keys):
+    """Indices de début des groupes de clés égales consécutives (keys triées)"""
+    boundary = np.empty(len(keys), dtype=bool)
+    boundary[:1] = True
+    np.not_equal(keys[1:], keys[:-1], out=boundary[1:])
+    return np.flatnonzero(boundary)
+
+
+def analyse(columns, debounce_minutes=DEBOUNCE_MINUTES, max_duration=MAX_DURATION):
+    """
+    Retourne le rapport par employé-jour: dict de colonnes NumPy de même longueur
+    (une ligne par employé et jour ayant au moins un pointage).
+    """
+    # Tri (employé, horodatage): base du regroupement par employé-jour
+    order = np.lexsort((columns.timestamp, columns.employee))
+    employee = columns.employee[order].astype(np.int64)
+    ts = columns.timestamp[order]
+    state = columns.state[order]
+
+    # Groupe employé-jour de chaque pointage (clé croissante dans l'ordre du tri)
+    day = ts // SECONDS_PER_DAY
+    first_day = day.min() if len(day) else 0
+    span = (day.max() - first_day + 1) if len(day) else 1
+    key = employee * span + (day - first_day)
+    starts = group_starts(key)
+    row = np.zeros(len(key), dtype=np.int64)
+    row[starts[1:]] = 1
+    np.cumsum(row, out=row)
+    rows = len(starts)
+
+    # Anti-rebond: trop proche du pointage précédent du même employé
+    debounced = np.zeros(len(ts), dtype=bool)
+    debounced[1:] = (employee[1:] == employee[:-1]) & (ts[1:] - ts[:-1] < debounce_minutes * 60)
+
+    # Appariement: tri (employé, catégorie, horodatage) des pointages retenus,
+    # une ouverture suivie de sa fermeture dans le même groupe forme une session
+    kept = np.flatnonzero(~debounced)
+    category = CATEGORY_LUT[state[kept]]
+    kept = kept[np.lexsort((ts[kept], category, employee[kept]))]
+    category = CATEGORY_LUT[state[kept]]
+    opens = OPENS_LUT[state[kept]]
+    k_ts, k_row = ts[kept], row[kept]
+    k_group = employee[kept] * 3 + category
+
+    same_next = k_group[1:] == k_group[:-1]
+    duration = k_ts[1:] - k_ts[:-1]
+    limit = np.array([max_duration[c] * 3600 for c in (WORK, BREAK, OVERTIME)])[category[:-1]]
+    paired = opens[:-1] & ~opens[1:] & same_next & (duration <= limit)
+    open_idx = np.flatnonzero(paired)
+
+    is_open_paired = np.zeros(len(kept), dtype=bool)
+    is_open_paired[open_idx] = True
+    is_close_paired = np.zeros(len(kept), dtype=bool)
+    is_close_paired[open_idx + 1] = True
+
+    # Sessions: durées cumulées sur le jour d'ouverture
+    totals = {}
+    for name, cat in (("work", WORK), ("break", BREAK), ("overtime", OVERTIME)):
+        idx = open_idx[category[open_idx] == cat]
+        totals[name] = np.bincount(k_row[idx], weights=duration[idx], minlength=rows)
+        if cat == WORK:
+            sessions = np.bincount(k_row[idx], minlength=rows)
+            first_in = np.full(rows, -1, dtype=np.int64)
+            last_out = np.full(rows, -1, dtype=np.int64)
+            if len(idx):
+                # Sessions de travail triées par employé puis horodatage: k_row croissant
+                bounds = group_starts(k_row[idx])
+                first_in[k_row[idx][bounds]] = k_ts[idx][bounds]
+                ends = np.append(bounds[1:], len(idx)) - 1
+                last_out[k_row[idx][ends]] = k_ts[idx + 1][ends]
+
+    # Anomalies: pointages non appariés, classés selon le voisin dans le groupe
+    prev_same = np.zeros(len(kept), dtype=bool)
+    prev_same[1:] = same_next
+    next_same = np.zeros(len(kept), dtype=bool)
+    next_same[:-1] = same_next
+    next_opens = np.zeros(len(kept), dtype=bool)
+    next_opens[:-1] = opens[1:] & (duration <= limit)  # Nouvelle ouverture dans la même session
+    prev_closes = np.zeros(len(kept), dtype=bool)
+    prev_closes[1:] = ~opens[:-1]
+
+    unclosed = opens & ~is_open_paired
+    unopened = ~opens & ~is_close_paired
+    work = category == WORK
+    anomaly = np.full(len(kept), -1, dtype=np.int64)
+    anomaly[work & unclosed] = MISSING_OUT
+    anomaly[work & unclosed & next_same & next_opens] = DOUBLE_IN
+    anomaly[work & unopened] = MISSING_IN
+    anomaly[work & unopened & prev_same & prev_closes] = DOUBLE_OUT
+    anomaly[(category == BREAK) & (unclosed | unopened)] = BREAK_UNPAIRED
+    anomaly[(category == OVERTIME) & (unclosed | unopened)] = OVERTIME_UNPAIRED
+
+    flagged = anomaly >= 0
+    anomaly_rows = np.concatenate((k_row[flagged], row[debounced]))
+    anomaly_kinds = np.concatenate((anomaly[flagged], np.full(debounced.sum(), DEBOUNCE_BLOCKED)))
+    counts = np.bincount(anomaly_rows * len(ANOMALIES) + anomaly_kinds,
+                         minlength=rows * len(ANOMALIES)).reshape(rows, len(ANOMALIES))
+
+    worked = np.maximum(totals["work"] - totals["break"], 0)
+    return {
+        "employee": employee[starts],
+        "day": day[starts],
+        "punches": np.diff(np.append(starts, len(ts))),
+        "first_in": first_in,
+        "last_out": last_out,
+        "sessions": sessions,
+        "worked_hours": worked / 3600,
+        "break_hours": totals["break"] / 3600,
+        "overtime_hours": totals["overtime"] / 3600,
+        "anomalies": counts,
+    }
+
+
+# =============================================================================
+# RAPPORT
+# =============================================================================
+def format_times(seconds, day):
+    """HH:MM (vide si absent), suffixé (+1) pour une sortie le lendemain (équipe de nuit)"""
+    text = np.array([value[11:16] for value in seconds.astype("datetime64[s]").astype(str)], dtype=object)
+    text[seconds // SECONDS_PER_DAY > day] += " (+1)"
+    text[seconds < 0] = ""
+    return text
+
+
+def format_anomalies(counts):
+    text = np.full(len(counts), "", dtype=object)
+    for i in np.flatnonzero(counts.any(axis=1)):
+        text[i] = "|".join(name if count == 1 else f"{name}x{count}"
+                           for name, count in zip(ANOMALIES, counts[i]) if count)
+    return text
+
+
+def write_report(report, employee_ids, path):
+    """Rapport CSV trié par matricule puis date"""
+    matricules = np.array(employee_ids)[report["employee"]]  # Matricules tels que dans l'export
+    order = np.lexsort((report["day"], matricules))
+    day = report["day"][order]
+    columns = [
+        matricules[order],
+        day.astype("datetime64[D]").astype(str),
+        report["punches"][order],
+        format_times(report["first_in"][order], day),
+        format_times(report["last_out"][order], day),
+        report["sessions"][order],
+        np.char.mod("%.2f", report["worked_hours"][order]),
+        np.char.mod("%.2f", report["break_hours"][order]),
+        np.char.mod("%.2f", report["overtime_hours"][order]),
+        format_anomalies(report["anomalies"][order]),
+    ]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["matricule", "date", "pointages", "premiere_entree", "derniere_sortie", "sessions",
+                         "heures_travaillees", "heures_pause", "heures_sup", "anomalies"])
+        writer.writerows(zip(*(column.tolist() for column in columns)))
+
+
+def print_summary(report, columns):
+    employees = len(np.unique(report["employee"]))
+    days = np.datetime64(int(report["day"].min()), "D"), np.datetime64(int(report["day"].max()), "D")
+    print(f"👥 Employés: {employees} | 📅 Jours: {days[0]} → {days[1]} | 📊 Pointages: {len(columns)}")
+    print(f"   Employé-jours:       {len(report['day'])}")
+    print(f"   ⏱️ Heures travaillées: {report['worked_hours'].sum():,.1f} h")
+    print(f"   ☕ Pauses:            {report['break_hours'].sum():,.1f} h")
+    print(f"   ➕ Heures sup:        {report['overtime_hours'].sum():,.1f} h")
+
+    totals = report["anomalies"].sum(axis=0)
+    affected = (report["anomalies"] > 0).sum(axis=0)
+    if totals.any():
+        print("\n   ⚠️ Anomalies:")
+        for name, total, rows in zip(ANOMALIES, totals, affected):
+            if total:
+                print(f"      - {name}: {total} ({rows} employé-jours)")
+    else:
+        print("\n   ✅ Aucune anomalie")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Heures travaillées et anomalies depuis les exports des terminaux")
+    parser.add_argument("dumps", nargs="+", help="Exports CSV de sync_terminals.py --dump")
+    parser.add_argument("--out", help="Rapport CSV par employé et par jour")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_MINUTES,
+                        help=f"Anti-rebond en minutes (défaut: {DEBOUNCE_MINUTES})")
+    parser.add_argument("--max-session", type=float, default=MAX_SESSION_HOURS,
+                        help=f"Durée maximale d'une session IN→OUT en heures (défaut: {MAX_SESSION_HOURS})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("\n" + "="*60)
+    print("📈 ANALYSE DES POINTAGES")
+    print("="*60)
+
+    started = time.perf_counter()
+    columns = load_csv(args.dumps)
+    loaded = time.perf_counter()
+    print(f"📂 {len(columns)} pointages chargés en {loaded - started:.2f}s")
+    if not len(columns):
+        print("⚠️  Aucun pointage à analyser")
+        return
+
+    report = analyse(columns, args.debounce, {**MAX_DURATION, WORK: args.max_session})
+    print(f"⚡ Analyse en {time.perf_counter() - loaded:.2f}s\n")
+    print_summary(report, columns)
+
+    if args.out:
+        write_report(report, columns.employee_ids, args.out)
+        print(f"\n💾 Rapport: {args.out}")
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n🛑 Analyse interrompue")
+        sys.exit(1)
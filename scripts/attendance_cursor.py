@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Lecture incrémentale des pointages d'un terminal ZKTeco (curseur persisté)
+
+Au lieu de télécharger tout le journal du terminal à chaque vérification
+(conn.get_attendance() + filtre sur le timestamp), on conserve le nombre
+d'enregistrements déjà traités (lastSn, comme sync-terminal-state.js):
+
+1. read_sizes() donne le nombre d'enregistrements du terminal (une seule
+   petite commande): s'il n'a pas changé, il n'y a rien à lire.
+2. Sinon, seuls les octets des nouveaux enregistrements sont lus dans le
+   buffer du terminal (lecture par morceaux à partir de l'offset du curseur).
+3. Si le journal a été vidé (moins d'enregistrements que le curseur), le
+   curseur repart de zéro.
+
+pyzk n'expose pas de lecture partielle: la lecture de la fin du buffer utilise
+ses commandes internes et retombe sur get_attendance() en cas d'échec.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from struct import pack, unpack
+
+from zk import const
+from zk.attendance import Attendance
+
+CMD_PREPARE_BUFFER = 1503
+MAX_CHUNK_TCP = 0xFFC0
+MAX_CHUNK_UDP = 16 * 1024
+
+
+class AttendanceCursor:
+    """Position de lecture persistée dans un fichier JSON"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.last_sn = 0
+        self.last_timestamp = None
+        self.exists = False
+        self.users = None
+        self.users_count = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.last_sn = int(data.get("lastSn", 0))
+            self.last_timestamp = data.get("lastTimestamp")
+            self.exists = True
+        except (FileNotFoundError, ValueError):
+            self.exists = False
+
+    def save(self, last_sn=None):
+        """
+        Écrit la position. last_sn permet de persister une position antérieure
+        à celle en mémoire (pointages lus mais pas encore traités durablement).
+        """
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "lastSn": self.last_sn if last_sn is None else last_sn,
+                "lastTimestamp": self.last_timestamp,
+                "updatedAt": datetime.now().isoformat(),
+            }, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.exists = True
+
+    def advance(self, attendance):
+        """Avance le curseur d'un enregistrement traité"""
+        self.last_sn += 1
+        self.last_timestamp = attendance.timestamp.isoformat()
+
+    def reset(self, last_sn=0):
+        self.last_sn = last_sn
+        self.save()
+
+
+def count_records(conn):
+    """Nombre d'enregistrements dans le terminal (commande légère)"""
+    conn.read_sizes()
+    return conn.records
+
+
+def fetch_new_attendance(conn, cursor, log=print):
+    """
+    Retourne les pointages enregistrés depuis le curseur (dans l'ordre du terminal).
+    Le curseur n'est pas avancé: appeler cursor.advance() pour chaque pointage
+    traité puis cursor.save().
+    """
+    total = count_records(conn)
+
+    if total < cursor.last_sn:
+        log(f"⚠️  Journal du terminal vidé ({total} < {cursor.last_sn}), curseur remis à zéro")
+        cursor.reset(0)
+
+    if total == cursor.last_sn:
+        return []
+
+    try:
+        return read_attendance_from(conn, cursor, cursor.last_sn, total)
+    except Exception as e:
+        log(f"⚠️  Lecture incrémentale impossible ({e}), téléchargement complet")
+        return conn.get_attendance()[cursor.last_sn:]
+
+
+def read_attendance_from(conn, cursor, start_index, total):
+    """Lit les enregistrements [start_index, total) depuis le buffer du terminal"""
+    users = _cached_users(conn, cursor)
+
+    command_string = pack('<bhii', 1, const.CMD_ATTLOG_RRQ, 0, 0)
+    response = conn._ZK__send_command(CMD_PREPARE_BUFFER, command_string, 1024)
+    if not response.get('status'):
+        raise RuntimeError("buffer non supporté")
+    if response['code'] == const.CMD_DATA:
+        # Petit journal renvoyé directement dans la réponse: le lire en entier
+        # (comme pyzk.read_with_buffer) avant toute autre commande
+        data = _read_inline_data(conn)
+        if len(data) < 4:
+            raise RuntimeError("réponse CMD_DATA tronquée")
+        size = unpack('I', data[:4])[0]
+        record_size = _record_size(size + 4, total)
+        return decode_records(conn, data[4 + start_index * record_size:4 + size], record_size, users)
+
+    size = unpack('I', conn._ZK__data[1:5])[0]
+    record_size = _record_size(size, total)
+
+    max_chunk = MAX_CHUNK_TCP if conn.tcp else MAX_CHUNK_UDP
+    start = 4 + start_index * record_size
+    chunks = []
+    try:
+        while start < size:
+            length = min(max_chunk, size - start)
+            chunks.append(conn._ZK__read_chunk(start, length))
+            start += length
+    finally:
+        conn.free_data()
+
+    return decode_records(conn, b"".join(chunks), record_size, users)
+
+
+def _read_inline_data(conn):
+    """Données de la réponse CMD_DATA, complétées en TCP si le paquet est incomplet"""
+    data = conn._ZK__data
+    if conn.tcp:
+        need = (conn._ZK__tcp_length - 8) - len(data)
+        if need > 0:
+            data = b"".join([data, conn._ZK__recieve_raw_data(need)])
+    return data
+
+
+def _record_size(size, total):
+    """Taille d'un enregistrement d'après la taille du buffer (en-tête de 4 octets compris)"""
+    record_size, remainder = divmod(size - 4, total)
+    if remainder or record_size not in (8, 16, 40):
+        raise RuntimeError(f"taille d'enregistrement inattendue ({size} octets / {total})")
+    return record_size
+
+
+def decode_records(conn, data, record_size, users):
+    """Décode les enregistrements bruts (mêmes formats que pyzk.get_attendance)"""
+    decode_time = conn._ZK__decode_time
+    attendances = []
+
+    if record_size == 8:
+        by_uid = {u.uid: u.user_id for u in users}
+        for offset in range(0, len(data) - 7, 8):
+            uid, status, timestamp, punch = unpack('HB4sB', data[offset:offset + 8])
+            user_id = by_uid.get(uid, str(uid))
+            attendances.append(Attendance(user_id, decode_time(timestamp), status, punch, uid))
+    elif record_size == 16:
+        by_user_id = {u.user_id: u.uid for u in users}
+        for offset in range(0, len(data) - 15, 16):
+            user_id, timestamp, status, punch, _, _ = unpack('<I4sBB2sI', data[offset:offset + 16])
+            user_id = str(user_id)
+            uid = by_user_id.get(user_id, user_id)
+            attendances.append(Attendance(user_id, decode_time(timestamp), status, punch, uid))
+    else:
+        for offset in range(0, len(data) - 39, 40):
+            uid, user_id, status, timestamp, punch, _ = unpack('<H24sB4sB8s', data[offset:offset + 40])
+            user_id = user_id.split(b'\x00')[0].decode(errors='ignore')
+            attendances.append(Attendance(user_id, decode_time(timestamp), status, punch, uid))
+
+    return attendances
+
+
+def _cached_users(conn, cursor):
+    """La liste des utilisateurs n'est rechargée que si leur nombre change"""
+    if cursor.users is None or cursor.users_count != conn.users:
+        cursor.users = conn.get_users()
+        cursor.users_count = conn.users
+    return cursor.users
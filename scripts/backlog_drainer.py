@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Vidage de la queue locale (WAL) vers le backend après une coupure
+
+Après une nuit sans backend, des milliers de pointages attendent dans la
+queue. Au lieu de les envoyer un par un:
+- chaque lot lu dans la queue est réparti en voies par employé
+  (punch_dispatcher): une voie envoie dans l'ordre, les voies en parallèle
+  (workers). L'ordre chronologique de chaque employé est conservé;
+- un seau à jetons (rate, burst) plafonne le débit vers le backend, quel que
+  soit le nombre de voies;
+- le circuit breaker est consulté avant chaque envoi: backend en échec,
+  le vidage s'arrête jusqu'au prochain passage;
+- checkpoint après chaque lot: commit() jusqu'au dernier pointage du plus
+  long préfixe acquitté. Les pointages acquittés au-delà (autres voies) sont
+  mémorisés et ne sont pas renvoyés au passage suivant; après un crash, au
+  plus un lot est renvoyé (l'anti-doublon du backend les écarte);
+- progression journalisée (débit sur la dernière minute, pointages restants,
+  ETA) et exposée par stats().
+
+Mode lot (batch=True): send reçoit tous les pointages à envoyer d'un lot
+de la queue, dans leur ordre, et les envoie en une requête (endpoint bulk,
+qui les traite dans l'ordre chronologique); pas de voies.
+
+    drainer = BacklogDrainer(queue, post_item, breaker=circuit_breaker, log=log)
+    drainer.drain()
+"""
+
+import threading
+import time
+from collections import deque
+
+from punch_dispatcher import PunchDispatcher, employee_key
+
+DRAIN_WORKERS = 4  # Voies envoyées en parallèle
+DRAIN_RATE = 50.0  # Requêtes par seconde au plus vers le backend
+DRAIN_BATCH_SIZE = 100  # Pointages par lot (un checkpoint par lot)
+PROGRESS_INTERVAL = 10  # Secondes entre deux messages de progression
+RATE_WINDOW = 60  # Secondes: fenêtre de calcul du débit et de l'ETA
+
+
+class TokenBucket:
+    """Seau à jetons partagé par les threads d'envoi (rate jetons/s, burst au plus)"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def acquire(self):
+        """Attend qu'un jeton soit disponible et le consomme"""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class BacklogDrainer:
+    """
+    send(item) -> bool: True si le pointage est traité par le backend (il sera
+    acquitté dans la queue). key(item): voie d'ordonnancement (l'employé).
+    batch=True: send(items) -> [bool], un résultat par pointage du lot.
+    """
+
+    def __init__(self, queue, send, breaker=None, key=employee_key, workers=DRAIN_WORKERS, rate=DRAIN_RATE,
+                 burst=None, batch_size=DRAIN_BATCH_SIZE, progress_interval=PROGRESS_INTERVAL, log=print,
+                 batch=False):
+        self.queue = queue
+        self.send = send
+        self.batch = batch
+        self.breaker = breaker
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.log = log
+        self.dispatcher = None if batch else PunchDispatcher(self._deliver, lanes=workers, key=key,
+                                                             name="backlog-drain", log=log)
+        self.lock = threading.Lock()
+        self.delivered = set()  # Index (position WAL) acquittés par le backend mais pas encore commités
+        self.recent = deque()  # Instants des derniers acquittements (RATE_WINDOW)
+        self.sent = 0
+        self.last_progress = 0.0
+
+    # -------------------------------------------------------------------------
+    # Vidage
+    # -------------------------------------------------------------------------
+    def drain(self, stop_event=None):
+        """Envoie la queue lot par lot jusqu'à la vider ou au premier échec; retourne le nombre envoyé"""
+        sent_before = self.sent
+        while not (stop_event and stop_event.is_set()):
+            if not self.drain_batch():
+                break
+            if not len(self.queue):
+                break
+        sent = self.sent - sent_before
+        self.log(f"📊 Queue: {sent} envoyés, {len(self.queue)} restants")
+        return sent
+
+    def drain_batch(self):
+        """Envoie un lot; False si un pointage n'a pas pu être envoyé (le reste du lot attend)"""
+        batch = self.queue.read_batch(self.batch_size)
+        if not batch:
+            return True
+
+        results = [position[2] in self.delivered for _, position in batch]
+        # Une voie en échec n'envoie plus rien du lot (ordre de ses employés conservé)
+        pending = [index for index, done in enumerate(results) if not done]
+        items = [batch[index][0] for index in pending]
+        outcomes = self._deliver_batch(items) if self.batch else self.dispatcher.dispatch(items)
+        for index, ok in zip(pending, outcomes):
+            results[index] = ok
+
+        # Checkpoint: plus long préfixe acquitté du lot
+        acknowledged = next((index for index, ok in enumerate(results) if not ok), len(batch))
+        committed = -1
+        if acknowledged:
+            last_position = batch[acknowledged - 1][1]
+            self.queue.commit(last_position)
+            committed = last_position[2]
+        with self.lock:
+            self.delivered = {index for index in self.delivered if index > committed}
+            self.delivered.update(batch[index][1][2] for index in range(acknowledged, len(batch)) if results[index])
+        self.report()
+        return acknowledged == len(batch)
+
+    def _deliver(self, item):
+        """Un envoi (thread de voie): circuit breaker, seau à jetons puis send()"""
+        if self.breaker is not None and not self.breaker.allow():
+            return False
+        if self.bucket is not None:
+            self.bucket.acquire()
+        try:
+            ok = self.send(item)
+        except Exception as e:
+            self.log(f"⚠️  Envoi de la queue: {e}")
+            ok = False
+        if self.breaker is not None:
+            if ok:
+                self.breaker.on_success()
+            else:
+                self.breaker.on_failure()
+        if ok:
+            with self.lock:
+                self.sent += 1
+                self.recent.append(time.monotonic())
+        return ok
+
+    def _deliver_batch(self, items):
+        """Un envoi groupé (mode lot): une requête pour tous les pointages, un résultat par pointage"""
+        if not items:
+            return []
+        if self.breaker is not None and not self.breaker.allow():
+            return [False] * len(items)
+        if self.bucket is not None:
+            self.bucket.acquire()
+        try:
+            outcomes = [bool(ok) for ok in self.send(items)]
+            if len(outcomes) != len(items):
+                raise ValueError(f"{len(outcomes)} résultat(s) pour {len(items)} pointage(s)")
+        except Exception as e:
+            self.log(f"⚠️  Envoi de la queue: {e}")
+            outcomes = [False] * len(items)
+        sent = sum(outcomes)
+        if self.breaker is not None:
+            # Requête traitée (au moins un pointage accepté) ou backend en échec
+            if sent:
+                self.breaker.on_success()
+            else:
+                self.breaker.on_failure()
+        if sent:
+            now = time.monotonic()
+            with self.lock:
+                self.sent += sent
+                self.recent.extend([now] * sent)
+        return outcomes
+
+    # -------------------------------------------------------------------------
+    # Progression
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """Débit (pointages/s sur la dernière minute), pointages restants et ETA (s, None si inconnue)"""
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > RATE_WINDOW:
+                self.recent.popleft()
+            count = len(self.recent)
+            span = now - self.recent[0] if self.recent else 0.0
+            sent = self.sent
+        rate = count / span if span >= 1 else 0.0
+        remaining = len(self.queue)
+        return {
+            "sent": sent,
+            "rate_per_s": round(rate, 1),
+            "remaining": remaining,
+            "eta_s": round(remaining / rate) if rate else (0 if not remaining else None),
+        }
+
+    def report(self):
+        now = time.monotonic()
+        if now - self.last_progress < self.progress_interval:
+            return
+        self.last_progress = now
+        stats = self.stats()
+        if stats["remaining"] < self.batch_size:
+            return  # Pas de backlog: rien à signaler
+        eta = "inconnue" if stats["eta_s"] is None else f"{stats['eta_s']}s"
+        self.log(f"📤 Queue: {stats['sent']} envoyés ({stats['rate_per_s']}/s), "
+                 f"{stats['remaining']} restants, ETA {eta}")
+
+    def close(self):
+        if self.dispatcher is not None:
+            self.dispatcher.close()
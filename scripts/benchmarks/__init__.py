@@ -0,0 +1,13 @@
+"""
+Benchmarks de l'ingestion des pointages (parsing, payloads, queue, filtrage, listener, mémoire)
+
+Depuis scripts/:
+    python -m benchmarks                     # compare à baseline.json (code 1 si régression)
+    python -m benchmarks wal_drain --repeat 5
+    python -m benchmarks --update-baseline   # après une optimisation validée
+
+Les références dépendent de la machine: les réenregistrer (--update-baseline)
+sur la machine qui exécute la comparaison. Les mesures dépendant du disque
+(fsync), du réseau local ou de l'allocation d'objets ont leur propre seuil
+("threshold" de l'entrée dans baseline.json, conservé par --update-baseline).
+"""
@@ -0,0 +1,153 @@
+"""
+Exécution des benchmarks et comparaison à la référence (python -m benchmarks)
+
+Code de sortie 1 si une mesure régresse au-delà du seuil par rapport à
+baseline.json (débit plus faible, ou mémoire plus élevée). Chaque exécution
+est ajoutée à history.jsonl (date, commit git, machine) pour suivre
+l'évolution dans le temps.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from .suite import BENCHMARKS
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+HISTORY_FILE = BENCH_DIR / "history.jsonl"
+DEFAULT_THRESHOLD = 0.25  # Régression tolérée: 25% (bruit de mesure d'une machine à l'autre)
+DEFAULT_REPEAT = 5
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def run_benchmark(bench, repeat):
+    """Médiane de repeat exécutions (une exécution perturbée ne décide pas du résultat)"""
+    return statistics.median(bench.function() for _ in range(repeat if bench.repeatable else 1))
+
+
+def compare(value, reference, threshold):
+    """Retourne (variation relative, régression?) par rapport à la référence"""
+    base = reference["value"]
+    limit = reference.get("threshold", threshold)
+    change = (value - base) / base if base else 0.0
+    if reference.get("higher_is_better", True):
+        return change, change < -limit
+    return change, change > limit
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"benchmarks": {}}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmarks des chemins critiques de l'ingestion")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks à exécuter (défaut: tous): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Exécutions par benchmark, médiane retenue (défaut: {DEFAULT_REPEAT})")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help=f"Régression tolérée, ex: 0.25 = 25%% (défaut: baseline.json ou {DEFAULT_THRESHOLD})")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Enregistre les mesures comme nouvelle référence")
+    parser.add_argument("--no-history", action="store_true", help="Ne pas ajouter l'exécution à history.jsonl")
+    parser.add_argument("--list", action="store_true", help="Liste les benchmarks")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.list:
+        for bench in BENCHMARKS.values():
+            print(f"{bench.name:28} {bench.unit:12} {bench.description}")
+        return 0
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        print(f"❌ Benchmark inconnu: {', '.join(unknown)}")
+        return 2
+
+    baseline = load_baseline()
+    threshold = args.threshold if args.threshold is not None else baseline.get("threshold", DEFAULT_THRESHOLD)
+    references = baseline.get("benchmarks", {})
+
+    results = {}
+    regressions = []
+    print(f"{'Benchmark':28} {'Mesure':>14} {'Référence':>14}  Écart")
+    print("-" * 70)
+    for name in args.names or list(BENCHMARKS):
+        bench = BENCHMARKS[name]
+        value = run_benchmark(bench, args.repeat)
+        results[name] = {"value": round(value, 2), "unit": bench.unit, "higher_is_better": bench.higher_is_better}
+
+        reference = references.get(name)
+        if reference:
+            change, regressed = compare(value, reference, threshold)
+            status = "❌ RÉGRESSION" if regressed else "✅"
+            print(f"{name:28} {value:>14,.1f} {reference['value']:>14,.1f}  {change:+7.1%} {status}")
+            if regressed:
+                regressions.append(name)
+        else:
+            print(f"{name:28} {value:>14,.1f} {'-':>14}  (pas de référence) {bench.unit}")
+
+    if not args.no_history:
+        with open(HISTORY_FILE, "a") as f:
+            f.write(json.dumps({
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "revision": git_revision(),
+                "machine": machine_info(),
+                "results": results,
+            }) + "\n")
+
+    if args.update_baseline:
+        references.update({
+            name: {**result, **({"threshold": references[name]["threshold"]}
+                                if "threshold" in references.get(name, {}) else {})}
+            for name, result in results.items()
+        })
+        baseline = {
+            "threshold": baseline.get("threshold", DEFAULT_THRESHOLD),
+            "recorded": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "machine": machine_info(),
+            "benchmarks": references,
+        }
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Référence mise à jour: {BASELINE_FILE}")
+        return 0
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} régression(s) au-delà de {threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\n✅ Aucune régression")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
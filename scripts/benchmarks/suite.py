@@ -0,0 +1,342 @@
+"""
+Benchmarks des chemins critiques de l'ingestion
+
+Chaque benchmark retourne une mesure (débit ou mémoire) calculée sur des
+données synthétiques déterministes (graine fixe): deux exécutions sur la même
+machine sont comparables. Un débit est mesuré sur au moins MIN_DURATION
+secondes (charge répétée si besoin), ramasse-miettes suspendu: une mesure
+trop courte varie de plusieurs dizaines de % d'une exécution à l'autre.
+"""
+
+import atexit
+import gc
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from struct import pack
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR))
+
+from zk import ZK
+from zk.attendance import Attendance
+
+import adms_listener
+from attendance_cursor import decode_records
+from punch_digest_index import PunchDigestIndex, attendance_digest
+from simulator.adms_client import ADMSClient, build_frame
+from simulator.zk_device import encode_time
+from sync_terminals import build_payload as build_state_payload, filter_period, filter_unsent
+from terminal_supervisor import build_payload as build_webhook_payload
+from wal_queue import WriteAheadQueue
+
+SEED = 20260118
+MIN_DURATION = 1.0  # Secondes mesurées au minimum par exécution d'un benchmark de débit
+EMPLOYEES = 500
+START = datetime(2026, 1, 12, 6, 0, 0)
+
+
+@dataclass
+class Benchmark:
+    name: str
+    unit: str
+    higher_is_better: bool
+    function: object
+    description: str
+    repeatable: bool = True  # Débit: meilleur de N exécutions; mémoire: une seule
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name, unit, higher_is_better=True, repeatable=True):
+    def decorator(function):
+        BENCHMARKS[name] = Benchmark(name, unit, higher_is_better, function,
+                                     (function.__doc__ or "").strip(), repeatable)
+        return function
+    return decorator
+
+
+def rate(count, function, min_duration=MIN_DURATION):
+    """
+    Exécute function() (count éléments) jusqu'à avoir mesuré min_duration
+    secondes et retourne le débit. min_duration=0: une seule exécution (charge
+    qui ne peut pas être rejouée).
+    """
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    gc.disable()  # Pas de collecte au milieu de la mesure (source principale de bruit)
+    try:
+        runs = 0
+        started = time.perf_counter()
+        while True:
+            function()
+            runs += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_duration:
+                return count * runs / elapsed
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+# =============================================================================
+# DONNÉES SYNTHÉTIQUES
+# =============================================================================
+def synthetic_punches(count, seed=SEED):
+    """[(user_id, datetime, state, verify_mode)] croissants, ~1 pointage toutes les 6 s"""
+    rng = random.Random(seed)
+    timestamp = START
+    punches = []
+    for _ in range(count):
+        timestamp += timedelta(seconds=rng.randint(1, 12))
+        punches.append((rng.randint(1, EMPLOYEES), timestamp, rng.randint(0, 1), rng.choice((1, 4, 15))))
+    return punches
+
+
+def synthetic_attendances(count):
+    return [Attendance(str(user_id), timestamp, state, verify_mode, user_id)
+            for user_id, timestamp, state, verify_mode in synthetic_punches(count)]
+
+
+def zk_record_bytes(punches):
+    """Journal brut au format 40 octets du terminal"""
+    return b"".join(
+        pack('<H24sB4sB8s', user_id, str(user_id).encode(), state, pack('<I', encode_time(timestamp)), verify_mode, b"")
+        for user_id, timestamp, state, verify_mode in punches
+    )
+
+
+def webhook_payloads(count):
+    return [{"employeeId": str(user_id), "timestamp": timestamp.isoformat(), "type": "IN",
+             "method": "FINGERPRINT", "rawData": {"status": state, "verifyMode": verify_mode}}
+            for user_id, timestamp, state, verify_mode in synthetic_punches(count)]
+
+
+# =============================================================================
+# PARSING
+# =============================================================================
+@benchmark("adms_parse_single", "records/s")
+def bench_adms_parse_single():
+    """parse_adms_data + parse_realtime_attendance sur des frames d'un pointage"""
+    frames = [build_frame(0x0011, [punch]) for punch in synthetic_punches(20000)]
+    listener = adms_listener.ADMSListener.__new__(adms_listener.ADMSListener)
+    return rate(len(frames), lambda: [listener.parse_adms_data(frame) for frame in frames])
+
+
+@benchmark("adms_framer_stream", "records/s")
+def bench_adms_framer_stream():
+    """ADMSFramer: flux de frames de 100 pointages découpé en segments TCP de 1460 octets"""
+    punches = synthetic_punches(100000)
+    stream = b"".join(build_frame(0x0012, punches[i:i + 100]) for i in range(0, len(punches), 100))
+    segments = [stream[i:i + 1460] for i in range(0, len(stream), 1460)]
+
+    def run():
+        framer = adms_listener.ADMSFramer()
+        for segment in segments:
+            framer.feed(segment)
+    return rate(len(punches), run)
+
+
+@benchmark("zk_decode_records", "records/s")
+def bench_zk_decode_records():
+    """attendance_cursor.decode_records sur le journal brut 40 octets du terminal"""
+    data = zk_record_bytes(synthetic_punches(100000))
+    conn = ZK("127.0.0.1")
+    return rate(100000, lambda: decode_records(conn, data, 40, []))
+
+
+# =============================================================================
+# CONSTRUCTION DES PAYLOADS
+# =============================================================================
+@benchmark("payload_webhook", "payloads/s")
+def bench_payload_webhook():
+    """Payload du webhook (send_attendance_to_backend / terminal_supervisor)"""
+    attendances = synthetic_attendances(50000)
+    terminal = {"device_id": "BENCH-001"}
+    return rate(len(attendances), lambda: [build_webhook_payload(terminal, a) for a in attendances])
+
+
+@benchmark("payload_state", "payloads/s")
+def bench_payload_state():
+    """Payload du webhook state (sync_terminals.build_payload)"""
+    attendances = synthetic_attendances(50000)
+    return rate(len(attendances), lambda: [build_state_payload(a) for a in attendances])
+
+
+@benchmark("payload_adms", "payloads/s")
+def bench_payload_adms():
+    """ADMSListener.build_attendance"""
+    records = [(user_id, int(timestamp.timestamp()), state, verify_mode)
+               for user_id, timestamp, state, verify_mode in synthetic_punches(50000)]
+    listener = adms_listener.ADMSListener.__new__(adms_listener.ADMSListener)
+    return rate(len(records), lambda: [listener.build_attendance(*record) for record in records])
+
+
+# =============================================================================
+# FILTRAGE (sync_terminals)
+# =============================================================================
+@benchmark("sync_filter_period", "records/s")
+def bench_sync_filter_period():
+    """Filtrage par période de sync_terminal sur 100k pointages"""
+    attendances = synthetic_attendances(100000)
+    start, end = START + timedelta(days=1), START + timedelta(days=4)
+    return rate(len(attendances), lambda: filter_period(attendances, start, end))
+
+
+@benchmark("sync_filter_unsent", "records/s")
+def bench_sync_filter_unsent():
+    """Exclusion des pointages déjà acquittés (index d'empreintes, 50% connus)"""
+    attendances = synthetic_attendances(50000)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PunchDigestIndex(Path(tmp) / "bench.idx")
+        for attendance in attendances[::2]:
+            index.add(attendance_digest("BENCH-001", attendance))
+        return rate(len(attendances), lambda: filter_unsent(attendances, "BENCH-001", index))
+
+
+# =============================================================================
+# QUEUE DURABLE
+# =============================================================================
+@benchmark("wal_append_durable", "items/s")
+def bench_wal_append_durable():
+    """WriteAheadQueue.append_many par lots de 100 (fsync par lot)"""
+    payloads = webhook_payloads(20000)
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = WriteAheadQueue(tmp)
+        try:
+            return rate(len(payloads), lambda: [queue.append_many(payloads[i:i + 100])
+                                                for i in range(0, len(payloads), 100)])
+        finally:
+            queue.close()
+
+
+@benchmark("wal_append_buffered", "items/s")
+def bench_wal_append_buffered():
+    """WriteAheadQueue.append unitaire en mode non durable (fsync en arrière-plan)"""
+    payloads = webhook_payloads(50000)
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = WriteAheadQueue(tmp, durable=False)
+        try:
+            return rate(len(payloads), lambda: [queue.append(payload) for payload in payloads])
+        finally:
+            queue.close()
+
+
+@benchmark("wal_drain", "items/s")
+def bench_wal_drain():
+    """Lecture par lots de 100 + commit (process_local_queue / delivery_loop sans réseau)"""
+    payloads = webhook_payloads(50000)
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = WriteAheadQueue(tmp, durable=False)
+        try:
+            queue.append_many(payloads)
+            queue.flush()
+
+            def drain():
+                while True:
+                    batch = queue.read_batch(100)
+                    if not batch:
+                        return
+                    queue.commit(batch[-1][1])
+            return rate(len(payloads), drain, min_duration=0)  # Queue vide après un passage
+        finally:
+            queue.close()
+
+
+# =============================================================================
+# LISTENER ADMS (bout en bout local)
+# =============================================================================
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@benchmark("adms_listener_frames", "frames/s")
+def bench_adms_listener_frames():
+    """Frames ADMS d'un pointage acquittés par le listener (TCP + queue durable), 4 terminaux"""
+    port = free_port()
+    punches = synthetic_punches(2000)
+
+    # Le listener n'a pas d'arrêt propre: il reste actif (thread daemon) jusqu'à la fin du processus
+    queue_dir = tempfile.mkdtemp(prefix="bench-adms-")
+    atexit.register(shutil.rmtree, queue_dir, True)
+    listener = adms_listener.ADMSListener(port=port, queue_dir=queue_dir)
+    # Mesure jusqu'à l'acquittement au terminal: l'envoi au backend est hors du chemin mesuré
+    listener.drainer.send = lambda items: [True] * len(items)
+    threading.Thread(target=listener.start, daemon=True).start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    def terminal(part):
+        with ADMSClient("127.0.0.1", port) as client:
+            for user_id, timestamp, state, verify_mode in part:
+                client.send_realtime(user_id, timestamp, state, verify_mode)
+
+    def run():
+        threads = [threading.Thread(target=terminal, args=(punches[i::4],)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    measured = rate(len(punches), run)
+
+    # Queue vidée avant de rendre la main: le vidage en arrière-plan ne perturbe ni les
+    # benchmarks suivants (mémoire) ni la suppression du répertoire à la sortie
+    deadline = time.monotonic() + 30
+    while len(listener.queue) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return measured
+
+
+# =============================================================================
+# MÉMOIRE
+# =============================================================================
+def bytes_per_item(count, build):
+    """Mémoire allouée (tracemalloc) par élément pour la structure construite par build()"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        kept = build()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return size / count
+
+
+@benchmark("memory_attendances_100k", "bytes/punch", higher_is_better=False, repeatable=False)
+def bench_memory_attendances():
+    """Mémoire de 100k pointages décodés (objets Attendance, comme get_attendance)"""
+    data = zk_record_bytes(synthetic_punches(100000))
+    conn = ZK("127.0.0.1")
+    return bytes_per_item(100000, lambda: decode_records(conn, data, 40, []))
+
+
+@benchmark("memory_digest_index_100k", "bytes/punch", higher_is_better=False, repeatable=False)
+def bench_memory_digest_index():
+    """Mémoire de l'index des pointages acquittés pour 100k pointages"""
+    digests = [attendance_digest("BENCH-001", a) for a in synthetic_attendances(100000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        def build():
+            index = PunchDigestIndex(Path(tmp) / "bench.idx")
+            for digest in digests:
+                index.add(digest)
+            index._merge_recent()
+            return index
+        return bytes_per_item(100000, build)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker des envois vers le backend
+
+Après failure_threshold échecs consécutifs le circuit s'ouvre (OPEN): les
+appels sont refusés sans contacter le backend pendant timeout secondes, puis
+un appel d'essai est autorisé (HALF_OPEN). Un succès referme le circuit.
+Partageable entre plusieurs threads (un circuit par backend).
+"""
+
+import threading
+import time
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=10, timeout=60, log=print):
+        self.failure_count = 0
+        self.failure_threshold = failure_threshold
+        self.timeout = timeout
+        self.last_failure_time = None
+        self.state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
+        self.log = log
+        self.lock = threading.Lock()
+
+    def call(self, func, *args, **kwargs):
+        if not self.allow():
+            self.log("🛑 Circuit breaker OPEN: Backend indisponible, attente...")
+            return False
+
+        try:
+            result = func(*args, **kwargs)
+            if result:
+                self.on_success()
+            else:
+                self.on_failure()
+            return result
+        except Exception as e:
+            self.on_failure()
+            self.log(f"💥 Exception dans circuit breaker: {e}")
+            return False
+
+    def allow(self):
+        """True si un appel au backend peut être tenté"""
+        with self.lock:
+            if self.state != "OPEN":
+                return True
+            if self.last_failure_time and time.time() - self.last_failure_time > self.timeout:
+                self.state = "HALF_OPEN"
+                self.log("🔄 Circuit breaker: Tentative de reconnexion...")
+                return True
+            return False
+
+    def on_success(self):
+        with self.lock:
+            if self.state == "HALF_OPEN":
+                self.log("✅ Circuit breaker: Backend rétabli, passage en CLOSED")
+            self.failure_count = 0
+            self.state = "CLOSED"
+
+    def on_failure(self):
+        with self.lock:
+            self.failure_count += 1
+            self.last_failure_time = time.time()
+            if self.failure_count >= self.failure_threshold and self.state != "OPEN":
+                self.state = "OPEN"
+                self.log(f"🛑 Circuit breaker OPEN après {self.failure_count} échecs consécutifs")
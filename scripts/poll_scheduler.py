@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Planification adaptative de la relève des terminaux
+
+L'intervalle de polling est recalculé à chaque passage au lieu d'être une
+constante:
+- autour des horaires de shift du tenant (début, fin, pause: fenêtres du
+  backend GET /attendance/terminal/shift-windows), relève serrée
+  (min_interval): les pics d'entrée/sortie passent en quelques secondes;
+- hors fenêtre, l'intervalle suit le débit observé (moyenne mobile
+  exponentielle des pointages lus): environ un pointage par relève;
+- terminal inactif: l'intervalle double tous les IDLE_BACKOFF_STEPS passages
+  vides jusqu'à max_interval, avec une gigue aléatoire pour ne pas
+  synchroniser les terminaux d'un parc;
+- l'attente ne dépasse jamais l'ouverture de la prochaine fenêtre de shift.
+
+    windows = ShiftWindows(shift_windows_url(BACKEND_URL), headers)
+    scheduler = PollScheduler(windows)
+    while True:
+        new_attendances = fetch_new_attendance(conn, cursor)
+        scheduler.observe(len(new_attendances))
+        time.sleep(scheduler.next_interval())
+"""
+
+import math
+import random
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+MIN_INTERVAL = 2  # Secondes entre deux relèves autour d'un horaire de shift
+BASE_INTERVAL = 10  # Intervalle sans information (ancien CHECK_INTERVAL)
+MAX_INTERVAL = 120  # Plafond du recul quand le terminal est inactif
+WINDOW_BEFORE = 20  # Minutes avant un horaire de shift (arrivées en avance)
+WINDOW_AFTER = 20  # Minutes après (retardataires)
+IDLE_BACKOFF_STEPS = 3  # Passages vides avant chaque doublement de l'intervalle
+JITTER = 0.2  # Gigue: ±20% de l'intervalle
+RATE_TIME_CONSTANT = 300  # Secondes: mémoire de la moyenne mobile du débit
+WINDOWS_REFRESH = 3600  # Secondes entre deux lectures des fenêtres de shift
+WINDOWS_RETRY = 300  # Après un échec de lecture des fenêtres
+MINUTES_PER_DAY = 1440
+
+
+def shift_windows_url(backend_url):
+    """Endpoint des fenêtres de shift à partir de l'URL du webhook des agents"""
+    return backend_url.split("/attendance/")[0] + "/attendance/terminal/shift-windows"
+
+
+def parse_minutes(value):
+    """'HH:MM' → minutes depuis minuit"""
+    hours, minutes = value.split(":")[:2]
+    return (int(hours) * 60 + int(minutes)) % MINUTES_PER_DAY
+
+
+def window_boundaries(windows):
+    """Horaires (minutes depuis minuit) des fenêtres du backend: début, fin, début et fin de pause"""
+    boundaries = set()
+    for window in windows:
+        if not window.get("employees", 1):
+            continue
+        boundaries.add(parse_minutes(window["start"]))
+        boundaries.add(parse_minutes(window["end"]))
+        if window.get("breakStart"):
+            break_start = parse_minutes(window["breakStart"])
+            boundaries.add(break_start)
+            boundaries.add((break_start + int(window.get("breakDuration") or 0)) % MINUTES_PER_DAY)
+    return sorted(boundaries)
+
+
+class ShiftWindows:
+    """
+    Horaires de shift du tenant, relus depuis le backend toutes les
+    WINDOWS_REFRESH secondes et au changement de jour. Partagé par les
+    terminaux d'un même tenant. En cas d'échec, les derniers horaires connus
+    (ou fallback, "HH:MM" de la configuration) restent utilisés. La requête
+    est faite hors du verrou par un seul thread; les autres terminaux
+    continuent avec les horaires courants pendant ce temps.
+    """
+
+    def __init__(self, url, headers, fallback=(), session=None, timeout=5, log=print):
+        self.url = url
+        self.headers = headers
+        self.session = session or requests
+        self.timeout = timeout
+        self.log = log
+        self.lock = threading.Lock()
+        self.minutes = sorted({parse_minutes(value) for value in fallback})
+        self.next_refresh = 0.0
+        self.day = None
+        self.refreshing = False
+
+    def boundaries(self):
+        with self.lock:
+            today = datetime.now().date()
+            refresh = not self.refreshing and (time.monotonic() >= self.next_refresh or today != self.day)
+            self.refreshing = self.refreshing or refresh
+            minutes = self.minutes
+        if not refresh:
+            return minutes
+        try:
+            return self._refresh(today)
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def _refresh(self, today):
+        try:
+            response = self.session.get(self.url, params={"date": today.isoformat()},
+                                        headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            minutes = window_boundaries(response.json().get("windows", []))
+        except (requests.RequestException, ValueError, KeyError) as e:
+            with self.lock:
+                self.next_refresh = time.monotonic() + WINDOWS_RETRY
+                known = self.minutes
+            self.log(f"⚠️  Horaires de shift indisponibles ({e}), {len(known)} horaire(s) connu(s) conservé(s)")
+            return known
+        with self.lock:
+            if minutes:
+                self.minutes = minutes
+            self.day = today
+            self.next_refresh = time.monotonic() + WINDOWS_REFRESH
+            minutes = self.minutes
+        self.log(f"🕐 Horaires de shift: {', '.join(f'{m // 60:02d}:{m % 60:02d}' for m in minutes) or 'aucun'}")
+        return minutes
+
+
+class PollScheduler:
+    """Intervalle de relève d'un terminal (observe() après chaque relève, puis next_interval())"""
+
+    def __init__(self, windows=None, min_interval=MIN_INTERVAL, base_interval=BASE_INTERVAL,
+                 max_interval=MAX_INTERVAL, jitter=JITTER, rng=None, clock=time.time):
+        self.windows = windows
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+        self.clock = clock
+
+        self.rate = 0.0  # Pointages par seconde (moyenne mobile)
+        self.empty_polls = 0
+        self.last_poll = None
+        self.interval = base_interval
+        self.reason = "base"
+
+    def observe(self, count):
+        """Nombre de pointages lus lors de la relève qui vient de se terminer"""
+        now = self.clock()
+        if self.last_poll is not None:
+            elapsed = max(now - self.last_poll, 1e-3)
+            alpha = 1 - math.exp(-elapsed / RATE_TIME_CONSTANT)
+            self.rate += alpha * (count / elapsed - self.rate)
+        self.last_poll = now
+        self.empty_polls = 0 if count else self.empty_polls + 1
+
+    def next_interval(self):
+        """Secondes à attendre avant la prochaine relève"""
+        local = datetime.fromtimestamp(self.clock())
+        minute = local.hour * 60 + local.minute + local.second / 60
+        in_window, until_window = self._window_position(minute)
+
+        if in_window:
+            interval, reason = self.min_interval, "shift"
+        elif self.rate > 0 and 1 / self.rate < self.base_interval:
+            interval, reason = max(self.min_interval, 1 / self.rate), "rate"
+        elif self.empty_polls >= IDLE_BACKOFF_STEPS:
+            steps = self.empty_polls // IDLE_BACKOFF_STEPS
+            interval, reason = min(self.max_interval, self.base_interval * 2 ** steps), "idle"
+        else:
+            interval, reason = self.base_interval, "base"
+
+        if reason != "shift":
+            interval *= 1 + self.rng.uniform(-self.jitter, self.jitter)
+            if until_window is not None and until_window < interval:
+                interval, reason = until_window, "shift_soon"
+        self.interval = max(self.min_interval, min(interval, self.max_interval))
+        self.reason = reason
+        return self.interval
+
+    def stats(self):
+        return {
+            "interval": round(self.interval, 2),
+            "reason": self.reason,
+            "rate_per_minute": round(self.rate * 60, 2),
+            "empty_polls": self.empty_polls,
+        }
+
+    def _window_position(self, minute):
+        """(dans une fenêtre de shift?, secondes avant la prochaine fenêtre ou None)"""
+        boundaries = self.windows.boundaries() if self.windows is not None else []
+        until = None
+        for boundary in boundaries:
+            ahead = (boundary - minute) % MINUTES_PER_DAY  # Minutes avant l'horaire
+            if ahead <= WINDOW_BEFORE or MINUTES_PER_DAY - ahead <= WINDOW_AFTER:
+                return True, None
+            seconds = (ahead - WINDOW_BEFORE) * 60
+            until = seconds if until is None else min(until, seconds)
+        return False, until
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Archive locale des pointages bruts des terminaux (ajout seul, mmap)
+
+Chaque pointage est un enregistrement binaire de taille fixe (16 octets):
+code terminal, code matricule, horodatage (secondes, heure locale du
+terminal), state, verify mode. Les enregistrements sont ajoutés par extents:
+un extent regroupe les pointages d'un terminal pour un jour, triés par
+horodatage.
+
+- punches.bin: les enregistrements, lus via mmap;
+- index.json: codes des terminaux, table des matricules (user_id tels que lus
+  sur le terminal, zéros de tête compris: le code matricule d'un
+  enregistrement est leur position), extents par terminal et par jour, nombre
+  d'enregistrements validés (réécrit de manière atomique après chaque ajout;
+  une fin de fichier non référencée, crash pendant un ajout, est tronquée).
+
+Une requête (terminal, période) ne lit que les extents des jours concernés
+et retourne des memoryview sur le mmap, sans copie (np.frombuffer(view,
+RECORD_DTYPE) pour une analyse en colonnes). Les rattrapages, audits et
+ré-imports sont servis depuis le disque sans interroger les pointeuses.
+
+Usage:
+    python punch_archive.py info
+    python punch_archive.py export EJB8241100244 --since 2026-01-12 --until 2026-01-16 --out cit.csv
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from zk.attendance import Attendance
+
+ARCHIVE_DIR = Path(__file__).resolve().parent / "archive"
+RECORD = struct.Struct('<HIqBB')  # terminal, code matricule (index de users), horodatage, state, verify mode
+RECORD_SIZE = RECORD.size
+RECORD_DTYPE = [('device', '<u2'), ('user', '<u4'), ('timestamp', '<i8'), ('state', 'u1'), ('verify_mode', 'u1')]
+INDEX_FORMAT = 2  # 2: table des matricules (le format 1 stockait int(user_id), zéros de tête perdus)
+TIMESTAMP_OFFSET = 6
+EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+
+
+def to_seconds(timestamp):
+    return (timestamp - EPOCH) // timedelta(seconds=1)
+
+
+def from_seconds(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class PunchArchive:
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.directory / "punches.bin"
+        self.index_path = self.directory / "index.json"
+        self.lock = threading.Lock()
+        self.map = None
+
+        index = self._load_index()
+        self.devices = index["devices"]
+        self.users = index["users"]
+        self.user_codes = {user_id: code for code, user_id in enumerate(self.users)}
+        self.extents = index["extents"]
+        self.records = index["records"]
+
+        # Enregistrements écrits mais non référencés par l'index (crash): supprimés
+        with open(self.data_path, "ab+") as f:
+            if f.seek(0, os.SEEK_END) != self.records * RECORD_SIZE:
+                f.truncate(self.records * RECORD_SIZE)
+        self._remap()
+
+    def __len__(self):
+        return self.records
+
+    # -------------------------------------------------------------------------
+    # Écriture
+    # -------------------------------------------------------------------------
+    def append(self, device_id, attendances):
+        """
+        Archive le journal (complet ou partiel) d'un terminal: seuls les pointages
+        absents de l'archive sont ajoutés. Retourne (ajoutés, ignorés); un pointage
+        qui ne tient pas dans le format (state ou verify mode hors 0-255) est ignoré.
+
+        Les enregistrements sont encodés avant toute modification de l'index:
+        un ajout en échec ne laisse ni extent ni matricule non écrit.
+        """
+        with self.lock:
+            device = self.devices.get(device_id, len(self.devices))
+            new_users = {}  # Matricules absents de la table, ajoutés après l'écriture
+            by_day = {}
+            ignored = 0
+            for attendance in attendances:
+                user_id = str(attendance.user_id)
+                user = self.user_codes.get(user_id)
+                if user is None:
+                    user = new_users.get(user_id, len(self.users) + len(new_users))
+                seconds = to_seconds(attendance.timestamp)
+                state, verify_mode = attendance.status or 0, attendance.punch or 0
+                try:
+                    RECORD.pack(device, user, seconds, state, verify_mode)
+                except struct.error:
+                    ignored += 1
+                    continue
+                if user >= len(self.users):
+                    new_users.setdefault(user_id, user)
+                by_day.setdefault(seconds // SECONDS_PER_DAY, set()).add((seconds, user, state, verify_mode))
+
+            days = self.extents.get(device_id, {})
+            chunks = []
+            new_extents = []  # (jour, [position, nombre]) référencés après l'écriture
+            position = self.records
+            for day, punches in sorted(by_day.items()):
+                key = str(day)
+                if key in days:
+                    known = {(seconds, user, state)
+                             for _, user, seconds, state, _ in self._iter_day(days[key])}
+                    punches = [p for p in punches if (p[0], p[1], p[2]) not in known]
+                if not punches:
+                    continue
+                punches = sorted(punches)
+                chunks.append(b"".join(RECORD.pack(device, user, seconds, state, verify_mode)
+                                       for seconds, user, state, verify_mode in punches))
+                new_extents.append((key, [position, len(punches)]))
+                position += len(punches)
+
+            if position == self.records:
+                return 0, ignored
+
+            with open(self.data_path, "ab") as f:
+                try:
+                    f.write(b"".join(chunks))
+                    f.flush()
+                    os.fsync(f.fileno())
+                except OSError:
+                    # Écriture partielle: la fin du fichier doit rester à self.records
+                    f.truncate(self.records * RECORD_SIZE)
+                    raise
+
+            # Données sur disque: l'index peut les référencer
+            self.devices.setdefault(device_id, device)
+            for user_id, user in new_users.items():
+                self.users.append(user_id)
+                self.user_codes[user_id] = user
+            days = self.extents.setdefault(device_id, {})
+            for key, extent in new_extents:
+                days.setdefault(key, []).append(extent)
+            added = position - self.records
+            self.records = position
+            self._write_index()
+            self._remap()
+            return added, ignored
+
+    # -------------------------------------------------------------------------
+    # Lecture
+    # -------------------------------------------------------------------------
+    def extents_between(self, device_id, start, end):
+        """
+        memoryview (sans copie) des pointages du terminal entre start et end
+        inclus: un par extent, chacun trié par horodatage.
+        """
+        with self.lock:
+            days = self.extents.get(device_id, {})
+            first, last = to_seconds(start), to_seconds(end)
+            views = []
+            for day in range(first // SECONDS_PER_DAY, last // SECONDS_PER_DAY + 1):
+                for position, count in days.get(str(day), ()):
+                    view = self._view(position, count)
+                    # Premier et dernier jour: bornes horaires par dichotomie
+                    low = self._lower_bound(view, first)
+                    high = self._lower_bound(view, last + 1)
+                    if high > low:
+                        views.append(view[low * RECORD_SIZE:high * RECORD_SIZE])
+            return views
+
+    def records_between(self, device_id, start, end):
+        """Tuples (terminal, code matricule, secondes, state, verify mode) triés par horodatage"""
+        records = [record for view in self.extents_between(device_id, start, end)
+                   for record in RECORD.iter_unpack(view)]
+        records.sort(key=lambda record: record[2])
+        return records
+
+    def attendances(self, device_id, start, end):
+        """Pointages au format pyzk (comme conn.get_attendance()), triés par horodatage"""
+        users = self.users
+        return [Attendance(users[user], from_seconds(seconds), state, verify_mode, user)
+                for _, user, seconds, state, verify_mode in self.records_between(device_id, start, end)]
+
+    def summary(self):
+        """{device_id: (premier jour, dernier jour, pointages)}"""
+        with self.lock:
+            result = {}
+            for device_id, days in self.extents.items():
+                if days:
+                    ordered = sorted(int(day) for day in days)
+                    count = sum(c for extents in days.values() for _, c in extents)
+                    result[device_id] = (from_seconds(ordered[0] * SECONDS_PER_DAY).date(),
+                                         from_seconds(ordered[-1] * SECONDS_PER_DAY).date(), count)
+            return result
+
+    # -------------------------------------------------------------------------
+    # Interne
+    # -------------------------------------------------------------------------
+    def _view(self, position, count):
+        return memoryview(self.map)[position * RECORD_SIZE:(position + count) * RECORD_SIZE]
+
+    def _iter_day(self, extents):
+        for position, count in extents:
+            yield from RECORD.iter_unpack(self._view(position, count))
+
+    @staticmethod
+    def _lower_bound(view, seconds):
+        """Premier enregistrement de view (trié) d'horodatage >= seconds"""
+        low, high = 0, len(view) // RECORD_SIZE
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('<q', view, middle * RECORD_SIZE + TIMESTAMP_OFFSET)[0] < seconds:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _remap(self):
+        # L'ancien mmap reste valide tant que des vues le référencent
+        if self.records:
+            with open(self.data_path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), self.records * RECORD_SIZE, access=mmap.ACCESS_READ)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {"devices": {}, "users": [], "extents": {}, "records": 0}
+        if data.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Archive {self.directory} au format {data.get('format', 1)} (attendu: {INDEX_FORMAT}): "
+                             "la supprimer puis la reconstruire (sync_terminals.py --archive)")
+        return {"devices": data["devices"], "users": data["users"], "extents": data["extents"],
+                "records": int(data["records"])}
+
+    def _write_index(self):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"format": INDEX_FORMAT, "devices": self.devices, "users": self.users,
+                       "extents": self.extents, "records": self.records}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+
+# =============================================================================
+# LIGNE DE COMMANDE
+# =============================================================================
+def export_csv(archive, device_id, start, end, path):
+    """Export au format de sync_terminals.py --dump (entrée de analyse_pointages.py)"""
+    records = archive.records_between(device_id, start, end)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("device_id", "user_id", "timestamp", "state", "verify_mode"))
+        writer.writerows((device_id, archive.users[user], from_seconds(seconds).strftime("%Y-%m-%d %H:%M:%S"),
+                          state, verify_mode)
+                         for _, user, seconds, state, verify_mode in records)
+    return len(records)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Archive locale des pointages bruts des terminaux")
+    parser.add_argument("--dir", default=str(ARCHIVE_DIR), help=f"Répertoire de l'archive (défaut: {ARCHIVE_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("info", help="Terminaux archivés, période couverte et volume")
+    export = commands.add_parser("export", help="Export CSV d'une période pour un terminal")
+    export.add_argument("device_id")
+    export.add_argument("--since", required=True, type=lambda value: datetime.strptime(value, "%Y-%m-%d"))
+    export.add_argument("--until", required=True, type=lambda value: datetime.strptime(value, "%Y-%m-%d"))
+    export.add_argument("--out", required=True)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    archive = PunchArchive(args.dir)
+
+    if args.command == "info":
+        summary = archive.summary()
+        print(f"🗄️ Archive: {archive.directory} ({len(archive)} pointages, "
+              f"{len(archive) * RECORD_SIZE / 1024 / 1024:.1f} Mo)")
+        for device_id, (first, last, count) in sorted(summary.items()):
+            print(f"   📟 {device_id}: {count} pointages du {first.strftime('%d/%m/%Y')} au {last.strftime('%d/%m/%Y')}")
+        return
+
+    end = args.until.replace(hour=23, minute=59, second=59)
+    count = export_csv(archive, args.device_id, args.since, end, args.out)
+    print(f"💾 {count} pointages exportés: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
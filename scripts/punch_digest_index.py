@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Index local des pointages déjà acquittés par le backend
+
+Chaque pointage est réduit à une empreinte de 8 octets (blake2b de
+device_id|user_id|timestamp|state). Les empreintes sont:
+- en mémoire: un tableau trié (8 octets par pointage, recherche par
+  dichotomie) + un petit ensemble des ajouts récents, fusionné périodiquement;
+- sur disque: un fichier binaire en ajout seul (8 octets par pointage),
+  compacté (trié, sans doublons) au chargement si nécessaire. Seuls les
+  ajouts postérieurs au dernier compactage sont triés, par blocs de
+  LOAD_CHUNK, puis fusionnés avec la partie déjà triée.
+
+Quelques millions de pointages tiennent en quelques dizaines de Mo. Une
+collision d'empreinte 64 bits (pointage nouveau pris pour un pointage connu)
+a une probabilité négligeable, sans les faux positifs d'un filtre de Bloom.
+"""
+
+import operator
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from heapq import merge
+from itertools import islice
+from pathlib import Path
+
+DIGEST_SIZE = 8
+MERGE_THRESHOLD = 65536  # Ajouts récents fusionnés dans le tableau trié au-delà de ce nombre
+LOAD_CHUNK = 65536  # Empreintes converties en entiers Python à la fois au chargement
+
+
+def punch_digest(device_id, user_id, timestamp, state):
+    """Empreinte 64 bits d'un pointage"""
+    key = f"{device_id}|{user_id}|{timestamp.strftime('%Y-%m-%dT%H:%M:%S')}|{state}"
+    return int.from_bytes(blake2b(key.encode("utf-8"), digest_size=DIGEST_SIZE).digest(), "little")
+
+
+def attendance_digest(device_id, attendance):
+    return punch_digest(device_id, attendance.user_id, attendance.timestamp, getattr(attendance, 'status', 0))
+
+
+def sorted_prefix(data):
+    """Longueur du début strictement croissant de data (partie compactée du fichier)"""
+    previous = -1
+    for start in range(0, len(data), LOAD_CHUNK):
+        chunk = data[start:start + LOAD_CHUNK].tolist()
+        if chunk[0] > previous and all(map(operator.lt, chunk, islice(chunk, 1, None))):
+            previous = chunk[-1]
+            continue
+        for offset, digest in enumerate(chunk):
+            if digest <= previous:
+                return start + offset
+            previous = digest
+    return len(data)
+
+
+class PunchDigestIndex:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.sorted = array('Q')
+        self.recent = set()
+        self.pending = array('Q')
+        self.load()
+
+    def load(self):
+        data = array('Q')
+        truncated = False
+        try:
+            with open(self.path, "rb") as f:
+                # Dernière empreinte incomplète (écriture interrompue): ignorée
+                size = os.fstat(f.fileno()).st_size
+                truncated = size % DIGEST_SIZE != 0
+                data.fromfile(f, size // DIGEST_SIZE)
+            if sys.byteorder != "little":
+                data.byteswap()
+        except FileNotFoundError:
+            pass
+
+        self.recent = set()
+        prefix = sorted_prefix(data)
+        if prefix == len(data):
+            self.sorted = data
+            if truncated:
+                self._rewrite()  # Les prochains ajouts restent alignés sur DIGEST_SIZE
+            return
+
+        # Ajouts depuis le dernier compactage: triés par blocs, puis insérés dans
+        # le début trié (recopié par tranches entre deux insertions)
+        runs = [array('Q', sorted(data[start:start + LOAD_CHUNK].tolist()))
+                for start in range(prefix, len(data), LOAD_CHUNK)]
+        unique = array('Q')
+        copied = 0
+        previous = None
+        for digest in merge(*runs):
+            if digest == previous:
+                continue
+            previous = digest
+            index = bisect_left(data, digest, copied, prefix)
+            unique += data[copied:index]
+            copied = index
+            if index == prefix or data[index] != digest:
+                unique.append(digest)
+        unique += data[copied:prefix]
+        self.sorted = unique
+        self._rewrite()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.sorted) + len(self.recent)
+
+    def __contains__(self, digest):
+        with self.lock:
+            return self._contains(digest)
+
+    def add(self, digest):
+        with self.lock:
+            if self._contains(digest):
+                return
+            self.recent.add(digest)
+            self.pending.append(digest)
+            if len(self.recent) >= MERGE_THRESHOLD:
+                self._merge_recent()
+
+    def flush(self):
+        """Ajoute les nouvelles empreintes au fichier (un seul fsync)"""
+        with self.lock:
+            if not self.pending:
+                return
+            pending = self.pending
+            self.pending = array('Q')
+            if sys.byteorder != "little":
+                pending.byteswap()
+            with open(self.path, "ab") as f:
+                f.write(pending.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    # -------------------------------------------------------------------------
+    # Interne
+    # -------------------------------------------------------------------------
+    def _contains(self, digest):
+        if digest in self.recent:
+            return True
+        index = bisect_left(self.sorted, digest)
+        return index < len(self.sorted) and self.sorted[index] == digest
+
+    def _merge_recent(self):
+        self.sorted = array('Q', merge(self.sorted, sorted(self.recent)))
+        self.recent = set()
+
+    def _rewrite(self):
+        """Réécrit le fichier compacté (trié, sans doublons) de manière atomique"""
+        data = array('Q', self.sorted)
+        if sys.byteorder != "little":
+            data.byteswap()
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Répartiteur des envois par employé: parallélisme sans réordonnancement
+
+L'anti-rebond et la logique IN/OUT du backend (processTerminalPunch) exigent
+que les pointages d'un employé arrivent dans l'ordre chronologique. Le
+répartiteur hashe la clé de chaque pointage (employeeId, crc32: stable d'un
+processus à l'autre) sur N voies; chaque voie est un thread qui envoie ses
+pointages dans l'ordre de soumission. Des employés différents partent en
+parallèle, ceux d'un même employé jamais.
+
+- submit(item): envoi asynchrone, retourne un Future (True si accepté);
+- dispatch(items): envoie une liste et attend les résultats, dans l'ordre des
+  items. Par défaut une voie en échec n'envoie plus rien du lot (les
+  pointages suivants de ses employés ne doivent pas doubler celui en échec);
+- stats(): profondeur et occupation de chaque voie, déséquilibre entre voies
+  (skew: charge de la voie la plus chargée / charge moyenne, 1.0 = équilibré)
+  et clés ayant le plus de pointages en attente (employé qui monopolise sa
+  voie). Une clé est oubliée dès que son dernier pointage est traité: la
+  mémoire reste bornée par le nombre de pointages en attente.
+
+    dispatcher = PunchDispatcher(post_item, lanes=8)
+    results = dispatcher.dispatch(items)
+"""
+
+import queue
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import Future
+
+DISPATCH_LANES = 8
+HOT_KEYS = 5  # Clés ayant le plus de pointages en attente, rapportées par stats()
+
+
+def employee_key(item):
+    return str(item.get("employeeId"))
+
+
+class _Batch:
+    """Lot de dispatch(): voies en échec (leurs pointages suivants ne partent pas)"""
+
+    def __init__(self, stop_on_failure):
+        self.stop_on_failure = stop_on_failure
+        self.failed_lanes = set()
+
+
+class PunchDispatcher:
+    """deliver(item) -> bool; key(item) -> clé d'ordonnancement (l'employé)"""
+
+    def __init__(self, deliver, lanes=DISPATCH_LANES, key=employee_key, name="dispatch", log=print):
+        self.deliver = deliver
+        self.key = key
+        self.log = log
+        self.lanes = lanes
+        self.lock = threading.Lock()
+        self.queues = [queue.SimpleQueue() for _ in range(lanes)]
+        self.depth = [0] * lanes  # Pointages en attente ou en cours par voie
+        self.submitted = [0] * lanes
+        self.delivered = [0] * lanes
+        self.busy_seconds = [0.0] * lanes
+        self.key_counts = Counter()  # Pointages en attente ou en cours par clé (clé supprimée à zéro)
+        self.started = time.monotonic()
+        self.threads = [
+            threading.Thread(target=self._lane_loop, args=(lane,), name=f"{name}-lane-{lane}", daemon=True)
+            for lane in range(lanes)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def lane_of(self, item):
+        return self._lane(self.key(item))
+
+    def submit(self, item):
+        """Envoi asynchrone dans la voie de l'employé; Future résolu à True si accepté"""
+        return self._enqueue(item, None)
+
+    def dispatch(self, items, stop_on_failure=True):
+        """Envoie les items (ordre conservé par employé) et retourne leurs résultats, dans l'ordre"""
+        batch = _Batch(stop_on_failure)
+        futures = [self._enqueue(item, batch) for item in items]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Arrête les voies une fois les envois en cours terminés"""
+        for lane_queue in self.queues:
+            lane_queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def stats(self):
+        with self.lock:
+            submitted = list(self.submitted)
+            lanes = [
+                {"lane": lane, "depth": self.depth[lane], "delivered": self.delivered[lane],
+                 "busy_seconds": round(self.busy_seconds[lane], 3)}
+                for lane in range(self.lanes)
+            ]
+            hot_keys = self.key_counts.most_common(HOT_KEYS)
+        uptime = max(time.monotonic() - self.started, 1e-9)
+        for entry in lanes:
+            entry["busy_ratio"] = round(entry["busy_seconds"] / uptime, 3)
+        mean = sum(submitted) / self.lanes
+        return {
+            "lanes": lanes,
+            "skew": round(max(submitted) / mean, 2) if mean else 1.0,
+            "hot_keys": hot_keys,
+        }
+
+    # -------------------------------------------------------------------------
+    # Interne
+    # -------------------------------------------------------------------------
+    def _lane(self, key):
+        return zlib.crc32(key.encode("utf-8")) % self.lanes
+
+    def _enqueue(self, item, batch):
+        key = self.key(item)
+        lane = self._lane(key)
+        future = Future()
+        with self.lock:
+            self.depth[lane] += 1
+            self.submitted[lane] += 1
+            self.key_counts[key] += 1
+        self.queues[lane].put((key, item, batch, future))
+        return future
+
+    def _lane_loop(self, lane):
+        lane_queue = self.queues[lane]
+        while True:
+            task = lane_queue.get()
+            if task is None:
+                return
+            key, item, batch, future = task
+            if batch is not None and batch.stop_on_failure and lane in batch.failed_lanes:
+                ok, elapsed = False, 0.0
+            else:
+                started = time.perf_counter()
+                try:
+                    ok = bool(self.deliver(item))
+                except Exception as e:
+                    self.log(f"⚠️  Envoi (voie {lane}): {e}")
+                    ok = False
+                elapsed = time.perf_counter() - started
+                if not ok and batch is not None:
+                    batch.failed_lanes.add(lane)
+            with self.lock:
+                self.depth[lane] -= 1
+                self.key_counts[key] -= 1
+                if not self.key_counts[key]:
+                    del self.key_counts[key]
+                self.busy_seconds[lane] += elapsed
+                if ok:
+                    self.delivered[lane] += 1
+            future.set_result(ok)
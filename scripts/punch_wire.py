@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Format binaire compact des lots de pointages (agents → backend)
+
+En JSON, chaque pointage d'un lot répète ses clés, un horodatage ISO de 24
+caractères et des énumérations en toutes lettres (~130 octets), que le backend
+reparse et revalide champ par champ. Pour l'import en masse
+(POST /attendance/webhook/state/bulk), les agents peuvent envoyer le lot en
+enregistrements de taille fixe dans une enveloppe gzip:
+
+    Content-Type: application/vnd.pointaflex.punches
+    Content-Encoding: gzip
+
+Corps décompressé (petit-boutiste):
+- en-tête: MAGIC (4 octets, version incluse), nombre de pointages (u32),
+  nombre de matricules (u32);
+- table des matricules: longueur (u8) + UTF-8, une fois par employé du lot
+  (les zéros de tête des matricules sont conservés);
+- un enregistrement de RECORD.size (16) octets par pointage: index du
+  matricule (u32), horodatage en secondes depuis l'epoch (i64, même valeur
+  que le suffixe Z du JSON), terminalState (u8), type (u8, index de TYPES),
+  méthode (u8, index de METHODS, NO_METHOD si absente), réservé (u8).
+
+Négociation: le backend annonce le format dans l'en-tête Accept-Post de ses
+réponses bulk (accepts_binary). Un agent commence en JSON et passe au
+binaire dès que le backend l'a annoncé; un backend plus ancien continue de
+recevoir du JSON. Le décodeur de référence côté backend est
+backend/src/modules/attendance/punch-wire.ts.
+
+    wire = WireFormat("auto")
+    kwargs, wire_headers = wire.request([build_payload(a) for a in attendances])
+    response = http_session.post(BULK_URL, headers={**headers, **wire_headers}, **kwargs)
+    wire.negotiate(response)
+"""
+
+import calendar
+import functools
+import gzip
+import struct
+import time
+from datetime import datetime, timezone
+
+CONTENT_TYPE = "application/vnd.pointaflex.punches"
+WIRE_HEADERS = {"Content-Type": CONTENT_TYPE, "Content-Encoding": "gzip"}
+MAGIC = b"PFP\x01"
+HEADER = struct.Struct("<4sII")
+RECORD = struct.Struct("<IqBBBx")
+COMPRESS_LEVEL = 6  # Niveau gzip: au-delà, quelques % gagnés pour un coût CPU double
+
+# Mêmes ordres que les énumérations Prisma AttendanceType et DeviceType (ne pas réordonner)
+TYPES = ("IN", "OUT")
+METHODS = ("FINGERPRINT", "FACE_RECOGNITION", "RFID_BADGE", "QR_CODE", "PIN_CODE", "MOBILE_GPS", "MANUAL")
+NO_METHOD = 255
+
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+METHOD_CODES = {name: code for code, name in enumerate(METHODS)}
+
+
+def accepts_binary(response):
+    """Le backend a-t-il annoncé le format binaire (en-tête Accept-Post)?"""
+    return CONTENT_TYPE in response.headers.get("Accept-Post", "")
+
+
+class WireFormat:
+    """
+    Format des lots négocié avec le backend (partagé par les threads d'envoi).
+    mode "auto": JSON jusqu'à l'annonce du backend, binaire ensuite (retour
+    au JSON sur 415); "binary" ou "json": format imposé.
+    """
+
+    MODES = ("auto", "binary", "json")
+
+    def __init__(self, mode="auto"):
+        self.set_mode(mode)
+
+    def set_mode(self, mode):
+        if mode not in self.MODES:
+            raise ValueError(f"Format de lot inconnu: {mode}")
+        self.mode = mode
+        self.binary = mode == "binary"
+
+    def request(self, punches):
+        """Arguments de requests.post pour le lot: (data ou json, en-têtes propres au format)"""
+        if self.binary:
+            return {"data": encode_punches(punches)}, WIRE_HEADERS
+        return {"json": {"punches": punches}}, {"Content-Type": "application/json"}
+
+    def negotiate(self, response):
+        """Met à jour le format après une réponse bulk; True si le lot doit être renvoyé en JSON"""
+        if self.mode != "auto":
+            return False
+        if self.binary and response.status_code == 415:
+            self.binary = False  # Backend revenu à une version sans le format binaire
+            return True
+        if not self.binary and accepts_binary(response):
+            self.binary = True
+        return False
+
+
+@functools.lru_cache(maxsize=4096)
+def _day_seconds(day):
+    return calendar.timegm(time.strptime(day, "%Y-%m-%d"))
+
+
+def epoch_seconds(timestamp):
+    """Horodatage du payload (ISO avec suffixe Z, ou datetime naïf) → secondes, sans conversion de fuseau"""
+    if isinstance(timestamp, str):
+        # "AAAA-MM-JJTHH:MM:SS...": découpage direct, le jour est mis en cache (lots triés par date)
+        return (_day_seconds(timestamp[:10]) + int(timestamp[11:13]) * 3600
+                + int(timestamp[14:16]) * 60 + int(timestamp[17:19]))
+    return calendar.timegm(timestamp.timetuple())
+
+
+def encode_punches(punches, compresslevel=COMPRESS_LEVEL):
+    """Pointages au format du webhook state (build_payload) → corps gzip du lot"""
+    strings = {}
+    records = bytearray(RECORD.size * len(punches))
+    for index, punch in enumerate(punches):
+        employee_id = str(punch["employeeId"])
+        string_index = strings.setdefault(employee_id, len(strings))
+        method = punch.get("method")
+        RECORD.pack_into(
+            records, index * RECORD.size,
+            string_index,
+            epoch_seconds(punch["timestamp"]),
+            punch["terminalState"],
+            TYPE_CODES[punch["type"]],
+            NO_METHOD if method is None else METHOD_CODES[method],
+        )
+
+    body = bytearray(HEADER.pack(MAGIC, len(punches), len(strings)))
+    for employee_id in strings:
+        encoded = employee_id.encode("utf-8")
+        if len(encoded) > 255:
+            raise ValueError(f"Matricule trop long pour le format binaire: {employee_id[:20]}...")
+        body.append(len(encoded))
+        body += encoded
+    body += records
+    return gzip.compress(bytes(body), compresslevel=compresslevel)
+
+
+def decode_punches(body):
+    """Corps gzip d'un lot → pointages au format du webhook state (backend factice, tests)"""
+    data = gzip.decompress(body)
+    magic, count, string_count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Format de lot inconnu: {magic!r}")
+    offset = HEADER.size
+    strings = []
+    for _ in range(string_count):
+        length = data[offset]
+        strings.append(data[offset + 1:offset + 1 + length].decode("utf-8"))
+        offset += 1 + length
+    if len(data) - offset != count * RECORD.size:
+        raise ValueError("Lot tronqué ou corrompu")
+
+    punches = []
+    for string_index, seconds, state, type_code, method_code in RECORD.iter_unpack(data[offset:]):
+        punch = {
+            "employeeId": strings[string_index],
+            "timestamp": datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "type": TYPES[type_code],
+            "terminalState": state,
+        }
+        if method_code != NO_METHOD:
+            punch["method"] = METHODS[method_code]
+        punches.append(punch)
+    return punches
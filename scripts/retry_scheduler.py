@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Ordonnanceur de nouvelles tentatives (tas de minuteries)
+
+Un envoi en échec n'est plus retenté par time.sleep() dans la boucle de
+polling: il est « garé » avec l'heure de sa prochaine tentative (backoff
+exponentiel) et la boucle continue de lire et d'envoyer les nouveaux
+pointages. À chaque tour, due() rend les envois dont l'heure est passée
+(tas trié par échéance: O(log n) par envoi garé).
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class RetryScheduler:
+    def __init__(self, base_delay=2, max_retries=5, max_delay=300):
+        self.base_delay = base_delay
+        self.max_retries = max_retries
+        self.max_delay = max_delay
+        self.heap = []
+        self.sequence = itertools.count()  # Départage les échéances égales (ordre d'arrivée)
+        self.lock = threading.Lock()
+
+    def park(self, item, attempt=1, now=None):
+        """
+        Gare un envoi après son échec numéro attempt.
+        Retourne False si le nombre maximal de tentatives est atteint (non garé).
+        """
+        if attempt >= self.max_retries:
+            return False
+        delay = min(self.base_delay * (2 ** (attempt - 1)), self.max_delay)  # 2, 4, 8, 16...
+        due_at = (now if now is not None else time.monotonic()) + delay
+        with self.lock:
+            heapq.heappush(self.heap, (due_at, next(self.sequence), attempt, item))
+        return True
+
+    def due(self, now=None):
+        """Retire et retourne [(item, attempt), ...] dont l'échéance est passée"""
+        now = now if now is not None else time.monotonic()
+        ready = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, _, attempt, item = heapq.heappop(self.heap)
+                ready.append((item, attempt))
+        return ready
+
+    def seconds_until_next(self, now=None):
+        """Délai avant la prochaine échéance (None si rien n'est garé)"""
+        with self.lock:
+            if not self.heap:
+                return None
+            return max(0.0, self.heap[0][0] - (now if now is not None else time.monotonic()))
+
+    def pending(self):
+        """Envois garés, sans les retirer"""
+        with self.lock:
+            return [entry[3] for entry in self.heap]
+
+    def drain(self):
+        """Retire et retourne tous les envois garés (ordre d'échéance)"""
+        with self.lock:
+            entries = sorted(self.heap)
+            self.heap = []
+        return [entry[3] for entry in entries]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.heap)
@@ -0,0 +1,20 @@
+"""
+Simulateur de pointeuses pour les tests de bout en bout hors site
+
+- zk_device: terminal ZKTeco émulé (TCP 4370) pour les bridges pyzk
+  (zkteco_bridge.py, zkteco_terminal_improved.py, sync_terminals.py...);
+- adms_client: terminal ADMS qui pousse des frames 0x0011/0x0012 vers adms_listener.py;
+- stub_backend: backend factice qui enregistre l'arrivée des pointages
+  (débit, latence de bout en bout, doublons);
+- profiles: profils de charge (effectif, débit, pics de changement d'équipe).
+
+Depuis scripts/:
+    python -m simulator backend --port 3000
+    python -m simulator zk --port 4370 --employees 300 --history 5000 --profile shift_change
+    python -m simulator adms --port 8081 --employees 300 --profile spike
+"""
+
+from .adms_client import ADMSClient
+from .profiles import Burst, LoadProfile, PROFILES, build_profile, history, paced
+from .stub_backend import StubBackend
+from .zk_device import SimulatedDevice, ZKDeviceServer
@@ -0,0 +1,146 @@
+"""
+Point d'entrée du simulateur (python -m simulator <commande>)
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from .adms_client import ADMSClient
+from .profiles import PROFILES, build_profile, history, paced
+from .stub_backend import StubBackend
+from .zk_device import SimulatedDevice, ZKDeviceServer
+
+
+def add_load_arguments(parser):
+    parser.add_argument("--employees", type=int, default=200, help="Effectif simulé (défaut: 200)")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="steady",
+                        help="Profil de charge (défaut: steady)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Débit de fond en pointages/minute (remplace celui du profil)")
+    parser.add_argument("--duration", type=float, default=None, help="Durée en secondes (défaut: sans fin)")
+    parser.add_argument("--seed", type=int, default=None, help="Graine aléatoire (charge reproductible)")
+
+
+def run_zk(args):
+    device = SimulatedDevice(employees=args.employees, name=args.name)
+    for timestamp, user_id, state in history(args.employees, args.history, seed=args.seed):
+        device.add_punch(user_id, timestamp, state)
+
+    server = ZKDeviceServer(device, args.host, args.port)
+    server.start()
+    print(f"📟 Terminal simulé {args.name} sur {args.host}:{args.port}")
+    print(f"👥 {args.employees} employés, 📊 {args.history} pointages en historique, profil: {args.profile}")
+
+    profile = build_profile(args.profile, args.employees, args.duration, args.seed, args.rate)
+    count = 0
+    try:
+        for timestamp, user_id, state in paced(profile.events()):
+            device.add_punch(user_id, timestamp, state)
+            count += 1
+            if count % 100 == 0:
+                print(f"📥 {count} pointages générés ({len(device.records)} dans le journal)")
+        print(f"✅ Profil terminé: {count} pointages générés")
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n🛑 Arrêt: {count} pointages générés")
+    finally:
+        server.shutdown()
+
+
+def run_adms(args):
+    profile = build_profile(args.profile, args.employees, args.duration, args.seed, args.rate)
+    with ADMSClient(args.host, args.port) as client:
+        print(f"📡 Client ADMS connecté à {args.host}:{args.port}")
+        if args.stored:
+            records = [(user_id, timestamp, state, 1)
+                       for timestamp, user_id, state in history(args.employees, args.stored, seed=args.seed)]
+            acked = client.send_stored(records, args.batch)
+            print(f"📦 {acked}/{len(records)} pointages stockés acquittés (0x0012)")
+
+        count = 0
+        try:
+            for timestamp, user_id, state in paced(profile.events()):
+                client.send_realtime(user_id, timestamp, state)
+                count += 1
+                if count % 100 == 0:
+                    print(f"📥 {count} pointages envoyés (non acquittés: {client.frames_unacked})")
+        except KeyboardInterrupt:
+            pass
+
+        latencies = sorted(client.ack_latencies)
+        print(f"\n📊 {client.frames_sent} frames, {client.frames_unacked} sans ACK")
+        if latencies:
+            print(f"⏱️  ACK p50: {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                  f"p99: {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+
+
+def run_backend(args):
+    backend = StubBackend(args.host, args.port, delay=args.delay, error_rate=args.error_rate, seed=args.seed)
+    backend.start()
+    print(f"🧪 Backend factice sur http://{args.host}:{args.port} (rapport: GET /stats)")
+
+    def write_report():
+        report = backend.report()
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+        return report
+
+    try:
+        while True:
+            time.sleep(args.report_interval)
+            report = write_report()
+            latency = report["latency_s"]
+            p95 = f"{latency['p95']:.2f}s" if latency["p95"] is not None else "-"
+            print(f"📊 {report['punches']} pointages, {report['duplicates']} doublons, "
+                  f"débit: {report['throughput_per_s'] or '-'} /s, latence p95: {p95}")
+    except KeyboardInterrupt:
+        print("\n" + json.dumps(write_report(), indent=2))
+    finally:
+        backend.shutdown()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulator",
+                                     description="Simulateur de pointeuses et backend factice")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    zk = commands.add_parser("zk", help="Terminal ZKTeco émulé (TCP)")
+    zk.add_argument("--host", default="0.0.0.0")
+    zk.add_argument("--port", type=int, default=4370)
+    zk.add_argument("--name", default="PointaFlex-SIM", help="Nom du terminal (~DeviceName)")
+    zk.add_argument("--history", type=int, default=0, help="Pointages déjà présents dans le journal")
+    add_load_arguments(zk)
+    zk.set_defaults(run=run_zk)
+
+    adms = commands.add_parser("adms", help="Terminal ADMS (pousse vers adms_listener.py)")
+    adms.add_argument("--host", default="127.0.0.1")
+    adms.add_argument("--port", type=int, default=8081)
+    adms.add_argument("--stored", type=int, default=0, help="Pointages stockés envoyés d'abord (0x0012)")
+    adms.add_argument("--batch", type=int, default=100, help="Pointages par frame 0x0012")
+    add_load_arguments(adms)
+    adms.set_defaults(run=run_adms)
+
+    backend = commands.add_parser("backend", help="Backend factice (mesure débit et latence)")
+    backend.add_argument("--host", default="127.0.0.1")
+    backend.add_argument("--port", type=int, default=3000)
+    backend.add_argument("--delay", type=float, default=0.0, help="Délai de réponse en secondes")
+    backend.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses 503 (0-1)")
+    backend.add_argument("--seed", type=int, default=None)
+    backend.add_argument("--report", default=None, help="Fichier JSON du rapport (réécrit périodiquement)")
+    backend.add_argument("--report-interval", type=float, default=10.0)
+    backend.set_defaults(run=run_backend)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
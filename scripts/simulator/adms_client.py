@@ -0,0 +1,87 @@
+"""
+Client ADMS simulé: pousse des frames de pointages vers ADMSListener
+
+Même format binaire que le terminal IN01 (voir adms_listener.py):
+en-tête magic 0x50 0x50, commande (0x0011 temps réel, 0x0012 pointages
+stockés), longueur du payload, puis N enregistrements de 10 octets. Le
+client attend l'ACK de chaque frame (le listener n'acquitte qu'une fois les
+pointages écrits dans sa queue durable) et mesure ce délai.
+"""
+
+import socket
+import struct
+import time
+
+ADMS_MAGIC = b'\x50\x50'
+ADMS_HEADER = struct.Struct('<2sHI')
+ADMS_RECORD = struct.Struct('<IIBB')
+ADMS_REALTIME = 0x0011
+ADMS_STORED = 0x0012
+ACK_SIZE = 12
+
+
+def build_frame(command, records):
+    """records: [(user_id, datetime, state, verify_mode), ...]"""
+    payload = b"".join(
+        ADMS_RECORD.pack(int(user_id), int(timestamp.timestamp()), state, verify_mode)
+        for user_id, timestamp, state, verify_mode in records
+    )
+    return ADMS_HEADER.pack(ADMS_MAGIC, command, len(payload)) + payload
+
+
+class ADMSClient:
+    def __init__(self, host="127.0.0.1", port=8081, timeout=10):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.sock = None
+        self.ack_latencies = []
+        self.frames_sent = 0
+        self.frames_unacked = 0
+
+    def connect(self):
+        self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def send_frame(self, command, records):
+        """Envoie un frame et attend son ACK; retourne True si acquitté"""
+        started = time.perf_counter()
+        self.sock.sendall(build_frame(command, records))
+        self.frames_sent += 1
+        ack = b""
+        try:
+            while len(ack) < ACK_SIZE:
+                chunk = self.sock.recv(ACK_SIZE - len(ack))
+                if not chunk:
+                    break
+                ack += chunk
+        except socket.timeout:
+            pass
+        if len(ack) < ACK_SIZE or not ack.startswith(ADMS_MAGIC):
+            self.frames_unacked += 1
+            return False
+        self.ack_latencies.append(time.perf_counter() - started)
+        return True
+
+    def send_realtime(self, user_id, timestamp, state=0, verify_mode=1):
+        return self.send_frame(ADMS_REALTIME, [(user_id, timestamp, state, verify_mode)])
+
+    def send_stored(self, records, batch_size=100):
+        """Pointages stockés (rattrapage après coupure), par frames de batch_size"""
+        acked = 0
+        for i in range(0, len(records), batch_size):
+            batch = records[i:i + batch_size]
+            if self.send_frame(ADMS_STORED, batch):
+                acked += len(batch)
+        return acked
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
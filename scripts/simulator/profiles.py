@@ -0,0 +1,118 @@
+"""
+Profils de charge: quand et qui pointe
+
+Les pointages suivent un processus de Poisson dont le débit (pointages par
+minute) est la somme d'un débit de fond et des pics actifs (changement
+d'équipe...). Chaque employé alterne entrée (state 0) et sortie (state 1).
+Avec une graine (seed), la séquence est reproductible d'une exécution à l'autre.
+"""
+
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+
+@dataclass
+class Burst:
+    """Pic de pointages: rate pointages/minute en plus du fond, de start à start + duration (secondes)"""
+    start: float
+    duration: float
+    rate: float
+
+
+@dataclass
+class LoadProfile:
+    employees: int = 200
+    rate: float = 10.0  # Débit de fond, pointages par minute
+    bursts: list = field(default_factory=list)
+    duration: float = None  # Secondes (None = sans fin)
+    seed: int = None
+
+    def rate_at(self, offset):
+        return self.rate + sum(b.rate for b in self.bursts if b.start <= offset < b.start + b.duration)
+
+    def events(self):
+        """
+        Génère (offset en secondes, user_id, state) dans l'ordre chronologique
+        (méthode d'amincissement: tirages au débit maximal, acceptés au prorata
+        du débit courant).
+        """
+        rng = random.Random(self.seed)
+        peak = self.rate + sum(b.rate for b in self.bursts)
+        if peak <= 0 or self.employees <= 0:
+            return
+        states = {}
+        offset = 0.0
+        while True:
+            offset += rng.expovariate(peak / 60.0)
+            if self.duration is not None and offset >= self.duration:
+                return
+            if rng.random() * peak > self.rate_at(offset):
+                continue
+            user_id = rng.randint(1, self.employees)
+            state = states.get(user_id, 1) ^ 1  # Premier pointage: entrée
+            states[user_id] = state
+            yield offset, user_id, state
+
+
+def shift_change_profile(employees, duration=None, seed=None):
+    """90% de l'effectif pointe en 5 minutes, 30 secondes après le démarrage"""
+    return LoadProfile(employees=employees, rate=employees / 60.0,
+                       bursts=[Burst(30, 300, employees * 0.9 / 5)], duration=duration, seed=seed)
+
+
+def steady_profile(employees, duration=None, seed=None):
+    """Chaque employé pointe en moyenne une fois par heure"""
+    return LoadProfile(employees=employees, rate=employees / 60.0, duration=duration, seed=seed)
+
+
+def spike_profile(employees, duration=None, seed=None):
+    """Tout l'effectif en une minute (pire cas: arrivée d'un car de ramassage)"""
+    return LoadProfile(employees=employees, rate=employees / 60.0,
+                       bursts=[Burst(10, 60, float(employees))], duration=duration, seed=seed)
+
+
+PROFILES = {
+    "steady": steady_profile,
+    "shift_change": shift_change_profile,
+    "spike": spike_profile,
+}
+
+
+def build_profile(name, employees, duration=None, seed=None, rate=None):
+    profile = PROFILES[name](employees, duration=duration, seed=seed)
+    if rate is not None:
+        profile.rate = rate
+    return profile
+
+
+def paced(events, start=None):
+    """
+    Rejoue les événements en temps réel. Chaque pointage est émis au début de
+    sa seconde et horodaté de cette seconde: l'horodatage du terminal (résolution
+    d'une seconde) est donc exactement l'instant d'émission, et la latence de
+    bout en bout se mesure à l'arrivée par heure_arrivée - horodatage.
+    Génère (datetime, user_id, state).
+    """
+    start = math.ceil(time.time()) if start is None else start
+    for offset, user_id, state in events:
+        due = start + math.floor(offset)
+        delay = due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        yield datetime.fromtimestamp(due), user_id, state
+
+
+def history(employees, count, days=7, seed=None):
+    """Journal déjà présent dans le terminal: count pointages répartis sur les derniers jours"""
+    rng = random.Random(seed)
+    now = math.floor(time.time())
+    stamps = sorted(rng.randint(now - days * 86400, now - 60) for _ in range(count))
+    states = {}
+    for stamp in stamps:
+        user_id = rng.randint(1, employees)
+        state = states.get(user_id, 1) ^ 1
+        states[user_id] = state
+        yield datetime.fromtimestamp(stamp), user_id, state
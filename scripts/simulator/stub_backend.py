@@ -0,0 +1,173 @@
+"""
+Backend factice: enregistre l'arrivée de chaque pointage
+
+Accepte les mêmes requêtes que l'API PointaFlex utilisée par les agents
+(POST /api/v1/attendance/webhook, /webhook/state, /webhook/state/bulk) et
+répond comme elle (201, statut CREATED ou DUPLICATE). Chaque pointage reçu est
+noté avec son heure d'arrivée: latence = arrivée - horodatage du pointage
+(le simulateur émet chaque pointage au début de sa seconde, voir profiles.paced).
+
+Les lots bulk sont acceptés en JSON ou au format binaire compact (punch_wire),
+annoncé comme le vrai backend dans l'en-tête Accept-Post.
+
+Options pour les tests de robustesse: délai de réponse et taux d'erreurs 503.
+GET /stats retourne le rapport courant en JSON.
+"""
+
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from punch_wire import CONTENT_TYPE as PUNCH_BATCH_CONTENT_TYPE, decode_punches
+
+
+def parse_timestamp(value):
+    """Horodatage des agents (heure locale, suffixe Z/millisecondes selon l'agent)"""
+    value = value.rstrip("Z")
+    if "." in value:
+        value = value.split(".")[0]
+    return datetime.fromisoformat(value).timestamp()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class StubBackend(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=3000, delay=0.0, error_rate=0.0, seed=None):
+        super().__init__((host, port), StubBackendHandler)
+        self.delay = delay
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.arrivals = []  # (arrivée, device_id, employee_id, horodatage)
+        self.seen = set()
+        self.duplicates = 0
+        self.requests = 0
+        self.rejected = 0
+        self.bytes_received = 0
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="stub-backend", daemon=True)
+        thread.start()
+        return thread
+
+    def record(self, device_id, punch):
+        """Enregistre un pointage; retourne False si déjà reçu"""
+        arrival = time.time()
+        key = (device_id, str(punch.get("employeeId")), punch.get("timestamp"))
+        with self.lock:
+            if key in self.seen:
+                self.duplicates += 1
+                return False
+            self.seen.add(key)
+            self.arrivals.append((arrival, device_id, key[1], punch.get("timestamp")))
+            return True
+
+    def should_fail(self, length=0):
+        with self.lock:
+            self.requests += 1
+            self.bytes_received += length
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.rejected += 1
+                return True
+            return False
+
+    def reset(self):
+        with self.lock:
+            self.arrivals = []
+            self.seen = set()
+            self.duplicates = self.requests = self.rejected = self.bytes_received = 0
+
+    def report(self):
+        with self.lock:
+            arrivals = list(self.arrivals)
+            duplicates, requests, rejected = self.duplicates, self.requests, self.rejected
+            bytes_received = self.bytes_received
+        latencies = []
+        for arrival, _, _, timestamp in arrivals:
+            try:
+                latencies.append(arrival - parse_timestamp(timestamp))
+            except (TypeError, ValueError):
+                pass
+        span = arrivals[-1][0] - arrivals[0][0] if len(arrivals) > 1 else 0
+        return {
+            "punches": len(arrivals),
+            "duplicates": duplicates,
+            "requests": requests,
+            "rejected": rejected,
+            "bytes_received": bytes_received,
+            "throughput_per_s": round(len(arrivals) / span, 2) if span else None,
+            "latency_s": {
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "max": max(latencies) if latencies else None,
+            },
+        }
+
+
+class StubBackendHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, comme le vrai backend
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if server.delay:
+            time.sleep(server.delay)
+        if server.should_fail(length):
+            self.reply(503, {"message": "Service Unavailable (simulé)"})
+            return
+        bulk = self.path.rstrip("/").endswith("/bulk")
+        try:
+            if bulk and self.headers.get("Content-Type", "").startswith(PUNCH_BATCH_CONTENT_TYPE):
+                data = {"punches": decode_punches(body)}
+            else:
+                data = json.loads(body or b"{}")
+        except (ValueError, OSError, EOFError) as e:
+            self.reply(400, {"message": f"Corps invalide: {e}"})
+            return
+
+        device_id = self.headers.get("X-Device-ID") or self.headers.get("Device-ID") or "inconnu"
+        if bulk:
+            results = []
+            for index, punch in enumerate(data.get("punches", [])):
+                created = server.record(device_id, punch)
+                results.append({"index": index, "status": "CREATED" if created else "DUPLICATE"})
+            created = sum(1 for r in results if r["status"] == "CREATED")
+            self.reply(201, {
+                "results": results, "created": created, "duplicates": len(results) - created,
+                "debounceBlocked": 0, "anomalies": 0, "errors": 0, "duration": 0,
+            }, {"Accept-Post": f"application/json, {PUNCH_BATCH_CONTENT_TYPE}"})
+        else:
+            created = server.record(device_id, data)
+            self.reply(201, {"status": "CREATED" if created else "DUPLICATE", "id": None})
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/stats":
+            self.reply(200, self.server.report())
+        else:
+            self.reply(404, {"message": "Not Found"})
+
+    def reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
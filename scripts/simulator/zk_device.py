@@ -0,0 +1,286 @@
+"""
+Émulateur de terminal ZKTeco (protocole TCP, port 4370)
+
+Implémente ce qu'utilisent pyzk et attendance_cursor.py:
+- CMD_CONNECT / CMD_EXIT, version firmware, options (~DeviceName...),
+  CMD_GET_FREE_SIZES (nombre d'utilisateurs et d'enregistrements);
+- lecture par buffer (1503 / 1504 / CMD_FREE_DATA) des utilisateurs
+  (format 72 octets) et du journal de pointages (format 40 octets), y compris
+  la lecture partielle par offset;
+- événements temps réel (CMD_REG_EVENT): un pointage ajouté est poussé aux
+  connexions abonnées, un à la fois, après l'acquittement du précédent
+  (comme le terminal).
+Les autres commandes sont acquittées sans effet.
+"""
+
+import socketserver
+import threading
+from collections import deque
+from datetime import datetime
+from struct import pack, unpack
+
+from zk import const
+
+CMD_PREPARE_BUFFER = 1503
+CMD_READ_BUFFER = 1504
+EVENT_ACK_TIMEOUT = 2.0  # Secondes d'attente de l'acquittement d'un événement
+
+
+def checksum(data):
+    """Somme de contrôle des paquets ZK (zkemsdk.c)"""
+    total = 0
+    for i in range(0, len(data) - 1, 2):
+        total += data[i] | (data[i + 1] << 8)
+        if total > const.USHRT_MAX:
+            total -= const.USHRT_MAX
+    if len(data) % 2:
+        total += data[-1]
+    while total > const.USHRT_MAX:
+        total -= const.USHRT_MAX
+    total = ~total
+    while total < 0:
+        total += const.USHRT_MAX
+    return total
+
+
+def build_packet(command, session_id, reply_id, data=b""):
+    body = pack('<4H', command, 0, session_id, reply_id) + data
+    body = pack('<4H', command, checksum(body), session_id, reply_id) + data
+    return pack('<HHI', const.MACHINE_PREPARE_DATA_1, const.MACHINE_PREPARE_DATA_2, len(body)) + body
+
+
+def encode_time(t):
+    """Horodatage 32 bits du journal (zkemsdk.c - EncodeTime)"""
+    return (((t.year % 100) * 12 * 31 + ((t.month - 1) * 31) + t.day - 1) * (24 * 60 * 60)
+            + (t.hour * 60 + t.minute) * 60 + t.second)
+
+
+class SimulatedDevice:
+    """État du terminal: utilisateurs, journal de pointages et abonnés aux événements"""
+
+    def __init__(self, employees=200, name="PointaFlex-SIM", serial="SIM0000000001", firmware="Ver 6.60 Sep 27 2019"):
+        self.name = name
+        self.serial = serial
+        self.firmware = firmware
+        self.lock = threading.Lock()
+        self.users = [(uid, str(uid), f"Employe {uid}") for uid in range(1, employees + 1)]
+        self.records = []  # (user_id, datetime, state, verify_mode)
+        self.subscribers = set()
+
+    def add_punch(self, user_id, timestamp, state=0, verify_mode=1):
+        """Ajoute un pointage au journal et le pousse aux connexions en mode temps réel"""
+        record = (str(user_id), timestamp, state, verify_mode)
+        with self.lock:
+            self.records.append(record)
+            subscribers = list(self.subscribers)
+        for connection in subscribers:
+            connection.push_event(record)
+
+    def clear(self):
+        with self.lock:
+            self.records = []
+
+    def options(self):
+        return {
+            "~DeviceName": self.name,
+            "~SerialNumber": self.serial,
+            "~Platform": "ZMM220_TFT",
+            "~ZKFPVersion": "10",
+            "~ExtendFmt": "1",
+            "~UserExtFmt": "1",
+            "FaceFunOn": "0",
+            "CompatOldFirmware": "0",
+        }
+
+    def free_sizes(self):
+        with self.lock:
+            users, records = len(self.users), len(self.records)
+        fields = [0] * 20
+        fields[4] = users
+        fields[8] = records
+        fields[14], fields[15], fields[16] = 3000, 3000, 100000
+        fields[17], fields[18], fields[19] = 3000, 3000 - users, 100000 - records
+        return pack('20i', *fields) + pack('3i', 0, 0, 0)
+
+    def users_buffer(self):
+        data = b"".join(
+            pack('<HB8s24sIx7sx24s', uid, 0, b"", name.encode(), 0, b"1", user_id.encode())
+            for uid, user_id, name in self.users
+        )
+        return pack('I', len(data)) + data
+
+    def attendance_buffer(self):
+        with self.lock:
+            records = list(self.records)
+        uids = {user_id: uid for uid, user_id, _ in self.users}
+        data = b"".join(
+            pack('<H24sB4sB8s', uids.get(user_id, 0), user_id.encode(), state,
+                 pack('<I', encode_time(timestamp)), verify_mode, b"")
+            for user_id, timestamp, state, verify_mode in records
+        )
+        return pack('I', len(data)) + data
+
+
+class ZKConnectionHandler(socketserver.BaseRequestHandler):
+    """Une connexion client (pyzk) au terminal simulé"""
+
+    session_counter = 0
+    session_lock = threading.Lock()
+
+    def setup(self):
+        self.device = self.server.device
+        with self.session_lock:
+            ZKConnectionHandler.session_counter = (ZKConnectionHandler.session_counter + 1) % const.USHRT_MAX
+            self.session_id = ZKConnectionHandler.session_counter or 1
+        self.send_lock = threading.Lock()
+        self.buffer = b""
+        self.events = deque()
+        self.event_ready = threading.Condition()
+        self.event_acked = threading.Event()
+        self.closed = False
+        self.event_thread = None
+
+    def handle(self):
+        try:
+            while True:
+                top = self.recv_exactly(8)
+                if top is None:
+                    return
+                magic1, magic2, length = unpack('<HHI', top)
+                if (magic1, magic2) != (const.MACHINE_PREPARE_DATA_1, const.MACHINE_PREPARE_DATA_2):
+                    return
+                body = self.recv_exactly(length)
+                if body is None or len(body) < 8:
+                    return
+                command, _, _, reply_id = unpack('<4H', body[:8])
+                if not self.dispatch(command, reply_id, body[8:]):
+                    return
+        except (ConnectionError, OSError):
+            pass
+
+    def finish(self):
+        self.unsubscribe()
+        with self.event_ready:
+            self.closed = True
+            self.event_ready.notify_all()
+
+    def recv_exactly(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def send(self, command, reply_id, data=b""):
+        with self.send_lock:
+            self.request.sendall(build_packet(command, self.session_id, reply_id, data))
+
+    # -------------------------------------------------------------------------
+    # Commandes
+    # -------------------------------------------------------------------------
+    def dispatch(self, command, reply_id, data):
+        """Traite une commande; retourne False pour fermer la connexion"""
+        device = self.device
+        if command == const.CMD_ACK_OK:
+            # Acquittement d'un événement temps réel: pas de réponse
+            self.event_acked.set()
+        elif command == const.CMD_EXIT:
+            self.send(const.CMD_ACK_OK, reply_id)
+            return False
+        elif command == const.CMD_GET_VERSION:
+            self.send(const.CMD_ACK_OK, reply_id, device.firmware.encode() + b"\x00")
+        elif command == const.CMD_OPTIONS_RRQ:
+            key = data.split(b"\x00")[0].decode(errors="ignore")
+            value = device.options().get(key, "")
+            self.send(const.CMD_ACK_OK, reply_id, f"{key}={value}".encode() + b"\x00")
+        elif command == const.CMD_GET_FREE_SIZES:
+            self.send(const.CMD_ACK_OK, reply_id, device.free_sizes())
+        elif command == const.CMD_GET_TIME:
+            self.send(const.CMD_ACK_OK, reply_id, pack('<I', encode_time(datetime.now())))
+        elif command == CMD_PREPARE_BUFFER:
+            _, requested, _, _ = unpack('<bhii', data[:11])
+            if requested == const.CMD_ATTLOG_RRQ:
+                self.buffer = device.attendance_buffer()
+            elif requested == const.CMD_USERTEMP_RRQ:
+                self.buffer = device.users_buffer()
+            else:
+                self.buffer = pack('I', 0)
+            self.send(const.CMD_ACK_OK, reply_id, b"\x00" + pack('<I', len(self.buffer)))
+        elif command == CMD_READ_BUFFER:
+            start, size = unpack('<ii', data[:8])
+            chunk = self.buffer[start:start + size]
+            with self.send_lock:
+                self.request.sendall(
+                    build_packet(const.CMD_PREPARE_DATA, self.session_id, reply_id, pack('<II', len(chunk), 0))
+                    + build_packet(const.CMD_DATA, self.session_id, reply_id, chunk)
+                    + build_packet(const.CMD_ACK_OK, self.session_id, reply_id)
+                )
+        elif command == const.CMD_FREE_DATA:
+            self.buffer = b""
+            self.send(const.CMD_ACK_OK, reply_id)
+        elif command == const.CMD_REG_EVENT:
+            flags = unpack('<I', data[:4])[0] if len(data) >= 4 else 0
+            self.send(const.CMD_ACK_OK, reply_id)
+            if flags & const.EF_ATTLOG:
+                self.subscribe()
+            else:
+                self.unsubscribe()
+        else:
+            # CMD_CONNECT, ENABLE/DISABLE, CANCELCAPTURE, STARTVERIFY...
+            self.send(const.CMD_ACK_OK, reply_id)
+        return True
+
+    # -------------------------------------------------------------------------
+    # Événements temps réel
+    # -------------------------------------------------------------------------
+    def subscribe(self):
+        with self.device.lock:
+            self.device.subscribers.add(self)
+        if self.event_thread is None:
+            self.event_thread = threading.Thread(target=self.event_loop, name="zk-sim-events", daemon=True)
+            self.event_thread.start()
+
+    def unsubscribe(self):
+        with self.device.lock:
+            self.device.subscribers.discard(self)
+
+    def push_event(self, record):
+        with self.event_ready:
+            self.events.append(record)
+            self.event_ready.notify()
+
+    def event_loop(self):
+        while True:
+            with self.event_ready:
+                while not self.events and not self.closed:
+                    self.event_ready.wait()
+                if self.closed:
+                    return
+                user_id, timestamp, state, verify_mode = self.events.popleft()
+            timehex = pack('6B', timestamp.year - 2000, timestamp.month, timestamp.day,
+                           timestamp.hour, timestamp.minute, timestamp.second)
+            payload = pack('<24sBB6s4s', user_id.encode(), state, verify_mode, timehex, b"")
+            self.event_acked.clear()
+            try:
+                self.send(const.CMD_REG_EVENT, 0, payload)
+            except OSError:
+                return
+            # Un événement à la fois: le client acquitte chaque paquet
+            self.event_acked.wait(EVENT_ACK_TIMEOUT)
+
+
+class ZKDeviceServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, device, host="0.0.0.0", port=4370):
+        self.device = device
+        super().__init__((host, port), ZKConnectionHandler)
+
+    def start(self):
+        """Sert les connexions dans un thread de fond"""
+        thread = threading.Thread(target=self.serve_forever, name="zk-sim-server", daemon=True)
+        thread.start()
+        return thread
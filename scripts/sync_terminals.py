@@ -4,10 +4,23 @@ Script de synchronisation des pointages ZKTeco
 Récupère les pointages des terminaux CP et CIT depuis une date donnée
 """
 
+import argparse
+import csv
 import requests
 import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from zk import ZK
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+from punch_archive import ARCHIVE_DIR, PunchArchive
+from punch_digest_index import PunchDigestIndex, attendance_digest
+from punch_dispatcher import HOT_KEYS, PunchDispatcher
+from punch_wire import WireFormat
+from zk_sessions import SESSIONS
 
 # =============================================================================
 # CONFIGURATION
@@ -28,8 +41,17 @@ TERMINALS = [
 ]
 
 BACKEND_URL = "http://localhost:3000/api/v1/attendance/webhook/state"
+BULK_URL = BACKEND_URL + "/bulk"  # Import en masse (ré-imports d'historique)
 TENANT_ID = "340a6c2a-160e-4f4b-917e-6eea8fd5ff2d"
 TIMEOUT = 15
+DELIVERY_CONCURRENCY = 8  # Requêtes simultanées max vers le backend (par terminal)
+HTTP_POOL_SIZE = 64  # Connexions keep-alive conservées vers le backend
+BULK_CHUNK_SIZE = 500  # Pointages par lot en mode --bulk (maximum accepté par le backend)
+BULK_TIMEOUT = 120  # Un lot est traité en une requête: délai plus long
+# Format des lots --bulk: "auto" (binaire compact dès que le backend l'annonce), "binary" ou "json"
+BULK_WIRE_FORMAT = "auto"
+# Empreintes des pointages déjà acquittés par le backend (non renvoyés aux exécutions suivantes)
+SENT_INDEX_FILE = Path(__file__).resolve().parent / "sent_punches.idx"
 
 # Mapping des types de vérification
 VERIFY_MODE_MAP = {
@@ -52,9 +74,45 @@ STATE_TYPE_MAP = {
     5: "OUT",  # OT-Out
 }
 
+# Session HTTP partagée: les connexions TCP vers le backend sont réutilisées
+# (keep-alive) au lieu d'ouvrir une connexion par pointage
+http_session = requests.Session()
+http_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+http_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+
+# Format des lots négocié avec le backend (punch_wire.py), partagé par les terminaux
+bulk_wire = WireFormat(BULK_WIRE_FORMAT)
+
 # =============================================================================
 # FONCTIONS
 # =============================================================================
+class PunchDump:
+    """
+    Export CSV des pointages bruts de la période (--dump), entrée de
+    analyse_pointages.py. Partagé entre les threads des terminaux.
+    """
+
+    FIELDS = ("device_id", "user_id", "timestamp", "state", "verify_mode")
+
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.FIELDS)
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def write(self, device_id, attendances):
+        rows = [(device_id, attendance.user_id, attendance.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                 attendance.status, attendance.punch)
+                for attendance in attendances]
+        with self.lock:
+            self.writer.writerows(rows)
+            self.file.flush()
+            self.count += len(rows)
+
+    def close(self):
+        self.file.close()
+
 def get_last_monday():
     """Retourne la date du lundi de la semaine dernière"""
     today = datetime.now()
@@ -63,15 +121,23 @@ def get_last_monday():
         days_since_monday = 7
     return today - timedelta(days=days_since_monday)
 
-def send_to_backend(attendance, device_id):
-    """Envoie un pointage au backend"""
+def filter_period(attendances, start_date, end_date):
+    """Pointages compris entre start_date et end_date (incluses)"""
+    return [a for a in attendances if start_date <= a.timestamp <= end_date]
+
+def filter_unsent(attendances, device_id, sent_index):
+    """Pointages absents de l'index des pointages déjà acquittés"""
+    return [a for a in attendances if attendance_digest(device_id, a) not in sent_index]
+
+def build_payload(attendance):
+    """Pointage au format du webhook state"""
     employee_id = str(attendance.user_id).zfill(5)  # Pad avec des zéros
 
     # Déterminer le type (IN/OUT) basé sur le state
     state = getattr(attendance, 'status', 0)
     punch_type = STATE_TYPE_MAP.get(state, "IN")
 
-    payload = {
+    return {
         "employeeId": employee_id,
         "timestamp": attendance.timestamp.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
         "type": punch_type,
@@ -79,14 +145,20 @@ def send_to_backend(attendance, device_id):
         "method": VERIFY_MODE_MAP.get(getattr(attendance, 'punch', 1), "FINGERPRINT"),
     }
 
-    headers = {
+def backend_headers(device_id):
+    return {
         "Content-Type": "application/json",
         "X-Device-ID": device_id,
         "X-Tenant-ID": TENANT_ID,
     }
 
+def send_to_backend(attendance, device_id):
+    """Envoie un pointage au backend"""
+    payload = build_payload(attendance)
+    headers = backend_headers(device_id)
+
     try:
-        response = requests.post(BACKEND_URL, json=payload, headers=headers, timeout=TIMEOUT)
+        response = http_session.post(BACKEND_URL, json=payload, headers=headers, timeout=TIMEOUT)
         result = response.json()
 
         if response.status_code == 201 or result.get('status') in ['CREATED', 'DUPLICATE', 'DEBOUNCE_BLOCKED']:
@@ -96,117 +168,369 @@ def send_to_backend(attendance, device_id):
     except Exception as e:
         return False, str(e), None
 
-def sync_terminal(terminal_config, start_date, end_date):
-    """Synchronise les pointages d'un terminal"""
-    name = terminal_config['name']
-    ip = terminal_config['ip']
-    port = terminal_config['port']
-    device_id = terminal_config['device_id']
-
-    print(f"\n{'='*60}")
-    print(f"📡 Connexion à {name} ({ip}:{port})")
-    print(f"{'='*60}")
+def send_bulk_to_backend(attendances, device_id):
+    """
+    Envoie un lot de pointages à l'endpoint bulk.
+    Retourne [(success, status, anomaly), ...] dans l'ordre du lot.
+    """
+    punches = [build_payload(attendance) for attendance in attendances]
 
-    zk = ZK(ip, port=port, timeout=TIMEOUT)
-    conn = None
+    try:
+        while True:
+            body, wire_headers = bulk_wire.request(punches)
+            response = http_session.post(BULK_URL, headers={**backend_headers(device_id), **wire_headers},
+                                         timeout=BULK_TIMEOUT, **body)
+            # Format binaire refusé (415): le lot repart aussitôt en JSON
+            if not bulk_wire.negotiate(response):
+                break
+        result = response.json()
+        if response.status_code != 201 or 'results' not in result:
+            error = result.get('message') or result.get('error') or f"HTTP {response.status_code}"
+            return [(False, str(error), None)] * len(attendances)
+    except Exception as e:
+        return [(False, str(e), None)] * len(attendances)
+
+    results = result['results'] if isinstance(result['results'], list) else []
+    if len(results) != len(attendances):
+        # Résultats non alignés sur le lot: aucun pointage n'est compté comme envoyé
+        error = f"Réponse incomplète: {len(results)} résultat(s) pour {len(attendances)} pointage(s)"
+        return [(False, error, None)] * len(attendances)
+
+    outcomes = []
+    for item in results:
+        status = item.get('status')
+        if status in ['CREATED', 'DUPLICATE', 'DEBOUNCE_BLOCKED']:
+            outcomes.append((True, status, item.get('anomaly')))
+        else:
+            outcomes.append((False, item.get('error', 'Unknown error'), None))
+    return outcomes
 
-    stats = {
+def new_stats():
+    return {
         'total': 0,
         'sent': 0,
+        'skipped': 0,
         'duplicates': 0,
         'errors': 0,
-        'anomalies': {}
+        'anomalies': {},
+        'latencies': []
     }
 
+def merge_stats(total_stats, stats):
+    """Ajoute les statistiques d'un terminal au total"""
+    total_stats['total'] += stats['total']
+    total_stats['sent'] += stats['sent']
+    total_stats['skipped'] += stats['skipped']
+    total_stats['duplicates'] += stats['duplicates']
+    total_stats['errors'] += stats['errors']
+    for anomaly, count in stats['anomalies'].items():
+        total_stats['anomalies'][anomaly] = total_stats['anomalies'].get(anomaly, 0) + count
+    total_stats['latencies'].extend(stats['latencies'])
+
+def percentile(sorted_values, pct):
+    """Percentile (méthode du rang le plus proche) d'une liste triée"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def record_result(stats, i, total, attendance, success, status, anomaly, log):
+    """Comptabilise et affiche le résultat de l'envoi d'un pointage"""
+    employee_id = str(attendance.user_id).zfill(5)
+    state = getattr(attendance, 'status', 0)
+    punch_type = STATE_TYPE_MAP.get(state, "IN")
+
+    if success:
+        if status == 'DUPLICATE' or status == 'DEBOUNCE_BLOCKED':
+            stats['duplicates'] += 1
+            symbol = "⊘"
+        else:
+            stats['sent'] += 1
+            symbol = "✅"
+
+        if anomaly:
+            stats['anomalies'][anomaly] = stats['anomalies'].get(anomaly, 0) + 1
+
+        log(f"  {symbol} [{i}/{total}] {employee_id} | {attendance.timestamp.strftime('%d/%m %H:%M')} | {punch_type} | {status}" + (f" | ⚠️ {anomaly}" if anomaly else ""))
+    else:
+        stats['errors'] += 1
+        log(f"  ❌ [{i}/{total}] {employee_id} | {attendance.timestamp.strftime('%d/%m %H:%M')} | Erreur: {status}")
+
+def deliver_punches(attendances, device_id, stats, concurrency=DELIVERY_CONCURRENCY, log=print,
+                    sent_index=None):
+    """
+    Envoie les pointages (triés par timestamp) sur `concurrency` voies
+    (punch_dispatcher: un employé = une voie). Les pointages d'un même employé
+    partent l'un après l'autre dans l'ordre chronologique (l'anti-rebond et la
+    logique IN/OUT du backend en dépendent); seuls des employés de voies
+    différentes sont envoyés en parallèle.
+    """
+    total = len(attendances)
+    lock = threading.Lock()
+
+    def send_one(entry):
+        i, attendance = entry
+        started = time.perf_counter()
+        success, status, anomaly = send_to_backend(attendance, device_id)
+        latency = time.perf_counter() - started
+        if success and sent_index is not None:
+            sent_index.add(attendance_digest(device_id, attendance))
+        with lock:
+            stats['latencies'].append(latency)
+            record_result(stats, i, total, attendance, success, status, anomaly, log)
+        return success
+
+    numbered = list(enumerate(attendances, 1))
+    if concurrency <= 1:
+        for entry in numbered:
+            send_one(entry)
+        return
+
+    dispatcher = PunchDispatcher(send_one, lanes=concurrency, key=lambda entry: str(entry[1].user_id),
+                                 name="delivery", log=log)
     try:
-        conn = zk.connect()
-        print(f"✅ Connecté: {conn.get_device_name()}")
-        print(f"📊 Firmware: {conn.get_firmware_version()}")
+        # Une erreur n'arrête pas la voie: chaque pointage est comptabilisé (re-sync manuel)
+        dispatcher.dispatch(numbered, stop_on_failure=False)
+    finally:
+        dispatcher.close()
+    lane_stats = dispatcher.stats()
+    if total >= concurrency * 20 and lane_stats['skew'] > 1.5:
+        # Les voies sont vides: employés les plus chargés recomptés sur le lot
+        employees = Counter(str(attendance.user_id) for attendance in attendances)
+        hot = ", ".join(f"{employee} ({count})" for employee, count in employees.most_common(HOT_KEYS))
+        log(f"⚖️  Voies déséquilibrées (skew {lane_stats['skew']}): employés les plus chargés {hot}")
+
+def deliver_bulk(attendances, device_id, stats, chunk_size=BULK_CHUNK_SIZE, log=print, sent_index=None):
+    """
+    Envoie les pointages (triés par timestamp) par lots à l'endpoint bulk, un lot
+    après l'autre: le backend résout employés et anti-doublon une fois par lot et
+    traite chaque lot dans l'ordre chronologique.
+    """
+    total = len(attendances)
+    for start in range(0, total, chunk_size):
+        chunk = attendances[start:start + chunk_size]
+        started = time.perf_counter()
+        binary = bulk_wire.binary
+        outcomes = send_bulk_to_backend(chunk, device_id)
+        if bulk_wire.binary != binary:
+            log("  🗜️ Lots suivants au format " + ("binaire compact" if bulk_wire.binary else "JSON (binaire refusé)"))
+        stats['latencies'].append(time.perf_counter() - started)
+        for offset, (attendance, (success, status, anomaly)) in enumerate(zip(chunk, outcomes)):
+            if success and sent_index is not None:
+                sent_index.add(attendance_digest(device_id, attendance))
+            record_result(stats, start + offset + 1, total, attendance, success, status, anomaly, log)
+        if sent_index is not None:
+            sent_index.flush()
+        log(f"  📦 Lot {start // chunk_size + 1}/{(total + chunk_size - 1) // chunk_size} traité "
+            f"({len(chunk)} pointages en {stats['latencies'][-1]:.1f}s)")
+
+def print_throughput(stats, elapsed):
+    """Affiche le débit d'envoi et les latences backend (par requête)"""
+    latencies = sorted(stats['latencies'])
+    processed = stats['sent'] + stats['duplicates'] + stats['errors']
+    if not latencies or elapsed <= 0:
+        return
+    print(f"   ⏱️ Débit:    {processed / elapsed:.1f} pointages/s ({processed} en {elapsed:.1f}s)")
+    print(f"   ⏱️ Latence:  p50 {percentile(latencies, 50) * 1000:.0f} ms | p99 {percentile(latencies, 99) * 1000:.0f} ms")
+
+def sync_terminal(terminal_config, start_date, end_date, log=print, concurrency=DELIVERY_CONCURRENCY,
+                  bulk=False, sent_index=None, resend=False, dump=None, archive=None, from_archive=False):
+    """
+    Synchronise les pointages d'un terminal. archive: le journal téléchargé y est
+    conservé; from_archive: les pointages sont lus dans l'archive, sans
+    interroger le terminal.
+    """
+    name = terminal_config['name']
+    ip = terminal_config['ip']
+    port = terminal_config['port']
+    device_id = terminal_config['device_id']
+
+    log(f"\n{'='*60}")
+    log(f"🗄️ {name}: archive locale" if from_archive else f"📡 Connexion à {name} ({ip}:{port})")
+    log(f"{'='*60}")
 
-        users = conn.get_users()
-        print(f"👥 Utilisateurs: {len(users)}")
+    stats = new_stats()
 
-        attendances = conn.get_attendance()
-        print(f"📊 Total pointages dans terminal: {len(attendances)}")
+    try:
+        if from_archive:
+            attendances = archive.attendances(device_id, start_date, end_date)
+            log(f"📊 Pointages archivés pour la période: {len(attendances)}")
+        else:
+            # Session persistante: nom, firmware et utilisateurs viennent du cache,
+            # la connexion n'est empruntée que pendant la lecture du journal
+            session = SESSIONS.session(ip, port, timeout=TIMEOUT)
+            with session.lease() as conn:
+                log(f"✅ Connecté: {session.device_name()}")
+                log(f"📊 Firmware: {session.firmware_version()}")
+                log(f"👥 Utilisateurs: {session.counts()[0]}")
+
+                attendances = conn.get_attendance()
+            log(f"📊 Total pointages dans terminal: {len(attendances)}")
+
+            if archive is not None:
+                added, ignored = archive.append(device_id, attendances)
+                log(f"🗄️ Archivés: {added} nouveaux pointages" + (f" ({ignored} hors format ignorés)"
+                                                                 if ignored else ""))
 
         # Filtrer par date
-        filtered = [a for a in attendances if start_date <= a.timestamp <= end_date]
-        print(f"📅 Pointages du {start_date.strftime('%d/%m/%Y')} au {end_date.strftime('%d/%m/%Y')}: {len(filtered)}")
+        filtered = filter_period(attendances, start_date, end_date)
+        log(f"📅 Pointages du {start_date.strftime('%d/%m/%Y')} au {end_date.strftime('%d/%m/%Y')}: {len(filtered)}")
 
         stats['total'] = len(filtered)
 
+        # Export brut avant exclusion des pointages déjà envoyés (l'analyse a besoin de tout)
+        if dump is not None:
+            dump.write(device_id, filtered)
+
+        # Ne pas renvoyer les pointages déjà acquittés lors d'une exécution précédente
+        if sent_index is not None and not resend:
+            pending = filter_unsent(filtered, device_id, sent_index)
+            stats['skipped'] = len(filtered) - len(pending)
+            if stats['skipped']:
+                log(f"⏭️  Déjà envoyés (index local): {stats['skipped']}")
+            filtered = pending
+
         if not filtered:
-            print("⚠️  Aucun pointage à synchroniser")
+            log("⚠️  Aucun pointage à synchroniser")
             return stats
 
         # Trier par timestamp
         filtered.sort(key=lambda x: x.timestamp)
 
-        print(f"\n🔄 Envoi des pointages...")
-
-        for i, attendance in enumerate(filtered, 1):
-            employee_id = str(attendance.user_id).zfill(5)
-            state = getattr(attendance, 'status', 0)
-            punch_type = STATE_TYPE_MAP.get(state, "IN")
-
-            success, status, anomaly = send_to_backend(attendance, device_id)
-
-            if success:
-                if status == 'DUPLICATE' or status == 'DEBOUNCE_BLOCKED':
-                    stats['duplicates'] += 1
-                    symbol = "⊘"
-                else:
-                    stats['sent'] += 1
-                    symbol = "✅"
+        log(f"\n🔄 Envoi des pointages...")
 
-                if anomaly:
-                    stats['anomalies'][anomaly] = stats['anomalies'].get(anomaly, 0) + 1
-
-                print(f"  {symbol} [{i}/{len(filtered)}] {employee_id} | {attendance.timestamp.strftime('%d/%m %H:%M')} | {punch_type} | {status}" + (f" | ⚠️ {anomaly}" if anomaly else ""))
-            else:
-                stats['errors'] += 1
-                print(f"  ❌ [{i}/{len(filtered)}] {employee_id} | {attendance.timestamp.strftime('%d/%m %H:%M')} | Erreur: {status}")
+        if bulk:
+            deliver_bulk(filtered, device_id, stats, log=log, sent_index=sent_index)
+        else:
+            deliver_punches(filtered, device_id, stats, concurrency=concurrency, log=log, sent_index=sent_index)
 
         return stats
 
     except Exception as e:
-        print(f"❌ Erreur: {e}")
+        log(f"❌ Erreur: {e}")
         return stats
     finally:
-        if conn:
-            conn.disconnect()
-            print(f"👋 Déconnecté de {name}")
+        if sent_index is not None:
+            sent_index.flush()
+
+def sync_all_terminals(terminals, start_date, end_date, workers, concurrency=DELIVERY_CONCURRENCY,
+                       bulk=False, sent_index=None, resend=False, dump=None, archive=None, from_archive=False):
+    """
+    Synchronise les terminaux en parallèle (workers threads): la durée totale
+    devient celle du terminal le plus lent au lieu de la somme. Chaque terminal
+    a sa propre connexion; un terminal injoignable ne bloque pas les autres.
+    """
+    total_stats = new_stats()
+
+    if workers <= 1:
+        for terminal in terminals:
+            merge_stats(total_stats, sync_terminal(terminal, start_date, end_date, concurrency=concurrency,
+                                                   bulk=bulk, sent_index=sent_index, resend=resend,
+                                                   dump=dump, archive=archive, from_archive=from_archive))
+        return total_stats
+
+    print_lock = threading.Lock()
+
+    def run(terminal):
+        prefix = f"[{terminal['name']}]"
+
+        def log(message):
+            # Préfixer chaque ligne pour distinguer les terminaux dans la sortie
+            with print_lock:
+                print(f"{prefix} {message.lstrip()}", flush=True)
+
+        return sync_terminal(terminal, start_date, end_date, log=log, concurrency=concurrency, bulk=bulk,
+                             sent_index=sent_index, resend=resend, dump=dump, archive=archive,
+                             from_archive=from_archive)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync") as executor:
+        futures = {executor.submit(run, terminal): terminal for terminal in terminals}
+        done = 0
+        for future in as_completed(futures):
+            terminal = futures[future]
+            done += 1
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"[{terminal['name']}] 💥 Erreur inattendue: {e}")
+                continue
+            merge_stats(total_stats, stats)
+            print(f"📶 Terminal terminé {done}/{len(terminals)}: {terminal['name']} "
+                  f"({stats['sent']} envoyés, {stats['skipped']} déjà envoyés, {stats['duplicates']} doublons, "
+                  f"{stats['errors']} erreurs)")
+
+    return total_stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synchronisation des pointages des terminaux ZKTeco")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Nombre de terminaux synchronisés en parallèle (défaut: 1, séquentiel)")
+    parser.add_argument("--concurrency", type=int, default=DELIVERY_CONCURRENCY,
+                        help=f"Requêtes backend simultanées par terminal (défaut: {DELIVERY_CONCURRENCY})")
+    parser.add_argument("--bulk", action="store_true",
+                        help=f"Envoi par lots de {BULK_CHUNK_SIZE} à l'endpoint bulk (ré-imports d'historique)")
+    parser.add_argument("--wire", choices=WireFormat.MODES, default=BULK_WIRE_FORMAT,
+                        help="Format des lots --bulk: auto (binaire si le backend l'annonce), binary ou json "
+                             f"(défaut: {BULK_WIRE_FORMAT})")
+    parser.add_argument("--since", type=lambda value: datetime.strptime(value, "%Y-%m-%d"),
+                        help="Date de début AAAA-MM-JJ (défaut: lundi de la semaine dernière)")
+    parser.add_argument("--resend", action="store_true",
+                        help="Renvoyer aussi les pointages déjà acquittés (index local ignoré)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Ne pas utiliser ni mettre à jour l'index local des pointages envoyés")
+    parser.add_argument("--dump", metavar="FICHIER",
+                        help="Exporter aussi les pointages bruts de la période en CSV (analyse_pointages.py)")
+    parser.add_argument("--until", type=lambda value: datetime.strptime(value, "%Y-%m-%d"),
+                        help="Date de fin AAAA-MM-JJ incluse (défaut: maintenant)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--archive", action="store_true",
+                        help="Conserver le journal téléchargé dans l'archive locale (punch_archive.py)")
+    source.add_argument("--from-archive", action="store_true",
+                        help="Lire les pointages dans l'archive locale sans interroger les terminaux")
+    return parser.parse_args()
 
 def main():
     """Fonction principale"""
+    args = parse_args()
+
     print("\n" + "="*60)
     print("🔄 SYNCHRONISATION DES TERMINAUX ZKTECO")
     print("="*60)
 
     # Calculer les dates
-    start_date = get_last_monday().replace(hour=0, minute=0, second=0, microsecond=0)
-    end_date = datetime.now()
+    start_date = args.since or get_last_monday().replace(hour=0, minute=0, second=0, microsecond=0)
+    end_date = args.until.replace(hour=23, minute=59, second=59) if args.until else datetime.now()
 
     print(f"\n📅 Période: {start_date.strftime('%d/%m/%Y %H:%M')} → {end_date.strftime('%d/%m/%Y %H:%M')}")
-    print(f"🌐 Backend: {BACKEND_URL}")
+    print(f"🌐 Backend: {BULK_URL if args.bulk else BACKEND_URL}")
+    if args.bulk:
+        bulk_wire.set_mode(args.wire)
+        print(f"🗜️ Format des lots: {args.wire}")
     print(f"🏢 Tenant: {TENANT_ID}")
+    if args.workers > 1:
+        print(f"⚡ Terminaux en parallèle: {min(args.workers, len(TERMINALS))}")
 
-    total_stats = {
-        'total': 0,
-        'sent': 0,
-        'duplicates': 0,
-        'errors': 0,
-        'anomalies': {}
-    }
+    sent_index = None
+    if not args.no_index:
+        sent_index = PunchDigestIndex(SENT_INDEX_FILE)
+        print(f"🗂️ Index local: {len(sent_index)} pointages déjà acquittés")
+
+    dump = PunchDump(args.dump) if args.dump else None
 
-    for terminal in TERMINALS:
-        stats = sync_terminal(terminal, start_date, end_date)
-        total_stats['total'] += stats['total']
-        total_stats['sent'] += stats['sent']
-        total_stats['duplicates'] += stats['duplicates']
-        total_stats['errors'] += stats['errors']
-        for anomaly, count in stats['anomalies'].items():
-            total_stats['anomalies'][anomaly] = total_stats['anomalies'].get(anomaly, 0) + count
+    archive = None
+    if args.archive or args.from_archive:
+        archive = PunchArchive(ARCHIVE_DIR)
+        print(f"🗄️ Archive locale: {len(archive)} pointages" + (" (terminaux non interrogés)" if args.from_archive else ""))
+
+    started = time.perf_counter()
+    try:
+        total_stats = sync_all_terminals(TERMINALS, start_date, end_date, args.workers, args.concurrency, args.bulk,
+                                         sent_index=sent_index, resend=args.resend, dump=dump,
+                                         archive=archive, from_archive=args.from_archive)
+    finally:
+        if dump is not None:
+            dump.close()
+    elapsed = time.perf_counter() - started
 
     # Résumé final
     print("\n" + "="*60)
@@ -214,8 +538,10 @@ def main():
     print("="*60)
     print(f"   Total pointages traités: {total_stats['total']}")
     print(f"   ✅ Envoyés avec succès:  {total_stats['sent']}")
+    print(f"   ⏭️ Déjà envoyés (local): {total_stats['skipped']}")
     print(f"   ⊘ Doublons ignorés:      {total_stats['duplicates']}")
     print(f"   ❌ Erreurs:              {total_stats['errors']}")
+    print_throughput(total_stats, elapsed)
 
     if total_stats['anomalies']:
         print(f"\n   ⚠️ Anomalies détectées:")
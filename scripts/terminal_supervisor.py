@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Superviseur des terminaux ZKTeco - un seul processus pour tout le parc
+
+Remplace une copie de zkteco_terminal_improved.py par terminal:
+- la liste des terminaux (IP, device ID, tenant, endpoint) est lue dans un
+  fichier JSON (voir terminals.example.json);
+- un thread de polling léger par terminal (curseur incrémental par terminal);
+- ressources partagées: session HTTP (pool keep-alive), queue durable (WAL),
+  circuit breaker par backend, registre de métriques et endpoint /metrics;
+- les pointages lus sont d'abord écrits dans la queue durable (le curseur
+  n'avance qu'ensuite), puis envoyés dans l'ordre par le thread d'envoi;
+- relève adaptative (poll_scheduler): serrée autour des horaires de shift du
+  tenant, espacée quand le terminal est inactif;
+- session persistante par terminal (zk_sessions): connexion empruntée à
+  chaque relève, sondée pendant l'inactivité et rouverte en arrière-plan si
+  elle tombe; nom et firmware en cache dans le répertoire d'état;
+- le fichier de configuration est surveillé: terminaux ajoutés, retirés ou
+  modifiés sont démarrés/arrêtés sans redémarrer le processus.
+
+Usage:
+    python terminal_supervisor.py --config terminals.json
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from agent_logging import setup_logging
+from agent_metrics import REGISTRY, TerminalMetrics, start_metrics_server
+from attendance_cursor import AttendanceCursor, fetch_new_attendance
+from backlog_drainer import BacklogDrainer
+from circuit_breaker import CircuitBreaker
+from poll_scheduler import MAX_INTERVAL, MIN_INTERVAL, PollScheduler, ShiftWindows, shift_windows_url
+from wal_queue import WriteAheadQueue
+from zk_sessions import SessionManager
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+SCRIPT_DIR = Path(__file__).resolve().parent
+CONFIG_FILE = SCRIPT_DIR / "terminals.json"
+STATE_DIR = SCRIPT_DIR / "supervisor_state"  # Queue durable + curseurs par terminal
+LOG_FILE = SCRIPT_DIR / "terminal_supervisor.log"
+METRICS_PORT = 9100  # Endpoint Prometheus http://localhost:9100/metrics (0 = désactivé)
+
+DEFAULT_BACKEND_URL = "http://localhost:3000/api/v1/attendance/webhook"
+DEFAULT_PORT = 4370
+CHECK_INTERVAL = 10
+TIMEOUT = 10
+RECONNECT_DELAY = 30  # Secondes avant une nouvelle connexion au terminal
+RELOAD_INTERVAL = 5  # Secondes entre deux vérifications du fichier de configuration
+QUEUE_BATCH_SIZE = 100
+DRAIN_WORKERS = 8  # Envois en parallèle (voies par terminal et employé, ordre de chacun conservé)
+DRAIN_RATE = 100  # Requêtes/s au plus vers les backends (tous terminaux confondus)
+DELIVERY_RETRY_DELAY = 5  # Attente après un échec d'envoi (backend indisponible)
+HTTP_POOL_SIZE = 32
+CIRCUIT_BREAKER_THRESHOLD = 10
+CIRCUIT_BREAKER_TIMEOUT = 60
+
+# Mapping des types de vérification
+VERIFY_MODE_MAP = {
+    0: "PIN_CODE",
+    1: "FINGERPRINT",
+    3: "FINGERPRINT",
+    4: "FACE_RECOGNITION",
+    15: "RFID_BADGE",
+}
+
+logger = logging.getLogger("terminal_supervisor")
+
+_terminal_metrics = {}
+_terminal_metrics_lock = threading.Lock()
+
+
+def terminal_metrics(device_id):
+    """Métriques d'un terminal, partagées par son poller et le thread d'envoi"""
+    with _terminal_metrics_lock:
+        metrics = _terminal_metrics.get(device_id)
+        if metrics is None:
+            metrics = _terminal_metrics[device_id] = TerminalMetrics(device_id)
+        return metrics
+
+
+# =============================================================================
+# CONFIGURATION DU PARC
+# =============================================================================
+def load_fleet(path):
+    """
+    Lit le fichier de configuration et retourne {device_id: terminal}.
+    Les valeurs globales (backend_url, tenant_id, check_interval, timeout,
+    ignored_employees, adaptive_polling, min_interval, max_interval,
+    shift_boundaries) s'appliquent aux terminaux qui ne les redéfinissent pas.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    defaults = {
+        "port": DEFAULT_PORT,
+        "backend_url": config.get("backend_url", DEFAULT_BACKEND_URL),
+        "tenant_id": config.get("tenant_id"),
+        "check_interval": config.get("check_interval", CHECK_INTERVAL),
+        "timeout": config.get("timeout", TIMEOUT),
+        "ignored_employees": config.get("ignored_employees", []),
+        # Relève adaptative: check_interval devient l'intervalle de base
+        "adaptive_polling": config.get("adaptive_polling", True),
+        "min_interval": config.get("min_interval", MIN_INTERVAL),
+        "max_interval": config.get("max_interval", MAX_INTERVAL),
+        "shift_boundaries": config.get("shift_boundaries", []),  # "HH:MM" si le backend est injoignable
+    }
+
+    fleet = {}
+    for entry in config.get("terminals", []):
+        terminal = {**defaults, **entry}
+        if not terminal.get("ip") or not terminal.get("device_id"):
+            raise ValueError(f"Terminal incomplet (ip et device_id requis): {entry}")
+        if not terminal.get("tenant_id"):
+            raise ValueError(f"Terminal {terminal['device_id']}: tenant_id manquant")
+        terminal.setdefault("name", terminal["device_id"])
+        terminal["ignored_employees"] = [str(e) for e in terminal["ignored_employees"]]
+        if terminal["device_id"] in fleet:
+            raise ValueError(f"device_id en double: {terminal['device_id']}")
+        fleet[terminal["device_id"]] = terminal
+    return fleet
+
+
+def build_payload(terminal, attendance):
+    """Pointage au format du webhook (identique à zkteco_terminal_improved.py)"""
+    return {
+        "employeeId": str(attendance.user_id),
+        "timestamp": attendance.timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "type": "IN",
+        "method": VERIFY_MODE_MAP.get(attendance.punch, "MANUAL"),
+        "rawData": {
+            "confidence": 95,
+            "deviceId": terminal["device_id"],
+            "verifyMode": attendance.punch,
+            "status": attendance.status
+        }
+    }
+
+
+# =============================================================================
+# POLLING D'UN TERMINAL
+# =============================================================================
+class TerminalPoller(threading.Thread):
+    """Lit les nouveaux pointages d'un terminal et les dépose dans la queue partagée"""
+
+    def __init__(self, terminal, queue, state_dir, session, shift_windows=None):
+        super().__init__(name=f"poller-{terminal['device_id']}", daemon=True)
+        self.terminal = terminal
+        self.queue = queue
+        self.session = session
+        self.cursor_path = Path(state_dir) / f"cursor_{terminal['device_id']}.json"
+        self.stop_event = threading.Event()
+        self.metrics = terminal_metrics(terminal["device_id"])
+        self.log = logging.getLogger(f"terminal_supervisor.{terminal['device_id']}")
+        self.scheduler = None
+        if terminal["adaptive_polling"]:
+            self.scheduler = PollScheduler(shift_windows, terminal["min_interval"], terminal["check_interval"],
+                                           terminal["max_interval"])
+            self.metrics.track_poll_scheduler(self.scheduler)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        terminal = self.terminal
+        while not self.stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self.log.error(f"❌ {terminal['name']}: erreur de connexion: {e}")
+                self.session.invalidate()
+            if not self.stop_event.is_set():
+                delay = max(RECONNECT_DELAY, self.session.retry_in())
+                self.log.info(f"🔄 {terminal['name']}: reconnexion dans {delay:.0f}s")
+                self.stop_event.wait(delay)
+        self.log.info(f"👋 {terminal['name']}: poller arrêté")
+
+    def poll(self):
+        terminal = self.terminal
+        session = self.session
+        users_count, total_records = session.counts()
+        self.log.info(f"✅ {terminal['name']} connecté ({terminal['ip']}:{terminal['port']}, "
+                      f"{session.device_name()}, {users_count} utilisateurs)")
+        cursor = AttendanceCursor(self.cursor_path)
+        if not cursor.exists:
+            cursor.reset(total_records)
+            self.log.info(f"📍 {terminal['name']}: curseur initialisé sur le dernier pointage")
+
+        errors = 0
+        while not self.stop_event.is_set():
+            try:
+                # Connexion empruntée le temps de la lecture; une session tombée est rouverte ici
+                with session.lease() as conn:
+                    new_attendances = fetch_new_attendance(conn, cursor, log=self.log.warning)
+                errors = 0
+            except Exception as e:
+                self.metrics.parse_failures.inc()
+                errors += 1
+                self.log.warning(f"⚠️  {terminal['name']}: erreur de lecture: {e}")
+                if errors >= 3:
+                    raise  # Connexion probablement perdue: reconnecter
+                self.stop_event.wait(terminal["check_interval"])
+                continue
+
+            if new_attendances:
+                self.metrics.record_read(len(new_attendances), new_attendances[-1].timestamp)
+                items = [
+                    {
+                        "deviceId": terminal["device_id"],
+                        "tenantId": terminal["tenant_id"],
+                        "url": terminal["backend_url"],
+                        "payload": build_payload(terminal, attendance),
+                    }
+                    for attendance in new_attendances
+                    if str(attendance.user_id) not in terminal["ignored_employees"]
+                ]
+                # Le curseur n'avance qu'une fois les pointages écrits sur disque
+                self.queue.append_many(items)
+                for attendance in new_attendances:
+                    cursor.advance(attendance)
+                cursor.save()
+                self.log.info(f"📥 {terminal['name']}: {len(items)} nouveau(x) pointage(s) en queue")
+
+            self.stop_event.wait(self.next_interval(len(new_attendances)))
+
+    def next_interval(self, count):
+        if self.scheduler is None:
+            return self.terminal["check_interval"]
+        reason = self.scheduler.reason
+        self.scheduler.observe(count)
+        interval = self.scheduler.next_interval()
+        if self.scheduler.reason != reason:
+            stats = self.scheduler.stats()
+            self.log.info(f"⏱️  {self.terminal['name']}: relève toutes les {interval:.0f}s ({stats['reason']}, "
+                          f"{stats['rate_per_minute']} pointages/min)")
+        return interval
+
+
+# =============================================================================
+# ENVOI AU BACKEND
+# =============================================================================
+class Deliverer(threading.Thread):
+    """
+    Vide la queue partagée vers le backend avec une session HTTP commune:
+    voies parallèles par terminal et employé, débit plafonné, checkpoint par lot
+    """
+
+    def __init__(self, queue, timeout=TIMEOUT):
+        super().__init__(name="supervisor-delivery", daemon=True)
+        self.queue = queue
+        self.timeout = timeout
+        self.stop_event = threading.Event()
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE))
+        self.breakers = {}
+        self.breakers_lock = threading.Lock()  # send() est appelé depuis les voies du drainer
+        self.drainer = BacklogDrainer(
+            queue, self.send, key=lambda item: f"{item['deviceId']}:{item['payload']['employeeId']}",
+            workers=DRAIN_WORKERS, rate=DRAIN_RATE, batch_size=QUEUE_BATCH_SIZE, log=logger.info)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def breaker(self, url):
+        """Un circuit breaker par backend"""
+        with self.breakers_lock:
+            breaker = self.breakers.get(url)
+            if breaker is None:
+                breaker = self.breakers[url] = CircuitBreaker(
+                    CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_TIMEOUT, log=logger.warning)
+            return breaker
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if not self.queue.wait(1.0):
+                continue
+            # Un lot en échec (backend indisponible): le reste attend le prochain passage
+            if not self.drainer.drain_batch():
+                self.stop_event.wait(DELIVERY_RETRY_DELAY)
+        self.drainer.close()
+
+    def send(self, item):
+        """True si le pointage est traité (accepté, ou rejeté définitivement par le backend)"""
+        breaker = self.breaker(item["url"])
+        if not breaker.allow():
+            return False
+        metrics = terminal_metrics(item["deviceId"])
+        headers = {
+            "Content-Type": "application/json",
+            "X-Device-ID": item["deviceId"],
+            "X-Tenant-ID": item["tenantId"],
+        }
+        payload = item["payload"]
+
+        started = time.perf_counter()
+        try:
+            response = self.session.post(item["url"], json=payload, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            metrics.observe_request(time.perf_counter() - started, False)
+            breaker.on_failure()
+            logger.warning(f"⚠️  Backend injoignable ({item['deviceId']}): {e}")
+            return False
+        metrics.observe_request(time.perf_counter() - started, response.status_code in (200, 201))
+
+        if response.status_code in (200, 201):
+            breaker.on_success()
+            logger.info(f"✅ Pointage envoyé: {payload['employeeId']} à {payload['timestamp']} ({item['deviceId']})")
+            return True
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            # Rejet définitif (employé inconnu, données invalides): ne pas bloquer la queue
+            breaker.on_success()
+            logger.error(f"❌ Pointage rejeté {response.status_code} ({item['deviceId']}, "
+                         f"{payload['employeeId']} à {payload['timestamp']}): {response.text[:200]}")
+            return True
+        breaker.on_failure()
+        logger.error(f"❌ Backend error {response.status_code} ({item['deviceId']})")
+        return False
+
+
+# =============================================================================
+# SUPERVISEUR
+# =============================================================================
+class Supervisor:
+    def __init__(self, config_path, state_dir=STATE_DIR):
+        self.config_path = Path(config_path)
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.queue = WriteAheadQueue(self.state_dir / "queue")
+        self.deliverer = Deliverer(self.queue)
+        self.pollers = {}
+        self.stopping = {}  # Pollers arrêtés mais encore bloqués sur une commande: (poller, keep_session)
+        self.fleet = {}
+        self.shift_windows = {}  # Horaires de shift partagés par tenant
+        self.sessions = SessionManager(cache_dir=self.state_dir / "terminals", log=logger.info)
+        self.config_mtime = None
+        REGISTRY.gauge("pointage_queue_depth", "Pointages en attente dans la queue locale",
+                       ["terminal"]).labels("supervisor").set_function(lambda: len(self.queue))
+        # Débit, ETA et occupation des voies d'envoi
+        terminal_metrics("supervisor").track_backlog_drain(self.deliverer.drainer)
+
+    def reload(self):
+        """
+        Relit la configuration si le fichier a changé et applique les différences.
+        Un terminal dont l'ancien poller n'est pas encore terminé est redémarré à
+        un passage suivant: deux pollers ne partagent jamais un curseur.
+        """
+        self.reap_stopped()
+        fleet = self.read_config()
+        if fleet is not None:
+            for device_id in list(self.pollers):
+                terminal = fleet.get(device_id)
+                previous = self.fleet.get(device_id)
+                if terminal is None or terminal != previous:
+                    # Session conservée si les paramètres de connexion n'ont pas changé
+                    keep_session = terminal is not None and previous is not None and all(
+                        terminal[key] == previous[key] for key in ("ip", "port", "timeout"))
+                    self.stop_poller(device_id, keep_session)
+            self.fleet = fleet
+            logger.info(f"📋 Configuration chargée: {len(fleet)} terminal(aux)")
+        for device_id, terminal in self.fleet.items():
+            if device_id not in self.pollers and device_id not in self.stopping:
+                self.start_poller(terminal)
+
+    def read_config(self):
+        """Nouvelle configuration du parc, None si le fichier n'a pas changé ou est invalide"""
+        try:
+            mtime = self.config_path.stat().st_mtime
+        except FileNotFoundError:
+            if self.config_mtime is None:
+                raise
+            return None
+        if mtime == self.config_mtime:
+            return None
+
+        try:
+            fleet = load_fleet(self.config_path)
+        except (ValueError, OSError) as e:
+            # Fichier en cours d'édition ou invalide: on garde la configuration actuelle
+            logger.error(f"❌ Configuration invalide, ignorée: {e}")
+            if self.config_mtime is None:
+                raise
+            self.config_mtime = mtime
+            return None
+        self.config_mtime = mtime
+        return fleet
+
+    def windows_for(self, terminal):
+        """Horaires de shift du tenant du terminal (une lecture backend par tenant)"""
+        key = (terminal["backend_url"], terminal["tenant_id"], tuple(terminal["shift_boundaries"]))
+        windows = self.shift_windows.get(key)
+        if windows is None:
+            headers = {"X-Device-ID": terminal["device_id"], "X-Tenant-ID": terminal["tenant_id"]}
+            windows = self.shift_windows[key] = ShiftWindows(
+                shift_windows_url(terminal["backend_url"]), headers, terminal["shift_boundaries"],
+                session=self.deliverer.session, log=logger.info)
+        return windows
+
+    def start_poller(self, terminal):
+        session = self.sessions.session(terminal["ip"], terminal["port"], terminal["timeout"])
+        poller = TerminalPoller(terminal, self.queue, self.state_dir, session, self.windows_for(terminal))
+        self.pollers[terminal["device_id"]] = poller
+        poller.start()
+        logger.info(f"▶️  Terminal démarré: {terminal['name']} ({terminal['device_id']}, {terminal['ip']})")
+
+    def stop_poller(self, device_id, keep_session=False):
+        poller = self.pollers.pop(device_id)
+        poller.stop()
+        # Un poller bloqué sur une commande réseau s'arrête normalement au plus après le timeout
+        poller.join(poller.terminal["timeout"] + 1)
+        if poller.is_alive():
+            # Toujours bloqué: ni redémarrage ni fermeture de session avant sa fin (reap_stopped)
+            self.stopping[device_id] = (poller, keep_session)
+            logger.warning(f"⏳ Terminal {poller.terminal['name']} ({device_id}): arrêt en attente "
+                           f"d'une commande en cours, redémarrage différé")
+            return
+        self.finish_stop(poller, keep_session)
+
+    def reap_stopped(self):
+        """Termine l'arrêt des pollers qui étaient encore bloqués"""
+        for device_id, (poller, keep_session) in list(self.stopping.items()):
+            if not poller.is_alive():
+                del self.stopping[device_id]
+                self.finish_stop(poller, keep_session)
+
+    def finish_stop(self, poller, keep_session):
+        if not keep_session:
+            self.sessions.discard(poller.terminal["ip"], poller.terminal["port"])
+        logger.info(f"⏹️  Terminal arrêté: {poller.terminal['name']} ({poller.terminal['device_id']})")
+
+    def run(self):
+        self.reload()
+        self.deliverer.start()
+        try:
+            while True:
+                time.sleep(RELOAD_INTERVAL)
+                self.reload()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        for device_id in list(self.pollers):
+            self.stop_poller(device_id)
+        self.sessions.close()
+        self.deliverer.stop()
+        self.deliverer.join(TIMEOUT + 1)
+        self.queue.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Superviseur des terminaux ZKTeco (un processus pour tout le parc)")
+    parser.add_argument("--config", default=str(CONFIG_FILE),
+                        help="Fichier JSON des terminaux (relu automatiquement à chaque modification)")
+    parser.add_argument("--state-dir", default=str(STATE_DIR),
+                        help="Répertoire de la queue durable et des curseurs")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help=f"Port de l'endpoint /metrics Prometheus (défaut: {METRICS_PORT}, 0 = désactivé)")
+    parser.add_argument("--log-file", default=str(LOG_FILE),
+                        help="Fichier de log JSON-lines (rotation par taille, archives numérotées)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_logging("terminal_supervisor", args.log_file)
+    start_metrics_server(args.metrics_port)
+
+    logger.info("=" * 70)
+    logger.info(f"🛰️  Superviseur des terminaux - configuration: {args.config}")
+    logger.info(f"💾 État: {args.state_dir}")
+    logger.info("=" * 70)
+
+    supervisor = Supervisor(args.config, args.state_dir)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        logger.info("🛑 Arrêt demandé")
+    except Exception as e:
+        logger.error(f"💥 Erreur critique: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Tests de la lecture incrémentale (attendance_cursor) sur une connexion simulée"""
+
+from datetime import datetime
+from struct import pack
+
+import pytest
+from zk import ZK, const
+from zk.user import User
+
+from attendance_cursor import AttendanceCursor, fetch_new_attendance
+
+# ============================================================================
+# CONNEXION SIMULÉE
+# ============================================================================
+
+ENCODER = ZK("127.0.0.1")
+STAMPS = [datetime(2026, 1, 14, 8, minute) for minute in range(5)]
+
+
+def record_16(user_id, stamp, punch):
+    """Enregistrement de 16 octets (format des terminaux récents)"""
+    encoded = pack("<I", ENCODER._ZK__encode_time(stamp))
+    return pack("<I4sBB2sI", user_id, encoded, 1, punch, b"\x00\x00", 0)
+
+
+class FakeZK:
+    """
+    Sous-ensemble de pyzk.ZK utilisé par attendance_cursor: la commande 1503
+    répond soit CMD_DATA (journal dans la réponse, éventuellement sur plusieurs
+    paquets TCP), soit CMD_PREPARE_DATA (lecture par morceaux).
+    """
+
+    _ZK__decode_time = ENCODER._ZK__decode_time
+
+    def __init__(self, records, inline, tcp=True, first_packet=None):
+        self.records = len(records)
+        self.users = 1
+        self.tcp = tcp
+        body = b"".join(records)
+        self.buffer = pack("I", len(body)) + body
+        self.inline = inline
+        self.first_packet = first_packet
+        self.commands = []
+        self.chunks = []
+        self.freed = False
+        self._ZK__data = None
+        self._ZK__tcp_length = 0
+
+    def read_sizes(self):
+        self.commands.append("read_sizes")
+
+    def get_users(self):
+        self.commands.append("get_users")
+        return [User(1, "Awa", 0, user_id="123")]
+
+    def get_attendance(self):
+        raise AssertionError("la lecture incrémentale ne doit pas retomber sur get_attendance()")
+
+    def _ZK__send_command(self, command, command_string, response_size):
+        self.commands.append(command)
+        if self.inline:
+            # Réponse CMD_DATA: seul le premier paquet TCP est lu par send_command
+            cut = len(self.buffer) if self.first_packet is None else self.first_packet
+            self._ZK__data = self.buffer[:cut]
+            self._ZK__tcp_length = len(self.buffer) + 8
+            return {"status": True, "code": const.CMD_DATA}
+        self._ZK__data = b"\x00" + pack("I", len(self.buffer))
+        return {"status": True, "code": const.CMD_PREPARE_DATA}
+
+    def _ZK__recieve_raw_data(self, size):
+        self.commands.append(("recieve_raw_data", size))
+        start = len(self._ZK__data)
+        return self.buffer[start:start + size]
+
+    def _ZK__read_chunk(self, start, size):
+        self.chunks.append((start, size))
+        return self.buffer[start:start + size]
+
+    def free_data(self):
+        self.freed = True
+
+
+def make_records():
+    return [record_16(123, stamp, index % 2) for index, stamp in enumerate(STAMPS)]
+
+
+@pytest.fixture
+def cursor(tmp_path):
+    return AttendanceCursor(tmp_path / "cursor.json")
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+def test_cmd_data_decode_le_journal_de_la_reponse(cursor):
+    cursor.last_sn = 2
+    conn = FakeZK(make_records(), inline=True)
+
+    punches = fetch_new_attendance(conn, cursor)
+
+    assert [p.timestamp for p in punches] == STAMPS[2:]
+    assert [p.user_id for p in punches] == ["123"] * 3
+    assert [p.punch for p in punches] == [0, 1, 0]
+
+
+def test_cmd_data_complete_le_paquet_tcp_avant_de_decoder(cursor):
+    conn = FakeZK(make_records(), inline=True, first_packet=20)
+
+    punches = fetch_new_attendance(conn, cursor)
+
+    # Le reste de la réponse est lu sur la socket, sans autre commande
+    assert ("recieve_raw_data", 4 + 16 * 5 - 20) in conn.commands
+    assert [p.timestamp for p in punches] == STAMPS
+
+
+def test_cmd_data_udp_sans_lecture_complementaire(cursor):
+    cursor.last_sn = 4
+    conn = FakeZK(make_records(), inline=True, tcp=False)
+
+    punches = fetch_new_attendance(conn, cursor)
+
+    assert [p.timestamp for p in punches] == STAMPS[4:]
+    assert not any(isinstance(command, tuple) for command in conn.commands)
+
+
+def test_prepare_data_ne_lit_que_les_nouveaux_enregistrements(cursor):
+    cursor.last_sn = 3
+    conn = FakeZK(make_records(), inline=False)
+
+    punches = fetch_new_attendance(conn, cursor)
+
+    assert conn.chunks == [(4 + 3 * 16, 2 * 16)]
+    assert conn.freed
+    assert [p.timestamp for p in punches] == STAMPS[3:]
+
+
+def test_aucune_commande_si_le_nombre_d_enregistrements_n_a_pas_change(cursor):
+    cursor.last_sn = 5
+    conn = FakeZK(make_records(), inline=True)
+
+    assert fetch_new_attendance(conn, cursor) == []
+    assert conn.commands == ["read_sizes"]
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Tests du vidage de la queue locale en mode lot (backlog_drainer, batch=True)"""
+
+import pytest
+
+from backlog_drainer import BacklogDrainer
+from wal_queue import WriteAheadQueue
+
+
+def punches(count):
+    return [{"employeeId": str(100 + index % 3), "timestamp": f"2026-01-14T08:{index:02d}:00.000Z"}
+            for index in range(count)]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    wal = WriteAheadQueue(str(tmp_path / "queue"))
+    yield wal
+    wal.close()
+
+
+def test_un_envoi_par_lot_dans_l_ordre_de_la_queue(queue):
+    items = punches(10)
+    queue.append_many(items)
+    calls = []
+
+    def send(batch):
+        calls.append(batch)
+        return [True] * len(batch)
+
+    drainer = BacklogDrainer(queue, send, rate=None, batch=True, batch_size=4, log=lambda message: None)
+    assert drainer.drain() == 10
+
+    assert calls == [items[0:4], items[4:8], items[8:10]]
+    assert len(queue) == 0
+    assert drainer.dispatcher is None
+
+
+def test_seuls_les_pointages_refuses_sont_renvoyes(queue):
+    items = punches(5)
+    queue.append_many(items)
+    calls = []
+
+    def send(batch):
+        calls.append(batch)
+        # Premier envoi: le 3e pointage est refusé, les autres traités
+        return [len(calls) > 1 or item is not batch[2] for item in batch]
+
+    drainer = BacklogDrainer(queue, send, rate=None, batch=True, batch_size=10, log=lambda message: None)
+
+    assert not drainer.drain_batch()
+    assert len(queue) == 3  # Checkpoint au plus long préfixe acquitté
+    assert drainer.drain_batch()
+    assert calls[1] == [items[2]]
+    assert len(queue) == 0
+    assert drainer.sent == 5
+
+
+@pytest.mark.parametrize("outcomes", [[True], RuntimeError("backend indisponible")])
+def test_reponse_incomplete_ou_erreur_fait_echouer_tout_le_lot(queue, outcomes):
+    queue.append_many(punches(3))
+
+    def send(batch):
+        if isinstance(outcomes, Exception):
+            raise outcomes
+        return outcomes
+
+    drainer = BacklogDrainer(queue, send, rate=None, batch=True, log=lambda message: None)
+
+    assert not drainer.drain_batch()
+    assert len(queue) == 3
+    assert drainer.sent == 0
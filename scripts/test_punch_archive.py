@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Tests de l'archive locale des pointages (punch_archive): dédoublonnage, requêtes par période"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from zk.attendance import Attendance
+
+from punch_archive import RECORD_SIZE, PunchArchive
+
+DEVICE = "EJB8241100244"
+MONDAY = datetime(2026, 1, 12)
+
+
+def punch(user_id, timestamp, state=0, verify_mode=1):
+    return Attendance(user_id, timestamp, state, verify_mode, 0)
+
+
+def week():
+    """Deux pointages par jour et par employé, du lundi au vendredi (ordre du terminal)"""
+    return [punch(user_id, MONDAY + timedelta(days=day, hours=hour), state)
+            for day in range(5)
+            for hour, state in ((8, 0), (17, 1))
+            for user_id in ("00123", "42")]
+
+
+def keys(attendances):
+    return [(a.user_id, a.timestamp, a.status, a.punch) for a in attendances]
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return tmp_path / "archive"
+
+
+def test_ajout_et_relecture(directory):
+    archive = PunchArchive(directory)
+    assert archive.append(DEVICE, week()) == (20, 0)
+
+    reopened = PunchArchive(directory)
+    assert len(reopened) == 20
+    stored = reopened.attendances(DEVICE, MONDAY, MONDAY + timedelta(days=7))
+    assert sorted(keys(stored)) == sorted(keys(week()))
+    # Zéros de tête des matricules conservés
+    assert {a.user_id for a in stored} == {"00123", "42"}
+
+
+def test_journal_complet_relu_sans_doublon(directory):
+    archive = PunchArchive(directory)
+    archive.append(DEVICE, week()[:8])
+
+    # Journal complet du terminal: seuls les pointages absents sont ajoutés
+    assert archive.append(DEVICE, week()) == (12, 0)
+    assert archive.append(DEVICE, week()) == (0, 0)
+    assert len(archive) == 20
+    assert len(archive.records_between(DEVICE, MONDAY, MONDAY + timedelta(days=7))) == 20
+
+
+def test_meme_pointage_autre_state_conserve(directory):
+    archive = PunchArchive(directory)
+    archive.append(DEVICE, [punch("42", MONDAY + timedelta(hours=8), 0)])
+    assert archive.append(DEVICE, [punch("42", MONDAY + timedelta(hours=8), 1)]) == (1, 0)
+
+
+def test_doublons_dans_un_meme_ajout(directory):
+    archive = PunchArchive(directory)
+    duplicated = [punch("42", MONDAY + timedelta(hours=8))] * 3
+    assert archive.append(DEVICE, duplicated) == (1, 0)
+
+
+def test_periode_bornes_incluses_et_tri(directory):
+    archive = PunchArchive(directory)
+    archive.append(DEVICE, list(reversed(week())))
+
+    tuesday = MONDAY + timedelta(days=1)
+    stored = archive.attendances(DEVICE, tuesday + timedelta(hours=8), tuesday + timedelta(hours=17))
+    assert sorted((a.timestamp, a.user_id) for a in stored) == [
+        (tuesday + timedelta(hours=8), "00123"), (tuesday + timedelta(hours=8), "42"),
+        (tuesday + timedelta(hours=17), "00123"), (tuesday + timedelta(hours=17), "42"),
+    ]
+    assert [a.timestamp for a in stored] == sorted(a.timestamp for a in stored)
+
+    # Bornes à la seconde près, à cheval sur deux jours
+    stored = archive.attendances(DEVICE, MONDAY + timedelta(hours=17, seconds=1), tuesday + timedelta(hours=8))
+    assert {a.timestamp for a in stored} == {tuesday + timedelta(hours=8)}
+    assert archive.attendances(DEVICE, MONDAY + timedelta(hours=9), MONDAY + timedelta(hours=16)) == []
+
+
+def test_extents_sans_copie_par_jour(directory):
+    archive = PunchArchive(directory)
+    archive.append(DEVICE, week()[:4])
+    archive.append(DEVICE, week()[4:8])
+
+    views = archive.extents_between(DEVICE, MONDAY, MONDAY + timedelta(days=1, hours=23))
+    assert [len(view) // RECORD_SIZE for view in views] == [4, 4]
+    assert all(isinstance(view, memoryview) for view in views)
+
+
+def test_terminaux_separes(directory):
+    archive = PunchArchive(directory)
+    archive.append(DEVICE, week())
+    archive.append("EJB8241100241", week()[:2])
+
+    assert len(archive.records_between("EJB8241100241", MONDAY, MONDAY + timedelta(days=7))) == 2
+    assert archive.records_between("INCONNU", MONDAY, MONDAY + timedelta(days=7)) == []
+    summary = archive.summary()
+    assert summary[DEVICE] == (MONDAY.date(), (MONDAY + timedelta(days=4)).date(), 20)
+
+
+def test_pointage_hors_format_ignore(directory):
+    archive = PunchArchive(directory)
+    assert archive.append(DEVICE, [punch("42", MONDAY, state=300), punch("42", MONDAY, state=1)]) == (1, 1)
+
+
+def test_fin_non_referencee_tronquee_a_l_ouverture(directory):
+    archive = PunchArchive(directory)
+    archive.append(DEVICE, week())
+    # Crash pendant un ajout: enregistrements écrits mais absents de l'index
+    with open(directory / "punches.bin", "ab") as f:
+        f.write(b"\x00" * (RECORD_SIZE + 3))
+
+    reopened = PunchArchive(directory)
+    assert len(reopened) == 20
+    assert (directory / "punches.bin").stat().st_size == 20 * RECORD_SIZE
+    assert reopened.append(DEVICE, [punch("7", MONDAY)]) == (1, 0)
+    assert len(PunchArchive(directory).records_between(DEVICE, MONDAY, MONDAY)) == 1
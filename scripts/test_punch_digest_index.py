@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Tests de l'index des pointages acquittés (punch_digest_index): fusion au chargement, fin tronquée"""
+
+import random
+from array import array
+from datetime import datetime
+
+import pytest
+
+import punch_digest_index
+from punch_digest_index import DIGEST_SIZE, PunchDigestIndex, punch_digest, sorted_prefix
+
+
+def write_digests(path, digests, extra=b""):
+    with open(path, "ab") as f:
+        f.write(array("Q", digests).tobytes() + extra)
+
+
+def file_digests(path):
+    data = array("Q")
+    data.frombytes(path.read_bytes())
+    return data.tolist()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "sent.idx"
+
+
+def test_empreinte_stable_et_distincte():
+    stamp = datetime(2026, 1, 14, 8, 0)
+    assert punch_digest("EJB1", "00123", stamp, 0) == punch_digest("EJB1", "00123", stamp, 0)
+    assert punch_digest("EJB1", "00123", stamp, 0) != punch_digest("EJB1", "00123", stamp, 1)
+    assert punch_digest("EJB1", "00123", stamp, 0) != punch_digest("EJB2", "00123", stamp, 0)
+
+
+def test_ajout_flush_et_rechargement(path):
+    index = PunchDigestIndex(path)
+    for digest in (30, 10, 20, 10):
+        index.add(digest)
+    index.flush()
+
+    assert len(index) == 3
+    reloaded = PunchDigestIndex(path)
+    assert len(reloaded) == 3
+    assert all(digest in reloaded for digest in (10, 20, 30))
+    assert 15 not in reloaded
+    # Ajouts non triés compactés au chargement
+    assert file_digests(path) == [10, 20, 30]
+
+
+def test_fusion_de_la_fin_non_triee_avec_le_debut_compacte(path, monkeypatch):
+    monkeypatch.setattr(punch_digest_index, "LOAD_CHUNK", 4)
+    rng = random.Random(7)
+    compacted = sorted(rng.sample(range(1, 10 ** 6), 50))
+    # Ajouts postérieurs: nouveaux, doublons entre eux et déjà présents dans le début trié
+    appended = rng.sample(range(1, 10 ** 6), 30) + compacted[::7] + [compacted[0], compacted[-1]]
+    appended += appended[:5]
+    rng.shuffle(appended)
+    write_digests(path, compacted + appended)
+
+    index = PunchDigestIndex(path)
+
+    expected = sorted(set(compacted) | set(appended))
+    assert index.sorted.tolist() == expected
+    assert file_digests(path) == expected
+    assert all(digest in index for digest in expected)
+
+
+def test_fin_tronquee_ignoree_et_fichier_realigne(path):
+    write_digests(path, [1, 2, 3], extra=b"\x01\x02\x03")
+
+    index = PunchDigestIndex(path)
+    assert len(index) == 3
+    assert path.stat().st_size == 3 * DIGEST_SIZE
+
+    index.add(4)
+    index.flush()
+    assert PunchDigestIndex(path).sorted.tolist() == [1, 2, 3, 4]
+
+
+def test_fusion_des_ajouts_recents_au_seuil(path, monkeypatch):
+    monkeypatch.setattr(punch_digest_index, "MERGE_THRESHOLD", 4)
+    index = PunchDigestIndex(path)
+    for digest in (9, 3, 7, 1, 5):
+        index.add(digest)
+
+    assert index.sorted.tolist() == [1, 3, 7, 9]
+    assert index.recent == {5}
+    assert len(index) == 5
+    assert 7 in index and 5 in index
+
+
+@pytest.mark.parametrize("chunk", [2, 3, 1000])
+def test_prefixe_trie_a_cheval_sur_les_blocs(monkeypatch, chunk):
+    monkeypatch.setattr(punch_digest_index, "LOAD_CHUNK", chunk)
+    assert sorted_prefix(array("Q", [])) == 0
+    assert sorted_prefix(array("Q", [1, 2, 3, 4, 5])) == 5
+    assert sorted_prefix(array("Q", [1, 2, 3, 3, 5])) == 3  # Doublon: fin du début compacté
+    assert sorted_prefix(array("Q", [1, 2, 3, 9, 4, 5])) == 4
+    assert sorted_prefix(array("Q", [5, 1])) == 1
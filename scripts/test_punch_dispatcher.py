@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Tests du répartiteur par employé (punch_dispatcher): ordre par voie, arrêt d'une voie en échec"""
+
+import random
+import threading
+import time
+
+import pytest
+
+from punch_dispatcher import PunchDispatcher
+
+
+def punches(employees, per_employee):
+    """Pointages entrelacés de plusieurs employés, numérotés dans l'ordre de soumission par employé"""
+    return [{"employeeId": f"E{employee}", "seq": seq}
+            for seq in range(per_employee) for employee in range(employees)]
+
+
+@pytest.fixture
+def make_dispatcher():
+    dispatchers = []
+
+    def make(deliver, **kwargs):
+        dispatcher = PunchDispatcher(deliver, log=lambda message: None, **kwargs)
+        dispatchers.append(dispatcher)
+        return dispatcher
+
+    yield make
+    for dispatcher in dispatchers:
+        dispatcher.close()
+
+
+def test_ordre_conserve_par_employe_et_resultats_dans_l_ordre(make_dispatcher):
+    lock = threading.Lock()
+    delivered = []
+    rng = random.Random(3)
+
+    def deliver(item):
+        time.sleep(rng.random() / 1000)
+        with lock:
+            delivered.append((item["employeeId"], item["seq"]))
+        return True
+
+    dispatcher = make_dispatcher(deliver, lanes=4)
+    items = punches(12, 20)
+
+    assert dispatcher.dispatch(items) == [True] * len(items)
+    for employee in {employee for employee, _ in delivered}:
+        assert [seq for key, seq in delivered if key == employee] == list(range(20))
+
+
+def test_un_employe_toujours_dans_la_meme_voie(make_dispatcher):
+    dispatcher = make_dispatcher(lambda item: True, lanes=8)
+    other = make_dispatcher(lambda item: True, lanes=8)
+    for item in punches(50, 1):
+        assert dispatcher.lane_of(item) == other.lane_of(item)
+
+
+def test_voies_en_parallele(make_dispatcher):
+    running = set()
+    overlap = threading.Event()
+    lock = threading.Lock()
+
+    def deliver(item):
+        with lock:
+            running.add(item["employeeId"])
+            if len(running) > 1:
+                overlap.set()
+        time.sleep(0.02)
+        with lock:
+            running.discard(item["employeeId"])
+        return True
+
+    dispatcher = make_dispatcher(deliver, lanes=4)
+    dispatcher.dispatch(punches(16, 1))
+    assert overlap.is_set()
+
+
+def test_voie_en_echec_n_envoie_plus_rien_du_lot(make_dispatcher):
+    delivered = []
+
+    def deliver(item):
+        delivered.append((item["employeeId"], item["seq"]))
+        return not (item["employeeId"] == "E0" and item["seq"] == 1)
+
+    dispatcher = make_dispatcher(deliver, lanes=2)
+    items = punches(6, 4)
+    failed_lane = dispatcher.lane_of(items[0])
+
+    results = dispatcher.dispatch(items)
+
+    for item, ok in zip(items, results):
+        lane = dispatcher.lane_of(item)
+        if lane != failed_lane:
+            assert ok
+        elif item["employeeId"] == "E0":
+            assert ok == (item["seq"] == 0)
+    # Rien de la voie en échec n'est envoyé après le pointage refusé
+    failed_at = delivered.index(("E0", 1))
+    assert all(dispatcher.lane_of({"employeeId": employee}) != failed_lane
+               for employee, _ in delivered[failed_at + 1:])
+
+
+def test_sans_arret_sur_echec(make_dispatcher):
+    dispatcher = make_dispatcher(lambda item: item["seq"] != 0, lanes=2)
+    results = dispatcher.dispatch(punches(2, 3), stop_on_failure=False)
+    assert results == [False, False, True, True, True, True]
+
+
+def test_exception_comptee_comme_echec(make_dispatcher):
+    def deliver(item):
+        raise ConnectionError("backend indisponible")
+
+    dispatcher = make_dispatcher(deliver, lanes=2)
+    assert dispatcher.submit({"employeeId": "E1", "seq": 0}).result(timeout=2) is False
+
+
+def test_statistiques_des_voies(make_dispatcher):
+    release = threading.Event()
+    dispatcher = make_dispatcher(lambda item: release.wait(2), lanes=2)
+    futures = [dispatcher.submit(item) for item in punches(1, 9) + punches(3, 1)]
+
+    # En attente: l'employé qui monopolise sa voie est en tête
+    assert dispatcher.stats()["hot_keys"][0] == ("E0", 10)
+    release.set()
+    assert all(future.result(timeout=2) for future in futures)
+
+    stats = dispatcher.stats()
+    assert sum(lane["delivered"] for lane in stats["lanes"]) == 12
+    assert all(lane["depth"] == 0 for lane in stats["lanes"])
+    assert stats["skew"] >= 1.0
+    # Clés oubliées une fois traitées: pas de croissance avec le nombre d'employés vus
+    assert stats["hot_keys"] == []
+    assert not dispatcher.key_counts
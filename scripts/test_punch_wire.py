@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Tests du format binaire des lots (punch_wire)
+
+Le lot de FIXTURE_PATH est encodé ici et décodé par le backend
+(punch-wire.spec.ts): un changement de l'encodeur qui casse le décodeur
+TypeScript fait échouer ce test. Régénérer le fichier après un changement
+volontaire du format: python test_punch_wire.py
+"""
+
+import base64
+import gzip
+import json
+import struct
+from pathlib import Path
+
+import pytest
+
+from punch_wire import (CONTENT_TYPE, HEADER, MAGIC, METHODS, NO_METHOD, RECORD, WireFormat, decode_punches,
+                        encode_punches)
+
+FIXTURE_PATH = (Path(__file__).resolve().parent.parent
+                / "backend" / "src" / "modules" / "attendance" / "testing" / "punch-wire.fixture.json")
+
+# Cas limites du format: matricules (zéros de tête, UTF-8, 255 octets), méthode absente
+# (NO_METHOD), toutes les méthodes, state 255, horodatages avant 1970 (i64 négatif) et lointains
+FIXTURE_PUNCHES = (
+    [{"employeeId": "00123", "timestamp": "2026-01-14T08:00:00.000Z", "type": "IN", "terminalState": 0,
+      "method": "FINGERPRINT"},
+     {"employeeId": "00123", "timestamp": "2026-01-14T17:30:59.000Z", "type": "OUT", "terminalState": 1},
+     {"employeeId": "Élodie-7", "timestamp": "2026-01-15T00:00:00.000Z", "type": "IN", "terminalState": 255,
+      "method": "MANUAL"},
+     {"employeeId": "9" * 255, "timestamp": "2026-01-15T23:59:59.000Z", "type": "OUT", "terminalState": 5,
+      "method": "PIN_CODE"},
+     {"employeeId": "42", "timestamp": "1969-12-31T23:59:59.000Z", "type": "IN", "terminalState": 0},
+     {"employeeId": "42", "timestamp": "1900-01-01T00:00:00.000Z", "type": "OUT", "terminalState": 2,
+      "method": "RFID_BADGE"},
+     {"employeeId": "42", "timestamp": "9999-12-31T23:59:59.000Z", "type": "IN", "terminalState": 3,
+      "method": "FACE_RECOGNITION"}]
+    + [{"employeeId": "7", "timestamp": f"2026-02-0{index + 1}T12:00:00.000Z", "type": "IN", "terminalState": 0,
+        "method": method} for index, method in enumerate(METHODS)]
+)
+
+
+def raw_body(punches):
+    """Corps décompressé (tel que reçu par decodePunchBatch après le body parser)"""
+    return gzip.decompress(encode_punches(punches))
+
+
+def write_fixture():
+    FIXTURE_PATH.write_text(json.dumps({
+        "generatedBy": "scripts/test_punch_wire.py",
+        "body": base64.b64encode(raw_body(FIXTURE_PUNCHES)).decode("ascii"),
+        "punches": FIXTURE_PUNCHES,
+    }, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+
+class FakeResponse:
+    def __init__(self, status_code=201, accept_post=""):
+        self.status_code = status_code
+        self.headers = {"Accept-Post": accept_post} if accept_post else {}
+
+
+# ============================================================================
+# ENCODAGE / DÉCODAGE
+# ============================================================================
+
+def test_aller_retour_python():
+    assert decode_punches(encode_punches(FIXTURE_PUNCHES)) == FIXTURE_PUNCHES
+
+
+def test_lot_de_reference_du_backend_a_jour():
+    fixture = json.loads(FIXTURE_PATH.read_text(encoding="utf-8"))
+    assert fixture["punches"] == FIXTURE_PUNCHES
+    assert base64.b64decode(fixture["body"]) == raw_body(FIXTURE_PUNCHES)
+
+
+def test_disposition_des_enregistrements():
+    body = raw_body([{"employeeId": "00123", "timestamp": "1969-12-31T23:59:59.000Z", "type": "OUT",
+                      "terminalState": 1}])
+
+    assert HEADER.unpack_from(body) == (MAGIC, 1, 1)
+    assert body[HEADER.size:HEADER.size + 6] == b"\x0500123"
+    record = RECORD.unpack_from(body, HEADER.size + 6)
+    assert record == (0, -1, 1, 1, NO_METHOD)
+    assert len(body) == HEADER.size + 6 + RECORD.size
+
+
+def test_matricules_partages_entre_pointages():
+    body = raw_body(FIXTURE_PUNCHES[:2])
+    assert HEADER.unpack_from(body)[2] == 1
+
+
+def test_matricule_trop_long_refuse():
+    with pytest.raises(ValueError):
+        encode_punches([{"employeeId": "9" * 256, "timestamp": "2026-01-14T08:00:00.000Z", "type": "IN",
+                         "terminalState": 0}])
+
+
+@pytest.mark.parametrize("field, value", [("type", "BREAK"), ("method", "BADGE"), ("terminalState", 256)])
+def test_valeurs_hors_format_refusees(field, value):
+    punch = {"employeeId": "1", "timestamp": "2026-01-14T08:00:00.000Z", "type": "IN", "terminalState": 0,
+             field: value}
+    with pytest.raises((KeyError, struct.error)):
+        encode_punches([punch])
+
+
+def test_lot_corrompu_refuse():
+    body = bytearray(raw_body(FIXTURE_PUNCHES[:1]))
+    with pytest.raises(ValueError):
+        decode_punches(gzip.compress(bytes(body[:-1])))
+    body[:4] = b"PFP\x02"
+    with pytest.raises(ValueError):
+        decode_punches(gzip.compress(bytes(body)))
+
+
+# ============================================================================
+# NÉGOCIATION
+# ============================================================================
+
+def test_auto_passe_au_binaire_apres_annonce_du_backend():
+    wire = WireFormat("auto")
+    kwargs, headers = wire.request(FIXTURE_PUNCHES[:1])
+    assert kwargs == {"json": {"punches": FIXTURE_PUNCHES[:1]}}
+
+    assert wire.negotiate(FakeResponse(accept_post=f"application/json, {CONTENT_TYPE}")) is False
+    kwargs, headers = wire.request(FIXTURE_PUNCHES[:1])
+    assert headers["Content-Type"] == CONTENT_TYPE
+    assert decode_punches(kwargs["data"]) == FIXTURE_PUNCHES[:1]
+
+
+def test_auto_revient_au_json_sur_415():
+    wire = WireFormat("auto")
+    wire.negotiate(FakeResponse(accept_post=CONTENT_TYPE))
+
+    assert wire.negotiate(FakeResponse(status_code=415)) is True
+    assert not wire.binary
+
+
+def test_format_impose_non_negocie():
+    wire = WireFormat("json")
+    assert wire.negotiate(FakeResponse(accept_post=CONTENT_TYPE)) is False
+    assert not wire.binary
+    wire = WireFormat("binary")
+    assert wire.negotiate(FakeResponse(status_code=415)) is False
+    assert wire.binary
+    with pytest.raises(ValueError):
+        WireFormat("xml")
+
+
+if __name__ == "__main__":
+    write_fixture()
+    print(f"💾 Lot de référence écrit: {FIXTURE_PATH}")
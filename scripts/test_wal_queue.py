@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Tests de la queue locale durable (wal_queue): reprise après crash, réparation de fin, compactage"""
+
+import time
+
+import pytest
+
+from wal_queue import CHECKPOINT_FILE, WriteAheadQueue
+
+
+def punches(start, count):
+    return [{"employeeId": str(index), "timestamp": f"2026-01-14T08:00:{index % 60:02d}"}
+            for index in range(start, start + count)]
+
+
+def segments(directory):
+    return sorted(path.name for path in directory.glob("segment-*.log"))
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return tmp_path / "queue"
+
+
+def test_lecture_dans_l_ordre_et_commit(directory):
+    queue = WriteAheadQueue(str(directory))
+    queue.append_many(punches(0, 5))
+    queue.append(punches(5, 1)[0])
+
+    batch = queue.read_batch(4)
+    assert [item for item, _ in batch] == punches(0, 4)
+    assert len(queue) == 6
+
+    queue.commit(batch[-1][1])
+    assert len(queue) == 2
+    assert [item for item, _ in queue.read_batch(10)] == punches(4, 2)
+    queue.close()
+
+
+def test_reprise_apres_crash_au_dernier_checkpoint(directory):
+    queue = WriteAheadQueue(str(directory))
+    queue.append_many(punches(0, 10))
+    queue.commit(queue.read_batch(3)[-1][1])
+    # Pointages lus mais non acquittés avant le crash: relus à la reprise
+    queue.read_batch(5)
+    # Crash: pas de close(), les ajouts durables sont déjà synchronisés
+    reopened = WriteAheadQueue(str(directory))
+
+    assert len(reopened) == 7
+    assert [item for item, _ in reopened.read_batch(100)] == punches(3, 7)
+    queue.close()
+    reopened.close()
+
+
+def test_reprise_apres_arret_propre(directory):
+    queue = WriteAheadQueue(str(directory), durable=False)
+    queue.append_many(punches(0, 4))
+    queue.commit(queue.read_batch(4)[-1][1])
+    queue.append_many(punches(4, 2))
+    queue.close()
+
+    reopened = WriteAheadQueue(str(directory))
+    assert len(reopened) == 2
+    assert [item for item, _ in reopened.read_batch(10)] == punches(4, 2)
+    reopened.close()
+
+
+def test_ligne_incomplete_tronquee_a_l_ouverture(directory):
+    queue = WriteAheadQueue(str(directory))
+    queue.append_many(punches(0, 3))
+    queue.close()
+    # Crash pendant une écriture: dernière ligne sans saut de ligne
+    [segment] = segments(directory)
+    with open(directory / segment, "ab") as f:
+        f.write(b'{"employeeId":"99","timest')
+
+    reopened = WriteAheadQueue(str(directory))
+    assert len(reopened) == 3
+    reopened.append(punches(3, 1)[0])
+    assert [item for item, _ in reopened.read_batch(10)] == punches(0, 4)
+    reopened.close()
+
+
+def test_segment_entierement_incomplet_vide(directory):
+    directory.mkdir()
+    (directory / "segment-00000001.log").write_bytes(b'{"employeeId":"1"')
+
+    queue = WriteAheadQueue(str(directory))
+    assert len(queue) == 0
+    assert (directory / "segment-00000001.log").stat().st_size == 0
+    queue.close()
+
+
+def test_lecture_a_travers_les_segments(directory):
+    queue = WriteAheadQueue(str(directory), segment_max_bytes=200)
+    for start in range(0, 30, 3):
+        queue.append_many(punches(start, 3))
+
+    assert len(segments(directory)) > 1
+    assert [item for item, _ in queue.read_batch(100)] == punches(0, 30)
+    queue.close()
+
+
+def test_compactage_des_segments_acquittes(directory):
+    queue = WriteAheadQueue(str(directory), segment_max_bytes=200)
+    for start in range(0, 30, 3):
+        queue.append_many(punches(start, 3))
+    before = segments(directory)
+
+    batch = queue.read_batch(18)
+    queue.commit(batch[-1][1])
+    last_needed = f"segment-{batch[-1][1][0]:08d}.log"
+
+    # Segments antérieurs au checkpoint supprimés en arrière-plan, les suivants conservés
+    assert wait_for(lambda: segments(directory)[0] == last_needed)
+    assert segments(directory) == [name for name in before if name >= last_needed]
+    assert [item for item, _ in queue.read_batch(100)] == punches(18, 12)
+    queue.close()
+
+    reopened = WriteAheadQueue(str(directory))
+    assert len(reopened) == 12
+    reopened.close()
+
+
+def test_checkpoint_anterieur_au_premier_segment(directory):
+    queue = WriteAheadQueue(str(directory), segment_max_bytes=200)
+    for start in range(0, 30, 3):
+        queue.append_many(punches(start, 3))
+    queue.commit(queue.read_batch(18)[-1][1])
+    assert wait_for(lambda: segments(directory)[0] != "segment-00000001.log")
+    queue.close()
+    # Checkpoint restauré d'une sauvegarde: son segment a été supprimé depuis
+    (directory / CHECKPOINT_FILE).write_text('{"segment": 1, "offset": 120, "index": 0}')
+
+    reopened = WriteAheadQueue(str(directory))
+    items = [item for item, _ in reopened.read_batch(100)]
+    first = int(items[0]["employeeId"])
+    # Reprise au début du premier segment restant
+    assert 0 < first <= 18
+    assert items == punches(first, 30 - first)
+    assert len(reopened) == len(items)
+    reopened.close()
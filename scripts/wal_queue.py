@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Queue locale durable (write-ahead log segmenté) pour les pointages en attente d'envoi
+
+- Les pointages sont ajoutés en fin de segment (une ligne JSON par pointage):
+  ajout en O(1), jamais de réécriture du fichier.
+- fsync groupé: les ajouts concurrents partagent un même fsync (group commit);
+  en mode durable=False, un thread de fond synchronise toutes les
+  flush_interval secondes.
+- Le consommateur lit par lots à partir de son offset et ne l'avance (commit)
+  qu'une fois les pointages acceptés par le backend. L'offset est conservé dans
+  un fichier checkpoint séparé, écrit de manière atomique.
+- Les segments entièrement acquittés sont supprimés en arrière-plan.
+- Après un crash, une dernière ligne incomplète est tronquée à l'ouverture.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_FILE = "checkpoint.json"
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024  # Rotation du segment actif au-delà de 4 Mo
+FLUSH_INTERVAL = 0.2  # Secondes entre deux fsync en mode non durable
+
+
+class WriteAheadQueue:
+    def __init__(self, directory, durable=True, segment_max_bytes=SEGMENT_MAX_BYTES,
+                 flush_interval=FLUSH_INTERVAL):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_path = self.directory / CHECKPOINT_FILE
+        self.durable = durable
+        self.segment_max_bytes = segment_max_bytes
+        self.flush_interval = flush_interval
+
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.sync_lock = threading.Lock()
+        self.compact_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.closed = False
+
+        # Position du consommateur: (segment, offset dans le segment, index du pointage)
+        self.read_segment, self.read_offset, self.read_index = self._load_checkpoint()
+
+        segments = self._list_segments()
+        if not segments:
+            segments = [max(1, self.read_segment)]
+        if self.read_segment not in segments:
+            # Checkpoint plus ancien que le premier segment restant
+            self.read_segment, self.read_offset = segments[0], 0
+        self._repair_tail(self._segment_path(segments[-1]))
+
+        self.write_segment = segments[-1]
+        self.segment_file = open(self._segment_path(self.write_segment), "ab")
+        self.segment_size = self.segment_file.tell()
+
+        # Compteurs d'ajouts: écrits (write_index) et synchronisés sur disque (synced_index)
+        self.write_index = self.read_index + self._count_pending(segments)
+        self.synced_index = self.write_index
+
+        self.compactor = threading.Thread(target=self._compaction_loop, name="wal-compaction")
+        self.compactor.daemon = True
+        self.compactor.start()
+        if not durable:
+            self.flusher = threading.Thread(target=self._flush_loop, name="wal-flush")
+            self.flusher.daemon = True
+            self.flusher.start()
+        self.compact_event.set()
+
+    # -------------------------------------------------------------------------
+    # Producteur
+    # -------------------------------------------------------------------------
+    def append(self, item):
+        """Ajoute un pointage; en mode durable, retourne une fois écrit sur disque"""
+        self.append_many([item])
+
+    def append_many(self, items):
+        """Ajoute plusieurs pointages (un seul fsync pour l'ensemble)"""
+        if not items:
+            return
+        data = b"".join(self._encode(item) for item in items)
+        with self.lock:
+            if self.segment_size >= self.segment_max_bytes:
+                self._roll_segment()
+            self.segment_file.write(data)
+            self.segment_size += len(data)
+            self.write_index += len(items)
+            target = self.write_index
+            self.not_empty.notify_all()
+        if self.durable:
+            self._sync_to(target)
+
+    def flush(self):
+        """Force l'écriture sur disque de tous les ajouts en cours"""
+        with self.lock:
+            target = self.write_index
+        self._sync_to(target)
+
+    # -------------------------------------------------------------------------
+    # Consommateur
+    # -------------------------------------------------------------------------
+    def read_batch(self, max_items):
+        """
+        Lit jusqu'à max_items pointages non acquittés, dans l'ordre d'ajout.
+        Retourne [(item, position), ...]; passer la position du dernier
+        pointage traité à commit().
+        """
+        batch = []
+        with self.lock:
+            segment, offset, index = self.read_segment, self.read_offset, self.read_index
+            last_segment = self.write_segment
+            self.segment_file.flush()
+
+        while len(batch) < max_items:
+            path = self._segment_path(segment)
+            if path.exists():
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    while len(batch) < max_items:
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        index += 1
+                        batch.append((json.loads(line), (segment, offset, index)))
+            if len(batch) >= max_items or segment >= last_segment:
+                break
+            # Segment terminé: passer au suivant
+            segment, offset = segment + 1, 0
+        return batch
+
+    def commit(self, position):
+        """Marque comme acquittés tous les pointages jusqu'à position (incluse)"""
+        segment, offset, index = position
+        with self.lock:
+            if index <= self.read_index:
+                return
+            self.read_segment, self.read_offset, self.read_index = segment, offset, index
+            self._write_checkpoint()
+        self.compact_event.set()
+
+    def wait(self, timeout):
+        """Attend qu'au moins un pointage soit en attente (ou timeout); retourne la profondeur"""
+        with self.lock:
+            if self.write_index == self.read_index:
+                self.not_empty.wait(timeout)
+            return self.write_index - self.read_index
+
+    def __len__(self):
+        with self.lock:
+            return self.write_index - self.read_index
+
+    def close(self):
+        self.stop_event.set()
+        self.flush()
+        with self.lock:
+            self.closed = True
+            self.segment_file.close()
+        self.compact_event.set()
+
+    # -------------------------------------------------------------------------
+    # Interne
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _encode(item):
+        return json.dumps(item, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+
+    def _segment_path(self, segment):
+        return self.directory / f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}"
+
+    def _list_segments(self):
+        segments = []
+        for path in self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"):
+            try:
+                segments.append(int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def _roll_segment(self):
+        """Ferme le segment actif et en ouvre un nouveau (appelé sous self.lock)"""
+        self.segment_file.flush()
+        os.fsync(self.segment_file.fileno())
+        self.synced_index = max(self.synced_index, self.write_index)
+        self.segment_file.close()
+        self.write_segment += 1
+        self.segment_file = open(self._segment_path(self.write_segment), "ab")
+        self.segment_size = 0
+        self.compact_event.set()
+
+    def _sync_to(self, target):
+        """
+        fsync groupé: si un autre thread a déjà synchronisé au-delà de target,
+        il n'y a rien à faire; sinon un seul fsync couvre tous les ajouts en cours.
+        """
+        with self.sync_lock:
+            if self.synced_index >= target:
+                return
+            with self.lock:
+                if self.closed:
+                    return
+                self.segment_file.flush()
+                covered = self.write_index
+                fileno = self.segment_file.fileno()
+            try:
+                os.fsync(fileno)
+            except OSError:
+                # Segment fermé entre-temps par une rotation, qui l'a déjà synchronisé
+                pass
+            self.synced_index = max(self.synced_index, covered)
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except (OSError, ValueError):
+                pass
+
+    def _compaction_loop(self):
+        """Supprime les segments dont tous les pointages sont acquittés"""
+        while True:
+            self.compact_event.wait()
+            self.compact_event.clear()
+            with self.lock:
+                if self.closed:
+                    return
+                first_needed = min(self.read_segment, self.write_segment)
+            for segment in self._list_segments():
+                if segment >= first_needed:
+                    break
+                try:
+                    self._segment_path(segment).unlink()
+                except OSError:
+                    pass
+
+    def _write_checkpoint(self):
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "segment": self.read_segment,
+                "offset": self.read_offset,
+                "index": self.read_index,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                data = json.load(f)
+            return int(data.get("segment", 1)), int(data.get("offset", 0)), int(data.get("index", 0))
+        except (FileNotFoundError, ValueError):
+            return 1, 0, 0
+
+    @staticmethod
+    def _repair_tail(path):
+        """Supprime une dernière ligne incomplète (crash pendant une écriture)"""
+        if not path.exists():
+            return
+        with open(path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # Revenir jusqu'au dernier saut de ligne
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                f.seek(position - step)
+                chunk = f.read(step)
+                index = chunk.rfind(b"\n")
+                if index >= 0:
+                    f.truncate(position - step + index + 1)
+                    return
+                position -= step
+            f.truncate(0)
+
+    def _count_pending(self, segments):
+        """Nombre de pointages non acquittés (lecture unique au démarrage)"""
+        count = 0
+        for segment in segments:
+            if segment < self.read_segment:
+                continue
+            path = self._segment_path(segment)
+            if not path.exists():
+                continue
+            start = self.read_offset if segment == self.read_segment else 0
+            if start > path.stat().st_size:
+                start = 0
+                self.read_offset = 0
+            with open(path, "rb") as f:
+                f.seek(start)
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    count += chunk.count(b"\n")
+        return count
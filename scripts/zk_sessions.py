@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Sessions persistantes vers les terminaux ZKTeco
+
+Au lieu d'ouvrir une connexion par outil et par exécution (ZK(...).connect()
+puis get_device_name et get_firmware_version à chaque fois):
+- une session longue par terminal (ip, port), prêtée (lease) au code de
+  synchronisation, de diagnostic et de polling; un verrou par session
+  sérialise les commandes (pyzk n'est pas thread-safe);
+- sonde de maintien (read_sizes, une petite commande) sur les sessions
+  inactives depuis KEEPALIVE_INTERVAL; une session qui ne répond plus est
+  fermée puis reconnectée en arrière-plan (recul exponentiel), pour que le
+  prochain emprunt la trouve déjà ouverte;
+- métadonnées en cache, aussi sur disque (CACHE_DIR): nom, firmware et numéro
+  de série relus une fois par jour, y compris d'un processus à l'autre.
+  Aucune donnée des utilisateurs (badges, mots de passe) n'est écrite sur disque.
+
+    from zk_sessions import SESSIONS
+    session = SESSIONS.session("192.168.16.174", 4370, timeout=10)
+    with session.lease() as conn:
+        attendances = conn.get_attendance()
+    print(session.device_name(), session.counts())
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from zk import ZK
+from zk.exception import ZKError
+
+CACHE_DIR = Path(__file__).resolve().parent / "zk_cache"  # Métadonnées des terminaux (un JSON par terminal)
+KEEPALIVE_INTERVAL = 60  # Secondes d'inactivité avant une sonde de maintien
+RECONNECT_BASE_DELAY = 2  # Recul après un échec de connexion: 2, 4, 8... secondes
+RECONNECT_MAX_DELAY = 300
+METADATA_TTL = 86400  # Nom, firmware et numéro de série relus une fois par jour
+
+# Erreurs qui laissent la connexion dans un état inconnu: la session est fermée
+NETWORK_ERRORS = (OSError, ZKError)
+
+
+class SessionUnavailable(ConnectionError):
+    """Terminal injoignable; nouvelle tentative de connexion après le recul"""
+
+
+class TerminalSession:
+    def __init__(self, ip, port=4370, timeout=10, cache_dir=CACHE_DIR, ommit_ping=False, log=print):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.ommit_ping = ommit_ping
+        self.log = log
+        self.lock = threading.RLock()
+        self.conn = None
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.last_used = 0.0
+        self.connects = 0
+        self.cache_path = Path(cache_dir) / f"terminal_{ip.replace('.', '_')}_{port}.json" if cache_dir else None
+        self.metadata = self._load_cache()
+
+    @property
+    def connected(self):
+        return self.conn is not None
+
+    def retry_in(self):
+        """Secondes avant la prochaine tentative de connexion autorisée"""
+        return max(0.0, self.next_attempt - time.monotonic())
+
+    @contextmanager
+    def lease(self):
+        """
+        Connexion prêtée à l'appelant (accès exclusif pendant le bloc). Ouvre la
+        session si besoin; une erreur réseau dans le bloc ferme la session
+        (reconnectée au prochain emprunt ou par la sonde de maintien).
+        """
+        with self.lock:
+            conn = self._ensure_connected()
+            try:
+                yield conn
+            except NETWORK_ERRORS:
+                self.invalidate()
+                raise
+            finally:
+                self.last_used = time.monotonic()
+
+    def probe(self):
+        """Sonde de maintien (une petite commande); False si la session est tombée"""
+        try:
+            with self.lease() as conn:
+                conn.read_sizes()
+            return True
+        except (SessionUnavailable, *NETWORK_ERRORS):
+            return False
+
+    def invalidate(self):
+        with self.lock:
+            if self.conn is None:
+                return
+            try:
+                self.conn.disconnect()
+            except Exception:
+                pass
+            self.conn = None
+            self.log(f"⚠️  Session {self.ip}:{self.port} fermée (terminal ne répond plus)")
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                try:
+                    self.conn.disconnect()
+                except Exception:
+                    pass
+                self.conn = None
+
+    # -------------------------------------------------------------------------
+    # Métadonnées en cache
+    # -------------------------------------------------------------------------
+    def device_name(self):
+        return self._device_info()["name"]
+
+    def firmware_version(self):
+        return self._device_info()["firmware"]
+
+    def serial_number(self):
+        return self._device_info()["serial"]
+
+    def counts(self):
+        """(utilisateurs, pointages) enregistrés dans le terminal (une petite commande)"""
+        with self.lease() as conn:
+            conn.read_sizes()
+            return conn.users, conn.records
+
+    # -------------------------------------------------------------------------
+    # Interne
+    # -------------------------------------------------------------------------
+    def _ensure_connected(self):
+        if self.conn is not None:
+            return self.conn
+        wait = self.retry_in()
+        if wait > 0:
+            raise SessionUnavailable(f"Terminal {self.ip}:{self.port} injoignable, nouvelle tentative dans {wait:.0f}s")
+        try:
+            self.conn = ZK(self.ip, port=self.port, timeout=self.timeout, ommit_ping=self.ommit_ping).connect()
+        except Exception as e:
+            self.failures += 1
+            delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** (self.failures - 1))
+            self.next_attempt = time.monotonic() + delay
+            raise SessionUnavailable(f"Connexion à {self.ip}:{self.port} impossible: {e}") from e
+        if self.failures:
+            self.log(f"🔌 Session {self.ip}:{self.port} rétablie après {self.failures} échec(s)")
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.connects += 1
+        return self.conn
+
+    def _device_info(self):
+        if time.time() - self.metadata.get("fetched_at", 0) > METADATA_TTL or "name" not in self.metadata:
+            with self.lease() as conn:
+                self.metadata.update({
+                    "name": conn.get_device_name(),
+                    "firmware": conn.get_firmware_version(),
+                    "serial": conn.get_serialnumber(),
+                    "fetched_at": time.time(),
+                })
+            self._save_cache()
+        return self.metadata
+
+    def _load_cache(self):
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        if "users" in metadata:
+            # Liste des utilisateurs des anciennes versions (avec numéros de badge): effacée du disque
+            del metadata["users"]
+            metadata.pop("users_count", None)
+            self.metadata = metadata
+            self._save_cache()
+        return metadata
+
+    def _save_cache(self):
+        if self.cache_path is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.metadata, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+
+class SessionManager:
+    """Une session par terminal, maintenues par un thread de fond"""
+
+    def __init__(self, keepalive_interval=KEEPALIVE_INTERVAL, cache_dir=CACHE_DIR, log=print):
+        self.keepalive_interval = keepalive_interval
+        self.cache_dir = cache_dir
+        self.log = log
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def session(self, ip, port=4370, timeout=10, ommit_ping=False):
+        with self.lock:
+            session = self.sessions.get((ip, port))
+            if session is None:
+                session = self.sessions[(ip, port)] = TerminalSession(
+                    ip, port, timeout, self.cache_dir, ommit_ping, self.log)
+            if self.thread is None and self.keepalive_interval:
+                self.thread = threading.Thread(target=self._keepalive_loop, name="zk-keepalive", daemon=True)
+                self.thread.start()
+            return session
+
+    def discard(self, ip, port=4370):
+        """Ferme et oublie la session d'un terminal retiré"""
+        with self.lock:
+            session = self.sessions.pop((ip, port), None)
+        if session is not None:
+            session.close()
+
+    def stats(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return {
+            f"{s.ip}:{s.port}": {"connected": s.connected, "connects": s.connects, "failures": s.failures}
+            for s in sessions
+        }
+
+    def close(self):
+        self.stop_event.set()
+        with self.lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            session.close()
+
+    def _keepalive_loop(self):
+        step = max(1.0, self.keepalive_interval / 4)
+        while not self.stop_event.wait(step):
+            with self.lock:
+                sessions = list(self.sessions.values())
+            now = time.monotonic()
+            for session in sessions:
+                # Session empruntée: en cours d'utilisation, rien à vérifier
+                if not session.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if session.connected and now - session.last_used >= self.keepalive_interval:
+                        session.probe()
+                    elif not session.connected and session.connects and session.retry_in() == 0:
+                        # Reconnexion anticipée d'une session tombée
+                        session.probe()
+                finally:
+                    session.lock.release()
+
+
+# Gestionnaire partagé par les outils d'un même processus (sessions fermées à la sortie)
+SESSIONS = SessionManager()
+atexit.register(SESSIONS.close)
@@ -7,11 +7,17 @@ Avec: Retry Logic, Circuit Breaker, Queue Locale
 import time
 import requests
 import json
-import sys
-from datetime import datetime, timedelta
-from zk import ZK
 from pathlib import Path
-from functools import wraps
+from requests.adapters import HTTPAdapter
+from agent_logging import setup_logging
+from agent_metrics import TerminalMetrics, start_metrics_server
+from circuit_breaker import CircuitBreaker
+from poll_scheduler import PollScheduler, ShiftWindows, shift_windows_url
+from retry_scheduler import RetryScheduler
+from wal_queue import WriteAheadQueue
+from backlog_drainer import BacklogDrainer
+from attendance_cursor import AttendanceCursor, fetch_new_attendance
+from zk_sessions import SESSIONS
 
 # =============================================================================
 # CONFIGURATION
@@ -22,8 +28,16 @@ BACKEND_URL = "http://localhost:3000/api/v1/attendance/webhook"
 DEVICE_ID = "TERMINAL-PRINC-001"  # À MODIFIER
 TENANT_ID = "90fab0cc-8539-4566-8da7-8742e9b6937b"
 CHECK_INTERVAL = 10
+ADAPTIVE_POLLING = True  # Relève serrée autour des horaires de shift, espacée hors activité (CHECK_INTERVAL = base)
+SHIFT_BOUNDARIES = []  # Horaires "HH:MM" utilisés si le backend ne répond pas (ex: ["08:00", "17:00"])
 LOG_FILE = "C:\\Users\\yassi\\terminal1_improved.log"  # À MODIFIER
-QUEUE_FILE = "C:\\Users\\yassi\\attendance_queue_t1.json"  # À MODIFIER
+QUEUE_DIR = "C:\\Users\\yassi\\attendance_queue_t1"  # À MODIFIER
+QUEUE_FILE = "C:\\Users\\yassi\\attendance_queue_t1.json"  # Ancienne queue JSON (migrée au démarrage)
+QUEUE_BATCH_SIZE = 100  # Pointages lus par lot lors du traitement de la queue (un checkpoint par lot)
+DRAIN_WORKERS = 4  # Envois en parallèle pendant le vidage de la queue (voies par employé)
+DRAIN_RATE = 20  # Requêtes/s au plus vers le backend pendant le vidage de la queue
+CURSOR_FILE = "C:\\Users\\yassi\\last_sync_state_t1.json"  # À MODIFIER (dernier enregistrement traité)
+METRICS_PORT = 9102  # Endpoint Prometheus http://localhost:9102/metrics (0 = désactivé)
 
 # Paramètres améliorés
 TIMEOUT = 10  # Augmenté de 5s à 10s
@@ -31,6 +45,8 @@ MAX_RETRIES = 5
 BASE_RETRY_DELAY = 2
 CIRCUIT_BREAKER_THRESHOLD = 10
 CIRCUIT_BREAKER_TIMEOUT = 60
+RECONNECT_DELAY = 30
+MAX_LOOP_ERRORS = 3  # Erreurs de lecture consécutives avant reconnexion au terminal
 
 # Employés à ignorer (si ce sont des tests)
 IGNORED_EMPLOYEES = ["78", "80"]  # Optionnel
@@ -47,174 +63,148 @@ VERIFY_MODE_MAP = {
 # =============================================================================
 # LOGGING
 # =============================================================================
+# Écriture par un thread de fond (JSON-lines, rotation par taille avec archives
+# numérotées): un message ne coûte qu'un dépôt en file mémoire
+logger = setup_logging("zkteco_terminal_improved", LOG_FILE, console=False)
+
 def log(message):
     """Écrire dans le fichier de log"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"[{timestamp}] {message}\n")
-    # Rotation: garder seulement les 1000 dernières lignes
-    try:
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        if len(lines) > 1000:
-            with open(LOG_FILE, "w", encoding="utf-8") as f:
-                f.writelines(lines[-1000:])
-    except:
-        pass
+    logger.info(message)
 
 # =============================================================================
-# CIRCUIT BREAKER
+# MÉTRIQUES
 # =============================================================================
-class CircuitBreaker:
-    def __init__(self, failure_threshold=10, timeout=60):
-        self.failure_count = 0
-        self.failure_threshold = failure_threshold
-        self.timeout = timeout
-        self.last_failure_time = None
-        self.state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
-    
-    def call(self, func, *args, **kwargs):
-        if self.state == "OPEN":
-            if self.last_failure_time and time.time() - self.last_failure_time > self.timeout:
-                self.state = "HALF_OPEN"
-                log("🔄 Circuit breaker: Tentative de reconnexion...")
-            else:
-                log("🛑 Circuit breaker OPEN: Backend indisponible, attente...")
-                return False
-        
-        try:
-            result = func(*args, **kwargs)
-            if result:
-                self.on_success()
-            else:
-                self.on_failure()
-            return result
-        except Exception as e:
-            self.on_failure()
-            log(f"💥 Exception dans circuit breaker: {e}")
-            return False
-    
-    def on_success(self):
-        if self.state == "HALF_OPEN":
-            log("✅ Circuit breaker: Backend rétabli, passage en CLOSED")
-        self.failure_count = 0
-        self.state = "CLOSED"
-    
-    def on_failure(self):
-        self.failure_count += 1
-        self.last_failure_time = time.time()
-        if self.failure_count >= self.failure_threshold:
-            if self.state != "OPEN":
-                self.state = "OPEN"
-                log(f"🛑 Circuit breaker OPEN après {self.failure_count} échecs consécutifs")
+metrics = TerminalMetrics(DEVICE_ID)
 
+# =============================================================================
+# CIRCUIT BREAKER
+# =============================================================================
 # Instance globale du circuit breaker
 circuit_breaker = CircuitBreaker(
     failure_threshold=CIRCUIT_BREAKER_THRESHOLD,
-    timeout=CIRCUIT_BREAKER_TIMEOUT
+    timeout=CIRCUIT_BREAKER_TIMEOUT,
+    log=log
 )
+metrics.track_circuit_breaker(circuit_breaker)
 
 # =============================================================================
 # RETRY LOGIC
 # =============================================================================
-def retry_with_backoff(max_retries=5, base_delay=2):
-    """Décorateur pour retry avec exponential backoff"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            retries = 0
-            while retries < max_retries:
-                try:
-                    return func(*args, **kwargs)
-                except (requests.exceptions.RequestException, requests.exceptions.Timeout) as e:
-                    retries += 1
-                    if retries >= max_retries:
-                        log(f"❌ Échec définitif après {max_retries} tentatives")
-                        return False
-                    
-                    delay = base_delay * (2 ** (retries - 1))  # 2, 4, 8, 16, 32 seconds
-                    log(f"⚠️  Erreur: {e}, retry {retries}/{max_retries} dans {delay}s...")
-                    time.sleep(delay)
-            return False
-        return wrapper
-    return decorator
+# Un envoi en échec est garé avec l'heure de sa prochaine tentative (2, 4, 8,
+# 16s): la boucle continue de lire et d'envoyer les nouveaux pointages pendant
+# ce temps. Après MAX_RETRIES tentatives il part dans la queue locale.
+retry_scheduler = RetryScheduler(base_delay=BASE_RETRY_DELAY, max_retries=MAX_RETRIES)
+
+# =============================================================================
+# RELÈVE ADAPTATIVE
+# =============================================================================
+# Intervalle recalculé après chaque relève: serré autour des horaires de shift
+# du tenant, suivant le débit observé, espacé quand le terminal est inactif
+poll_scheduler = None
+if ADAPTIVE_POLLING:
+    poll_scheduler = PollScheduler(
+        ShiftWindows(shift_windows_url(BACKEND_URL), {"X-Device-ID": DEVICE_ID, "X-Tenant-ID": TENANT_ID},
+                     SHIFT_BOUNDARIES, log=log),
+        base_interval=CHECK_INTERVAL,
+    )
+    metrics.track_poll_scheduler(poll_scheduler)
 
 # =============================================================================
 # QUEUE LOCALE
 # =============================================================================
+local_queue = None
+
+def get_local_queue():
+    """Ouvre la queue locale (WAL segmenté) et migre l'ancienne queue JSON si présente"""
+    global local_queue
+    if local_queue is None:
+        local_queue = WriteAheadQueue(QUEUE_DIR)
+        metrics.track_queue_depth(lambda: len(local_queue))
+        legacy = Path(QUEUE_FILE)
+        if legacy.exists():
+            try:
+                with open(legacy, 'r') as f:
+                    items = json.load(f)
+                local_queue.append_many(items)
+                legacy.rename(legacy.with_name(legacy.name + ".migrated"))
+                log(f"📦 Ancienne queue migrée: {len(items)} pointages")
+            except Exception as e:
+                log(f"❌ Erreur migration ancienne queue: {e}")
+    return local_queue
+
 def save_to_local_queue(attendance_data):
     """Sauvegarder le pointage localement si l'envoi échoue"""
-    queue = []
-    if Path(QUEUE_FILE).exists():
-        try:
-            with open(QUEUE_FILE, 'r') as f:
-                queue = json.load(f)
-        except:
-            queue = []
-    
-    queue.append(attendance_data)
-    
     try:
-        with open(QUEUE_FILE, 'w') as f:
-            json.dump(queue, f, indent=2)
+        queue = get_local_queue()
+        queue.append(attendance_data)
         log(f"💾 Pointage sauvegardé localement (queue: {len(queue)} pointages)")
         return True
     except Exception as e:
         log(f"❌ Erreur sauvegarde locale: {e}")
         return False
 
-def process_local_queue():
-    """Envoyer les pointages en attente"""
-    if not Path(QUEUE_FILE).exists():
-        return
-    
+# Vidage: voies parallèles par employé (ordre de chaque employé conservé),
+# débit plafonné, circuit breaker consulté avant chaque envoi, checkpoint
+# après chaque lot acquitté, progression (débit, ETA) dans le log
+backlog_drainer = None
+# Session partagée (connexions keep-alive) pour tous les envois au backend:
+# voies de vidage + envoi en direct
+backend_session = requests.Session()
+backend_session.mount("http://", HTTPAdapter(pool_maxsize=DRAIN_WORKERS + 1))
+backend_session.mount("https://", HTTPAdapter(pool_maxsize=DRAIN_WORKERS + 1))
+
+def post_queued(item):
+    """Envoi d'un pointage de la queue (True si traité par le backend)"""
+    started = time.perf_counter()
     try:
-        with open(QUEUE_FILE, 'r') as f:
-            queue = json.load(f)
-    except:
+        response = backend_session.post(BACKEND_URL, json=item, headers=HEADERS, timeout=TIMEOUT)
+    except requests.exceptions.RequestException:
+        metrics.observe_request(time.perf_counter() - started, False)
+        return False
+    metrics.observe_request(time.perf_counter() - started, response.status_code == 201)
+    if response.status_code == 201:
+        log(f"✅ Pointage historique envoyé: {item['employeeId']} à {item['timestamp']}")
+        return True
+    if 400 <= response.status_code < 500 and response.status_code != 429:
+        # Rejet définitif (employé inconnu, données invalides): ne pas bloquer la queue
+        log(f"❌ Pointage historique rejeté {response.status_code}: {item['employeeId']} à {item['timestamp']}")
+        return True
+    return False
+
+def process_local_queue():
+    """Envoyer les pointages en attente (ordre par employé, checkpoint après chaque lot)"""
+    global backlog_drainer
+    queue = get_local_queue()
+    if not len(queue):
         return
     
-    if not queue:
-        return
+    if backlog_drainer is None:
+        backlog_drainer = BacklogDrainer(queue, post_queued, breaker=circuit_breaker, workers=DRAIN_WORKERS,
+                                         rate=DRAIN_RATE, batch_size=QUEUE_BATCH_SIZE, log=log)
+        metrics.track_backlog_drain(backlog_drainer)
     
     log(f"📤 Traitement de {len(queue)} pointages en attente...")
-    
-    remaining = []
-    sent_count = 0
-    
-    for item in queue:
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "X-Device-ID": DEVICE_ID,
-                "X-Tenant-ID": TENANT_ID,
-            }
-            
-            response = requests.post(BACKEND_URL, json=item, headers=headers, timeout=TIMEOUT)
-            
-            if response.status_code == 201:
-                log(f"✅ Pointage historique envoyé: {item['employeeId']} à {item['timestamp']}")
-                sent_count += 1
-            else:
-                remaining.append(item)
-        except:
-            remaining.append(item)
-    
-    # Sauvegarder ce qui reste
-    try:
-        with open(QUEUE_FILE, 'w') as f:
-            json.dump(remaining, f, indent=2)
-        log(f"📊 Queue: {sent_count} envoyés, {len(remaining)} restants")
-    except Exception as e:
-        log(f"❌ Erreur mise à jour queue: {e}")
+    backlog_drainer.drain()
 
 # =============================================================================
 # ENVOI AU BACKEND
 # =============================================================================
-@retry_with_backoff(max_retries=MAX_RETRIES, base_delay=BASE_RETRY_DELAY)
-def send_attendance_to_backend_with_retry(payload, headers):
-    """Envoie avec retry automatique"""
-    response = requests.post(BACKEND_URL, json=payload, headers=headers, timeout=TIMEOUT)
+HEADERS = {
+    "Content-Type": "application/json",
+    "X-Device-ID": DEVICE_ID,
+    "X-Tenant-ID": TENANT_ID,
+}
+
+def post_attendance(payload):
+    """Une tentative d'envoi (True si accepté par le backend)"""
+    started = time.perf_counter()
+    try:
+        response = backend_session.post(BACKEND_URL, json=payload, headers=HEADERS, timeout=TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        metrics.observe_request(time.perf_counter() - started, False)
+        log(f"⚠️  Erreur: {e}")
+        return False
+    metrics.observe_request(time.perf_counter() - started, response.status_code == 201)
     
     if response.status_code == 201:
         return True
@@ -222,7 +212,33 @@ def send_attendance_to_backend_with_retry(payload, headers):
         log(f"❌ Erreur {response.status_code}: {response.text}")
         return False
 
-def send_attendance_to_backend(attendance):
+def attempt_delivery(payload, sn=None, attempt=1):
+    """
+    Tente l'envoi d'un pointage (sn = position dans le journal du terminal).
+    En cas d'échec, le pointage est garé pour une nouvelle tentative, ou
+    sauvegardé dans la queue locale une fois MAX_RETRIES tentatives épuisées.
+    """
+    # Utiliser le circuit breaker
+    if circuit_breaker.call(post_attendance, payload):
+        log(f"✅ Pointage envoyé: {payload['employeeId']} à {payload['timestamp']}")
+        return True
+    
+    if retry_scheduler.park({"payload": payload, "sn": sn}, attempt):
+        log(f"⚠️  Échec envoi, tentative {attempt + 1}/{MAX_RETRIES} programmée")
+    else:
+        log(f"❌ Échec définitif après {MAX_RETRIES} tentatives, sauvegarde locale...")
+        save_to_local_queue(payload)
+    return False
+
+def process_due_retries():
+    """Relance les envois garés arrivés à échéance; retourne leur nombre"""
+    due = retry_scheduler.due()
+    for item, attempt in due:
+        metrics.retries.inc()
+        attempt_delivery(item["payload"], item["sn"], attempt + 1)
+    return len(due)
+
+def send_attendance_to_backend(attendance, sn=None):
     """Envoie un pointage vers le backend PointaFlex"""
     employee_id = str(attendance.user_id)
     
@@ -244,100 +260,131 @@ def send_attendance_to_backend(attendance):
         }
     }
     
-    headers = {
-        "Content-Type": "application/json",
-        "X-Device-ID": DEVICE_ID,
-        "X-Tenant-ID": TENANT_ID,
-    }
-    
-    # Utiliser le circuit breaker
-    success = circuit_breaker.call(send_attendance_to_backend_with_retry, payload, headers)
-    
-    if success:
-        log(f"✅ Pointage envoyé: {employee_id} à {attendance.timestamp}")
-        return True
-    else:
-        # Si échec, sauvegarder localement
-        log(f"⚠️  Échec envoi, sauvegarde locale...")
-        save_to_local_queue(payload)
-        return False
+    return attempt_delivery(payload, sn)
+
+def durable_position(cursor):
+    """
+    Position du curseur à écrire sur disque: pas au-delà du plus ancien pointage
+    garé (qui n'est encore ni envoyé ni en queue locale), pour qu'il soit relu
+    après un arrêt brutal.
+    """
+    parked = [item["sn"] for item in retry_scheduler.pending() if item["sn"] is not None]
+    return min([cursor.last_sn] + parked)
+
+def flush_parked_to_local_queue(cursor):
+    """À l'arrêt: les envois garés passent dans la queue locale"""
+    parked = retry_scheduler.drain()
+    saved = all([save_to_local_queue(item["payload"]) for item in parked])
+    if parked:
+        log(f"💾 {len(parked)} envoi(s) en attente de retry sauvegardé(s) dans la queue locale")
+    if cursor.exists and saved:
+        cursor.save()
+
+def wait_until(deadline):
+    """Attend jusqu'à deadline (time.monotonic) en traitant les retries échus"""
+    while True:
+        process_due_retries()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        next_retry = retry_scheduler.seconds_until_next()
+        time.sleep(remaining if next_retry is None else min(remaining, next_retry))
 
 # =============================================================================
 # BOUCLE PRINCIPALE
 # =============================================================================
+def run_sync(session, conn, cursor):
+    """Synchronisation sur une connexion ouverte (retourne via exception si elle est perdue)"""
+    users_count, total_records = session.counts()
+    log(f"✅ Connecté: {session.device_name()}")
+    log(f"📊 Firmware: {session.firmware_version()}")
+    log(f"👥 Utilisateurs: {users_count}")
+    
+    # Traiter la queue locale au démarrage
+    process_local_queue()
+    
+    log(f"📊 Total: {total_records} pointages dans le terminal")
+    
+    if not cursor.exists:
+        cursor.reset(total_records)
+        log("📍 Curseur initialisé sur le dernier pointage du terminal")
+    elif total_records > cursor.last_sn:
+        log(f"📊 En attente depuis le dernier arrêt: {total_records - cursor.last_sn} pointages")
+    
+    log(f"🚀 Synchronisation active (intervalle: {'adaptatif' if poll_scheduler else f'{CHECK_INTERVAL}s'})")
+    
+    errors = 0
+    saved_position = cursor.last_sn
+    while True:
+        interval = CHECK_INTERVAL
+        try:
+            new_attendances = fetch_new_attendance(conn, cursor, log=log)
+            errors = 0
+            if poll_scheduler:
+                poll_scheduler.observe(len(new_attendances))
+                interval = poll_scheduler.next_interval()
+            
+            if new_attendances:
+                metrics.record_read(len(new_attendances), new_attendances[-1].timestamp)
+                log(f"📥 {len(new_attendances)} nouveau(x) pointage(s)")
+                
+                for attendance in new_attendances:
+                    # En cas d'échec le pointage est garé puis, si besoin, mis en queue locale
+                    send_attendance_to_backend(attendance, cursor.last_sn)
+                    cursor.advance(attendance)
+            
+            position = durable_position(cursor)
+            if new_attendances or position != saved_position:
+                cursor.save(position)
+                saved_position = position
+            
+            # Essayer de traiter la queue locale régulièrement
+            if circuit_breaker.state == "CLOSED":
+                process_local_queue()
+            
+        except Exception as e:
+            metrics.parse_failures.inc()
+            log(f"⚠️  Erreur boucle: {e}")
+            errors += 1
+            if errors >= MAX_LOOP_ERRORS:
+                raise  # Connexion probablement perdue: reconnexion
+        
+        # Les retries échus sont relancés pendant l'attente du prochain polling
+        wait_until(time.monotonic() + interval)
+
 def main():
-    """Boucle principale de synchronisation"""
+    """Boucle principale de synchronisation (reconnexion en boucle)"""
     log("=" * 70)
     log(f"🔄 Démarrage - Connexion à {TERMINAL_IP}:{TERMINAL_PORT}")
     log(f"📋 Device ID: {DEVICE_ID}")
     log(f"⚙️  Timeout: {TIMEOUT}s, Retry: {MAX_RETRIES}, Backoff: {BASE_RETRY_DELAY}s")
     log("=" * 70)
     
-    zk = ZK(TERMINAL_IP, port=TERMINAL_PORT, timeout=TIMEOUT)  # Timeout augmenté
-    conn = None
-    
+    cursor = AttendanceCursor(CURSOR_FILE)
+    # Session persistante: métadonnées en cache, recul exponentiel si le terminal est injoignable
+    SESSIONS.log = log
+    session = SESSIONS.session(TERMINAL_IP, TERMINAL_PORT, timeout=TIMEOUT)  # Timeout augmenté
     try:
-        conn = zk.connect()
-        log(f"✅ Connecté: {conn.get_device_name()}")
-        log(f"📊 Firmware: {conn.get_firmware_version()}")
-        log(f"👥 Utilisateurs: {len(conn.get_users())}")
-        
-        # Traiter la queue locale au démarrage
-        process_local_queue()
-        
-        all_attendances = conn.get_attendance()
-        
-        if all_attendances:
-            log(f"📊 Total: {len(all_attendances)} pointages dans le terminal")
-            cutoff_date = datetime.now() - timedelta(days=1)
-            recent_attendances = [a for a in all_attendances if a.timestamp >= cutoff_date]
-            
-            if recent_attendances:
-                log(f"📊 Récents (24h): {len(recent_attendances)} pointages")
-            
-            last_timestamp = max([a.timestamp for a in all_attendances])
-        else:
-            last_timestamp = datetime.now()
-            log("📊 Aucun pointage dans le terminal")
-        
-        log(f"🚀 Synchronisation active (intervalle: {CHECK_INTERVAL}s)")
-        
         while True:
+            conn = None
             try:
-                attendances = conn.get_attendance()
-                new_attendances = [a for a in attendances if a.timestamp > last_timestamp]
-                
-                if new_attendances:
-                    log(f"📥 {len(new_attendances)} nouveau(x) pointage(s)")
-                    
-                    for attendance in new_attendances:
-                        success = send_attendance_to_backend(attendance)
-                        if success:
-                            last_timestamp = attendance.timestamp
-                
-                # Essayer de traiter la queue locale régulièrement
-                if circuit_breaker.state == "CLOSED":
-                    process_local_queue()
-                
-                time.sleep(CHECK_INTERVAL)
-                
+                with session.lease() as conn:
+                    run_sync(session, conn, cursor)
             except Exception as e:
-                log(f"⚠️  Erreur boucle: {e}")
-                time.sleep(CHECK_INTERVAL)
-    
-    except Exception as e:
-        log(f"❌ Erreur de connexion: {e}")
-        log("Tentative de reconnexion dans 30 secondes...")
-        time.sleep(30)
-        # Redémarrer
-        main()
-    
+                log(f"❌ Erreur de connexion: {e}")
+            finally:
+                if conn:
+                    session.close()
+                    log("👋 Déconnecté")
+            
+            delay = max(RECONNECT_DELAY, session.retry_in())
+            log(f"Tentative de reconnexion dans {delay:.0f} secondes...")
+            wait_until(time.monotonic() + delay)
     finally:
-        if conn:
-            conn.disconnect()
-            log("👋 Déconnecté")
+        flush_parked_to_local_queue(cursor)
 
 if __name__ == "__main__":
+    start_metrics_server(METRICS_PORT)
     try:
         main()
     except KeyboardInterrupt:
@@ -1,11 +1,29 @@
 #!/usr/bin/env python3
 """
 Script de diagnostic pour tester la connexion au terminal ZKTeco
+
+Sans argument: teste les terminaux de TERMINALS un par un.
+Avec --scan: recherche les pointeuses sur des sous-réseaux (balayage TCP
+asynchrone des ports SDK 4370 et ADMS 8081, handshake ZKTeco en parallèle
+sur les terminaux qui répondent) et écrit un inventaire JSON.
+
+    python test_terminal_connection.py --scan 192.168.16.0/24 192.168.17.0/24
+    python test_terminal_connection.py --scan   # sous-réseaux /24 des TERMINALS
 """
 
+import argparse
+import asyncio
+import ipaddress
+import json
 import socket
 import sys
-from zk import ZK
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from zk_sessions import SESSIONS, TerminalSession
 
 # IPs des terminaux découverts
 TERMINALS = [
@@ -13,6 +31,16 @@ TERMINALS = [
     {"name": "Pointeuse Cl", "ip": "192.168.16.175", "port": 4370},
 ]
 
+# Mode --scan
+SDK_PORT = 4370
+ADMS_PORT = 8081
+SCAN_CONCURRENCY = 512  # Connexions TCP simultanées pendant le balayage
+MAX_SCAN_ADDRESSES = 65536  # Réseau le plus large accepté par --scan (un /16)
+CONNECT_TIMEOUT = 1.0  # Secondes: un port qui ne répond pas est considéré fermé
+HANDSHAKE_TIMEOUT = 5
+HANDSHAKE_WORKERS = 32  # Handshakes SDK en parallèle (pyzk est bloquant: un thread chacun)
+INVENTORY_FILE = "terminals_inventory.json"
+
 def test_tcp_connection(ip, port):
     """Teste la connexion TCP basique"""
     try:
@@ -25,23 +53,19 @@ def test_tcp_connection(ip, port):
         return False
 
 def test_zk_connection(ip, port):
-    """Teste la connexion via le SDK ZKTeco"""
+    """Teste la connexion via le SDK ZKTeco (session partagée, nom et firmware en cache)"""
     try:
-        zk = ZK(ip, port=port, timeout=5)
-        conn = zk.connect()
+        session = SESSIONS.session(ip, port, timeout=5)
 
-        # Récupérer les informations
-        device_name = conn.get_device_name()
-        firmware = conn.get_firmware_version()
-        users_count = len(conn.get_users())
-
-        conn.disconnect()
+        # Récupérer les informations (compteurs: une seule petite commande)
+        users_count, records = session.counts()
 
         return {
             "success": True,
-            "device_name": device_name,
-            "firmware": firmware,
-            "users": users_count
+            "device_name": session.device_name(),
+            "firmware": session.firmware_version(),
+            "users": users_count,
+            "records": records,
         }
     except Exception as e:
         return {
@@ -84,6 +108,7 @@ def main():
             print(f"   📊 Nom du terminal: {zk_result['device_name']}")
             print(f"   📊 Firmware: {zk_result['firmware']}")
             print(f"   👥 Utilisateurs: {zk_result['users']}")
+            print(f"   📋 Pointages: {zk_result['records']}")
             print()
             print(f"   ✅ Ce terminal peut être utilisé!")
             print(f"   💡 Modifier TERMINAL_IP = \"{ip}\" dans zkteco_bridge.py")
@@ -95,9 +120,170 @@ def main():
         print("-" * 70)
         print()
 
+# =============================================================================
+# MODE --scan: DÉCOUVERTE DU PARC
+# =============================================================================
+def expand_targets(targets):
+    """
+    Adresses à balayer ("192.168.16.0/24", "192.168.16.174"), sans doublon, dans l'ordre.
+    ValueError si une cible est invalide ou plus large que MAX_SCAN_ADDRESSES.
+    """
+    hosts = {}
+    for target in targets:
+        network = ipaddress.ip_network(target, strict=False)
+        if network.num_addresses > MAX_SCAN_ADDRESSES:
+            raise ValueError(f"{target}: réseau trop large ({network.num_addresses} adresses, "
+                             f"{MAX_SCAN_ADDRESSES} maximum, soit un /16)")
+        for address in list(network.hosts()) or [network.network_address]:
+            hosts[str(address)] = None
+    return list(hosts)
+
+async def probe_port(ip, port, semaphore, timeout):
+    """Temps d'ouverture de la connexion TCP en ms, None si le port est fermé"""
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        rtt = (time.perf_counter() - started) * 1000
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return rtt
+
+def identify_terminal(ip, port, timeout):
+    """Handshake SDK et informations d'un terminal (bloquant, exécuté dans un thread)"""
+    # Session jetable: pas de cache disque ni de ping (le port vient de répondre)
+    session = TerminalSession(ip, port, timeout, cache_dir=None, ommit_ping=True, log=lambda message: None)
+    started = time.perf_counter()
+    try:
+        info = {
+            "serial": session.serial_number(),
+            "name": session.device_name(),
+            "firmware": session.firmware_version(),
+        }
+        handshake = time.perf_counter() - started
+        # RTT: aller-retour d'une commande sur la session ouverte (hors charge du balayage)
+        started = time.perf_counter()
+        info["users"], info["records"] = session.counts()
+        info["rtt_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        info["handshake_ms"] = round(handshake * 1000, 1)
+        return info
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        session.close()
+
+async def scan(hosts, sdk_port=SDK_PORT, adms_port=ADMS_PORT, concurrency=SCAN_CONCURRENCY,
+               connect_timeout=CONNECT_TIMEOUT, handshake_timeout=HANDSHAKE_TIMEOUT):
+    """
+    Balaye les hôtes (ports SDK et ADMS en parallèle); le handshake SDK d'un
+    terminal démarre dès que son port répond, sans attendre la fin du balayage.
+    Les hôtes sont distribués à `concurrency` workers: le nombre de tâches
+    reste borné quelle que soit la taille du réseau.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(HANDSHAKE_WORKERS, thread_name_prefix="zk-handshake")
+    ports = [port for port in (sdk_port, adms_port) if port]
+
+    async def scan_host(ip):
+        rtts = await asyncio.gather(*(probe_port(ip, port, semaphore, connect_timeout) for port in ports))
+        open_ports = {port: rtt for port, rtt in zip(ports, rtts) if rtt is not None}
+        if not open_ports:
+            return None
+        device = {
+            "ip": ip,
+            "open_ports": sorted(open_ports),
+            "connect_ms": round(min(open_ports.values()), 1),
+            "adms": adms_port in open_ports,
+        }
+        if sdk_port in open_ports:
+            device.update(await loop.run_in_executor(executor, identify_terminal, ip, sdk_port, handshake_timeout))
+        return device
+
+    found = []
+    pending = enumerate(hosts)  # Partagé par les workers
+
+    async def worker():
+        for index, ip in pending:
+            device = await scan_host(ip)
+            if device:
+                found.append((index, device))
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(hosts)))))
+    finally:
+        executor.shutdown(wait=False)
+    return [device for _, device in sorted(found, key=lambda item: item[0])]
+
+def run_scan(args):
+    targets = args.scan or sorted({f"{terminal['ip']}/24" for terminal in TERMINALS})
+    try:
+        hosts = expand_targets(targets)
+    except ValueError as e:
+        print(f"❌ Cible de balayage refusée: {e}")
+        sys.exit(1)
+    print("=" * 70)
+    print(f"🔍 RECHERCHE DE POINTEUSES: {', '.join(targets)} ({len(hosts)} hôtes)")
+    print("=" * 70)
+
+    started = time.perf_counter()
+    devices = asyncio.run(scan(hosts, args.sdk_port, args.adms_port, args.concurrency,
+                               args.connect_timeout, args.handshake_timeout))
+    duration = time.perf_counter() - started
+
+    for device in devices:
+        ports = ", ".join(str(port) for port in device["open_ports"])
+        print(f"\n📱 {device['ip']} (ports {ports})")
+        if "serial" in device:
+            print(f"   📊 {device['name']} - n° série {device['serial']} - firmware {device['firmware']}")
+            print(f"   ⏱️  RTT {device['rtt_ms']} ms, handshake {device['handshake_ms']} ms")
+            print(f"   👥 Utilisateurs: {device['users']}   📋 Pointages: {device['records']}")
+        elif "error" in device:
+            print(f"   ❌ Handshake SDK en échec: {device['error']}")
+        if device["adms"]:
+            print(f"   📡 Port ADMS {args.adms_port} ouvert")
+
+    inventory = {
+        "scanned_at": datetime.now().isoformat(timespec="seconds"),
+        "targets": targets,
+        "hosts_scanned": len(hosts),
+        "duration_s": round(duration, 2),
+        "devices": devices,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(inventory, f, ensure_ascii=False, indent=2)
+
+    terminals = sum(1 for device in devices if "serial" in device)
+    print()
+    print("-" * 70)
+    print(f"✅ {len(hosts)} hôtes balayés en {duration:.1f}s: {len(devices)} répondent, {terminals} terminal(aux) identifié(s)")
+    print(f"💾 Inventaire: {args.out}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Diagnostic et découverte des terminaux ZKTeco")
+    parser.add_argument("--scan", nargs="*", metavar="RÉSEAU",
+                        help="Sous-réseaux (/16 au plus large) ou IP à balayer (défaut: /24 des TERMINALS)")
+    parser.add_argument("--sdk-port", type=int, default=SDK_PORT)
+    parser.add_argument("--adms-port", type=int, default=ADMS_PORT, help="0 pour ne pas balayer le port ADMS")
+    parser.add_argument("--concurrency", type=int, default=SCAN_CONCURRENCY,
+                        help=f"Connexions TCP simultanées (défaut: {SCAN_CONCURRENCY})")
+    parser.add_argument("--connect-timeout", type=float, default=CONNECT_TIMEOUT)
+    parser.add_argument("--handshake-timeout", type=int, default=HANDSHAKE_TIMEOUT)
+    parser.add_argument("--out", default=INVENTORY_FILE, help=f"Inventaire JSON (défaut: {INVENTORY_FILE})")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        main()
+        if args.scan is not None:
+            run_scan(args)
+        else:
+            main()
     except KeyboardInterrupt:
         print("\n\n🛑 Test interrompu")
         sys.exit(0)
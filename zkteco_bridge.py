@@ -4,10 +4,19 @@ ZKTeco Terminal Bridge - Envoie les pointages du terminal ZKTeco vers PointaFlex
 Nécessite: pip install pyzk requests
 """
 
+import argparse
+import logging
+import sys
 import time
 import requests
-from datetime import datetime
-from zk import ZK
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from agent_logging import setup_logging
+from agent_metrics import TerminalMetrics, start_metrics_server
+from attendance_cursor import AttendanceCursor, fetch_new_attendance
+from poll_scheduler import PollScheduler, ShiftWindows, shift_windows_url
+from zk_sessions import NETWORK_ERRORS, SESSIONS, SessionUnavailable, TerminalSession
 
 # Configuration
 TERMINAL_IP = "192.168.16.174"  # IP de votre terminal ZKTeco
@@ -16,6 +25,14 @@ BACKEND_URL = "http://localhost:3000/api/v1/attendance/webhook"
 DEVICE_ID = "TERMINAL-PRINC-001"
 TENANT_ID = "90fab0cc-8539-4566-8da7-8742e9b6937b"
 CHECK_INTERVAL = 10  # Vérifier toutes les 10 secondes
+ADAPTIVE_POLLING = True  # Relève serrée autour des horaires de shift, espacée hors activité (CHECK_INTERVAL = base)
+SHIFT_BOUNDARIES = []  # Horaires "HH:MM" utilisés si le backend ne répond pas (ex: ["08:00", "17:00"])
+LIVE_TIMEOUT = 1  # Mode --live: attente d'événement (s) avant de vérifier si une réconciliation est due
+RECONCILE_INTERVAL = 300  # Mode --live: rattrapage des pointages manqués (déconnexions) toutes les 5 min
+RECONNECT_DELAY = 30  # Mode --live: attente avant reconnexion au terminal
+CURSOR_FILE = f"last_sync_state_{DEVICE_ID}.json"  # Dernier enregistrement traité (lastSn)
+LOG_FILE = f"zkteco_bridge_{DEVICE_ID}.log"  # JSON-lines, rotation par taille (archives .1, .2, ...)
+METRICS_PORT = 9101  # Endpoint Prometheus http://localhost:9101/metrics (0 = désactivé)
 
 # Mapping des types de vérification ZKTeco
 VERIFY_MODE_MAP = {
@@ -26,6 +43,9 @@ VERIFY_MODE_MAP = {
     15: "RFID_BADGE",    # Badge RFID
 }
 
+logger = logging.getLogger("zkteco_bridge")
+metrics = TerminalMetrics(DEVICE_ID)
+
 def send_attendance_to_backend(attendance):
     """Envoie un pointage vers le backend PointaFlex"""
 
@@ -49,103 +69,217 @@ def send_attendance_to_backend(attendance):
         "X-Tenant-ID": TENANT_ID,
     }
 
+    started = time.perf_counter()
     try:
         response = requests.post(BACKEND_URL, json=payload, headers=headers, timeout=5)
+        metrics.observe_request(time.perf_counter() - started, response.status_code == 201)
         if response.status_code == 201:
-            print(f"✅ Pointage envoyé: {attendance.user_id} à {attendance.timestamp}")
+            logger.info(f"✅ Pointage envoyé: {attendance.user_id} à {attendance.timestamp}")
             return True
         else:
-            print(f"❌ Erreur {response.status_code}: {response.text}")
+            logger.error(f"❌ Erreur {response.status_code}: {response.text}")
             return False
     except Exception as e:
-        print(f"❌ Erreur d'envoi: {e}")
+        metrics.observe_request(time.perf_counter() - started, False)
+        logger.error(f"❌ Erreur d'envoi: {e}")
         return False
 
-def main():
-    """Boucle principale de synchronisation"""
+def punch_key(attendance):
+    return (str(attendance.user_id), attendance.timestamp, attendance.status)
 
-    print(f"🔄 Connexion au terminal ZKTeco à {TERMINAL_IP}:{TERMINAL_PORT}...")
+def build_scheduler():
+    """Planificateur de relève adaptatif (None: intervalle fixe CHECK_INTERVAL)"""
+    if not ADAPTIVE_POLLING:
+        return None
+    headers = {"X-Device-ID": DEVICE_ID, "X-Tenant-ID": TENANT_ID}
+    windows = ShiftWindows(shift_windows_url(BACKEND_URL), headers, SHIFT_BOUNDARIES, log=logger.info)
+    scheduler = PollScheduler(windows, base_interval=CHECK_INTERVAL)
+    metrics.track_poll_scheduler(scheduler)
+    return scheduler
 
-    zk = ZK(TERMINAL_IP, port=TERMINAL_PORT, timeout=5)
-    conn = None
+def poll_loop(conn, cursor):
+    """Mode par défaut: relecture du journal (intervalle adaptatif ou CHECK_INTERVAL)"""
+    scheduler = build_scheduler()
+    mode = "adaptatif" if scheduler else f"{CHECK_INTERVAL}s"
+    logger.info(f"\n🚀 Début de la synchronisation en temps réel (intervalle: {mode})")
+    logger.info("Appuyez sur Ctrl+C pour arrêter\n")
 
-    try:
-        conn = zk.connect()
-        print(f"✅ Connecté au terminal: {conn.get_device_name()}")
-        print(f"📊 Version firmware: {conn.get_firmware_version()}")
-        print(f"👥 Utilisateurs enregistrés: {len(conn.get_users())}")
-
-        # Récupérer tous les pointages pour obtenir le dernier ID
-        all_attendances = conn.get_attendance()
-
-        if all_attendances:
-            print(f"\n📊 Total de {len(all_attendances)} pointages dans le terminal")
-
-            # Ne synchroniser que les pointages récents (dernières 24h par défaut)
-            from datetime import datetime, timedelta
-            cutoff_date = datetime.now() - timedelta(days=1)
-
-            recent_attendances = [a for a in all_attendances if a.timestamp >= cutoff_date]
-
-            if recent_attendances:
-                print(f"📊 {len(recent_attendances)} pointages des dernières 24h seront synchronisés")
-
-                # Demander confirmation si beaucoup de pointages
-                if len(recent_attendances) > 100:
-                    print(f"\n⚠️  ATTENTION: {len(recent_attendances)} pointages à synchroniser")
-                    print("Voulez-vous continuer? (O/N)")
-                    # Note: En production, on skip cette confirmation
-                    # response = input().upper()
-                    # if response != 'O':
-                    #     print("Synchronisation annulée")
-                    #     return
-
-            # Marquer comme déjà traités (commencer à partir de maintenant)
-            last_timestamp = max([a.timestamp for a in all_attendances])
+    while True:
+        interval = CHECK_INTERVAL
+        try:
+            # Lire uniquement les pointages enregistrés depuis le curseur
+            new_attendances = fetch_new_attendance(conn, cursor, log=logger.warning)
+
+            if new_attendances:
+                metrics.record_read(len(new_attendances), new_attendances[-1].timestamp)
+                logger.info(f"\n📥 {len(new_attendances)} nouveau(x) pointage(s) détecté(s)")
+
+                for attendance in new_attendances:
+                    if not send_attendance_to_backend(attendance):
+                        # Réessayer au prochain passage sans changer l'ordre
+                        break
+                    cursor.advance(attendance)
+                cursor.save()
+
+            if scheduler:
+                scheduler.observe(len(new_attendances))
+                interval = scheduler.next_interval()
+
+        except Exception as e:
+            metrics.parse_failures.inc()
+            logger.warning(f"⚠️ Erreur lors de la récupération: {e}")
+
+        # Attendre avant la prochaine vérification
+        time.sleep(interval)
+
+def reconcile(conn, cursor, forwarded, recovered):
+    """
+    Rattrapage du mode --live: lit le journal depuis le curseur (lecture
+    incrémentale, une commande si rien de nouveau) et envoie les pointages
+    qui n'ont pas été transmis en direct (ajoutés à recovered). Retourne le
+    nombre de rattrapés.
+    """
+    new_attendances = fetch_new_attendance(conn, cursor, log=logger.warning)
+    missed = 0
+    for attendance in new_attendances:
+        key = punch_key(attendance)
+        if key in forwarded:
+            forwarded.discard(key)
         else:
-            last_timestamp = datetime.now()
-            print("\n📊 Aucun pointage dans le terminal")
+            if not send_attendance_to_backend(attendance):
+                cursor.save()
+                return missed
+            metrics.record_read(1, attendance.timestamp)
+            recovered.add(key)
+            missed += 1
+        cursor.advance(attendance)
+    cursor.save()
+    # Journal relu jusqu'au bout: tous les pointages transmis en direct y figurent
+    forwarded.clear()
+    return missed
+
+def live_loop(conn, cursor, reconcile_interval=RECONCILE_INTERVAL):
+    """
+    Mode --live: le terminal pousse chaque pointage (événements temps réel)
+    et il est transmis immédiatement. La capture reste ouverte pendant toute
+    la session (get_users() une seule fois, à son ouverture); les
+    réconciliations passent par une seconde connexion, ouverte le temps de
+    relire le journal. Le curseur n'avance qu'à la réconciliation, qui
+    rattrape les pointages manqués (déconnexion, envoi en échec).
+    """
+    forwarded = set()  # Pointages transmis en direct depuis la dernière réconciliation
+    recovered = set()  # Pointages rattrapés dont l'événement peut encore être en attente sur la capture
+    # Hors de SESSIONS: la session de capture (même terminal) reste prêtée à live_loop
+    reconcile_session = TerminalSession(TERMINAL_IP, TERMINAL_PORT, timeout=5, cache_dir=None, log=logger.info)
+    logger.info(f"\n🚀 Capture en temps réel (réconciliation toutes les {reconcile_interval}s)")
+    logger.info("Appuyez sur Ctrl+C pour arrêter\n")
 
-        print(f"\n🚀 Début de la synchronisation en temps réel (intervalle: {CHECK_INTERVAL}s)")
-        print("Appuyez sur Ctrl+C pour arrêter\n")
+    # Rattrapage initial sur la connexion principale, avant l'ouverture de la capture
+    missed = reconcile(conn, cursor, forwarded, recovered)
+    if missed:
+        logger.info(f"🔁 Réconciliation: {missed} pointage(s) rattrapé(s)")
 
-        while True:
+    deadline = time.monotonic() + reconcile_interval
+    try:
+        for attendance in conn.live_capture(new_timeout=LIVE_TIMEOUT):
+            if attendance is not None:
+                key = punch_key(attendance)
+                if key in recovered:
+                    # Événement lu après la réconciliation qui l'a déjà envoyé
+                    recovered.discard(key)
+                else:
+                    metrics.record_read(1, attendance.timestamp)
+                    logger.info(f"📥 Pointage reçu en direct: {attendance.user_id} à {attendance.timestamp}")
+                    # En échec: renvoyé par la réconciliation (absent de forwarded)
+                    if send_attendance_to_backend(attendance):
+                        forwarded.add(key)
+            if time.monotonic() < deadline:
+                continue
+            deadline = time.monotonic() + reconcile_interval
+            # Les événements arrivés pendant la relecture attendent dans le socket de capture
+            recovered.clear()
             try:
-                # Récupérer tous les pointages
-                attendances = conn.get_attendance()
+                with reconcile_session.lease() as reconcile_conn:
+                    missed = reconcile(reconcile_conn, cursor, forwarded, recovered)
+                if missed:
+                    logger.info(f"🔁 Réconciliation: {missed} pointage(s) rattrapé(s)")
+            except (SessionUnavailable, *NETWORK_ERRORS) as e:
+                logger.warning(f"⚠️ Réconciliation reportée: {e}")
+            finally:
+                # Le terminal limite les connexions simultanées: pas de seconde session en attente
+                reconcile_session.close()
+    finally:
+        reconcile_session.close()
 
-                # Filtrer uniquement les nouveaux pointages (après le dernier timestamp)
-                new_attendances = [a for a in attendances if a.timestamp > last_timestamp]
+    # pyzk termine la capture sur Ctrl+C sans propager l'interruption
+    raise KeyboardInterrupt
 
-                if new_attendances:
-                    print(f"\n📥 {len(new_attendances)} nouveau(x) pointage(s) détecté(s)")
+def main(live=False, reconcile_interval=RECONCILE_INTERVAL):
+    """Boucle principale de synchronisation"""
 
-                    for attendance in new_attendances:
-                        success = send_attendance_to_backend(attendance)
-                        if success:
-                            last_timestamp = attendance.timestamp
+    # Session persistante: nom, firmware et utilisateurs en cache, reconnexion à chaud
+    SESSIONS.log = logger.info
+    session = SESSIONS.session(TERMINAL_IP, TERMINAL_PORT, timeout=5)
 
-                # Attendre avant la prochaine vérification
-                time.sleep(CHECK_INTERVAL)
+    while True:
+        logger.info(f"🔄 Connexion au terminal ZKTeco à {TERMINAL_IP}:{TERMINAL_PORT}...")
+        conn = None
 
-            except Exception as e:
-                print(f"⚠️ Erreur lors de la récupération: {e}")
-                time.sleep(CHECK_INTERVAL)
+        try:
+            with session.lease() as conn:
+                users_count, total_records = session.counts()
+                logger.info(f"✅ Connecté au terminal: {session.device_name()}")
+                logger.info(f"📊 Version firmware: {session.firmware_version()}")
+                logger.info(f"👥 Utilisateurs enregistrés: {users_count}")
 
-    except Exception as e:
-        print(f"❌ Erreur de connexion: {e}")
-        print("\nVérifiez:")
-        print("  1. L'IP du terminal est correcte")
-        print("  2. Le terminal est allumé et connecté au réseau")
-        print("  3. Le port 4370 n'est pas bloqué par un firewall")
+                # Curseur persisté: seuls les nouveaux enregistrements sont lus à chaque vérification
+                cursor = AttendanceCursor(CURSOR_FILE)
+                logger.info(f"\n📊 Total de {total_records} pointages dans le terminal")
 
-    finally:
-        if conn:
-            conn.disconnect()
-            print("\n👋 Déconnecté du terminal")
+                if not cursor.exists:
+                    # Premier démarrage: commencer à partir de maintenant
+                    cursor.reset(total_records)
+                    logger.info("📍 Curseur initialisé sur le dernier pointage du terminal")
+                elif total_records > cursor.last_sn:
+                    logger.info(f"📊 {total_records - cursor.last_sn} pointage(s) en attente depuis le dernier arrêt")
+
+                if live:
+                    live_loop(conn, cursor, reconcile_interval)
+                else:
+                    poll_loop(conn, cursor)
+
+        except Exception as e:
+            logger.error(f"❌ Erreur de connexion: {e}")
+            logger.info("\nVérifiez:")
+            logger.info("  1. L'IP du terminal est correcte")
+            logger.info("  2. Le terminal est allumé et connecté au réseau")
+            logger.info("  3. Le port 4370 n'est pas bloqué par un firewall")
+
+        finally:
+            if conn:
+                # Capture en direct interrompue: état de la connexion inconnu
+                session.close()
+                logger.info("\n👋 Déconnecté du terminal")
+
+        if not live:
+            return
+        # Les pointages enregistrés pendant la coupure sont rattrapés à la reconnexion
+        logger.info(f"🔁 Reconnexion dans {RECONNECT_DELAY}s")
+        time.sleep(RECONNECT_DELAY)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bridge terminal ZKTeco → PointaFlex")
+    parser.add_argument("--live", action="store_true",
+                        help="Capture des événements temps réel au lieu de la relecture périodique")
+    parser.add_argument("--reconcile-interval", type=int, default=RECONCILE_INTERVAL,
+                        help=f"Mode --live: secondes entre deux réconciliations (défaut: {RECONCILE_INTERVAL})")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
+    setup_logging("zkteco_bridge", LOG_FILE)
+    start_metrics_server(METRICS_PORT)
     try:
-        main()
+        main(args.live, args.reconcile_interval)
     except KeyboardInterrupt:
-        print("\n\n🛑 Arrêt de la synchronisation")
+        logger.info("\n\n🛑 Arrêt de la synchronisation")